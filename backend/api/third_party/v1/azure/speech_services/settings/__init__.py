@@ -0,0 +1,4 @@
+from .token_settings import (
+    AZURE_SPEECH_STS_URL_TEMPLATE, AZURE_SPEECH_STS_TIMEOUT_SEC, AZURE_SPEECH_STS_MAX_CONNECTIONS,
+    AZURE_SPEECH_TOKEN_TTL_SEC, AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC, AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC,
+)
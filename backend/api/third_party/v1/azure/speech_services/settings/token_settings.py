@@ -0,0 +1,11 @@
+# Azure Speech Services のアクセストークン (api.third_party.v1.azure.speech_services.utils.SpeechTokenBroker)
+# https://learn.microsoft.com/ja-jp/azure/ai-services/authentication#authenticate-with-an-access-token
+AZURE_SPEECH_STS_URL_TEMPLATE    = 'https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken'
+AZURE_SPEECH_STS_TIMEOUT_SEC     = 5.0
+AZURE_SPEECH_STS_MAX_CONNECTIONS = 10 # イベントループごとの STS へのコネクションの上限
+
+# トークンは発行から 10 分間有効. AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC を残して期限切れとする
+# 残りが AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC を下回ったらバックグラウンドで更新する
+AZURE_SPEECH_TOKEN_TTL_SEC           = 600
+AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC = 60
+AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC = 240
@@ -0,0 +1,198 @@
+"""
+Azure Speech Services のアクセストークンの取得と共有
+    - トークンは利用者間で共有できるため、リージョンごとに 1 つを Django のキャッシュに保存する (プロセス間で共有)
+    - 期限 (発行から AZURE_SPEECH_TOKEN_TTL_SEC - AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC) までキャッシュから返し、
+      残りが AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC を下回ったらバックグラウンドで更新する
+      (更新に失敗した場合は期限まで前のトークンを返す)
+    - 同じリージョンの取得が重なった場合は STS へのリクエストを 1 回にまとめる (single-flight. プロセス内)
+    - STS へはイベントループごとに共有する httpx.AsyncClient (コネクションプール・タイムアウト付き) でリクエストする
+"""
+import asyncio
+import httpx
+import threading
+import time
+import weakref
+from django.conf import settings
+from django.core.cache import cache
+from typing import Dict, Optional
+from ..settings import (
+    AZURE_SPEECH_STS_URL_TEMPLATE, AZURE_SPEECH_STS_TIMEOUT_SEC, AZURE_SPEECH_STS_MAX_CONNECTIONS,
+    AZURE_SPEECH_TOKEN_TTL_SEC, AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC, AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC,
+)
+
+CACHE_KEY_PREFIX = 'azure_speech_token'
+
+
+class AzureSpeechToken:
+
+    __slots__ = ('access_token', 'region', 'expires_at')
+
+    def __init__(self, access_token:str, region:str, expires_at:float):
+        self.access_token = access_token
+        self.region       = region
+        self.expires_at   = expires_at # time.time() の期限 (プロセス間で共有するため)
+
+    @property
+    def remaining_sec(self) -> float:
+        return self.expires_at - time.time()
+
+    @property
+    def max_age(self) -> int:
+        # Cookie の max_age (期限を超えてクライアントに残さない)
+        return max(int(self.remaining_sec), 0)
+
+
+class _LoopState:
+
+    __slots__ = ('client', 'inflight')
+
+    def __init__(self, client:httpx.AsyncClient):
+        self.client                            = client
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+
+class AzureSpeechTokenBroker:
+    """
+    Args:
+        subscription_key (str): Azure Speech Services のキー。
+        url_template (str): STS の URL ({region} をリージョンに置き換える)。
+        timeout_sec (float): STS へのリクエストのタイムアウト(秒)。
+        max_connections (int): イベントループごとの STS へのコネクションの上限。
+        ttl_sec (int): トークンの有効期間(秒)。
+        expiry_margin_sec (int): 有効期間の残りがこれ以下のトークンは返さない。
+        refresh_ahead_sec (int): 残りがこれを下回ったらバックグラウンドで更新する。
+
+    Example Usage:
+        token = await get_azure_speech_token_broker().get_token(region)
+        if token is None:
+            # 取得に失敗
+        token.access_token, token.max_age
+    """
+
+    def __init__(self,
+                 subscription_key:Optional[str],
+                 url_template:str       = AZURE_SPEECH_STS_URL_TEMPLATE,
+                 timeout_sec:float      = AZURE_SPEECH_STS_TIMEOUT_SEC,
+                 max_connections:int    = AZURE_SPEECH_STS_MAX_CONNECTIONS,
+                 ttl_sec:int            = AZURE_SPEECH_TOKEN_TTL_SEC,
+                 expiry_margin_sec:int  = AZURE_SPEECH_TOKEN_EXPIRY_MARGIN_SEC,
+                 refresh_ahead_sec:int  = AZURE_SPEECH_TOKEN_REFRESH_AHEAD_SEC,):
+        self.subscription_key  = subscription_key
+        self.url_template      = url_template
+        self.timeout_sec       = timeout_sec
+        self.max_connections   = max_connections
+        self.ttl_sec           = ttl_sec
+        self.expiry_margin_sec = expiry_margin_sec
+        self.refresh_ahead_sec = refresh_ahead_sec
+        self.stats_dict        = {'hit': 0, 'miss': 0, 'refresh': 0, 'upstream': 0, 'error': 0}
+        self._lock             = threading.Lock()
+        self._loop_states: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]' = weakref.WeakKeyDictionary()
+
+    async def get_token(self, region:str) -> Optional[AzureSpeechToken]:
+        """
+        Returns:
+            Optional[AzureSpeechToken]: 取得に失敗した場合は None
+        """
+        token = await self._get_cached_token(region)
+        if token is not None:
+            self.stats_dict['hit'] += 1
+            if token.remaining_sec < self.refresh_ahead_sec:
+                # 期限が近い → 待たずに今のトークンを返して、バックグラウンドで更新する
+                if region not in self._get_loop_state().inflight:
+                    self.stats_dict['refresh'] += 1
+                    self._get_inflight_task(region)
+            return token
+        self.stats_dict['miss'] += 1
+        # 呼び出し元がキャンセルされても、まとめた取得は続ける
+        return await asyncio.shield(self._get_inflight_task(region))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self.stats_dict,
+                'event_loops': len(self._loop_states),
+            }
+
+    async def aclose(self) -> None:
+        """
+        実行中のイベントループの httpx.AsyncClient を閉じる (テスト/シャットダウン用)
+        """
+        with self._lock:
+            state = self._loop_states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        for task in list(state.inflight.values()):
+            task.cancel()
+        await asyncio.gather(*state.inflight.values(), return_exceptions=True)
+        await state.client.aclose()
+
+    # ------------------------------
+    def _get_cache_key(self, region:str) -> str:
+        return f'{CACHE_KEY_PREFIX}:{region}'
+
+    def _get_loop_state(self) -> _LoopState:
+        # httpx.AsyncClient と取得中のタスクはイベントループに紐づく
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_states.get(loop)
+            if state is None:
+                client = httpx.AsyncClient(
+                    timeout = httpx.Timeout(self.timeout_sec),
+                    limits  = httpx.Limits(max_connections           = self.max_connections,
+                                           max_keepalive_connections = self.max_connections,),
+                )
+                state                   = _LoopState(client)
+                self._loop_states[loop] = state
+            return state
+
+    def _get_inflight_task(self, region:str) -> asyncio.Task:
+        state = self._get_loop_state()
+        task  = state.inflight.get(region)
+        if task is None:
+            task                   = asyncio.create_task(self._fetch_token(region, state.client))
+            state.inflight[region] = task
+            task.add_done_callback(lambda _: state.inflight.pop(region, None))
+        return task
+
+    async def _get_cached_token(self, region:str) -> Optional[AzureSpeechToken]:
+        cached = await cache.aget(self._get_cache_key(region))
+        if not cached:
+            return None
+        token = AzureSpeechToken(cached['access_token'], region, cached['expires_at'])
+        return token if token.remaining_sec > 0 else None
+
+    async def _fetch_token(self, region:str, client:httpx.AsyncClient) -> Optional[AzureSpeechToken]:
+        try:
+            self.stats_dict['upstream'] += 1
+            response = await client.post(
+                self.url_template.format(region=region),
+                headers = {
+                    'Ocp-Apim-Subscription-Key': self.subscription_key or '',
+                    'Content-Type':              'application/x-www-form-urlencoded',
+                },
+            )
+            response.raise_for_status()
+            lifetime_sec = self.ttl_sec - self.expiry_margin_sec
+            token        = AzureSpeechToken(response.text, region, time.time() + lifetime_sec)
+            await cache.aset(self._get_cache_key(region),
+                             {'access_token': token.access_token, 'expires_at': token.expires_at},
+                             timeout = lifetime_sec,)
+            return token
+        except Exception as e:
+            print(e)
+            self.stats_dict['error'] += 1
+            # 更新に失敗した場合は期限までキャッシュのトークンを返す
+            return await self._get_cached_token(region)
+
+
+_azure_speech_token_broker: Optional[AzureSpeechTokenBroker] = None
+
+def get_azure_speech_token_broker() -> AzureSpeechTokenBroker:
+    global _azure_speech_token_broker
+    if _azure_speech_token_broker is None:
+        _azure_speech_token_broker = AzureSpeechTokenBroker(settings.AZURE_SPEECH_SERVICES_SUBSCRIPTION_KEY)
+    return _azure_speech_token_broker
+
+async def aclose_azure_speech_token_clients() -> None:
+    if _azure_speech_token_broker is not None:
+        await _azure_speech_token_broker.aclose()
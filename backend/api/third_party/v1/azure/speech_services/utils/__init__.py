@@ -0,0 +1,4 @@
+from .SpeechTokenBroker import (
+    AzureSpeechToken, AzureSpeechTokenBroker,
+    get_azure_speech_token_broker, aclose_azure_speech_token_clients,
+)
@@ -1,12 +1,13 @@
 # https://www.django-rest-framework.org/api-guide/status-codes/
 # https://zenn.dev/microsoft/articles/azure_next_english_lesson
+from asgiref.sync import async_to_sync
 from django.conf import settings
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from api.utils import StandardThrottle
-import requests
+from .utils import get_azure_speech_token_broker
 
 class getTokenOrRefreshViewSet(APIView):
 
@@ -15,25 +16,14 @@ class getTokenOrRefreshViewSet(APIView):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.subscription_key = settings.AZURE_SPEECH_SERVICES_SUBSCRIPTION_KEY
-        self.speech_region    = settings.AZURE_SPEECH_SERVICES_REGION
+        self.speech_region = settings.AZURE_SPEECH_SERVICES_REGION
 
     def _get_speech_token(self):
         """
         Azure Speech Services 用のアクセストークンを取得する関数
+        (リージョンごとに共有するトークン. utils.SpeechTokenBroker)
         """
-        try:
-            url     = f'https://{self.speech_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken'
-            headers = {
-                'Ocp-Apim-Subscription-Key': self.subscription_key,
-                'Content-Type':              'application/x-www-form-urlencoded',
-            }
-            response = requests.post(url, data=None, headers=headers)
-            response.raise_for_status()
-            access_token = response.text
-            return access_token
-        except requests.exceptions.RequestException as e:
-            return None
+        return async_to_sync(get_azure_speech_token_broker().get_token)(self.speech_region)
 
     def post(self, request, *args, **kwargs):
         set_cookie_prefix = request.data.get('set_cookie_prefix')
@@ -53,23 +43,23 @@ class getTokenOrRefreshViewSet(APIView):
             return response
 
         try:
-            access_token = self._get_speech_token()
+            token = self._get_speech_token()
 
-            if access_token:
-                response = Response({
-                    'access_token': access_token,
-                    'region':       self.speech_region,
-                }, status=status.HTTP_200_OK)
-            else:
-                response = Response({
+            if not token:
+                return Response({
                     'message': 'Get Token failed',
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Cookie に CSRFトークン を設定
+            response = Response({
+                'access_token': token.access_token,
+                'region':       token.region,
+            }, status=status.HTTP_200_OK)
+
+            # Cookie にトークンを設定 (共有するトークンの期限まで)
             response.set_cookie(
                 key      = f'{set_cookie_prefix}speech-token',
-                value    = access_token+':'+self.speech_region,
-                max_age  = 540,
+                value    = token.access_token+':'+token.region,
+                max_age  = token.max_age,
                 httponly = False,
                 secure   = False if settings.DEBUG else True,
                 samesite = 'Lax',
@@ -79,4 +69,4 @@ class getTokenOrRefreshViewSet(APIView):
                 'message': 'Get Token failed',
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        return response
\ No newline at end of file
+        return response
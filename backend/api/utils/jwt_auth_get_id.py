@@ -1,6 +1,6 @@
 from django.conf import settings
 from rest_framework_simplejwt.tokens import AccessToken
-from common.auth import decode_jwe, get_session_token
+from common.auth import decode_session_token, get_session_token
 from typing import Optional, Dict
 
 
@@ -18,7 +18,7 @@ def jwt_auth_get_id(scope_cookies: Optional[Dict[str, str]] = None,
     user_id = None
     session_token = get_session_token(scope_cookies)
     if session_token:
-        session = decode_jwe(session_token)
+        session = decode_session_token(session_token)
         if session:
             # NextAuth の session名をハードコードしてるので注意
             access_token = session.get('accessToken')
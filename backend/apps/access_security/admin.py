@@ -12,6 +12,7 @@ class BlockIpListResource(ModelResource):
         fields = ('id',
                   'date_create',
                   'ip',
+                  'prefixlen',
                   'reason',)
         export_order = fields
         clean_model_instances = True
@@ -23,6 +24,7 @@ class BlockIpListAdmin(ExportMixin, admin.ModelAdmin):
     # 一覧画面
     list_display_ = ('date_create',
                      'ip',
+                     'prefixlen',
                      'reason',)
     list_filter   = ['date_create',]
     list_display       = list_display_
@@ -46,6 +48,7 @@ class BlockIpListAdmin(ExportMixin, admin.ModelAdmin):
         (_('記録'), {'fields': (
             'date_create',
             'ip',
+            'prefixlen',
             'reason',
             )}),
     )
@@ -6,7 +6,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from concurrency.fields import AutoIncVersionField
 from common.scripts.DjangoUtils import RequestUtil
-from datetime import timedelta
+from ..utils import get_access_log_writer
 from encrypted_fields.fields import (
     SearchField, EncryptedFieldMixin, EncryptedCharField,
 )
@@ -20,15 +20,9 @@ class AccessSecurityManager(models.Manager):
     
     @staticmethod
     def insert_access_log(request, type:str):
+        # 同じIPからのログは30分に1回ログ記録 (重複の確認と書き込みは AccessLogWriter)
         request_util = RequestUtil(request)
-        ip           = request_util.get_ip()
-        # 同じIPからのログは30分に1回ログ記録
-        logs = AccessSecurity.objects.filter(
-                                        ip               = ip,
-                                        type             = type,
-                                        date_create__gte = timezone.now()-timedelta(minutes=30),).first()
-        if not logs:
-            AccessSecurity.objects.create(
+        get_access_log_writer().enqueue(
                         ip               = request_util.get_ip(),
                         type             = type,
                         request_host_url = request_util.get_request_host_url(),
@@ -36,7 +30,7 @@ class AccessSecurityManager(models.Manager):
                         # user_agent       = request_util.get_user_agent(),
                         # csrf_token       = request_util.get_csrf_cookie(),
                         # time_zone        = request_util.get_time_zone(),
-            )
+        )
 
 
 class AccessSecurity(models.Model):
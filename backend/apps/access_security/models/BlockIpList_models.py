@@ -16,6 +16,11 @@ class BlockIpList(models.Model):
                     verbose_name = 'blockedIp',
                     blank        = False,
                     null         = False,)
+    # CIDR で登録する場合のプレフィックス長 (ip はネットワークアドレス. 空の場合は ip のみ)
+    prefixlen = models.PositiveSmallIntegerField(
+                    verbose_name = 'prefixLength',
+                    blank        = True,
+                    null         = True,)
     reason = EncryptedTextField(
                     verbose_name = 'blockedReasen',
                     blank        = True,
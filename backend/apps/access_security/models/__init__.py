@@ -1,3 +1,4 @@
 from .BlockIpList_models import BlockIpList
 from .AccessSecurity_models import AccessSecurity
-from .receivers.AccessSecurityModels_receivers import access_security_notice_admin
\ No newline at end of file
+from .receivers.AccessSecurityModels_receivers import access_security_notice_admin
+from .receivers.BlockIpList_receivers import block_ip_list_invalidate_cache
\ No newline at end of file
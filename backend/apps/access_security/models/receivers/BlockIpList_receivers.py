@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ...models import BlockIpList
+from ...utils import invalidate_ip_blocklist
+
+@receiver([post_save, post_delete], sender=BlockIpList)
+def block_ip_list_invalidate_cache(sender, instance, **kwargs) -> None:
+    # 登録済みブロックリストの索引を作成し直す
+    invalidate_ip_blocklist()
@@ -0,0 +1,12 @@
+from .blocklist_settings import (
+    IP_BLOCKLIST_CACHE_KEY, IP_BLOCKLIST_CACHE_TIMEOUT_SEC, IP_BLOCKLIST_LOCAL_TTL_SEC,
+)
+from .access_log_settings import (
+    ACCESS_LOG_BACKGROUND, ACCESS_LOG_DEDUPE_SEC, ACCESS_LOG_DEDUPE_MAX_KEYS,
+    ACCESS_LOG_BUFFER_SIZE, ACCESS_LOG_FLUSH_SEC, ACCESS_LOG_MAX_BATCH,
+)
+from .bot_settings import (
+    GOOGLE_BOT_HOST_SUFFIXES, GOOGLE_BOT_DNS_TIMEOUT_SEC, GOOGLE_BOT_DNS_MAX_THREADS,
+    GOOGLE_BOT_POSITIVE_TTL_SEC, GOOGLE_BOT_NEGATIVE_TTL_SEC,
+    GOOGLE_BOT_VERIFY_MAX_WORKERS, GOOGLE_BOT_VERIFY_MAX_PENDING,
+)
@@ -0,0 +1,10 @@
+# アクセス遮断のログ記録 (apps.access_security.utils.AccessLogWriter)
+# リクエストの処理ではバッファに積むだけで、バックグラウンドのスレッドがまとめて bulk_create する
+# 同じ IP・type のログは ACCESS_LOG_DEDUPE_SEC に 1 回 (プロセス内のメモリとキャッシュで判定. DB は読まない)
+# バッファが一杯の場合は記録せずに type ごとの件数だけ数える (レスポンスを待たせない)
+ACCESS_LOG_BACKGROUND      = True
+ACCESS_LOG_DEDUPE_SEC      = 30*60
+ACCESS_LOG_DEDUPE_MAX_KEYS = 10000 # プロセス内で記憶する (IP, type) の上限 (古い順に忘れる)
+ACCESS_LOG_BUFFER_SIZE     = 10000
+ACCESS_LOG_FLUSH_SEC       = 1.0
+ACCESS_LOG_MAX_BATCH       = 500
@@ -0,0 +1,7 @@
+# 登録済みブロックリスト (apps.access_security.utils.IpBlocklist)
+# DB から作成した索引をキャッシュに保存し (プロセス間で共有)、プロセスごとにも保持する
+# プロセスの索引は IP_BLOCKLIST_LOCAL_TTL_SEC ごとにキャッシュと照合する (それまではキャッシュを読まない)
+# BlockIpList の保存・削除でキャッシュを削除する (receivers.BlockIpList_receivers)
+IP_BLOCKLIST_CACHE_KEY         = 'registered_block_ip_list'
+IP_BLOCKLIST_CACHE_TIMEOUT_SEC = 60*60 # キャッシュの有効期間(秒)
+IP_BLOCKLIST_LOCAL_TTL_SEC     = 5     # プロセスの索引をキャッシュと照合する間隔(秒)
@@ -0,0 +1,10 @@
+# googlebot の判定 (apps.access_security.utils.BotVerifier)
+# 逆引き → 正引きで元の IP に戻ることを確認する (forward-confirmed reverse DNS)
+# 判定はバックグラウンドのスレッドで行い、判定が出るまではアクセス制限の対象とする
+GOOGLE_BOT_HOST_SUFFIXES      = ('.googlebot.com', '.google.com')
+GOOGLE_BOT_DNS_TIMEOUT_SEC    = 2.0      # 逆引き・正引きそれぞれのタイムアウト(秒)
+GOOGLE_BOT_DNS_MAX_THREADS    = 4        # 名前解決のスレッド数の上限 (タイムアウトした名前解決も終わるまで占有する)
+GOOGLE_BOT_POSITIVE_TTL_SEC   = 60*60*24 # googlebot の判定をキャッシュする期間(秒)
+GOOGLE_BOT_NEGATIVE_TTL_SEC   = 60*60    # googlebot でない判定 (タイムアウト含む) をキャッシュする期間(秒)
+GOOGLE_BOT_VERIFY_MAX_WORKERS = 2
+GOOGLE_BOT_VERIFY_MAX_PENDING = 1000     # 判定待ちの IP の上限 (超えた場合は判定せずに制限する)
@@ -0,0 +1,201 @@
+"""
+アクセス遮断のログ (AccessSecurity) の記録 (AccessSecurity.objects.insert_access_log)
+    - リクエストの処理では重複を確認してバッファ (queue.Queue, 上限 ACCESS_LOG_BUFFER_SIZE) に積むだけにする
+      (攻撃を受けている間に、遮断したリクエストごとに SELECT と INSERT を実行しない)
+    - 同じ (IP, type) は ACCESS_LOG_DEDUPE_SEC に 1 回
+        - プロセス内: 最後に記録した時刻を ACCESS_LOG_DEDUPE_MAX_KEYS 件まで保持する
+        - プロセス間: 書き込み前に cache.add で確認する (バックグラウンドのスレッドで行う)
+    - バックグラウンドのスレッドが ACCESS_LOG_FLUSH_SEC ごと (または ACCESS_LOG_MAX_BATCH 件) に bulk_create する
+      bulk_create は post_save を送らないため、作成後に post_save を送る (receivers の管理者への通知)
+    - バッファが一杯の場合は記録せず、type ごとの件数を数えて次の書き込みで出力する
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import cache as default_cache
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from django.utils import timezone
+from typing import Dict, List, Optional, Tuple
+from ..settings import (
+    ACCESS_LOG_BACKGROUND, ACCESS_LOG_DEDUPE_SEC, ACCESS_LOG_DEDUPE_MAX_KEYS,
+    ACCESS_LOG_BUFFER_SIZE, ACCESS_LOG_FLUSH_SEC, ACCESS_LOG_MAX_BATCH,
+)
+
+CACHE_KEY_PREFIX = 'access_security_log'
+
+
+class AccessLogEntry:
+
+    __slots__ = ('ip', 'type', 'request_host_url', 'date_create')
+
+    def __init__(self, ip:str, type:str, request_host_url:Optional[str] = None, date_create = None):
+        self.ip               = ip
+        self.type             = type
+        self.request_host_url = request_host_url
+        self.date_create      = date_create
+
+
+class AccessLogWriter:
+    """
+    Args:
+        is_background (bool): バックグラウンドのスレッドで書き込む (False の場合は flush() を呼ぶ)。
+        dedupe_sec (int): 同じ (IP, type) を記録しない期間(秒)。
+        dedupe_max_keys (int): プロセス内で記憶する (IP, type) の上限。
+        buffer_size (int): バッファの上限。
+        flush_sec (float): 書き込みの間隔(秒)。
+        max_batch (int): 1 回の bulk_create の最大件数。
+
+    Example Usage:
+        get_access_log_writer().enqueue(ip, 'IP_BLOCK', request_host_url)
+    """
+
+    def __init__(self,
+                 is_background:bool  = ACCESS_LOG_BACKGROUND,
+                 dedupe_sec:int      = ACCESS_LOG_DEDUPE_SEC,
+                 dedupe_max_keys:int = ACCESS_LOG_DEDUPE_MAX_KEYS,
+                 buffer_size:int     = ACCESS_LOG_BUFFER_SIZE,
+                 flush_sec:float     = ACCESS_LOG_FLUSH_SEC,
+                 max_batch:int       = ACCESS_LOG_MAX_BATCH,
+                 cache               = None,):
+        self.is_background   = is_background
+        self.dedupe_sec      = dedupe_sec
+        self.dedupe_max_keys = dedupe_max_keys
+        self.flush_sec       = flush_sec
+        self.max_batch       = max_batch
+        self.cache           = cache or default_cache
+        self.stats_dict      = {'enqueued': 0, 'deduped': 0, 'dropped': 0, 'written': 0, 'error': 0}
+        self.dropped_dict: Dict[str, int] = {} # バッファが一杯で記録しなかった件数 (type ごと. 次の書き込みで出力する)
+        self._queue: queue.Queue = queue.Queue(maxsize=buffer_size)
+        self._recent: 'OrderedDict[Tuple[str, str], float]' = OrderedDict()
+        self._lock   = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, ip:str, type:str, request_host_url:Optional[str] = None) -> bool:
+        """
+        Returns:
+            bool: バッファに積んだか (重複・バッファが一杯の場合は False)
+        """
+        now = time.monotonic()
+        key = (ip, type)
+        with self._lock:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedupe_sec:
+                self.stats_dict['deduped'] += 1
+                return False
+            try:
+                self._queue.put_nowait(AccessLogEntry(ip, type, request_host_url, timezone.now()))
+            except queue.Full:
+                self.stats_dict['dropped'] += 1
+                self.dropped_dict[type] = self.dropped_dict.get(type, 0) + 1
+                return False
+            self._recent[key] = now
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.dedupe_max_keys:
+                self._recent.popitem(last=False)
+            self.stats_dict['enqueued'] += 1
+        if self.is_background:
+            self._ensure_thread()
+        return True
+
+    def flush(self) -> int:
+        """
+        バッファを書き込む (バックグラウンドのスレッド・テストから呼ぶ)
+
+        Returns:
+            int: 作成したログの件数
+        """
+        written = 0
+        while True:
+            entries = self._get_batch(block=False)
+            if not entries:
+                return written
+            written += self._write(entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats_dict, 'pending': self._queue.qsize()}
+
+    # ------------------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='AccessLogWriter', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            entries = self._get_batch(block=True)
+            if not entries:
+                continue
+            close_old_connections()
+            self._write(entries)
+            close_old_connections()
+
+    def _get_batch(self, block:bool) -> List[AccessLogEntry]:
+        entries = []
+        try:
+            if block:
+                entries.append(self._queue.get(timeout=self.flush_sec))
+                # 最初の 1 件から flush_sec まで、または max_batch 件までまとめる
+                deadline = time.monotonic() + self.flush_sec
+                while len(entries) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    entries.append(self._queue.get(timeout=timeout))
+            else:
+                while len(entries) < self.max_batch:
+                    entries.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return entries
+
+    def _write(self, entries:List[AccessLogEntry]) -> int:
+        from ..models import AccessSecurity
+        try:
+            with self._lock:
+                dropped_dict      = self.dropped_dict
+                self.dropped_dict = {}
+            if dropped_dict:
+                print(f'AccessLogWriter: buffer full, dropped {dropped_dict}')
+            # 他のプロセスで記録済みの (IP, type) は除く
+            objs = [
+                AccessSecurity(ip               = entry.ip,
+                               type             = entry.type,
+                               request_host_url = entry.request_host_url,
+                               date_create      = entry.date_create,)
+                for entry in entries
+                if self.cache.add(f'{CACHE_KEY_PREFIX}:{entry.type}:{entry.ip}', 1, timeout=self.dedupe_sec)
+            ]
+            if not objs:
+                return 0
+            AccessSecurity.objects.bulk_create(objs)
+            for obj in objs:
+                post_save.send(sender        = AccessSecurity,
+                               instance      = obj,
+                               created       = True,
+                               update_fields = None,
+                               raw           = False,
+                               using         = AccessSecurity.objects.db,)
+            self.stats_dict['written'] += len(objs)
+            return len(objs)
+        except Exception as e:
+            print(e)
+            self.stats_dict['error'] += len(entries)
+            return 0
+
+
+_access_log_writer: Optional[AccessLogWriter] = None
+_access_log_writer_lock = threading.Lock()
+
+def get_access_log_writer() -> AccessLogWriter:
+    global _access_log_writer
+    if _access_log_writer is None:
+        with _access_log_writer_lock:
+            if _access_log_writer is None:
+                _access_log_writer = AccessLogWriter()
+    return _access_log_writer
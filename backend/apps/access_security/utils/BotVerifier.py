@@ -0,0 +1,225 @@
+"""
+googlebot の判定 (config.settings.security.AccessSecurityMiddleware)
+    - 逆引きしたホスト名が GOOGLE_BOT_HOST_SUFFIXES で終わり、そのホスト名を正引きして元の IP に戻る場合のみ googlebot とする
+      (逆引きだけでは PTR を詐称できるため)
+    - DNS はプロセス内 (socket) で引き、GOOGLE_BOT_DNS_TIMEOUT_SEC でタイムアウトする (host コマンドを起動しない)
+      名前解決は上限付きのスレッド (GOOGLE_BOT_DNS_MAX_THREADS) で行い、タイムアウトはその Future に対して待つ
+      (応答しない名前解決はスレッドを占有し続けるが、スレッド数は上限を超えない)
+    - 判定はバックグラウンドのスレッド (ThreadPoolExecutor. 同時に判定する IP は GOOGLE_BOT_VERIFY_MAX_WORKERS まで) で行い、
+      リクエストの処理では待たない
+      判定が出るまでは unknown (None) を返す → 呼び出し側はアクセス制限の対象とする
+    - 判定はキャッシュに保存する (googlebot: GOOGLE_BOT_POSITIVE_TTL_SEC / それ以外: GOOGLE_BOT_NEGATIVE_TTL_SEC)
+    - resolver を差し替えてネットワークなしでテストできる (tests.common.FakeDnsResolver)
+"""
+import ipaddress
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.core.cache import cache as default_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from .CacheUtils import acache_call
+from ..settings import (
+    GOOGLE_BOT_HOST_SUFFIXES, GOOGLE_BOT_DNS_TIMEOUT_SEC, GOOGLE_BOT_DNS_MAX_THREADS,
+    GOOGLE_BOT_POSITIVE_TTL_SEC, GOOGLE_BOT_NEGATIVE_TTL_SEC,
+    GOOGLE_BOT_VERIFY_MAX_WORKERS, GOOGLE_BOT_VERIFY_MAX_PENDING,
+)
+
+CACHE_KEY_PREFIX = 'google_bot'
+
+
+class SocketDnsResolver:
+    """
+    socket による名前解決
+    socket の名前解決はタイムアウトを指定できないため、上限付きのスレッドで実行して Future を待つ時間を区切る
+
+    Args:
+        timeout_sec (float): 逆引き・正引きそれぞれのタイムアウト(秒)。
+        max_threads (int): 名前解決のスレッド数の上限。
+    """
+
+    def __init__(self,
+                 timeout_sec:float = GOOGLE_BOT_DNS_TIMEOUT_SEC,
+                 max_threads:int   = GOOGLE_BOT_DNS_MAX_THREADS,):
+        self.timeout_sec = timeout_sec
+        self.max_threads = max_threads
+        self._lock       = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def reverse(self, ip:str) -> str:
+        return self._call(socket.gethostbyaddr, ip)[0]
+
+    def forward(self, host:str) -> List[str]:
+        infos = self._call(socket.getaddrinfo, host, None)
+        return [info[4][0] for info in infos]
+
+    def shutdown(self, wait:bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _call(self, fnc:Callable, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='GoogleBotDns')
+            executor = self._executor
+        future = executor.submit(fnc, *args)
+        try:
+            return future.result(timeout=self.timeout_sec)
+        except FutureTimeoutError:
+            # 待機中であれば実行しない (実行中の名前解決は終わるまでスレッドを占有する)
+            future.cancel()
+            raise TimeoutError(f'dns lookup timed out: {args}')
+
+
+def _normalize_ip(ip:str) -> Optional[str]:
+    try:
+        return ipaddress.ip_address(ip.split('%')[0]).compressed
+    except ValueError:
+        return None
+
+
+class GoogleBotVerifier:
+    """
+    Args:
+        resolver: reverse(ip) -> ホスト名 / forward(ホスト名) -> [IP] を持つオブジェクト。
+        host_suffixes (Tuple[str, ...]): googlebot のホスト名の末尾。
+        positive_ttl_sec (int): googlebot の判定をキャッシュする期間(秒)。
+        negative_ttl_sec (int): googlebot でない判定をキャッシュする期間(秒)。
+        max_workers (int): 判定するスレッドの数。
+        max_pending (int): 判定待ちの IP の上限。
+        cache: Django のキャッシュ (None の場合は default)。
+
+    Example Usage:
+        verdict = google_bot_verifier.get_verdict(ip)
+        if verdict is None:
+            # 判定中 (制限する)
+        elif verdict:
+            # googlebot
+    """
+
+    def __init__(self,
+                 resolver                      = None,
+                 host_suffixes:Tuple[str, ...] = GOOGLE_BOT_HOST_SUFFIXES,
+                 positive_ttl_sec:int          = GOOGLE_BOT_POSITIVE_TTL_SEC,
+                 negative_ttl_sec:int          = GOOGLE_BOT_NEGATIVE_TTL_SEC,
+                 max_workers:int               = GOOGLE_BOT_VERIFY_MAX_WORKERS,
+                 max_pending:int               = GOOGLE_BOT_VERIFY_MAX_PENDING,
+                 cache                         = None,):
+        self.resolver         = resolver or SocketDnsResolver()
+        self.host_suffixes    = tuple(host_suffixes)
+        self.positive_ttl_sec = positive_ttl_sec
+        self.negative_ttl_sec = negative_ttl_sec
+        self.max_workers      = max_workers
+        self.max_pending      = max_pending
+        self.cache            = cache or default_cache
+        self.stats_dict       = {'hit': 0, 'scheduled': 0, 'skipped': 0, 'verified': 0, 'rejected': 0, 'error': 0}
+        self._pending: Set[str] = set()
+        self._lock     = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get_verdict(self, ip:str) -> Optional[bool]:
+        """
+        Returns:
+            Optional[bool]: googlebot か (判定中の場合は None. バックグラウンドで判定を始める)
+        """
+        verdict = self.cache.get(self._get_cache_key(ip))
+        if verdict is not None:
+            self.stats_dict['hit'] += 1
+            return bool(verdict)
+        self._schedule(ip)
+        return None
+
+    async def aget_verdict(self, ip:str) -> Optional[bool]:
+        """
+        get_verdict の非同期版 (非同期のミドルウェア用)
+        """
+        verdict = await acache_call(self.cache, 'get', self._get_cache_key(ip))
+        if verdict is not None:
+            self.stats_dict['hit'] += 1
+            return bool(verdict)
+        self._schedule(ip)
+        return None
+
+    def is_google_bot(self, ip:str) -> bool:
+        # 判定中は googlebot としない
+        return self.get_verdict(ip) is True
+
+    async def ais_google_bot(self, ip:str) -> bool:
+        return (await self.aget_verdict(ip)) is True
+
+    def verify(self, ip:str) -> bool:
+        """
+        逆引き → 正引きで判定してキャッシュに保存する (バックグラウンドのスレッド・テストから呼ぶ)
+        """
+        try:
+            verdict = self._verify(ip)
+        except Exception as e:
+            print(e)
+            self.stats_dict['error'] += 1
+            verdict = False
+        self.stats_dict['verified' if verdict else 'rejected'] += 1
+        self.cache.set(self._get_cache_key(ip),
+                       1 if verdict else 0,
+                       timeout = self.positive_ttl_sec if verdict else self.negative_ttl_sec,)
+        return verdict
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats_dict, 'pending': len(self._pending)}
+
+    def shutdown(self, wait:bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        resolver_shutdown = getattr(self.resolver, 'shutdown', None)
+        if resolver_shutdown is not None:
+            resolver_shutdown(wait=wait)
+
+    # ------------------------------
+    def _get_cache_key(self, ip:str) -> str:
+        return f'{CACHE_KEY_PREFIX}:{ip}'
+
+    def _verify(self, ip:str) -> bool:
+        normalized_ip = _normalize_ip(ip)
+        if normalized_ip is None:
+            return False
+        host = self.resolver.reverse(ip).rstrip('.').lower()
+        if not host.endswith(self.host_suffixes):
+            return False
+        # 正引きで元の IP に戻ること
+        return normalized_ip in {_normalize_ip(address) for address in self.resolver.forward(host)}
+
+    def _schedule(self, ip:str) -> None:
+        with self._lock:
+            if ip in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                self.stats_dict['skipped'] += 1
+                return
+            self._pending.add(ip)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='GoogleBotVerifier')
+            executor = self._executor
+            self.stats_dict['scheduled'] += 1
+        executor.submit(self._run, ip)
+
+    def _run(self, ip:str) -> None:
+        try:
+            self.verify(ip)
+        finally:
+            with self._lock:
+                self._pending.discard(ip)
+
+
+_google_bot_verifier: Optional[GoogleBotVerifier] = None
+_google_bot_verifier_lock = threading.Lock()
+
+def get_google_bot_verifier() -> GoogleBotVerifier:
+    global _google_bot_verifier
+    if _google_bot_verifier is None:
+        with _google_bot_verifier_lock:
+            if _google_bot_verifier is None:
+                _google_bot_verifier = GoogleBotVerifier()
+    return _google_bot_verifier
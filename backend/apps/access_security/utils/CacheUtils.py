@@ -0,0 +1,33 @@
+"""
+非同期のミドルウェアからのキャッシュの操作
+    - Django の async キャッシュ API (aget など) は、バックエンドが実装していなければ
+      sync_to_async で呼び出すため、操作ごとにスレッドを移動する
+    - LocMemCache / DummyCache はプロセス内のメモリだけを操作する (I/O がない) ため、
+      イベントループからそのまま呼び出す (スレッドを移動しない)
+    - それ以外のバックエンド (Redis など) は async キャッシュ API を使う
+"""
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.connection import ConnectionProxy
+
+INLINE_CACHE_CLASSES = (LocMemCache, DummyCache)
+
+
+def get_cache_backend(cache):
+    # django.core.cache.cache (ConnectionProxy) は実際のバックエンドに置き換える
+    if isinstance(cache, ConnectionProxy):
+        return cache._connections[cache._alias]
+    return cache
+
+def is_inline_cache(cache) -> bool:
+    return isinstance(get_cache_backend(cache), INLINE_CACHE_CLASSES)
+
+async def acache_call(cache, method_name:str, *args, **kwargs):
+    """
+    Example Usage:
+        values = await acache_call(cache, 'get_many', keys) # cache.get_many / await cache.aget_many
+    """
+    backend = get_cache_backend(cache)
+    if isinstance(backend, INLINE_CACHE_CLASSES):
+        return getattr(backend, method_name)(*args, **kwargs)
+    return await getattr(backend, 'a' + method_name)(*args, **kwargs)
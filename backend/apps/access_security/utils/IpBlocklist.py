@@ -0,0 +1,232 @@
+"""
+登録済みブロックリスト (BlockIpList) の索引 (config.settings.security.AccessSecurityMiddleware)
+    - IP アドレスは frozenset、CIDR はプレフィックス長ごとのネットワークアドレスの frozenset で持ち、
+      登録数によらずプレフィックス長の種類数の set の参照で判定する
+    - 索引は DB から 1 回だけ作成し、キャッシュには IP・ネットワークの値のリスト (モデルのインスタンスではない) を保存する
+    - プロセスごとに索引を保持し、IP_BLOCKLIST_LOCAL_TTL_SEC ごとにキャッシュの世代と照合する
+      (判定ごとにキャッシュを読まない)
+    - BlockIpList の保存・削除で invalidate_ip_blocklist() を呼び、キャッシュとプロセスの索引を破棄する
+"""
+import ipaddress
+import time
+from channels.db import database_sync_to_async
+from django.core.cache import cache as default_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from .CacheUtils import acache_call
+from ..settings import (
+    IP_BLOCKLIST_CACHE_KEY, IP_BLOCKLIST_CACHE_TIMEOUT_SEC, IP_BLOCKLIST_LOCAL_TTL_SEC,
+)
+
+# invalidate_ip_blocklist() で加算する (プロセス内の索引を破棄する)
+_local_generation = 0
+
+
+class IpBlocklistIndex:
+    """
+    Args:
+        exact (Iterable[str]): IP アドレス (正規化済み)。
+        networks (Iterable[Tuple[int, int, Iterable[int]]]): (IP のバージョン, プレフィックス長, ネットワークアドレス >> ホスト部のビット数)。
+
+    Example Usage:
+        index = IpBlocklistIndex.from_entries([('192.0.2.1', None), ('198.51.100.0', 24)])
+        index.contains('198.51.100.10') # True
+    """
+
+    __slots__ = ('exact', 'networks', 'size')
+
+    def __init__(self,
+                 exact:Iterable[str]                               = (),
+                 networks:Iterable[Tuple[int, int, Iterable[int]]] = (),):
+        self.exact: FrozenSet[str] = frozenset(exact)
+        # {バージョン: [(ホスト部のビット数, ネットワーク)]}
+        self.networks: Dict[int, List[Tuple[int, FrozenSet[int]]]] = {4: [], 6: []}
+        for version, prefixlen, values in sorted(networks, key=lambda x: (x[0], x[1])):
+            bits = 32 if version == 4 else 128
+            self.networks[version].append((bits - prefixlen, frozenset(values)))
+        self.size = len(self.exact) + sum(len(values) for nets in self.networks.values() for _, values in nets)
+
+    @classmethod
+    def from_entries(cls, entries:Iterable[Tuple[str, Optional[int]]]) -> 'IpBlocklistIndex':
+        """
+        Args:
+            entries: (IP アドレス, プレフィックス長 (None の場合は IP アドレスのみ))
+        """
+        exact    = set()
+        networks: Dict[Tuple[int, int], set] = {}
+        for ip, prefixlen in entries:
+            try:
+                network = ipaddress.ip_network(f'{ip}/{prefixlen}' if prefixlen is not None else ip, strict=False)
+            except ValueError as e:
+                print(e)
+                continue
+            if network.prefixlen == network.max_prefixlen:
+                exact.add(network.network_address.compressed)
+                continue
+            host_bits = network.max_prefixlen - network.prefixlen
+            networks.setdefault((network.version, network.prefixlen), set()).add(int(network.network_address) >> host_bits)
+        return cls(exact, [(version, prefixlen, values) for (version, prefixlen), values in networks.items()])
+
+    @classmethod
+    def from_data(cls, data:Dict[str, Any]) -> 'IpBlocklistIndex':
+        return cls(data['exact'], data['networks'])
+
+    def to_data(self) -> Dict[str, Any]:
+        """
+        キャッシュに保存する形式 (str と int のリストのみ)
+        """
+        return {
+            'exact':    sorted(self.exact),
+            'networks': [(version, (32 if version == 4 else 128) - host_bits, sorted(values))
+                         for version, nets in self.networks.items()
+                         for host_bits, values in nets],
+        }
+
+    def contains(self, ip:str) -> bool:
+        if ip in self.exact:
+            return True
+        if ':' not in ip:
+            # IPv4 の文字列は正規化済みとみなし、CIDR がなければ変換しない
+            if not self.networks[4]:
+                return False
+            value = _ipv4_to_int(ip)
+            if value is None:
+                return False
+            for host_bits, values in self.networks[4]:
+                if (value >> host_bits) in values:
+                    return True
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6:
+            if address.ipv4_mapped is not None:
+                return self.contains(str(address.ipv4_mapped))
+            if address.compressed != ip and address.compressed in self.exact:
+                return True
+        value = int(address)
+        for host_bits, values in self.networks[address.version]:
+            if (value >> host_bits) in values:
+                return True
+        return False
+
+
+def _ipv4_to_int(ip:str) -> Optional[int]:
+    # ipaddress.ip_address より速い (判定ごとに呼ぶため)
+    parts = ip.split('.')
+    if len(parts) != 4:
+        return None
+    value = 0
+    for part in parts:
+        if not part.isdigit() or len(part) > 3:
+            return None
+        octet = int(part)
+        if octet > 255:
+            return None
+        value = (value << 8) | octet
+    return value
+
+
+class IpBlocklist:
+    """
+    Args:
+        cache_key (str): 索引を保存するキャッシュのキー。
+        cache_timeout_sec (int): キャッシュの有効期間(秒)。
+        local_ttl_sec (float): プロセスの索引をキャッシュと照合する間隔(秒)。
+        cache: Django のキャッシュ (None の場合は default)。
+
+    Example Usage:
+        ip_blocklist = IpBlocklist()
+        if ip_blocklist.is_blocked(ip):
+            # 遮断
+    """
+
+    def __init__(self,
+                 cache_key:str         = IP_BLOCKLIST_CACHE_KEY,
+                 cache_timeout_sec:int = IP_BLOCKLIST_CACHE_TIMEOUT_SEC,
+                 local_ttl_sec:float   = IP_BLOCKLIST_LOCAL_TTL_SEC,
+                 cache                 = None,):
+        self.cache_key         = cache_key
+        self.cache_timeout_sec = cache_timeout_sec
+        self.local_ttl_sec     = local_ttl_sec
+        self.cache             = cache or default_cache
+        self.stats_dict        = {'local': 0, 'cache': 0, 'db': 0}
+        self._index: Optional[IpBlocklistIndex] = None
+        self._token: Optional[int]              = None # キャッシュの世代 (作成時刻)
+        self._checked_at       = 0.0
+        self._local_generation = _local_generation
+
+    def is_blocked(self, ip:str) -> bool:
+        return self.get_index().contains(ip)
+
+    async def ais_blocked(self, ip:str) -> bool:
+        return (await self.aget_index()).contains(ip)
+
+    def get_index(self) -> IpBlocklistIndex:
+        index = self._get_local_index()
+        if index is not None:
+            return index
+        cached = self.cache.get(self.cache_key)
+        if cached is None:
+            index  = self._load_index()
+            cached = self._create_cached(index)
+            self.cache.set(self.cache_key, cached, timeout=self.cache_timeout_sec)
+            return self._set_local_index(cached, index)
+        return self._set_local_index(cached)
+
+    async def aget_index(self) -> IpBlocklistIndex:
+        """
+        get_index の非同期版 (DB の読み込みのみスレッドを移動する)
+        """
+        index = self._get_local_index()
+        if index is not None:
+            return index
+        cached = await acache_call(self.cache, 'get', self.cache_key)
+        if cached is None:
+            index  = await database_sync_to_async(self._load_index)()
+            cached = self._create_cached(index)
+            await acache_call(self.cache, 'set', self.cache_key, cached, timeout=self.cache_timeout_sec)
+            return self._set_local_index(cached, index)
+        return self._set_local_index(cached)
+
+    # ------------------------------
+    def _get_local_index(self) -> Optional[IpBlocklistIndex]:
+        if (self._index is not None
+            and self._local_generation == _local_generation
+            and time.monotonic() - self._checked_at < self.local_ttl_sec):
+            self.stats_dict['local'] += 1
+            return self._index
+        return None
+
+    def _create_cached(self, index:IpBlocklistIndex) -> Dict[str, Any]:
+        # キャッシュには作成時刻 (世代) と str/int のリストだけを保存する
+        self.stats_dict['db'] += 1
+        return {'token': time.time_ns(), 'data': index.to_data()}
+
+    def _set_local_index(self,
+                         cached:Dict[str, Any],
+                         index:Optional[IpBlocklistIndex] = None,) -> IpBlocklistIndex:
+        if index is not None:
+            self._index = index
+        elif self._index is None or cached['token'] != self._token or self._local_generation != _local_generation:
+            self.stats_dict['cache'] += 1
+            self._index = IpBlocklistIndex.from_data(cached['data'])
+        self._token            = cached['token']
+        self._checked_at       = time.monotonic()
+        self._local_generation = _local_generation
+        return self._index
+
+    def _load_index(self) -> IpBlocklistIndex:
+        from ..models import BlockIpList
+        # ip は暗号化されているため DB では絞り込まずに全件を読む
+        return IpBlocklistIndex.from_entries(BlockIpList.objects.values_list('ip', 'prefixlen'))
+
+
+def invalidate_ip_blocklist(cache = None) -> None:
+    """
+    キャッシュの索引を削除し、このプロセスの索引を破棄する
+    (他のプロセスは IP_BLOCKLIST_LOCAL_TTL_SEC 以内にキャッシュと照合して作成し直す)
+    """
+    global _local_generation
+    _local_generation += 1
+    (cache or default_cache).delete(IP_BLOCKLIST_CACHE_KEY)
@@ -0,0 +1,129 @@
+"""
+IP アドレスごとのアクセス回数の計測とアクセス遮断 (config.settings.security.AccessSecurityMiddleware)
+    - スライディングウィンドウカウンタ (IP ごとに固定メモリ)
+        window_sec ごとのカウンタ (今回・前回の 2 つ) を cache.incr で加算し、
+        前回のカウンタをウィンドウの経過割合で按分して直近 window_sec の回数を推定する
+        (タイムスタンプのリストを読み書きしない. Redis では INCR でワーカー間でも加算が競合しない)
+    - パスリスト・ブロックリストは IP ごとの状態のキー (値は IP_STATUS_PASS / IP_STATUS_BLOCK, 期限付き) で管理する
+      (1 つの共有リストを読み書きしないため、ワーカー間で上書きしない)
+    - 1 リクエストあたりのキャッシュの操作は get_many と incr (ウィンドウの最初は add) の 2 回
+"""
+import time
+from django.core.cache import cache as default_cache
+from typing import Optional, Tuple
+from .CacheUtils import acache_call
+
+IP_STATUS_PASS  = 'pass'  # パスリスト (計測しない)
+IP_STATUS_BLOCK = 'block' # ブロックリスト (遮断中)
+IP_STATUS_COUNT = 'count' # 計測した
+
+
+class IpRateLimiter:
+    """
+    Args:
+        window_sec (int): アクセス回数を計測する時間(秒)。
+        block_timeout_sec (int): ブロックリストの有効期間(秒)。
+        pass_timeout_sec (int): パスリストの有効期間(秒)。
+        key_prefix (str): キャッシュのキーの接頭辞。
+        cache: Django のキャッシュ (None の場合は default)。
+
+    Example Usage:
+        ip_rate_limiter = IpRateLimiter(window_sec=5, block_timeout_sec=60*60*24*30)
+        status, count   = ip_rate_limiter.hit(ip)
+        if status == IP_STATUS_COUNT and count > 100:
+            ip_rate_limiter.block(ip)
+    """
+
+    def __init__(self,
+                 window_sec:int,
+                 block_timeout_sec:int,
+                 pass_timeout_sec:int = 60*60*24*365,
+                 key_prefix:str       = 'access_security',
+                 cache                = None,):
+        self.window_sec        = window_sec
+        self.block_timeout_sec = block_timeout_sec
+        self.pass_timeout_sec  = pass_timeout_sec
+        self.key_prefix        = key_prefix
+        self.cache             = cache or default_cache
+
+    def hit(self, ip:str, now:Optional[float] = None) -> Tuple[str, float]:
+        """
+        パスリスト・ブロックリストを確認し、どちらでもなければ 1 回加算する
+
+        Returns:
+            Tuple[str, float]: (IP_STATUS_*, 直近 window_sec の推定アクセス回数 (今回を含む. COUNT 以外は 0))
+        """
+        now, state_key, prev_key, count_key = self._get_keys(ip, now)
+        values = self.cache.get_many([state_key, prev_key, count_key])
+        if state_key in values:
+            return values[state_key], 0
+        count = self._incr(count_key, is_exists=count_key in values)
+        return IP_STATUS_COUNT, self._estimate(now, values.get(prev_key, 0), count)
+
+    async def ahit(self, ip:str, now:Optional[float] = None) -> Tuple[str, float]:
+        """
+        hit の非同期版 (非同期のミドルウェア用)
+        """
+        now, state_key, prev_key, count_key = self._get_keys(ip, now)
+        values = await acache_call(self.cache, 'get_many', [state_key, prev_key, count_key])
+        if state_key in values:
+            return values[state_key], 0
+        count = await self._aincr(count_key, is_exists=count_key in values)
+        return IP_STATUS_COUNT, self._estimate(now, values.get(prev_key, 0), count)
+
+    def block(self, ip:str) -> None:
+        self.cache.set(self._get_state_key(ip), IP_STATUS_BLOCK, timeout=self.block_timeout_sec)
+
+    def allow(self, ip:str) -> None:
+        self.cache.set(self._get_state_key(ip), IP_STATUS_PASS, timeout=self.pass_timeout_sec)
+
+    def is_blocked(self, ip:str) -> bool:
+        return self.cache.get(self._get_state_key(ip)) == IP_STATUS_BLOCK
+
+    async def ablock(self, ip:str) -> None:
+        await acache_call(self.cache, 'set', self._get_state_key(ip), IP_STATUS_BLOCK, timeout=self.block_timeout_sec)
+
+    async def aallow(self, ip:str) -> None:
+        await acache_call(self.cache, 'set', self._get_state_key(ip), IP_STATUS_PASS, timeout=self.pass_timeout_sec)
+
+    # ------------------------------
+    def _get_keys(self, ip:str, now:Optional[float]) -> Tuple[float, str, str, str]:
+        now          = time.time() if now is None else now
+        window_index = int(now // self.window_sec)
+        return (now,
+                self._get_state_key(ip),
+                self._get_count_key(ip, window_index - 1),
+                self._get_count_key(ip, window_index),)
+
+    def _estimate(self, now:float, prev_count:int, count:int) -> float:
+        # 前回のウィンドウのうち、直近 window_sec に含まれる割合
+        prev_weight = 1.0 - (now % self.window_sec) / self.window_sec
+        return prev_count * prev_weight + count
+
+    def _get_state_key(self, ip:str) -> str:
+        return f'{self.key_prefix}:ip_status:{ip}'
+
+    def _get_count_key(self, ip:str, window_index:int) -> str:
+        return f'{self.key_prefix}:count:{ip}:{window_index}'
+
+    def _incr(self, key:str, is_exists:bool) -> int:
+        # ウィンドウの最初のアクセス → add (次のウィンドウで前回として参照するため 2 ウィンドウ分保持する)
+        # 同時に add された場合・incr の前に期限切れになった場合はもう一方で加算する
+        if not is_exists and self.cache.add(key, 1, timeout=self.window_sec * 2):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout=self.window_sec * 2):
+                return 1
+            return self.cache.incr(key)
+
+    async def _aincr(self, key:str, is_exists:bool) -> int:
+        if not is_exists and await acache_call(self.cache, 'add', key, 1, timeout=self.window_sec * 2):
+            return 1
+        try:
+            return await acache_call(self.cache, 'incr', key)
+        except ValueError:
+            if await acache_call(self.cache, 'add', key, 1, timeout=self.window_sec * 2):
+                return 1
+            return await acache_call(self.cache, 'incr', key)
@@ -0,0 +1,19 @@
+from .IpRateLimiter import (
+    IpRateLimiter,
+    IP_STATUS_PASS, IP_STATUS_BLOCK, IP_STATUS_COUNT,
+)
+from .IpBlocklist import (
+    IpBlocklist, IpBlocklistIndex,
+    invalidate_ip_blocklist,
+)
+from .AccessLogWriter import (
+    AccessLogWriter,
+    get_access_log_writer,
+)
+from .BotVerifier import (
+    GoogleBotVerifier, SocketDnsResolver,
+    get_google_bot_verifier,
+)
+from .CacheUtils import (
+    is_inline_cache, acache_call,
+)
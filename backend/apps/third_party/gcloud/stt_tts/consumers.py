@@ -1,23 +1,31 @@
 """
 WebSocket で Gcloud の Speech-to-Text と Text-to-Speech を扱う
     - bytes_data => STT処理 (Speech-to-Text: セッション管理)
+                    ストリーミング認識 1 回分の状態と期限は utils.SttSession で管理する
+                    ストリーミング認識の数はプロセス全体で管理する (utils.SttSessionManager)
+                    音声は変換・まとめ・無音の除去をしてから送る (utils.SttAudioPreprocessor)
+                    発話後の無音が続いた場合は b'sttend' を待たずに認識を終了する
     - text_data  => JSONに "cmd: tts" があれば TTS処理 (Text-to-Speech)
+                    音声は文ごとにバイナリフレームで返す (utils.TtsPipeline)
 """
 from channels.exceptions import StopConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 import asyncio
-from base64 import b64encode
 import brotli
 import json
+from typing import Dict, Optional
 from api.utils import jwt_auth_get_id
-from apps.utils import sync_get_user_obj
+from apps.utils import sync_get_user_obj, TaskSupervisor
 from google.cloud.speech_v1 import (
-    SpeechAsyncClient, RecognitionConfig,
-    StreamingRecognitionConfig, StreamingRecognizeRequest,
+    RecognitionConfig, StreamingRecognitionConfig, StreamingRecognizeRequest,
 )
-from google.cloud.texttospeech import (
-    TextToSpeechClient, SynthesisInput, VoiceSelectionParams,
-    SsmlVoiceGender, AudioConfig, AudioEncoding,
+from .settings import (
+    STT_LANGUAGE_CODE, STT_SAMPLE_RATE, TTS_AUDIO_MIME_TYPE,
+    TTS_TASK_MAX_CONCURRENCY, TTS_TASK_MAX_PENDING,
+)
+from .utils import (
+    get_speech_async_client, get_tts_async_client, get_stt_session_manager,
+    SttAudioPreprocessor, SttSession, TtsPipeline, encode_tts_audio_frame,
 )
 
 
@@ -41,19 +49,42 @@ class ThirdPartyGcloudSttTtsConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # クライアント
-        self.stt_client = SpeechAsyncClient()
-        self.tts_client = TextToSpeechClient()
+        # TTS などのメッセージごとの処理 (同時実行数・待機数の上限付き. disconnect でキャンセル)
+        self.task_supervisor = TaskSupervisor(max_concurrency = TTS_TASK_MAX_CONCURRENCY,
+                                              max_pending     = TTS_TASK_MAX_PENDING,
+                                              name            = 'gcloud_stt_tts',)
+
+        # クライアント (プロセスで共有する gRPC チャネルから割り当てる)
+        self.stt_client = get_speech_async_client()
+        self.tts_client = get_tts_async_client()
+
+        # TTS (文ごとに合成してバイナリフレームで返す. 音声のキャッシュはプロセスで共有)
+        self.tts_pipeline      = TtsPipeline(client=self.tts_client)
+        self.tts_request_count = 0
 
         # STT セッション管理
-        # セッションIDをキーにし、 { "queue": ..., "task": ..., "sttend_flag": ..., "running": ... } を持つ
-        self.stt_sessions    = {}
-        self.session_counter = 0  # 連番付与
+        self._init_stt()
+
+    def _init_stt(self):
+        # 終了していないセッション (draining のセッションは確定結果を受け取るまで残る)
+        self.stt_sessions: Dict[int, SttSession] = {}
+        # 現在の発話で音声を送るセッション (発話の終了で None に戻す)
+        self.stt_session: Optional[SttSession]   = None
+        self.session_counter                     = 0  # 連番付与
+        # 発話 (b'sttend' まで) の状態
+        #  - idle:     発話前
+        #  - open:     音声を受信中 (無音の間はセッションを開始しない)
+        #  - ended:    発話後の無音で終了済み (b'sttend' まで残りを捨てる)
+        #  - rejected: 上限でセッションを開始できなかった (b'sttend' まで残りを捨てる)
+        self.stt_utterance_state = 'idle'
+        self.stt_preprocessor    = SttAudioPreprocessor()
 
     async def disconnect(self, close_code):
-        # WebSocket切断時、すべてのセッションをキャンセル/クリーンアップ
-        for session_id in list(self.stt_sessions.keys()):
-            await self._cleanup_session(session_id)
+        # WebSocket切断時、実行中の TTS とすべてのセッションをキャンセル/クリーンアップ
+        if hasattr(self, 'task_supervisor'):
+            await self.task_supervisor.close()
+        for session in list(getattr(self, 'stt_sessions', {}).values()):
+            await self._cleanup_session(session)
         await self.close()
         raise StopConsumer()
 
@@ -68,7 +99,19 @@ class ThirdPartyGcloudSttTtsConsumer(AsyncWebsocketConsumer):
             if bytes_data is not None:
                 await self._handle_audio(bytes_data)
             elif text_data is not None:
-                asyncio.create_task(self._handle_receive_text(text_data))
+                # TTS は受信順に返す (待機数が上限を超えた場合は tts の失敗として busy を返す)
+                is_submitted = self.task_supervisor.submit(self._handle_receive_text, text_data, key='tts')
+                if not is_submitted:
+                    message_data = {
+                        'cmd':          'tts',
+                        'ok':           False,
+                        'status':       429,
+                        'audioContent': None,
+                        'message':      'busy',
+                        'toastType':    'info',
+                        'toastMessage': 'busy',
+                    }
+                    await self._self_send_message(message_data, is_send_bytes_data=False)
         except Exception as e:
             print(e)
             message_data = {
@@ -102,69 +145,104 @@ class ThirdPartyGcloudSttTtsConsumer(AsyncWebsocketConsumer):
     # Speech-to-Text
     ####################
     async def _handle_audio(self, chunk: bytes):
-        # 直前のセッションID(最大値)を探す
-        current_session_id = self._get_latest_session_id()
         if chunk == b'sttend':
-            # セッションを終了待ちにする (セッションがない場合は無視)
-            if current_session_id is not None:
-                self.stt_sessions[current_session_id]['sttend_flag'] = True
-                await self.stt_sessions[current_session_id]['queue'].put(b'sttend')
+            await self._handle_sttend()
             return
-        # セッションがない or 既存セッションが終了待ちなら、新規セッションを開始
-        if current_session_id is None:
-            # セッションが一つもない場合
-            session_id = await self._create_stt_session()
-            await self.stt_sessions[session_id]['queue'].put(chunk)
-        else:
-            # セッションがまだ動作中かチェック
-            if self.stt_sessions[current_session_id]['sttend_flag']:
-                # セッションが終了待ち状態なので、新しくセッションを立ち上げる
-                session_id = await self._create_stt_session()
-                await self.stt_sessions[session_id]['queue'].put(chunk)
-            else:
-                # 継続中のセッション
-                await self.stt_sessions[current_session_id]['queue'].put(chunk)
+        if self.stt_utterance_state in ('ended', 'rejected'):
+            return
+        self.stt_utterance_state = 'open'
+        # 前処理 (LINEAR16 への変換・まとめ・無音の除去)
+        try:
+            audio_content, is_end = self.stt_preprocessor.process(chunk)
+        except Exception as e:
+            # 扱えない形式のチャンクは捨てる
+            print(e)
+            return
+        session = self.stt_session
+        if audio_content:
+            # 発話を検出したらセッションを開始 (無音の間はストリーミング認識を開始しない)
+            # 最大時間で draining になった場合は新しいセッションで続ける
+            if session is None or not session.is_streaming:
+                session = self._create_stt_session()
+                if session is None:
+                    # プロセスのストリーミング認識の数が上限
+                    self.stt_utterance_state = 'rejected'
+                    message_data = {
+                        'cmd':          'stt',
+                        'ok':           False,
+                        'status':       429,
+                        'message':      'busy',
+                        'toastType':    'info',
+                        'toastMessage': 'busy',
+                    }
+                    await self._self_send_message(message_data, is_send_bytes_data=False)
+                    return
+            session.put_audio(audio_content)
+        if is_end:
+            # 発話後の無音が続いたので終了する (b'sttend' を待たない)
+            self.stt_utterance_state = 'ended'
+            await self._end_utterance()
+
+    async def _handle_sttend(self):
+        audio_content            = self.stt_preprocessor.flush()
+        utterance_state          = self.stt_utterance_state
+        self.stt_utterance_state = 'idle'
+        if utterance_state == 'ended':
+            # 終了済み (is_end は _run_streaming_recognize で送る)
+            return
+        if audio_content and self.stt_session is not None:
+            self.stt_session.put_audio(audio_content)
+        await self._end_utterance()
 
-    async def _create_stt_session(self) -> int:
+    async def _end_utterance(self):
         """
-        新しい STT セッションを作成し、タスクを起動して返す
+        発話を終了する (is_end は発話ごとに 1 回だけ送る)
+            - セッションがあればリクエストを閉じ、ストリームが終わったら is_end を送る
+            - セッションがない (無音のみ / 上限で開始できなかった / エラーで終了した) 場合はすぐに送る
         """
-        session_id           = self.session_counter
-        self.session_counter += 1
-        queue                = asyncio.Queue()
-        self.stt_sessions[session_id] = {
-            'queue':       queue,
-            'sttend_flag': False,   # b'sttend' を受け取ったか
-            'running':     True,    # セッションが継続中か
-            'task':        asyncio.create_task(self._run_streaming_recognize(session_id))
-        }
-        return session_id
+        session          = self.stt_session
+        self.stt_session = None
+        if session is None or session.is_closed:
+            await self._send_stt_end()
+            return
+        session.is_utterance_end = True
+        session.drain()
+
+    async def _send_stt_end(self):
+        await self.send(text_data=json.dumps({
+            'transcript': '',
+            'is_final':   True,
+            'is_end':     True,
+        }))
 
-    def _get_latest_session_id(self):
-        if not self.stt_sessions:
+    def _create_stt_session(self) -> Optional[SttSession]:
+        """
+        新しい STT セッションを作成し、タスクを起動して返す
+        (プロセスのストリーミング認識の数が上限の場合は None)
+        """
+        lease = get_stt_session_manager().try_acquire(owner=self.channel_name)
+        if lease is None:
             return None
-        return max(self.stt_sessions.keys())
+        session              = SttSession(self.session_counter, lease)
+        self.session_counter += 1
+        self.stt_sessions[session.session_id] = session
+        self.stt_session                      = session
+        session.start(self._run_streaming_recognize(session))
+        return session
 
-    async def _cleanup_session(self, session_id: int):
-        session = self.stt_sessions.get(session_id)
-        if not session:
-            return
-        session['running'] = False
-        task               = session['task']
-        if task and not task.done():
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-        self.stt_sessions.pop(session_id, None)
+    async def _cleanup_session(self, session: SttSession):
+        self.stt_sessions.pop(session.session_id, None)
+        if self.stt_session is session:
+            self.stt_session = None
+        # _run_streaming_recognize から呼ばれた場合は自身をキャンセルしない
+        await session.aclose()
 
     # メイン処理
-    async def _run_streaming_recognize(self, session_id: int):
+    async def _run_streaming_recognize(self, session: SttSession):
         config = RecognitionConfig(
             encoding                     = RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz            = 16000,
-            language_code                = 'ja-JP',
+            sample_rate_hertz            = STT_SAMPLE_RATE,
+            language_code                = STT_LANGUAGE_CODE,
             profanity_filter             = True,
             enable_automatic_punctuation = True,
         )
@@ -175,102 +253,59 @@ class ThirdPartyGcloudSttTtsConsumer(AsyncWebsocketConsumer):
         async def _request_generator():
             # 最初の1回だけ config を送る (仕様)
             yield StreamingRecognizeRequest(streaming_config=streaming_config)
-            while True:
-                # セッションがまだ存在しているか確認
-                session = self.stt_sessions.get(session_id)
-                if not session or not session['running']:
-                    break
-                # chuk処理
-                chunk = await session['queue'].get()
-                if chunk == b'sttend':
-                    # クライアントが認識終了の注入
-                    # → watch-dog起動
-                    asyncio.create_task(self._watchdog_no_final(session_id, timeout=1.0))
-                    continue
-                if chunk == 'closeTask' or chunk is None:
-                    break
-                yield StreamingRecognizeRequest(audio_content=chunk)
+            # draining/closed になるとリクエストを閉じる
+            async for audio_content in session.iter_audio():
+                yield StreamingRecognizeRequest(audio_content=audio_content)
 
         try:
-            requests       = _request_generator()
-            response_aiter = await self.stt_client.streaming_recognize(requests)
+            response_aiter = await self.stt_client.streaming_recognize(_request_generator())
             async for response in response_aiter:
                 # すでにセッションが終了していないか確認
-                session = self.stt_sessions.get(session_id)
-                if not session or not session['running']:
+                if session.is_closed:
                     break
-
                 for result in response.results:
                     if not result.alternatives:
                         continue
-                    transcript = result.alternatives[0].transcript
-                    is_final   = result.is_final
-                    is_end     = False
-                    if is_final and session['sttend_flag']:
-                        # sttend受け取り済みで is_final 出たら is_end
-                        is_end = True
-
                     await self.send(text_data=json.dumps({
-                        'transcript': transcript,
-                        'is_final':   is_final,
-                        'is_end':     is_end,
+                        'transcript': result.alternatives[0].transcript,
+                        'is_final':   result.is_final,
+                        'is_end':     False,
                     }))
-                    if is_end:
-                        # セッションを終了
-                        await self._cleanup_session(session_id)
-                        return
-
         except asyncio.CancelledError:
-            await self._cleanup_session(session_id)
+            # 切断 (closed) / draining の期限切れ (is_expired)
+            pass
         except Exception as e:
             print(e)
-            await self._cleanup_session(session_id)
-
-    async def _watchdog_no_final(self, session_id: int, timeout=1.0):
-        """
-        timeout 以内に is_final が来なければ
-        クライアントにそれを通知してセッションを終了する
-        """
-        await asyncio.sleep(timeout)
-        session = self.stt_sessions.get(session_id)
-        if session and session['sttend_flag'] and session['running']:
-            await self.send(text_data=json.dumps({
-                'transcript': '',
-                'is_final': True,
-                'is_end': True,
-            }))
-            await self._cleanup_session(session_id)
+        # 発話の終了で閉じたセッションはクライアントに通知する (切断で閉じた場合は送らない)
+        if session.is_utterance_end and not session.is_closed:
+            await self._send_stt_end()
+        await self._cleanup_session(session)
 
     ####################
     # Text-to-Speech
     ####################
     async def _handle_tts(self, text: str):
         try:
-            # TextToSpeech のリクエスト定義
-            # OGG_OPUS or MP3 などに設定可能
-            input_text   = SynthesisInput(text=text)
-            # サポート音声一覧
-            # https://cloud.google.com/text-to-speech/docs/voices?hl=ja
-            #  - print(self.tts_client.list_voices(language_code = 'ja-JP'))
-            voice_params = VoiceSelectionParams(
-                name          = 'ja-JP-Neural2-B',
-                language_code = 'ja-JP',
-                ssml_gender   = SsmlVoiceGender.SSML_VOICE_GENDER_UNSPECIFIED,
-            )
-            audio_config = AudioConfig(
-                audio_encoding = AudioEncoding.OGG_OPUS,
-                speaking_rate  = 1.0, # default: 1.0
-                pitch          = 0.0, # default: 0.0
-                volume_gain_db = 0.0, # default: 0.0
-            )
-            response = self.tts_client.synthesize_speech(
-                request = {
-                    'input':        input_text,
-                    'voice':        voice_params,
-                    'audio_config': audio_config,
+            # リクエストごとの番号 (クライアントは番号が変わったら前の音声を止める)
+            request_id              = self.tts_request_count
+            self.tts_request_count += 1
+            is_sent                 = False
+            async for index, count, audio_content in self.tts_pipeline.stream(text):
+                if not audio_content:
+                    continue
+                header = {
+                    'cmd':       'tts',
+                    'ok':        True,
+                    'status':    200,
+                    'requestId': request_id,
+                    'index':     index,
+                    'count':     count,
+                    'mimeType':  TTS_AUDIO_MIME_TYPE,
                 }
-            )
-            if not response.audio_content:
+                # 音声はチャンネルレイヤーを経由せず直接送る (Redis に音声を載せない)
+                await self.send(bytes_data=encode_tts_audio_frame(header, audio_content))
+                is_sent = True
+            if not is_sent:
                 message_data = {
                     'cmd':          'tts',
                     'ok':           False,
@@ -281,16 +316,6 @@ class ThirdPartyGcloudSttTtsConsumer(AsyncWebsocketConsumer):
                     'toastMessage': 'No speech?',
                 }
                 await self._self_send_message(message_data, is_send_bytes_data=False)
-                return
-            # バイナリ -> Base64
-            base64_audio = b64encode(response.audio_content).decode('utf-8')
-            message_data = {
-                'cmd':         'tts',
-                'ok':           True,
-                'status':       200,
-                'audioContent': base64_audio,
-            }
-            await self._self_send_message(message_data, is_send_bytes_data=False)
         except Exception as e:
             print(e)
             message_data = {
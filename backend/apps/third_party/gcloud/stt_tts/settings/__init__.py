@@ -0,0 +1,15 @@
+from .speech_settings import (
+    SPEECH_GRPC_CHANNEL_POOL_SIZE, SPEECH_GRPC_ENDPOINT, SPEECH_GRPC_INSECURE,
+    STT_MAX_SESSIONS,
+    STT_SESSION_MAX_SEC, STT_SESSION_DRAIN_TIMEOUT_SEC,
+    STT_LANGUAGE_CODE, STT_SAMPLE_RATE,
+    STT_CLIENT_SAMPLE_RATE, STT_CHUNK_MS,
+    STT_VAD_THRESHOLD_DBFS, STT_VAD_NOISE_MARGIN_DB,
+    STT_VAD_PREROLL_MS, STT_VAD_HANGOVER_MS, STT_VAD_END_SILENCE_MS,
+)
+from .tts_settings import (
+    TTS_VOICE_DICT, TTS_AUDIO_CONFIG_DICT, TTS_AUDIO_MIME_TYPE,
+    TTS_SENTENCE_MIN_CHARS, TTS_SENTENCE_MAX_CHARS, TTS_SYNTH_MAX_CONCURRENCY,
+    TTS_TASK_MAX_CONCURRENCY, TTS_TASK_MAX_PENDING,
+    TTS_CACHE_MEMORY_MAX_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_MAX_BYTES,
+)
@@ -0,0 +1,32 @@
+# Speech-to-Text / Text-to-Speech の gRPC クライアント (apps.third_party.gcloud.stt_tts.utils.SpeechClientRegistry)
+# プロセス (イベントループ) ごとに作成するチャネル数. 接続には順に割り当てる
+SPEECH_GRPC_CHANNEL_POOL_SIZE = 2
+# None の場合は Google Cloud のエンドポイント
+# SPEECH_GRPC_INSECURE=True の場合は TLS/認証なしで接続する (ローカルのフェイクサーバ用)
+SPEECH_GRPC_ENDPOINT = None
+SPEECH_GRPC_INSECURE = False
+
+# Speech-to-Text のストリーミング認識 (apps.third_party.gcloud.stt_tts.utils.SttSessionManager)
+# プロセスで同時に実行する数の上限. 超えた場合は開始せずクライアントに busy を返す
+STT_MAX_SESSIONS = 200
+
+# Speech-to-Text のストリーミング認識 1 回分 (apps.third_party.gcloud.stt_tts.utils.SttSession)
+# STT_SESSION_MAX_SEC を超えたらリクエストを閉じる (API のストリームの上限 (約 5 分) より前に閉じる)
+# リクエストを閉じてから STT_SESSION_DRAIN_TIMEOUT_SEC 以内に確定結果が返らなければ終了する
+STT_SESSION_MAX_SEC           = 290.0
+STT_SESSION_DRAIN_TIMEOUT_SEC = 1.0
+
+# Speech-to-Text の認識設定 (RecognitionConfig)
+STT_LANGUAGE_CODE = 'ja-JP'
+STT_SAMPLE_RATE   = 16000 # Google に送る LINEAR16 のサンプルレート
+
+# Speech-to-Text の前処理 (apps.third_party.gcloud.stt_tts.utils.SttAudioPreprocessor)
+# クライアントの音声 (WAV はヘッダのサンプルレート, ヘッダなしは STT_CLIENT_SAMPLE_RATE) を
+# STT_SAMPLE_RATE に変換し、STT_CHUNK_MS ごとにまとめて無音を除いてから送る
+STT_CLIENT_SAMPLE_RATE  = 16000
+STT_CHUNK_MS            = 100
+STT_VAD_THRESHOLD_DBFS  = -50.0 # これ以下の音量は常に無音
+STT_VAD_NOISE_MARGIN_DB = 10.0  # 背景雑音 (無音区間の音量の平均) よりこれ以上大きい場合に発話とする
+STT_VAD_PREROLL_MS      = 200   # 発話の開始前に含める長さ (語頭を欠かない)
+STT_VAD_HANGOVER_MS     = 300   # 発話の後に含める無音 (文中の短い間)
+STT_VAD_END_SILENCE_MS  = 800   # 発話の後にこれだけ無音が続いたら認識を終了する (0 の場合は b'sttend' まで待つ)
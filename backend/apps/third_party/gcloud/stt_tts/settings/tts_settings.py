@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+# Text-to-Speech の音声 (apps.third_party.gcloud.stt_tts.utils.TtsPipeline)
+# サポート音声一覧
+# https://cloud.google.com/text-to-speech/docs/voices?hl=ja
+TTS_VOICE_DICT = {
+    'name':          'ja-JP-Neural2-B',
+    'language_code': 'ja-JP',
+    'ssml_gender':   'SSML_VOICE_GENDER_UNSPECIFIED', # SsmlVoiceGender の名前
+}
+TTS_AUDIO_CONFIG_DICT = {
+    'audio_encoding': 'OGG_OPUS', # AudioEncoding の名前
+    'speaking_rate':  1.0,        # default: 1.0
+    'pitch':          0.0,        # default: 0.0
+    'volume_gain_db': 0.0,        # default: 0.0
+}
+TTS_AUDIO_MIME_TYPE = 'audio/ogg'
+
+# 文単位の分割
+# 先頭の文の音声を送信している間に後続の文を合成する
+TTS_SENTENCE_MIN_CHARS    = 8   # これ未満の文は次の文とまとめる
+TTS_SENTENCE_MAX_CHARS    = 120 # これを超える文は読点などで分割する
+TTS_SYNTH_MAX_CONCURRENCY = 3   # 1 リクエストで同時に合成する文の数
+
+# 接続ごとの TTS リクエストの処理 (apps.utils.TaskSupervisor)
+# 同時実行数と実行中 + 待機中の上限. 上限を超えたリクエストには busy を返す
+TTS_TASK_MAX_CONCURRENCY = 2
+TTS_TASK_MAX_PENDING     = 8
+
+# 合成した音声のキャッシュ (apps.third_party.gcloud.stt_tts.utils.TtsAudioCache)
+# キーは テキスト + 音声 + 音声設定 のハッシュ
+TTS_CACHE_MEMORY_MAX_BYTES = 32 * 1024 * 1024   # プロセスごと (LRU)
+TTS_CACHE_DIR              = os.path.join(tempfile.gettempdir(), 'gcloud_tts_cache') # None の場合はディスクに保存しない
+TTS_CACHE_DISK_MAX_BYTES   = 512 * 1024 * 1024 # 超えた場合は更新日時の古いものから削除
@@ -0,0 +1,134 @@
+"""
+Speech-to-Text / Text-to-Speech クライアントのプロセス全体での共有
+    - 接続ごとに SpeechAsyncClient / TextToSpeechAsyncClient を作成すると
+      gRPC チャネルの作成と認証情報の読み込みが毎回発生するため、共有する
+    - 認証情報 (google.auth.default) はプロセスで 1 回だけ読み込む
+    - gRPC (grpc.aio) のチャネルはイベントループに紐づくため、イベントループごとに
+      SPEECH_GRPC_CHANNEL_POOL_SIZE 個までクライアント (= チャネル) を作成し、順に割り当てる
+      (1 チャネルの同時ストリーム数の上限を超えないようにストリーミング認識を分散する)
+      gRPC は同じ接続先・設定のチャネルで TCP 接続を共有するため、
+      grpc.use_local_subchannel_pool でチャネルごとに接続を持たせる
+    - SPEECH_GRPC_ENDPOINT / SPEECH_GRPC_INSECURE でローカルのフェイクサーバに接続できる
+"""
+import google.auth
+import grpc
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+from google.cloud.speech_v1 import SpeechAsyncClient
+from google.cloud.speech_v1.services.speech.transports import SpeechGrpcAsyncIOTransport
+from google.cloud.texttospeech import TextToSpeechAsyncClient
+from google.cloud.texttospeech_v1.services.text_to_speech.transports import TextToSpeechGrpcAsyncIOTransport
+from ..settings import (
+    SPEECH_GRPC_CHANNEL_POOL_SIZE, SPEECH_GRPC_ENDPOINT, SPEECH_GRPC_INSECURE,
+)
+
+CREDENTIALS_SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+CHANNEL_OPTIONS    = [('grpc.use_local_subchannel_pool', 1)]
+
+_lock        = threading.Lock()
+_credentials = None
+_async_pools: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _ClientPool]]' = weakref.WeakKeyDictionary()
+
+
+class _ClientPool:
+
+    __slots__ = ('clients', 'index')
+
+    def __init__(self):
+        self.clients: List[Any] = []
+        self.index              = 0
+
+
+def _get_credentials():
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials, _ = google.auth.default(scopes=CREDENTIALS_SCOPES)
+        return _credentials
+
+def _create_async_client(client_class:type,
+                         transport_class:type,
+                         endpoint:Optional[str],
+                         is_insecure:bool,) -> Any:
+    if endpoint and is_insecure:
+        channel = grpc.aio.insecure_channel(endpoint, options=CHANNEL_OPTIONS)
+        return client_class(transport=transport_class(channel=channel))
+    def _create_channel(*args, options:Optional[list] = None, **kwargs):
+        return transport_class.create_channel(*args, options=list(options or []) + CHANNEL_OPTIONS, **kwargs)
+    transport_kwargs = {'host': endpoint} if endpoint else {}
+    return client_class(transport=transport_class(credentials = _get_credentials(),
+                                                  channel     = _create_channel,
+                                                  **transport_kwargs,))
+
+def _get_pooled_async_client(key:str,
+                             factory:Callable[[], Any],
+                             pool_size:int,) -> Any:
+    # 実行中のイベントループから呼ぶこと
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_pools = _async_pools.get(loop)
+        if loop_pools is None:
+            loop_pools        = {}
+            _async_pools[loop] = loop_pools
+        pool = loop_pools.get(key)
+        if pool is None:
+            pool            = _ClientPool()
+            loop_pools[key] = pool
+        # 上限までは作成し、以降は順に割り当てる
+        if len(pool.clients) < max(pool_size, 1):
+            client = factory()
+            pool.clients.append(client)
+            return client
+        client      = pool.clients[pool.index % len(pool.clients)]
+        pool.index += 1
+        return client
+
+
+# ------------------------------
+# Speech-to-Text
+def get_speech_async_client(endpoint:Optional[str] = SPEECH_GRPC_ENDPOINT,
+                            is_insecure:bool       = SPEECH_GRPC_INSECURE,
+                            pool_size:int          = SPEECH_GRPC_CHANNEL_POOL_SIZE,
+                            ) -> SpeechAsyncClient:
+    return _get_pooled_async_client(f'speech:{endpoint}:{is_insecure}',
+                                    lambda: _create_async_client(SpeechAsyncClient, SpeechGrpcAsyncIOTransport, endpoint, is_insecure),
+                                    pool_size,)
+
+# ------------------------------
+# Text-to-Speech
+def get_tts_async_client(endpoint:Optional[str] = SPEECH_GRPC_ENDPOINT,
+                         is_insecure:bool       = SPEECH_GRPC_INSECURE,
+                         pool_size:int          = SPEECH_GRPC_CHANNEL_POOL_SIZE,
+                         ) -> TextToSpeechAsyncClient:
+    return _get_pooled_async_client(f'tts:{endpoint}:{is_insecure}',
+                                    lambda: _create_async_client(TextToSpeechAsyncClient, TextToSpeechGrpcAsyncIOTransport, endpoint, is_insecure),
+                                    pool_size,)
+
+
+# ------------------------------
+# 管理
+def get_speech_client_registry_stats() -> Dict[str, int]:
+    with _lock:
+        pools = [pool for loop_pools in _async_pools.values() for pool in loop_pools.values()]
+        return {
+            'is_credentials_loaded': int(_credentials is not None),
+            'event_loops':           len(_async_pools),
+            'channels':              sum(len(pool.clients) for pool in pools),
+            'assigned':              sum(len(pool.clients) + pool.index for pool in pools),
+        }
+
+async def aclose_speech_async_clients() -> None:
+    """
+    実行中のイベントループに紐づくクライアント (チャネル) を閉じる (テスト/シャットダウン用)
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_pools = _async_pools.pop(loop, {})
+    for pool in loop_pools.values():
+        for client in pool.clients:
+            try:
+                await client.transport.close()
+            except Exception as e:
+                print(e)
@@ -0,0 +1,240 @@
+"""
+Speech-to-Text に送る前の音声の前処理 (接続ごとに作成する)
+    - クライアントの音声チャンクを LINEAR16 (STT_SAMPLE_RATE, モノラル) に変換する
+      WAV (RecordRTC の timeSlice ごとの Blob) はヘッダのサンプルレート/チャンネル数を使い、
+      ヘッダがない場合は STT_CLIENT_SAMPLE_RATE の LINEAR16 とする
+      サンプルレートの変換はチャンクをまたいで線形補間する (アンチエイリアスなし)
+    - STT_CHUNK_MS ごとにまとめる (数十 ms の小さなリクエストを送らない)
+    - 音量による発話区間検出 (VAD) で無音を送らない
+        - 発話の開始前 STT_VAD_PREROLL_MS と発話後 STT_VAD_HANGOVER_MS の無音は含める
+        - 発話の後に STT_VAD_END_SILENCE_MS 無音が続いたら発話の終了 (is_end) を返す
+          (b'sttend' と watchdog を待たずに認識を終了できる)
+"""
+import numpy as np
+import math
+import struct
+from collections import deque
+from typing import Dict, Optional, Tuple
+from ..settings import (
+    STT_SAMPLE_RATE, STT_CLIENT_SAMPLE_RATE, STT_CHUNK_MS,
+    STT_VAD_THRESHOLD_DBFS, STT_VAD_NOISE_MARGIN_DB,
+    STT_VAD_PREROLL_MS, STT_VAD_HANGOVER_MS, STT_VAD_END_SILENCE_MS,
+)
+
+WAV_FORMAT_PCM   = 1
+WAV_FORMAT_FLOAT = 3
+
+
+def decode_audio_chunk(chunk:bytes,
+                       default_sample_rate:int = STT_CLIENT_SAMPLE_RATE,
+                       ) -> Tuple[np.ndarray, int]:
+    """
+    Returns:
+        Tuple[np.ndarray, int]: (モノラルのサンプル (float32, int16 の範囲), サンプルレート)
+    """
+    sample_rate = default_sample_rate
+    channels    = 1
+    audio_fmt   = WAV_FORMAT_PCM
+    bits        = 16
+    data        = chunk
+    if chunk[:4] == b'RIFF' and chunk[8:12] == b'WAVE':
+        data = b''
+        pos  = 12
+        while pos + 8 <= len(chunk):
+            chunk_id   = chunk[pos:pos+4]
+            chunk_size = int.from_bytes(chunk[pos+4:pos+8], 'little')
+            body       = chunk[pos+8:pos+8+chunk_size]
+            if chunk_id == b'fmt ':
+                audio_fmt, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', body)
+            elif chunk_id == b'data':
+                # 録音中の WAV はサイズが実際より大きい場合がある (body は末尾まで)
+                data = body
+                break
+            pos += 8 + chunk_size + (chunk_size & 1)
+    if audio_fmt == WAV_FORMAT_FLOAT and bits == 32:
+        samples = np.frombuffer(data[:len(data)//4*4], dtype='<f4') * 32768.0
+    elif audio_fmt == WAV_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(data[:len(data)//2*2], dtype='<i2').astype(np.float32)
+    else:
+        raise ValueError(f'unsupported wav format: {audio_fmt} {bits}bit')
+    if channels > 1:
+        samples = samples[:len(samples)//channels*channels].reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32, copy=False), sample_rate
+
+def samples_to_linear16(samples:np.ndarray) -> bytes:
+    return np.clip(np.rint(samples), -32768, 32767).astype('<i2').tobytes()
+
+def get_dbfs(samples:np.ndarray) -> float:
+    if len(samples) == 0:
+        return -math.inf
+    rms = math.sqrt(float(np.mean(np.square(samples, dtype=np.float64))))
+    return 20 * math.log10(max(rms, 1e-9) / 32768.0)
+
+
+class LinearResampler:
+    """
+    チャンクをまたいで連続するように線形補間でサンプルレートを変換する
+    """
+
+    def __init__(self, sample_rate:int = STT_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.reset()
+
+    def reset(self) -> None:
+        self.src_rate: Optional[int] = None
+        self._pos                    = 0.0  # 次に出力する位置 (前のチャンクの最後のサンプルが 0)
+        self._last: Optional[np.ndarray] = None
+
+    def process(self, samples:np.ndarray, src_rate:int) -> np.ndarray:
+        if src_rate == self.sample_rate:
+            return samples
+        if src_rate != self.src_rate:
+            self.reset()
+            self.src_rate = src_rate
+        x = samples if self._last is None else np.concatenate((self._last, samples))
+        if len(x) < 2:
+            self._last = x[-1:] if len(x) else self._last
+            return np.zeros(0, dtype=np.float32)
+        step      = src_rate / self.sample_rate
+        positions = np.arange(self._pos, len(x) - 1, step)
+        out       = np.interp(positions, np.arange(len(x)), x).astype(np.float32)
+        next_pos  = positions[-1] + step if len(positions) else self._pos
+        self._pos  = next_pos - (len(x) - 1)
+        self._last = x[-1:]
+        return out
+
+
+class SttAudioPreprocessor:
+    """
+    Args:
+        sample_rate (int): Google に送るサンプルレート。
+        client_sample_rate (int): ヘッダのない音声のサンプルレート。
+        chunk_ms (int): まとめる長さ。
+        threshold_dbfs (float): これ以下の音量は常に無音。
+        noise_margin_db (float): 背景雑音よりこれ以上大きい場合に発話とする。
+        preroll_ms (int): 発話の開始前に含める長さ。
+        hangover_ms (int): 発話の後に含める無音の長さ。
+        end_silence_ms (int): 発話の後にこれだけ無音が続いたら終了する (0 の場合は終了しない)。
+
+    Example Usage:
+        audio_content, is_end = preprocessor.process(chunk)
+        if audio_content:
+            await queue.put(audio_content)
+        if is_end:
+            # 認識を終了する
+        # b'sttend'
+        audio_content = preprocessor.flush()
+    """
+
+    def __init__(self,
+                 sample_rate:int        = STT_SAMPLE_RATE,
+                 client_sample_rate:int = STT_CLIENT_SAMPLE_RATE,
+                 chunk_ms:int           = STT_CHUNK_MS,
+                 threshold_dbfs:float   = STT_VAD_THRESHOLD_DBFS,
+                 noise_margin_db:float  = STT_VAD_NOISE_MARGIN_DB,
+                 preroll_ms:int         = STT_VAD_PREROLL_MS,
+                 hangover_ms:int        = STT_VAD_HANGOVER_MS,
+                 end_silence_ms:int     = STT_VAD_END_SILENCE_MS,):
+        self.sample_rate        = sample_rate
+        self.client_sample_rate = client_sample_rate
+        self.chunk_ms           = chunk_ms
+        self.frame_samples      = sample_rate * chunk_ms // 1000
+        self.threshold_dbfs     = threshold_dbfs
+        self.noise_margin_db    = noise_margin_db
+        self.hangover_ms        = hangover_ms
+        self.end_silence_ms     = end_silence_ms
+        self.resampler          = LinearResampler(sample_rate)
+        self.noise_floor_dbfs: Optional[float] = None # 無音区間の音量の移動平均 (発話をまたいで保持)
+        self.stats_dict: Dict[str, int] = {'input_samples': 0, 'sent_samples': 0, 'utterances': 0}
+        self._preroll: deque = deque(maxlen=math.ceil(preroll_ms / chunk_ms))
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        発話ごとの状態を初期化する
+        """
+        self.is_speech  = False
+        self.silence_ms = 0
+        self.resampler.reset()
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._preroll.clear()
+
+    def process(self, chunk:bytes) -> Tuple[bytes, bool]:
+        """
+        Returns:
+            Tuple[bytes, bool]: (送信する LINEAR16 (なければ b''), 発話が終了したか)
+        """
+        samples, src_rate = decode_audio_chunk(chunk, self.client_sample_rate)
+        samples           = self.resampler.process(samples, src_rate)
+        buffer            = np.concatenate((self._buffer, samples)) if len(self._buffer) else samples
+        n_frames          = len(buffer) // self.frame_samples
+        sent_frames       = []
+        self.stats_dict['input_samples'] += len(samples)
+        for i in range(n_frames):
+            frame = buffer[i*self.frame_samples:(i+1)*self.frame_samples]
+            if self._process_frame(frame, sent_frames):
+                # 終了後の残りは破棄する (呼び出し側は b'sttend' まで次の発話を扱わない)
+                self._buffer = np.zeros(0, dtype=np.float32)
+                return self._to_bytes(sent_frames), True
+        self._buffer = buffer[n_frames*self.frame_samples:]
+        return self._to_bytes(sent_frames), False
+
+    def flush(self) -> bytes:
+        """
+        b'sttend' を受け取った時に、発話中なら未送信の端数を返して状態を初期化する
+        """
+        sent_frames = [self._buffer] if self.is_speech and len(self._buffer) else []
+        self.reset()
+        return self._to_bytes(sent_frames)
+
+    @property
+    def threshold(self) -> float:
+        if self.noise_floor_dbfs is None:
+            return self.threshold_dbfs
+        return max(self.threshold_dbfs, self.noise_floor_dbfs + self.noise_margin_db)
+
+    def stats(self) -> Dict[str, int]:
+        input_ms = self.stats_dict['input_samples'] * 1000 // self.sample_rate
+        sent_ms  = self.stats_dict['sent_samples'] * 1000 // self.sample_rate
+        return {
+            'utterances': self.stats_dict['utterances'],
+            'input_ms':   input_ms,
+            'sent_ms':    sent_ms,
+            'dropped_ms': input_ms - sent_ms,
+        }
+
+    # ------------------------------
+    def _process_frame(self, frame:np.ndarray, sent_frames:list) -> bool:
+        dbfs = get_dbfs(frame)
+        if dbfs > self.threshold:
+            if not self.is_speech:
+                self.is_speech = True
+                self.stats_dict['utterances'] += 1
+                sent_frames.extend(self._preroll)
+                self._preroll.clear()
+            self.silence_ms = 0
+            sent_frames.append(frame)
+            return False
+        # 無音
+        if self.noise_floor_dbfs is None:
+            self.noise_floor_dbfs = dbfs
+        else:
+            self.noise_floor_dbfs = 0.9 * self.noise_floor_dbfs + 0.1 * dbfs
+        if not self.is_speech:
+            self._preroll.append(frame)
+            return False
+        self.silence_ms += self.chunk_ms
+        if self.silence_ms <= self.hangover_ms:
+            sent_frames.append(frame)
+        if self.end_silence_ms and self.silence_ms >= self.end_silence_ms:
+            self.is_speech  = False
+            self.silence_ms = 0
+            return True
+        return False
+
+    def _to_bytes(self, sent_frames:list) -> bytes:
+        if not sent_frames:
+            return b''
+        samples = np.concatenate(sent_frames)
+        self.stats_dict['sent_samples'] += len(samples)
+        return samples_to_linear16(samples)
@@ -0,0 +1,185 @@
+"""
+Speech-to-Text のストリーミング認識 1 回分 (セッション) の状態
+    - 状態は idle → streaming → draining → closed の順に遷移する (どの状態からも closed にできる)
+        - idle:      作成済み (認識タスクの開始前)
+        - streaming: 音声を送信中
+        - draining:  リクエストを閉じて、残りの確定結果を待っている
+        - closed:    終了 (SttSessionManager の枠は返却済み)
+    - 期限のタイマーはセッションごとに 1 つだけ持ち、状態が変わるたびに設定し直す
+      (b'sttend' ごとに watchdog のタスクを作成しない)
+        - streaming: STT_SESSION_MAX_SEC を超えたら draining にする
+        - draining:  STT_SESSION_DRAIN_TIMEOUT_SEC 以内にストリームが終わらなければ
+                     期限切れ (is_expired) として認識タスクをキャンセルする
+"""
+import asyncio
+from typing import AsyncIterator, Coroutine, Dict, Optional, Tuple
+from ..settings import STT_SESSION_MAX_SEC, STT_SESSION_DRAIN_TIMEOUT_SEC
+from .SttSessionManager import SttSessionLease
+
+STT_SESSION_IDLE      = 'idle'
+STT_SESSION_STREAMING = 'streaming'
+STT_SESSION_DRAINING  = 'draining'
+STT_SESSION_CLOSED    = 'closed'
+
+STT_SESSION_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    STT_SESSION_IDLE:      (STT_SESSION_STREAMING, STT_SESSION_CLOSED),
+    STT_SESSION_STREAMING: (STT_SESSION_DRAINING, STT_SESSION_CLOSED),
+    STT_SESSION_DRAINING:  (STT_SESSION_CLOSED,),
+    STT_SESSION_CLOSED:    (),
+}
+
+
+class SttSession:
+    """
+    Args:
+        session_id (int): 接続内の連番。
+        lease (SttSessionLease): SttSessionManager の枠 (closed で返却する)。
+        max_sec (float): streaming の最大時間(秒)。0 の場合は制限しない。
+        drain_timeout_sec (float): draining の最大時間(秒)。0 の場合は制限しない。
+
+    Example Usage:
+        session = SttSession(session_id, lease)
+        session.start(self._run_streaming_recognize(session))
+        session.put_audio(audio_content)
+        # 発話の終了
+        session.drain()
+        # 認識タスク
+        async for audio_content in session.iter_audio():
+            yield StreamingRecognizeRequest(audio_content=audio_content)
+        ...
+        await session.aclose()
+    """
+
+    __slots__ = (
+        'session_id', 'lease', 'max_sec', 'drain_timeout_sec',
+        'state', 'task', 'is_utterance_end', 'is_expired',
+        '_queue', '_timer',
+    )
+
+    def __init__(self,
+                 session_id:int,
+                 lease:Optional[SttSessionLease] = None,
+                 max_sec:float                   = STT_SESSION_MAX_SEC,
+                 drain_timeout_sec:float         = STT_SESSION_DRAIN_TIMEOUT_SEC,):
+        self.session_id        = session_id
+        self.lease             = lease
+        self.max_sec           = max_sec
+        self.drain_timeout_sec = drain_timeout_sec
+        self.state             = STT_SESSION_IDLE
+        self.task: Optional[asyncio.Task] = None
+        self.is_utterance_end  = False # 発話の終了で閉じた (ストリームが終わったらクライアントに is_end を送る)
+        self.is_expired        = False # draining の期限切れで認識タスクをキャンセルした
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.state == STT_SESSION_STREAMING
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == STT_SESSION_CLOSED
+
+    def start(self, coro:Coroutine) -> None:
+        """
+        認識タスクを起動して streaming にする (実行中のイベントループから呼ぶこと)
+        """
+        try:
+            self._transition(STT_SESSION_STREAMING)
+        except ValueError:
+            coro.close()
+            raise
+        self.task = asyncio.create_task(coro)
+        self._set_deadline(self.max_sec)
+
+    def put_audio(self, audio_content:bytes) -> bool:
+        """
+        Returns:
+            bool: streaming でない場合は送らずに False
+        """
+        if self.state != STT_SESSION_STREAMING:
+            return False
+        self._queue.put_nowait(audio_content)
+        return True
+
+    def drain(self) -> bool:
+        """
+        リクエストを閉じて draining にする (残りの確定結果が返るとストリームが終わる)
+
+        Returns:
+            bool: streaming でない場合は False
+        """
+        if self.state != STT_SESSION_STREAMING:
+            return False
+        self._transition(STT_SESSION_DRAINING)
+        self._queue.put_nowait(None)
+        self._set_deadline(self.drain_timeout_sec)
+        return True
+
+    async def iter_audio(self) -> AsyncIterator[bytes]:
+        """
+        認識タスクに送る音声 (draining/closed になるまで)
+        """
+        while True:
+            audio_content = await self._queue.get()
+            if audio_content is None:
+                return
+            yield audio_content
+
+    def close(self) -> bool:
+        """
+        closed にして枠を返却する (認識タスクのキャンセルは aclose)
+
+        Returns:
+            bool: すでに closed の場合は False
+        """
+        if self.state == STT_SESSION_CLOSED:
+            return False
+        self._transition(STT_SESSION_CLOSED)
+        self._cancel_deadline()
+        if self.lease is not None:
+            self.lease.release()
+        # 音声待ちの iter_audio を終わらせる
+        self._queue.put_nowait(None)
+        return True
+
+    async def aclose(self) -> None:
+        """
+        closed にして認識タスクをキャンセルする (認識タスクから呼んだ場合は自身をキャンセルしない)
+        """
+        self.close()
+        task = self.task
+        if task and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # ------------------------------
+    def _transition(self, state:str) -> None:
+        if state not in STT_SESSION_TRANSITIONS[self.state]:
+            raise ValueError(f'invalid stt session transition: {self.state} -> {state}')
+        self.state = state
+
+    def _set_deadline(self, timeout:float) -> None:
+        # タイマーは 1 つだけ (前の期限は取り消す)
+        self._cancel_deadline()
+        if timeout and timeout > 0:
+            self._timer = asyncio.get_running_loop().call_later(timeout, self._on_deadline)
+
+    def _cancel_deadline(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_deadline(self) -> None:
+        self._timer = None
+        if self.state == STT_SESSION_STREAMING:
+            # 最大時間 → リクエストを閉じて確定結果を受け取る
+            self.drain()
+        elif self.state == STT_SESSION_DRAINING:
+            # 確定結果が返らない → 認識タスクを終わらせる
+            self.is_expired = True
+            if self.task and not self.task.done():
+                self.task.cancel()
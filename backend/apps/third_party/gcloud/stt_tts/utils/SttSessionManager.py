@@ -0,0 +1,95 @@
+"""
+Speech-to-Text のストリーミング認識 (streaming_recognize) のプロセス全体での管理
+    - 全ての接続で実行中のストリーミング認識を数え、STT_MAX_SESSIONS を超える場合は開始しない
+      (gRPC のストリームと API のクォータを使い切らないようにする)
+    - 使用率 (実行中 / 上限)・ピーク・拒否数・平均の継続時間を stats で取得できる
+"""
+import threading
+import time
+from typing import Dict, Optional
+from ..settings import STT_MAX_SESSIONS
+
+
+class SttSessionLease:
+    """
+    try_acquire で取得し、ストリーミング認識の終了時に release すること (複数回呼んでもよい)
+    """
+
+    __slots__ = ('manager', 'owner', 'started_at', 'is_released')
+
+    def __init__(self, manager:'SttSessionManager', owner:str):
+        self.manager     = manager
+        self.owner       = owner
+        self.started_at  = time.monotonic()
+        self.is_released = False
+
+    def release(self) -> None:
+        self.manager._release(self)
+
+
+class SttSessionManager:
+    """
+    Args:
+        max_sessions (int): プロセスで同時に実行するストリーミング認識の上限。
+
+    Example Usage:
+        lease = get_stt_session_manager().try_acquire(owner=self.channel_name)
+        if lease is None:
+            # busy
+        ...
+        lease.release()
+    """
+
+    def __init__(self, max_sessions:int = STT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.active       = 0
+        self.stats_dict   = {'peak': 0, 'started': 0, 'completed': 0, 'rejected': 0}
+        self.total_sec    = 0.0
+        self._lock        = threading.Lock()
+
+    def try_acquire(self, owner:str = '') -> Optional[SttSessionLease]:
+        """
+        Returns:
+            Optional[SttSessionLease]: 上限に達している場合は None
+        """
+        with self._lock:
+            if self.active >= self.max_sessions:
+                self.stats_dict['rejected'] += 1
+                return None
+            self.active                += 1
+            self.stats_dict['started'] += 1
+            self.stats_dict['peak']     = max(self.stats_dict['peak'], self.active)
+        return SttSessionLease(self, owner)
+
+    @property
+    def utilization(self) -> float:
+        return self.active / self.max_sessions if self.max_sessions > 0 else 1.0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            completed = self.stats_dict['completed']
+            return {
+                **self.stats_dict,
+                'active':           self.active,
+                'max_sessions':     self.max_sessions,
+                'utilization':      round(self.utilization, 3),
+                'avg_duration_sec': round(self.total_sec / completed, 3) if completed else 0.0,
+            }
+
+    def _release(self, lease:SttSessionLease) -> None:
+        with self._lock:
+            if lease.is_released:
+                return
+            lease.is_released             = True
+            self.active                  -= 1
+            self.stats_dict['completed'] += 1
+            self.total_sec               += time.monotonic() - lease.started_at
+
+
+_stt_session_manager: Optional[SttSessionManager] = None
+
+def get_stt_session_manager() -> SttSessionManager:
+    global _stt_session_manager
+    if _stt_session_manager is None:
+        _stt_session_manager = SttSessionManager()
+    return _stt_session_manager
@@ -0,0 +1,196 @@
+"""
+Text-to-Speech で合成した音声のキャッシュ
+    - キーは テキスト + 音声 + 音声設定 の sha256 (同じ内容なら同じ音声)
+    - メモリ (プロセスごとの LRU, 合計バイト数で上限) → ディスク の順に探す
+      ディスクは {TTS_CACHE_DIR}/{key[:2]}/{key}.bin に保存し、
+      合計が TTS_CACHE_DISK_MAX_BYTES を超えた場合は更新日時の古いものから削除する
+      (読み込み時に更新日時を更新するため LRU になる)
+    - ディスクの読み書きはスレッドで行い、イベントループを止めない
+    - get_or_create: 同じキーの合成中は完了を待って同じ音声を返す (合成は 1 回)
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from ..settings import (
+    TTS_CACHE_MEMORY_MAX_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_MAX_BYTES,
+)
+
+
+def make_tts_cache_key(text:str,
+                       voice_dict:Dict[str, Any],
+                       audio_config_dict:Dict[str, Any],) -> str:
+    data = json.dumps([text, voice_dict, audio_config_dict],
+                      ensure_ascii = False,
+                      sort_keys    = True,
+                      default      = str,)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class TtsAudioCache:
+    """
+    Args:
+        memory_max_bytes (int): メモリに保持する音声の合計バイト数。
+        cache_dir (str): ディスクの保存先。None の場合はディスクに保存しない。
+        disk_max_bytes (int): ディスクに保存する音声の合計バイト数。
+    """
+
+    def __init__(self,
+                 memory_max_bytes:int    = TTS_CACHE_MEMORY_MAX_BYTES,
+                 cache_dir:Optional[str] = TTS_CACHE_DIR,
+                 disk_max_bytes:int      = TTS_CACHE_DISK_MAX_BYTES,):
+        self.memory_max_bytes = memory_max_bytes
+        self.cache_dir        = cache_dir
+        self.disk_max_bytes   = disk_max_bytes
+        self.memory_bytes     = 0
+        self.disk_bytes: Optional[int] = None # 最初の書き込み時に集計する
+        self.stats_dict       = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0}
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key:str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats_dict['memory_hits'] += 1
+            return data
+        if self.cache_dir:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self._put_memory(key, data)
+                self.stats_dict['disk_hits'] += 1
+                return data
+        self.stats_dict['misses'] += 1
+        return None
+
+    async def put(self, key:str, data:bytes) -> None:
+        if not data:
+            return
+        self._put_memory(key, data)
+        if self.cache_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except Exception as e:
+                # ディスクに保存できなくてもメモリのキャッシュは使う
+                print(e)
+
+    async def get_or_create(self,
+                            key:str,
+                            create_fnc:Callable[[], Awaitable[bytes]],) -> bytes:
+        data = await self.get(key)
+        if data is not None:
+            return data
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats_dict['coalesced'] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 合成していた側がキャンセルされた場合は改めて合成する
+                if not future.cancelled():
+                    raise
+                return await self.get_or_create(key, create_fnc)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await create_fnc()
+            await self.put(key, data)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # 待っている側にも同じ例外を返す
+            future.set_exception(e)
+            # 待っている側がいない場合に未取得の例外の警告を出さない
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.stats_dict,
+            'memory_items': len(self._memory),
+            'memory_bytes': self.memory_bytes,
+        }
+
+    # ------------------------------
+    # memory
+    def _put_memory(self, key:str, data:bytes) -> None:
+        if len(data) > self.memory_max_bytes:
+            return
+        old_data = self._memory.pop(key, None)
+        if old_data is not None:
+            self.memory_bytes -= len(old_data)
+        self._memory[key]  = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.memory_max_bytes:
+            _, old_data        = self._memory.popitem(last=False)
+            self.memory_bytes -= len(old_data)
+
+    # ------------------------------
+    # disk (スレッドで実行する)
+    def _get_path(self, key:str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.bin')
+
+    def _read_disk(self, key:str) -> Optional[bytes]:
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path) # LRU
+            return data or None
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key:str, data:bytes) -> None:
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.disk_bytes is None:
+            self.disk_bytes = sum(size for _, _, size in self._scan_disk())
+        # 書き込み途中のファイルを読まないよう置き換える
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.disk_bytes += len(data)
+        if self.disk_bytes > self.disk_max_bytes:
+            self._prune_disk()
+
+    def _scan_disk(self):
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith('.bin'):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def _prune_disk(self) -> None:
+        # 上限の 9 割まで古いものから削除する (書き込みごとに走査しない)
+        files           = sorted(self._scan_disk(), key=lambda file: file[1])
+        self.disk_bytes = sum(size for _, _, size in files)
+        for path, _, size in files:
+            if self.disk_bytes <= self.disk_max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self.disk_bytes -= size
+            except FileNotFoundError:
+                pass
+
+
+_tts_audio_cache: Optional[TtsAudioCache] = None
+
+def get_tts_audio_cache() -> TtsAudioCache:
+    """
+    プロセスで 1 つ作成し、全ての接続で共有する
+    """
+    global _tts_audio_cache
+    if _tts_audio_cache is None:
+        _tts_audio_cache = TtsAudioCache()
+    return _tts_audio_cache
@@ -0,0 +1,175 @@
+"""
+Text-to-Speech の非同期パイプライン
+    - TextToSpeechAsyncClient で合成する (イベントループを止めない)
+    - テキストを文単位に分割し、TTS_SYNTH_MAX_CONCURRENCY まで並行して合成して文の順に返す
+      (先頭の文を再生している間に後続の文を合成する)
+    - 文ごとの音声は TtsAudioCache にキャッシュする (定型のセリフはキャッシュから返す)
+    - 音声はバイナリフレームで送信する (Base64 の JSON より約 33% 小さい)
+      フレーム: [ヘッダ長 (uint16 big endian)] [ヘッダ (UTF-8 の JSON)] [音声]
+"""
+import asyncio
+import json
+import re
+import struct
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from google.cloud.texttospeech import (
+    TextToSpeechAsyncClient, SynthesisInput, VoiceSelectionParams,
+    SsmlVoiceGender, AudioConfig, AudioEncoding,
+)
+from ..settings import (
+    TTS_VOICE_DICT, TTS_AUDIO_CONFIG_DICT,
+    TTS_SENTENCE_MIN_CHARS, TTS_SENTENCE_MAX_CHARS, TTS_SYNTH_MAX_CONCURRENCY,
+)
+from .SpeechClientRegistry import get_tts_async_client
+from .TtsAudioCache import TtsAudioCache, get_tts_audio_cache, make_tts_cache_key
+
+# 文末 (句点・感嘆符・疑問符 + 閉じ括弧) または改行まで
+SENTENCE_PATTERN = re.compile(r'[^\n]*?(?:[。．！？!?]+[」』）)]*|\n|$)')
+CLAUSE_END_CHARS = '、，,'
+
+AUDIO_FRAME_HEADER_STRUCT = struct.Struct('>H')
+
+
+# ------------------------------
+# 文の分割
+def _split_long_sentence(sentence:str, max_chars:int) -> List[str]:
+    pieces = []
+    while len(sentence) > max_chars:
+        # 読点で区切れる場合は読点まで
+        cut = max(sentence.rfind(char, 0, max_chars) for char in CLAUSE_END_CHARS) + 1
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(sentence[:cut])
+        sentence = sentence[cut:]
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+def split_tts_sentences(text:str,
+                        min_chars:int = TTS_SENTENCE_MIN_CHARS,
+                        max_chars:int = TTS_SENTENCE_MAX_CHARS,
+                        ) -> List[str]:
+    """
+    合成する単位に分割する
+    min_chars 未満の文は次の文とまとめ、max_chars を超える文は読点などで分割する
+    """
+    sentences = []
+    buffer    = ''
+    for m in SENTENCE_PATTERN.finditer(text):
+        sentence = m.group(0).strip()
+        if not sentence:
+            continue
+        for piece in _split_long_sentence(sentence, max_chars):
+            buffer += piece
+            if len(buffer) >= min_chars:
+                sentences.append(buffer)
+                buffer = ''
+    if buffer:
+        # 末尾の短い文は前の文とまとめる (max_chars を超える場合はそのまま)
+        if sentences and len(sentences[-1]) + len(buffer) <= max_chars:
+            sentences[-1] += buffer
+        else:
+            sentences.append(buffer)
+    return sentences
+
+
+# ------------------------------
+# フレーム
+def encode_tts_audio_frame(header:Dict[str, Any], audio_content:bytes) -> bytes:
+    header_bytes = json.dumps(header).encode('utf-8')
+    return AUDIO_FRAME_HEADER_STRUCT.pack(len(header_bytes)) + header_bytes + audio_content
+
+def decode_tts_audio_frame(frame:bytes) -> Tuple[Dict[str, Any], bytes]:
+    header_len = AUDIO_FRAME_HEADER_STRUCT.unpack_from(frame)[0]
+    start      = AUDIO_FRAME_HEADER_STRUCT.size
+    return json.loads(frame[start:start+header_len]), frame[start+header_len:]
+
+
+# ------------------------------
+# pipeline
+class TtsPipeline:
+    """
+    Args:
+        client: TextToSpeechAsyncClient (synthesize_speech が await できるもの)。
+                None の場合はプロセスで共有するクライアント。
+        cache (TtsAudioCache): None の場合はプロセスで共有するキャッシュ。
+        voice_dict (dict): VoiceSelectionParams の引数 (ssml_gender は名前)。
+        audio_config_dict (dict): AudioConfig の引数 (audio_encoding は名前)。
+        max_concurrency (int): 1 リクエストで同時に合成する文の数。
+
+    Example Usage:
+        tts_pipeline = TtsPipeline()
+        async for index, count, audio_content in tts_pipeline.stream(text):
+            await self.send(bytes_data=encode_tts_audio_frame({...}, audio_content))
+    """
+
+    def __init__(self,
+                 client:Optional[TextToSpeechAsyncClient] = None,
+                 cache:Optional[TtsAudioCache]            = None,
+                 voice_dict:Dict[str, Any]                = TTS_VOICE_DICT,
+                 audio_config_dict:Dict[str, Any]         = TTS_AUDIO_CONFIG_DICT,
+                 max_concurrency:int                      = TTS_SYNTH_MAX_CONCURRENCY,):
+        self.client            = client or get_tts_async_client()
+        self.cache             = cache or get_tts_audio_cache()
+        self.voice_dict        = voice_dict
+        self.audio_config_dict = audio_config_dict
+        self.max_concurrency   = max_concurrency
+        self._voice_params: Optional[VoiceSelectionParams] = None
+        self._audio_config: Optional[AudioConfig]          = None
+
+    async def synthesize(self, text:str) -> bytes:
+        """
+        1 文を合成する (キャッシュがあればキャッシュから返す)
+        """
+        key = make_tts_cache_key(text, self.voice_dict, self.audio_config_dict)
+        return await self.cache.get_or_create(key, lambda: self._synthesize_remote(text))
+
+    async def stream(self, text:str) -> AsyncIterator[Tuple[int, int, bytes]]:
+        """
+        Yields:
+            Tuple[int, int, bytes]: (文の番号, 文の数, 音声) を文の順に返す
+        """
+        sentences = split_tts_sentences(text)
+        if not sentences:
+            return
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async def _synthesize(sentence:str) -> bytes:
+            async with semaphore:
+                return await self.synthesize(sentence)
+        # セマフォの順に合成を開始するため、先頭の文から順に作成する
+        tasks = [asyncio.create_task(_synthesize(sentence)) for sentence in sentences]
+        try:
+            for index, task in enumerate(tasks):
+                yield index, len(tasks), await task
+        finally:
+            # 途中で止めた場合 (切断など) は残りの合成をキャンセルする
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ------------------------------
+    async def _synthesize_remote(self, text:str) -> bytes:
+        response = await self.client.synthesize_speech(
+            request = {
+                'input':        SynthesisInput(text=text),
+                'voice':        self._get_voice_params(),
+                'audio_config': self._get_audio_config(),
+            }
+        )
+        return response.audio_content
+
+    def _get_voice_params(self) -> VoiceSelectionParams:
+        if self._voice_params is None:
+            voice_dict = dict(self.voice_dict)
+            if isinstance(voice_dict.get('ssml_gender'), str):
+                voice_dict['ssml_gender'] = SsmlVoiceGender[voice_dict['ssml_gender']]
+            self._voice_params = VoiceSelectionParams(**voice_dict)
+        return self._voice_params
+
+    def _get_audio_config(self) -> AudioConfig:
+        if self._audio_config is None:
+            audio_config_dict = dict(self.audio_config_dict)
+            if isinstance(audio_config_dict.get('audio_encoding'), str):
+                audio_config_dict['audio_encoding'] = AudioEncoding[audio_config_dict['audio_encoding']]
+            self._audio_config = AudioConfig(**audio_config_dict)
+        return self._audio_config
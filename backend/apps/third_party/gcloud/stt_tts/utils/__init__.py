@@ -0,0 +1,18 @@
+from .SpeechClientRegistry import (
+    get_speech_async_client, get_tts_async_client,
+    get_speech_client_registry_stats, aclose_speech_async_clients,
+)
+from .SttAudioPreprocessor import (
+    SttAudioPreprocessor, LinearResampler,
+    decode_audio_chunk, samples_to_linear16, get_dbfs,
+)
+from .SttSession import (
+    SttSession,
+    STT_SESSION_IDLE, STT_SESSION_STREAMING, STT_SESSION_DRAINING, STT_SESSION_CLOSED,
+)
+from .SttSessionManager import SttSessionManager, SttSessionLease, get_stt_session_manager
+from .TtsAudioCache import TtsAudioCache, get_tts_audio_cache, make_tts_cache_key
+from .TtsPipeline import (
+    TtsPipeline, split_tts_sentences,
+    encode_tts_audio_frame, decode_tts_audio_frame,
+)
@@ -0,0 +1,27 @@
+from django.conf import settings
+import redis.asyncio as aioredis
+import asyncio
+import threading
+import weakref
+
+_lock          = threading.Lock()
+_redis_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]' = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    settings.REDIS_URL への非同期 Redis クライアントを返す。
+    接続プールはイベントループに紐づくため、イベントループごとに共有する。
+
+    Returns:
+        redis.asyncio.Redis: クライアント。
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _redis_clients.get(loop)
+        if client is None:
+            client = aioredis.Redis.from_url(settings.REDIS_URL,
+                                             socket_timeout         = 1.0,
+                                             socket_connect_timeout = 1.0,)
+            _redis_clients[loop] = client
+        return client
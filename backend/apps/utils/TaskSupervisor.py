@@ -0,0 +1,184 @@
+"""
+WebSocket の接続ごとのタスク管理
+    - receive ごとに asyncio.create_task していた処理を上限付きで実行する
+        - max_concurrency: 同時に実行する数
+        - max_pending:     実行中 + 待機中の上限. 超えた場合は submit が False を返す
+                           (呼び出し側で Busy を返す)
+    - key を指定したタスクは key ごとに受信順に 1 つずつ実行する (ルームごとの会話の順序を保つ)
+    - close (disconnect) で実行中/待機中のタスクをキャンセルする
+      (LLM のストリームなどはキャンセル時に各処理の finally で閉じる)
+    - get_task_supervisor_stats でプロセス全体の待機数・破棄数などを取得できる
+    - 上限は呼び出し側 (各アプリの settings) で指定する
+"""
+import asyncio
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set
+
+# プロセス全体の累計 (close 済みの接続も含む)
+_totals: Dict[str, int] = {
+    'submitted': 0,
+    'completed': 0,
+    'failed':    0,
+    'cancelled': 0,
+    'dropped':   0,
+}
+_supervisors: 'weakref.WeakSet[TaskSupervisor]' = weakref.WeakSet()
+
+
+class TaskSupervisor:
+    """
+    Args:
+        max_concurrency (int): 同時に実行するタスク数。
+        max_pending (int): 実行中 + 待機中のタスク数の上限。
+        name (str): 統計用の名前。
+
+    Example Usage:
+        # connect
+        self.task_supervisor = TaskSupervisor(max_concurrency=2, max_pending=8)
+        # receive
+        if not self.task_supervisor.submit(self._handle_receive, data_json, key=self.room_id):
+            await self._send_busy()
+        # disconnect
+        await self.task_supervisor.close()
+    """
+
+    def __init__(self,
+                 max_concurrency:int = 2,
+                 max_pending:int     = 8,
+                 name:str            = '',):
+        self.max_concurrency = max_concurrency
+        self.max_pending     = max_pending
+        self.name            = name
+        self.pending         = 0 # 実行中 + 待機中
+        self.running         = 0
+        self.is_closed       = False
+        self.stats_dict: Dict[str, int] = {key: 0 for key in _totals}
+        self.stats_dict['max_pending'] = 0
+        self._semaphore:  Optional[asyncio.Semaphore] = None
+        self._queues:     Dict[Hashable, Deque[Callable[[], Awaitable[Any]]]] = {}
+        self._tasks:      Set[asyncio.Task] = set()
+        _supervisors.add(self)
+
+    def submit(self,
+               coro_fnc:Callable[..., Awaitable[Any]],
+               *args,
+               key:Optional[Hashable] = None,
+               **kwargs,) -> bool:
+        """
+        Returns:
+            bool: 受け付けた場合 True (上限に達している/close 済みの場合は False)
+        """
+        if self.is_closed or self.pending >= self.max_pending:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        self.pending += 1
+        self.stats_dict['max_pending'] = max(self.stats_dict['max_pending'], self.pending)
+        # 受け付けるまでコルーチンは作成しない (破棄時に未 await の警告を出さない)
+        fnc = lambda: coro_fnc(*args, **kwargs)
+        if key is None:
+            self._spawn(self._run(fnc))
+        else:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = deque()
+                self._queues[key] = queue
+                queue.append(fnc)
+                self._spawn(self._drain(key, queue))
+            else:
+                # key の処理中 (_drain が順に実行する)
+                queue.append(fnc)
+        return True
+
+    async def close(self) -> None:
+        """
+        受け付けを終了し、実行中/待機中のタスクをキャンセルして完了を待つ
+        """
+        self.is_closed = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # 開始前にキャンセルされたタスクの分
+        if self.pending > 0:
+            self._count('cancelled', self.pending)
+        self.pending = 0
+        self.running = 0
+        self._queues.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        # 実行待ちの数
+        return self.pending - self.running
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.stats_dict,
+            'pending':     self.pending,
+            'running':     self.running,
+            'queue_depth': self.queue_depth,
+        }
+
+    # ------------------------------
+    def _count(self, key:str, n:int = 1) -> None:
+        self.stats_dict[key] += n
+        _totals[key]         += n
+
+    def _spawn(self, coro) -> None:
+        # タスクが GC されないよう完了まで参照を保持する
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, fnc:Callable[[], Awaitable[Any]]) -> None:
+        try:
+            if self._semaphore is None:
+                # 実行中のイベントループで作成する
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            async with self._semaphore:
+                self.running += 1
+                try:
+                    await fnc()
+                finally:
+                    self.running -= 1
+            self._count('completed')
+        except asyncio.CancelledError:
+            self._count('cancelled')
+            raise
+        except Exception as e:
+            print(e)
+            self._count('failed')
+        finally:
+            self.pending -= 1
+
+    async def _drain(self, key:Hashable, queue:Deque[Callable[[], Awaitable[Any]]]) -> None:
+        try:
+            while queue:
+                await self._run(queue[0])
+                queue.popleft()
+        finally:
+            # キャンセルされた場合は残りも実行しない
+            # (queue[0] は _run でキャンセル済みとして数えている)
+            if queue:
+                queue.popleft()
+                if queue:
+                    self._count('cancelled', len(queue))
+                    self.pending -= len(queue)
+                    queue.clear()
+            self._queues.pop(key, None)
+
+
+def get_task_supervisor_stats() -> Dict[str, int]:
+    """
+    プロセス全体のタスクの統計 (接続中の待機数と累計)
+    """
+    supervisors = list(_supervisors)
+    return {
+        **_totals,
+        'supervisors': sum(1 for supervisor in supervisors if not supervisor.is_closed),
+        'pending':     sum(supervisor.pending for supervisor in supervisors),
+        'running':     sum(supervisor.running for supervisor in supervisors),
+        'queue_depth': sum(supervisor.queue_depth for supervisor in supervisors),
+    }
@@ -1 +1,3 @@
-from .WebsocketUtils import sync_get_user_obj
\ No newline at end of file
+from .WebsocketUtils import sync_get_user_obj
+from .RedisUtils import get_async_redis
+from .TaskSupervisor import TaskSupervisor, get_task_supervisor_stats
\ No newline at end of file
@@ -1,31 +1,31 @@
-from channels.db import database_sync_to_async
 from channels.exceptions import StopConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import asyncio
-import brotli
-import json
-from api.utils import jwt_auth_get_id
 from common.scripts.DjangoUtils import generate_uuid_hex
-from common.scripts.LlmUtils import create_messages, calc_token, is_tokens_less_than_settings
+from common.scripts.LlmUtils import create_messages, calc_token, text_modify_fnc, TextHermlessStream
 from common.scripts.LlmUtils.llms import OpenAILlm, GcloudLlm
-from apps.utils import sync_get_user_obj
+from apps.utils import TaskSupervisor
 from ..settings import (
-    SOCKET_REQUEST_PER_SEC_LIMIT, SOCKET_REXEIVE_DATA_KB_LIMIT,
-    SEND_MAX_TOKENS,
-)
-from ..models import (
-    Room, SocketAccess,
-    MODEL_NAME_CHOICES,
+    SOCKET_REXEIVE_DATA_KB_LIMIT,
+    STREAM_CHUNK_COALESCE_CHARS, STREAM_CHUNK_COALESCE_SEC,
+    PRESENCE_HEARTBEAT_SEC,
+    SOCKET_TASK_MAX_CONCURRENCY, SOCKET_TASK_MAX_PENDING,
+    HISTORY_SUMMARY_ENABLED, HISTORY_SUMMARY_MAX_TOKENS,
 )
+from ..models import MODEL_NAME_CHOICES
 from ..utils import (
-    sync_get_room_obj,
-    get_room_settings, get_history,
-    sync_save_message_models,
-    replace_room_name_check,
+    authorize_connection,
     base_prompt,
+    create_socket_rate_limiter,
+    PresenceMember, presence_delta, get_presence_registry, schedule_presence_audit,
+    json_dumps, json_loads, negotiate_frame_codec,
+    get_room_group_name,
+    acquire_room_context, release_room_context,
+    get_room_context, append_room_context_turn, invalidate_room_context,
+    schedule_commit_turn, flush_turn_write_behind_soon,
+    build_context, schedule_history_summary,
 )
 
 
@@ -37,44 +37,66 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
 
         self.room_id    = self.scope['url_route']['kwargs']['room_id']
-        self.group_name = f'room_{self.room_id}'
-
-        # ユーザの取得と初期化 ▽
-        user_id = jwt_auth_get_id(self.scope['cookies'])
-        if user_id:
-            self.connect_user  = await sync_get_user_obj(user_id)
-        else:
-            self.connect_user  = None
-        # ユーザの取得と初期化 △
-        # ルームの取得 ▽
-        room_obj = await sync_get_room_obj(self.room_id)
-        # ルームの取得 △
+        self.group_name = get_room_group_name(self.room_id)
 
         # アクセス制御 ▽
-        ## ユーザが存在しない場合は接続を拒否
-        if not self.connect_user:
-            await self.close()
-            raise StopConsumer()
-        ## ルームが存在しない場合は接続を拒否
-        if not room_obj:
+        ## ユーザ・ルーム・ルームの作成者・ルーム設定を 1 クエリで取得 (接続中は保持する)
+        ## ユーザが存在しない / ルームが存在しない / ルームの作成者でない場合は接続を拒否
+        self.connection_auth = await authorize_connection(self.scope['cookies'], self.room_id)
+        if not self.connection_auth:
+            self.connect_user = None
             await self.close()
             raise StopConsumer()
+        self.connect_user = self.connection_auth.user
         # アクセス制御 △
 
+        # リクエスト制限 (memory は接続ごと / redis はユーザごとに共有)
+        self.rate_limiter     = create_socket_rate_limiter()
+        self.rate_limiter_key = f'user:{self.connect_user.pk}'
+        await self.rate_limiter.open(self.rate_limiter_key)
+        # ルーム設定と会話履歴のキャッシュ (以降のターンでは DB から読み出さない)
+        await acquire_room_context(self.room_id, self.connection_auth.room_settings_model_object)
+        self.is_room_context_acquired = True
+
+        # メッセージごとの処理 (同時実行数・待機数の上限付き. disconnect でキャンセル)
+        self.task_supervisor = TaskSupervisor(max_concurrency = SOCKET_TASK_MAX_CONCURRENCY,
+                                              max_pending     = SOCKET_TASK_MAX_PENDING,
+                                              name            = 'vrmchat',)
+
+        # フレームの圧縮 (Sec-WebSocket-Protocol で提示された場合のみ subprotocol を返す)
+        self.frame_codec, subprotocol = negotiate_frame_codec(self.scope.get('subprotocols'))
+        self.is_frame_codec_negotiated = subprotocol is not None
+
         # connect: group_name
         await self.channel_layer.group_add(self.group_name,
                                            self.channel_name,)
-        await self.accept()
-        asyncio.create_task(self._handle_connect(self.room_id,
-                                                 self.channel_name,
-                                                 self.connect_user,))
+        await self.accept(subprotocol=subprotocol)
+        # 接続中のメンバー (SocketAccess は使わない)
+        self.presence_registry  = get_presence_registry()
+        self.presence_join_task = asyncio.create_task(self._handle_connect(self.room_id,
+                                                                           self.channel_name,
+                                                                           self.connect_user,))
 
     async def disconnect(self, close_code):
         try:
             # disconnect: group_name
             await self.channel_layer.group_discard(self.group_name,
                                                    self.channel_name,)
-            asyncio.create_task(self._handle_disconnect(self.room_id, self.channel_name,))
+            if hasattr(self, 'rate_limiter'):
+                await self.rate_limiter.close(self.rate_limiter_key)
+            if getattr(self, 'is_room_context_acquired', False):
+                release_room_context(self.room_id)
+                self.is_room_context_acquired = False
+            # 実行中の LLM の処理などをキャンセル (ストリームは各処理の finally で閉じる)
+            if hasattr(self, 'task_supervisor'):
+                await self.task_supervisor.close()
+            # 退出後に参加し直さないようハートビートもキャンセル
+            presence_heartbeat_task = getattr(self, 'presence_heartbeat_task', None)
+            if presence_heartbeat_task is not None:
+                presence_heartbeat_task.cancel()
+            flush_turn_write_behind_soon()
+            if hasattr(self, 'presence_registry'):
+                asyncio.create_task(self._handle_disconnect(self.room_id))
         except Exception as e:
             print(e)
             pass
@@ -84,39 +106,102 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
             raise StopConsumer()
 
     async def receive(self, text_data=None, bytes_data=None):
-        asyncio.create_task(self._handle_receive(text_data, bytes_data))
-
-    # ------------------------------
-    # safety
-    @database_sync_to_async
-    def _request_count_and_check_socket_access(self, access_id:str):
-        # 短期間のリクエストを遮断する
+        # 受信データの判定とデコードのみ行い、メイン処理は task_supervisor で実行する
+        # (ルームごとに受信順に実行. 待機数が上限を超えた場合は Busy を返す)
+        is_possible_compress = self.is_frame_codec_negotiated
         try:
-            check_result = True
+            if text_data:
+                check_result = await self._check_text_data_byte(text_data)
+            elif bytes_data:
+                check_result = await self._check_bytes_data_length(bytes_data)
+            else:
+                check_result = False
 
-            socket_access_obj = SocketAccess.objects.filter(access_id = access_id).first()
-            now_utc_sec       = int(timezone.now().timestamp())
-            # socket_access_obj が作成されていなければ一旦Trueする
-            if socket_access_obj:
-                date_access_sec       = int(socket_access_obj.date_access.timestamp())
-                date_last_request_sec = int(socket_access_obj.date_last_request.timestamp())
-
-                # アクセスの2秒後からチェックを開始する
-                if now_utc_sec - date_access_sec >= 2:
-                    # 1秒間のアクセスをカウントする
-                    if now_utc_sec - date_last_request_sec < 1:
-                        request_count = socket_access_obj.request_count + 1
+            if check_result:
+                # post データ取得▽
+                # バイトデータで来たら(またはコーデックをネゴシエーション済みなら)圧縮モードで返せるとみなす
+                try:
+                    if text_data:
+                        data_json = json_loads(text_data) if text_data else None
+                        # ping は何も返さない (プレゼンスのハートビートのみ)
+                        if data_json['cmd'] == 'ping':
+                            self._schedule_presence_heartbeat()
+                            return None
+                        # Reconnect はユーザにのみ通知
+                        elif data_json['cmd'] == 'Reconnect':
+                            message_data = {
+                                'cmd':     'Reconnect',
+                                'status':  200,
+                                'ok':      True,
+                                'message': None,
+                                'data':    None,
+                            }
+                            return await self._self_send_message(message_data, is_send_bytes_data=False)
+                    elif bytes_data:
+                        data_json = self.frame_codec.decode(bytes_data) if bytes_data else None
+                        is_possible_compress = True
                     else:
-                        request_count = 1
-                        socket_access_obj.date_last_request = timezone.now()
-                    socket_access_obj.request_count = request_count
-                    socket_access_obj.save()
-                    
-                    # 規定回数を超えたらアクセスを遮断
-                    if request_count > SOCKET_REQUEST_PER_SEC_LIMIT:
-                        check_result = False
+                        data_json = None
+                except Exception as e:
+                    print(e)
+                    data_json = None
+                # post データ取得△
 
-            return check_result
+                if data_json:
+                    # 短期間のリクエストを遮断する
+                    check_result = await self._check_request_rate()
+                    if not check_result:
+                        message_data = {
+                            'cmd':     'wsClose',
+                            'status':  200,
+                            'ok':      True,
+                            'message': None,
+                            'data':    None,
+                        }
+                        await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+                        data_json = None
+
+                # メイン処理 (受信したら送信者に receiverMessage を返すため data_json がなくても実行する)
+                is_submitted = self.task_supervisor.submit(self._handle_receive,
+                                                           data_json,
+                                                           is_possible_compress,
+                                                           key = self.room_id,)
+                if not is_submitted:
+                    message_data = {
+                        'cmd':     'Busy',
+                        'status':  429,
+                        'ok':      False,
+                        'message': 'server busy',
+                        'data':    {'queueDepth': self.task_supervisor.queue_depth},
+                    }
+                    await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+            else:
+                message_data = {
+                    'cmd':     'wsClose',
+                    'status':  200,
+                    'ok':      True,
+                    'message': None,
+                    'data':    None,
+                }
+                await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+        except Exception as e:
+            print(e)
+            message_data = {
+                'cmd':     'Error',
+                'status':  500,
+                'ok':      False,
+                'message': 'server process Error',
+                'data':    None,
+            }
+            await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+        return None
+
+    # ------------------------------
+    # safety
+    async def _check_request_rate(self):
+        # 短期間のリクエストを遮断する (DB は使わない)
+        try:
+            return await self.rate_limiter.hit(self.rate_limiter_key)
         except Exception as e:
             print(e)
             return False
@@ -148,13 +233,23 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
 
     # ------------------------------
     # connect
+    # - プレゼンスに参加し、ユーザには現在のメンバー一覧、group には差分を通知する
     async def _handle_connect(self,
                               room_id:str,
                               channel_name:str,
                               connect_user,):
-        await asyncio.sleep(0.5)  # 非同期の待機処理
         try:
-            status_code, return_data, return_user_data = await self._create_socket_access(room_id, channel_name, connect_user)
+            member                   = PresenceMember.create(channel_name, connect_user)
+            members, expired_members = await self.presence_registry.join(room_id, member)
+            self.presence_member         = member
+            self.presence_heartbeat_time = asyncio.get_running_loop().time()
+            schedule_presence_audit(room_id, member, is_join=True, room_pk=self.connection_auth.room_pk)
+            status_code      = 200
+            return_data      = presence_delta(joined=[member], left=expired_members)
+            return_user_data = {
+                **member.to_public_dict(),
+                'members': [m.to_public_dict() for m in members],
+            }
         except Exception as e:
             print(e)
             status_code      = 500
@@ -184,166 +279,106 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
             await self._group_send_message(message_data, is_send_bytes_data=False)
         return None
 
-    @database_sync_to_async
-    def _create_socket_access(self,
-                              room_id:str,
-                              channel_name:str,
-                              connect_user,):
+    # ------------------------------
+    # disconnect
+    async def _handle_disconnect(self, room_id:str):
         try:
-            room_obj = Room.objects.get(room_id=room_id)
-            # Create SocketAccess
-            access_id = generate_uuid_hex()
-            user_name = '*'+access_id[:5].upper()
-            _ = SocketAccess.objects.create(room_id          = room_obj,
-                                            access_id         = access_id,
-                                            user              = None if connect_user.is_anonymous else connect_user,
-                                            user_name         = user_name,
-                                            channel_name      = channel_name,
-                                            date_last_request = timezone.now(),
-                                            date_access       = timezone.now(),)
-            # GET SocketAccess data
-            socket_access_objs = SocketAccess.objects.filter(room_id = room_obj).order_by('pk')\
-                                                     .values('access_id', 'user_name')
-            return_data = {
-                'socket_access_objs': list(socket_access_objs),
-            }
-            return_user_data = {
-                'access_id': access_id,
-                'user_name': user_name,
-            }
-            return 200, return_data, return_user_data
+            # 参加 / ハートビートの処理が終わってから退出する
+            tasks = [task for task in (self.presence_join_task, getattr(self, 'presence_heartbeat_task', None)) if task is not None]
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            member = getattr(self, 'presence_member', None)
+            if member is None:
+                return None
+            left_member = await self.presence_registry.leave(room_id, member.access_id)
+            schedule_presence_audit(room_id, member, is_join=False)
         except Exception as e:
             print(e)
-            return 500, None, None
+            return None
+
+        # 期限切れで既に削除されていた場合は通知済み
+        if left_member is not None:
+            await self._send_presence_left([left_member])
+        return None
 
     # ------------------------------
-    # disconnect
-    async def _handle_disconnect(self, room_id:str, channel_name:str):
-        await asyncio.sleep(1)  # 非同期の待機処理
+    # presence heartbeat
+    # - task_supervisor を使わずに実行する (Busy の判定・dropped の統計に含めない)
+    # - 更新間隔内 / 前回のハートビートの処理中はタスクを作成しない
+    def _schedule_presence_heartbeat(self):
+        presence_heartbeat_task = getattr(self, 'presence_heartbeat_task', None)
+        if getattr(self, 'presence_member', None) is None or (presence_heartbeat_task is not None and not presence_heartbeat_task.done()):
+            return None
+        if asyncio.get_running_loop().time() - self.presence_heartbeat_time < PRESENCE_HEARTBEAT_SEC:
+            return None
+        self.presence_heartbeat_task = asyncio.create_task(self._presence_heartbeat())
+        return None
+
+    # - クライアントの ping ごと (PRESENCE_HEARTBEAT_SEC 間隔まで間引く) に更新する
+    # - 期限切れのメンバーがいれば退出として通知する
+    async def _presence_heartbeat(self):
         try:
-            status_code, return_data = await self._delete_socket_access(room_id, channel_name)
+            member = getattr(self, 'presence_member', None)
+            now    = asyncio.get_running_loop().time()
+            if member is None or now - self.presence_heartbeat_time < PRESENCE_HEARTBEAT_SEC:
+                return None
+            self.presence_heartbeat_time = now
+            is_member, expired_members = await self.presence_registry.heartbeat(self.room_id, member.access_id)
+            if expired_members:
+                await self._send_presence_left(expired_members)
+            # 自身が期限切れで削除されていた場合は参加し直す
+            if not is_member:
+                _joined, expired_members = await self.presence_registry.join(self.room_id, member)
+                message_data = {
+                    'cmd':     'SocketConnect',
+                    'status':  200,
+                    'ok':      True,
+                    'message': None,
+                    'data':    presence_delta(joined=[member], left=expired_members),
+                }
+                await self._group_send_message(message_data, is_send_bytes_data=False)
         except Exception as e:
             print(e)
-            status_code = 500
-            return_data = None
+        return None
 
-        # group_send_message
+    async def _send_presence_left(self, left_members:list):
         message_data = {
             'cmd':     'SocketDisconnect',
-            'status':  status_code,
-            'ok':      True if status_code == 200 else False,
+            'status':  200,
+            'ok':      True,
             'message': None,
-            'data':    return_data,
+            'data':    presence_delta(left=left_members),
         }
-        if status_code == 200:
-            await self._group_send_message(message_data, is_send_bytes_data=False)
+        await self._group_send_message(message_data, is_send_bytes_data=False)
         return None
 
-    @database_sync_to_async
-    def _delete_socket_access(self, room_id:str, channel_name:str):
-        try:
-            # Derete SocketAccess
-            try:
-                socket_access_obj = SocketAccess.objects.get(channel_name = channel_name)
-                socket_access_obj.delete()
-            except Exception as e:
-                # 既にレコードが削除済みなどもありえるので無視
-                pass
-
-            # GET SocketAccess data
-            socket_access_objs = SocketAccess.objects.filter(room_id__room_id = room_id).order_by('pk')\
-                                                     .values('access_id', 'user_name')
-            return_data = {
-                'socket_access_objs': list(socket_access_objs),
-            }
-            return 200, return_data
-        except Exception as e:
-            print(e)
-            return 500, None
-
     # ------------------------------
     # receive
-    async def _handle_receive(self, text_data=None, bytes_data=None):
+    # - receive から task_supervisor 経由で受信順に実行する
+    async def _handle_receive(self, data_json, is_possible_compress:bool):
         try:
-            if text_data:
-                check_result = await self._check_text_data_byte(text_data)
-            elif bytes_data:
-                check_result = await self._check_bytes_data_length(bytes_data)
-            else:
-                check_result = False
-
-            if check_result:
-                # post データ取得▽
-                # バイトデータで来たら圧縮モードで返せるとみなす
-                is_possible_compress = False
-                try:
-                    if text_data:
-                        data_json = json.loads(text_data) if text_data else None
-                        # ping は何も返さない
-                        if data_json['cmd'] == 'ping':
-                            return
-                        # Reconnect はユーザにのみ通知
-                        elif data_json['cmd'] == 'Reconnect':
-                            message_data = {
-                                'cmd':     'Reconnect',
-                                'status':  200,
-                                'ok':      True,
-                                'message': None,
-                                'data':    None,
-                            }
-                            return await self._self_send_message(message_data, is_send_bytes_data=False)
-                    elif bytes_data:
-                        data_json = json.loads(brotli.decompress(bytes_data).decode('utf-8')) if bytes_data else None
-                        is_possible_compress = True
-                    else:
-                        data_json = None
-                except Exception as e:
-                    print(e)
-                    data_json = None
-                # post データ取得△
-
-                if data_json:                    
-                    # 短期間のリクエストを遮断する
-                    check_result = await self._request_count_and_check_socket_access(data_json['request_user_access_id'])
-
-                    if check_result:
-                        # -------------------------
-                        # メイン処理(cmd分岐) ▽
-                        if data_json['cmd'] == 'SendUserMessage':
-                            await self._receive_user_message(data_json['data']['message'],
-                                                             None,
-                                                             is_possible_compress)
-                        # ... 他のコマンドあればここで分岐処理させる
-                        # メイン処理(cmd分岐) △
-                        # -------------------------
-                    else:
-                        message_data = {
-                            'cmd':     'wsClose',
-                            'status':  200,
-                            'ok':      True,
-                            'message': None,
-                            'data':    None,
-                        }
-                        await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
-
-                # データを受信したら送信者に何か返す
-                message_data = {
-                    'cmd':     'receiverMessage',
-                    'status':  200,
-                    'ok':      True,
-                    'message': 'receiveFin',
-                    'data':    None,
-                }
-                await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
-            else:
-                message_data = {
-                    'cmd':     'wsClose',
-                    'status':  200,
-                    'ok':      True,
-                    'message': None,
-                    'data':    None,
-                }
-                await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+            if data_json:
+                # -------------------------
+                # メイン処理(cmd分岐) ▽
+                if data_json['cmd'] == 'SendUserMessage':
+                    await self._receive_user_message(data_json['data']['message'],
+                                                     None,
+                                                     is_possible_compress,
+                                                     # フロントエンドは値を文字列で送信する
+                                                     is_stream = data_json['data'].get('isStream') in (True, 'true'),)
+                # ... 他のコマンドあればここで分岐処理させる
+                # メイン処理(cmd分岐) △
+                # -------------------------
+
+            # データを受信したら送信者に何か返す
+            message_data = {
+                'cmd':     'receiverMessage',
+                'status':  200,
+                'ok':      True,
+                'message': 'receiveFin',
+                'data':    None,
+            }
+            await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
         except Exception as e:
             print(e)
             message_data = {
@@ -359,11 +394,16 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
     ####################
     # _receive_user_message ▽
     ####################
-    async def _receive_user_message(self, user_message:str, message_id:str, is_possible_compress:bool):
+    async def _receive_user_message(self,
+                                    user_message:str,
+                                    message_id:str,
+                                    is_possible_compress:bool,
+                                    is_stream:bool = False,):
 
         try:
-            # RoomSettings の取得
-            data_dict = await get_room_settings(self.room_id)
+            # RoomSettings / 会話履歴の取得 (キャッシュ)
+            room_context = await get_room_context(self.room_id)
+            data_dict    = room_context.get_settings()
             # model_name の変換 (model_name_int でこの後 llmの切り替えするので保持)
             model_name_int          = data_dict['model_name']
             data_dict['model_name'] = MODEL_NAME_CHOICES_DICT[model_name_int]
@@ -376,9 +416,11 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
                 data_dict['message_id'] = generate_uuid_hex()
 
             # ルームに紐づくヒストリーメッセージ時の取得▽
-            history_list, history_text = await get_history(self.room_id, data_dict['history_len'])
-            data_dict['history_list'] = history_list
-            data_dict['history_text'] = history_text
+            # history_len を上限にトークン予算に収まる分だけ新しい順に詰める
+            built_context = build_context(room_context, data_dict)
+            data_dict['history_list'] = built_context.history_list
+            data_dict['history_text'] = built_context.history_text
+            sent_tokens               = built_context.sent_tokens
             # ルームに紐づくヒストリーメッセージ時の取得△
 
             # 入力のバリデーション▽
@@ -397,13 +439,8 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
                 await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
             ## 何も質問されてないときに返すテキスト△
             ## メッセージのトークンが設定値を超えた場合の処理▽
-            elif not is_tokens_less_than_settings(
-                        sentence   = data_dict['user_message']+ \
-                                    data_dict['system_sentence'] if data_dict['system_sentence'] else ''+ \
-                                    data_dict['assistant_sentence'] if data_dict['assistant_sentence'] else ''+ \
-                                    data_dict['history_text'] if data_dict['history_text'] else '',
-                        max_tokens = int(SEND_MAX_TOKENS)):
-                error_message = f'入力文字数が設定値を超えたみたいです。\n過去の会話、システムメッセージなども含めて最大トークンは{SEND_MAX_TOKENS}に設定されています。'
+            elif built_context.is_over_budget:
+                error_message = f'入力文字数が設定値を超えたみたいです。\nシステムメッセージなども含めて最大トークンは{built_context.budget_tokens}に設定されています。'
                 message_data = {
                     'cmd':  'SendUserMessage',
                     'status': 200,
@@ -428,54 +465,59 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
                                         data_dict['assistant_sentence'],
                                         data_dict['history_list'])
                 # llm
-                # model_name_int の大きさで切り替え
-                if model_name_int < 100:
-                    llm = OpenAILlm(api_key           = settings.OPENAI_API_KEY,
-                                    model_name        = data_dict['model_name'],
-                                    temperature       = data_dict['temperature'],
-                                    max_tokens        = data_dict['max_tokens'],
-                                    top_p             = data_dict['top_p'],
-                                    frequency_penalty = data_dict['frequency_penalty'],
-                                    presence_penalty  = data_dict['presence_penalty'],)
-                elif 100 <= model_name_int:
-                    llm = GcloudLlm(project_name      = settings.GCLOUD_PROJECT_NAME,
-                                    location_name     = settings.GCLOUD_LOCATION_NAME,
-                                    model_name        = data_dict['model_name'],
-                                    temperature       = data_dict['temperature'],
-                                    max_tokens        = data_dict['max_tokens'],
-                                    top_p             = data_dict['top_p'],
-                                    frequency_penalty = data_dict['frequency_penalty'],
-                                    presence_penalty  = data_dict['presence_penalty'],)
-                llm_response = await llm.async_get_response(messages)
-                message_data = {
-                    'cmd':  'SendUserMessage',
-                    'status': 200,
-                    'ok':     True,
-                    'data': {
-                        'messageId':   data_dict['message_id'],
-                        'llmResponse': llm_response,
-                    },
-                }
-                await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+                llm = self._create_llm(model_name_int, data_dict)
+                if is_stream:
+                    # 差分を SendUserMessageChunk で逐次送信し SendUserMessageEnd で確定
+                    llm_response = await self._stream_llm_response(llm,
+                                                                   messages,
+                                                                   data_dict['message_id'],
+                                                                   is_possible_compress)
+                else:
+                    llm_response = await llm.async_get_response(messages)
+                    message_data = {
+                        'cmd':  'SendUserMessage',
+                        'status': 200,
+                        'ok':     True,
+                        'data': {
+                            'messageId':   data_dict['message_id'],
+                            # 保存する内容 (schedule_commit_turn) と同じく無害化して送信
+                            'llmResponse': text_modify_fnc(llm_response),
+                        },
+                    }
+                    await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
 
                 # 結果の処理
                 data_dict['llm_response'] = llm_response
                 tokens_info_dict = {
-                    'sent_tokens': calc_token(sentence = data_dict['user_message']+ \
-                                                        data_dict['system_sentence'] if data_dict['system_sentence'] else ''+ \
-                                                        data_dict['assistant_sentence'] if data_dict['assistant_sentence'] else ''+ \
-                                                        data_dict['history_text'] if data_dict['history_text'] else '',
-                                            model_name = data_dict['model_name']),
-                    'generated_tokens': calc_token(sentence = data_dict['llm_response'],),
+                    'sent_tokens':      sent_tokens,
+                    'generated_tokens': calc_token(sentence   = data_dict['llm_response'],
+                                                   model_name = data_dict['model_name'],),
                 }
                 data_dict['tokens_info_dict'] = tokens_info_dict
                 
-                # メッセージの保存
-                await sync_save_message_models(self.room_id, data_dict)
+                # メッセージ・ルーム名・トークン情報の保存 (バックグラウンドで 1 トランザクション)
+                # キャッシュはその場で更新し、ルーム名は保存を待たずに返す
+                saved_llm_response, room_name = schedule_commit_turn(room_context, data_dict)
+                # 同じルームの他の接続のキャッシュに通知
+                await self.channel_layer.group_send(
+                    self.group_name,
+                    {
+                        'type':         'room_context_update',
+                        'message_id':   data_dict['message_id'],
+                        'user_message': data_dict['user_message'],
+                        'llm_response': saved_llm_response,
+                    },
+                )
+
+                # 収まらなかった古い履歴の要約 (バックグラウンド. 次のターン以降で使用)
+                if HISTORY_SUMMARY_ENABLED and built_context.dropped_turns:
+                    schedule_history_summary(room_context,
+                                             built_context.dropped_turns,
+                                             self._create_llm(model_name_int, {**data_dict, 'max_tokens': HISTORY_SUMMARY_MAX_TOKENS}),
+                                             data_dict['model_name'],)
 
-                # ルーム名チェック
-                is_replace, room_name = await replace_room_name_check(self.room_id, data_dict['user_message'])
-                if is_replace:
+                # ルーム名の通知
+                if room_name:
                     message_data = {
                         'cmd':  'ChangeRoomName',
                         'status': 200,
@@ -500,6 +542,109 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
     # _receive_user_message △
     ####################
 
+    ####################
+    # _create_llm
+    # - model_name_int の大きさで切り替え
+    ####################
+    def _create_llm(self, model_name_int:int, data_dict:dict):
+        if model_name_int < 100:
+            llm = OpenAILlm(api_key           = settings.OPENAI_API_KEY,
+                            model_name        = data_dict['model_name'],
+                            temperature       = data_dict['temperature'],
+                            max_tokens        = data_dict['max_tokens'],
+                            top_p             = data_dict['top_p'],
+                            frequency_penalty = data_dict['frequency_penalty'],
+                            presence_penalty  = data_dict['presence_penalty'],)
+        else:
+            llm = GcloudLlm(project_name      = settings.GCLOUD_PROJECT_NAME,
+                            location_name     = settings.GCLOUD_LOCATION_NAME,
+                            model_name        = data_dict['model_name'],
+                            temperature       = data_dict['temperature'],
+                            max_tokens        = data_dict['max_tokens'],
+                            top_p             = data_dict['top_p'],
+                            frequency_penalty = data_dict['frequency_penalty'],
+                            presence_penalty  = data_dict['presence_penalty'],)
+        return llm
+
+    ####################
+    # _stream_llm_response
+    # - LLM の差分を SendUserMessageChunk として送信し、最後に SendUserMessageEnd を送信する
+    # - 差分は TextHermlessStream で無害化して送信する (送信した全文 = 保存する text_modify_fnc(全文))
+    # - 最初の差分は即時送信し、以降は STREAM_CHUNK_COALESCE_* に達するまでまとめて送信
+    # - 戻り値は無害化前の全文 (トークン数の計算・保存用)
+    ####################
+    async def _stream_llm_response(self,
+                                   llm,
+                                   messages:list,
+                                   message_id:str,
+                                   is_possible_compress:bool,) -> str:
+        loop          = asyncio.get_running_loop()
+        hermless      = TextHermlessStream()
+        response_list = []
+        sent_list     = []
+        buffer_list   = []
+        buffer_len    = 0
+        chunk_index   = 0
+        last_send_sec = loop.time()
+
+        async def _send_chunk():
+            nonlocal buffer_list, buffer_len, chunk_index, last_send_sec
+            message_data = {
+                'cmd':    'SendUserMessageChunk',
+                'status': 200,
+                'ok':     True,
+                'data': {
+                    'messageId': message_id,
+                    'index':     chunk_index,
+                    'delta':     ''.join(buffer_list),
+                },
+            }
+            await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+            sent_list.extend(buffer_list)
+            buffer_list   = []
+            buffer_len    = 0
+            chunk_index  += 1
+            last_send_sec = loop.time()
+
+        # 切断などでタスクがキャンセルされた場合も LLM 側のストリームを閉じる
+        stream = llm.async_get_stream_response(messages)
+        try:
+            async for delta in stream:
+                if not delta:
+                    continue
+                response_list.append(delta)
+                # URL / Markdown リンクの途中は確定するまで保持される
+                text = hermless.feed(delta)
+                if not text:
+                    continue
+                buffer_list.append(text)
+                buffer_len += len(text)
+                if (   chunk_index == 0
+                    or buffer_len >= STREAM_CHUNK_COALESCE_CHARS
+                    or loop.time() - last_send_sec >= STREAM_CHUNK_COALESCE_SEC):
+                    await _send_chunk()
+        finally:
+            await stream.aclose()
+        # 残りの差分を送信
+        text = hermless.flush()
+        if text:
+            buffer_list.append(text)
+        if buffer_list:
+            await _send_chunk()
+
+        message_data = {
+            'cmd':    'SendUserMessageEnd',
+            'status': 200,
+            'ok':     True,
+            'data': {
+                'messageId':   message_id,
+                'chunkCount':  chunk_index,
+                'llmResponse': ''.join(sent_list),
+            },
+        }
+        await self._self_send_message(message_data, is_send_bytes_data=is_possible_compress)
+        return ''.join(response_list)
+
     ####################
     # _create_prompt
     ####################
@@ -511,21 +656,6 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
             formatted_prompt = None
         return formatted_prompt
 
-    ####################
-    # _socket_access_get_channel_name
-    # - access_id から channel_name を特定して _target_channel_name_send_message でメッセージを送信
-    ####################
-    @database_sync_to_async
-    def _socket_access_get_channel_name(self, stage_id:str, access_id:str):
-        try:
-            channel_name = SocketAccess.objects.get(stage_id__stage_id = stage_id,
-                                                    access_id          = access_id)\
-                                                .channel_name
-            return 200, channel_name
-        except Exception as e:
-            print(e)
-            return 500, None
-
     ####################
     # _self_send_message
     ####################
@@ -573,13 +703,31 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
             )
         return None
 
+    ####################
+    # room_context
+    # - RoomContext の更新/破棄の group 通知 (クライアントには送信しない)
+    ####################
+    async def room_context_update(self, event):
+        try:
+            append_room_context_turn(self.room_id,
+                                     event['message_id'],
+                                     event['user_message'],
+                                     event['llm_response'],)
+        except Exception as e:
+            print(e)
+        return None
+
+    async def room_context_invalidate(self, event):
+        invalidate_room_context(self.room_id)
+        return None
+
     ####################
     # send_message
     ####################
     async def send_text_data_message(self, event):
         try:
             message = event['message']
-            await self.send(text_data=json.dumps(message))
+            await self.send(text_data=json_dumps(message))
         except Exception as e:
             print(e)
             pass
@@ -588,8 +736,9 @@ class VrmchatConsumer(AsyncWebsocketConsumer):
     async def send_bytes_data_message(self, event):
         try:
             message = event['message']
-            await self.send(bytes_data=brotli.compress(json.dumps(message).encode('utf-8'),
-                                                       quality=4))
+            # 小さいフレームはテキストのまま送る
+            text_data, bytes_data = self.frame_codec.encode(message)
+            await self.send(text_data=text_data, bytes_data=bytes_data)
         except Exception as e:
             print(e)
             pass
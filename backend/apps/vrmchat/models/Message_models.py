@@ -74,4 +74,9 @@ class Message(models.Model):
     class Meta:
         app_label    = 'vrmchat'
         db_table     = 'vrmchat_message_model'
-        verbose_name = verbose_name_plural = _('10_メッセージ一覧')
\ No newline at end of file
+        verbose_name = verbose_name_plural = _('10_メッセージ一覧')
+        indexes      = [
+            # 会話履歴 (room_id, is_active = True, -date_create の直近 N 件) をソートせずに取得する
+            # is_active=True の filter は WHERE "is_active" になり複合インデックスの等価条件に使えないため部分インデックスにする
+            models.Index(fields=['room_id', '-date_create'], condition=models.Q(is_active=True), name='vrmchat_msg_room_active_idx'),
+        ]
\ No newline at end of file
@@ -56,6 +56,10 @@ class Room(models.Model):
         app_label    = 'vrmchat'
         db_table     = 'vrmchat_room_model'
         verbose_name = verbose_name_plural = _('01_ルーム情報')
+        indexes      = [
+            # ルーム一覧 (create_user, is_active = True) . RoomSettings との結合に使う id まで含めてテーブルを読まない
+            models.Index(fields=['create_user', 'is_active', 'id'], name='vrmchat_room_user_active_idx'),
+        ]
 
 # パラメータのデフォルト値で参照
 # https://learn.microsoft.com/ja-jp/azure/ai-services/openai/reference#request-body
@@ -46,6 +46,7 @@ class SocketAccess(models.Model):
                     help_text    = _('半角英数字 25文字以内'),)
     channel_name = models.CharField(
                     verbose_name = 'channel_name',
+                    db_index     = True,
                     max_length   = 255,
                     default      = 'None',
                     blank        = False,
@@ -1,4 +1,9 @@
 from .Room_models import Room, RoomSettings
 from .Message_models import Message
 from .SocketAccess_models import SocketAccess
-from .Choices import MODEL_NAME_CHOICES
\ No newline at end of file
+from .Choices import MODEL_NAME_CHOICES
+from .receivers.RoomContext_receivers import (
+    room_settings_invalidate_room_context,
+    room_invalidate_room_context,
+    message_invalidate_room_context,
+)
\ No newline at end of file
@@ -0,0 +1,45 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ...models import Room, RoomSettings, Message
+from ...utils import get_room_group_name, invalidate_room_context
+
+
+def _notice_room_context_invalidate(room_id:str) -> None:
+    """
+    RoomContext (apps.vrmchat.utils.RoomContextCache) を破棄する
+    他のプロセスの接続にはルームの group 経由で通知する
+    """
+    invalidate_room_context(room_id)
+    def _group_send():
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                get_room_group_name(room_id),
+                {'type': 'room_context_invalidate'},
+            )
+        except Exception as e:
+            print(e)
+    # コミット後に通知し、再読み込みで変更前のデータを読まないようにする
+    transaction.on_commit(_group_send)
+
+@receiver(post_save, sender=RoomSettings)
+@receiver(post_delete, sender=RoomSettings)
+def room_settings_invalidate_room_context(sender, instance, **kwargs) -> None:
+    _notice_room_context_invalidate(instance.room_id.room_id)
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_invalidate_room_context(sender, instance, **kwargs) -> None:
+    # 新規作成時は接続がないため通知しない
+    if not kwargs.get('created', False):
+        _notice_room_context_invalidate(instance.room_id)
+
+# [Memo] Message に post_delete を設定するとルーム削除時のカスケードが
+#        1 件ずつの削除になるため、保存(管理画面での is_active 変更等)のみ対象とする
+@receiver(post_save, sender=Message)
+def message_invalidate_room_context(sender, instance, **kwargs) -> None:
+    # VrmchatConsumer からの保存はキャッシュをその場で更新済み
+    if not getattr(instance, 'is_room_context_synced', False):
+        _notice_room_context_invalidate(instance.room_id.room_id)
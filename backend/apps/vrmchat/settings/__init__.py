@@ -1,6 +1,9 @@
 from .llm_settings import (
     MIN_TOKENS, MAX_TOKENS, SEND_MAX_TOKENS,
+    MODEL_CONTEXT_WINDOW_DICT, DEFAULT_CONTEXT_WINDOW,
+    HISTORY_SUMMARY_ENABLED, HISTORY_SUMMARY_MAX_TOKENS, HISTORY_SUMMARY_MAX_CHARS, HISTORY_SUMMARY_SOURCE_MAX_TOKENS,
     RETRY_LIMIT_N, MAX_HISSTORY_N,
+    TURN_WRITE_BEHIND, TURN_WRITE_BEHIND_FLUSH_SEC, TURN_WRITE_BEHIND_MAX_BATCH,
     MAX_LEN_SYSTEM_SENTENCE, MAX_LEN_ASSISTANT_SENTENCE,
     DEFAULT_ROOM_NAME, MAX_LEN_ROOM_NAME,
     ALLOWD_DOMAINS_LIST,
@@ -8,4 +11,10 @@ from .llm_settings import (
 from .socket_settings import (
     SOCKET_REQUEST_PER_SEC_LIMIT,
     SOCKET_REXEIVE_DATA_KB_LIMIT,
+    SOCKET_RATE_LIMITER_BACKEND, SOCKET_RATE_LIMIT_GRACE_SEC,
+    SOCKET_TASK_MAX_CONCURRENCY, SOCKET_TASK_MAX_PENDING,
+    STREAM_CHUNK_COALESCE_CHARS, STREAM_CHUNK_COALESCE_SEC,
+    SOCKET_FRAME_CODEC_PREFERENCE, SOCKET_SUBPROTOCOL_PREFIX,
+    SOCKET_COMPRESS_MIN_BYTES, SOCKET_BROTLI_QUALITY,
+    PRESENCE_BACKEND, PRESENCE_HEARTBEAT_SEC, PRESENCE_TTL_SEC, PRESENCE_AUDIT_LOG,
 )
\ No newline at end of file
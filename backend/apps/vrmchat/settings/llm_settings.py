@@ -4,10 +4,36 @@ MIN_TOKENS      = 50
 MAX_TOKENS      = 8192
 SEND_MAX_TOKENS = 8192
 
+# モデルのコンテキスト長 (入力 + 出力). 未登録のモデルは DEFAULT_CONTEXT_WINDOW
+# 送信する履歴は min(コンテキスト長 - max_tokens, SEND_MAX_TOKENS) に収まる分だけ新しい順に詰める
+MODEL_CONTEXT_WINDOW_DICT = {
+    'gpt-3.5-turbo':   16385,
+    'gpt-4':           8192,
+    'gpt-4-turbo':     128000,
+    'gpt-4.5-preview': 128000,
+    'gpt-4o':          128000,
+    'gpt-4o-mini':     128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 予算に収まらなかった古い履歴を要約して送信する (apps.vrmchat.utils.ContextBuilder)
+# 要約はバックグラウンドで LLM を呼び出して作成し、ルームごとにキャッシュする
+HISTORY_SUMMARY_ENABLED           = False
+HISTORY_SUMMARY_MAX_TOKENS        = 512  # 要約の最大トークン数 (LLM の max_tokens)
+HISTORY_SUMMARY_MAX_CHARS         = 300  # プロンプトで指示する要約の文字数 (日本語は 1 文字 1 トークン前後のため、途中で切れないよう MAX_TOKENS より小さくする)
+HISTORY_SUMMARY_SOURCE_MAX_TOKENS = 4096 # 要約に渡す会話の最大トークン数
+
 # Process
 RETRY_LIMIT_N  = 2
 MAX_HISSTORY_N = 30
 
+# 会話の保存 (apps.vrmchat.utils.TurnWriter)
+# True の場合は TURN_WRITE_BEHIND_FLUSH_SEC ごとにまとめて bulk_create する
+# (多数のルームが同時に会話している場合向け. プロセス終了時に未保存のターンが失われる可能性がある)
+TURN_WRITE_BEHIND           = False
+TURN_WRITE_BEHIND_FLUSH_SEC = 0.5
+TURN_WRITE_BEHIND_MAX_BATCH = 200
+
 # Models
 MAX_LEN_SYSTEM_SENTENCE    = 1500
 MAX_LEN_ASSISTANT_SENTENCE = 1500
@@ -1,2 +1,34 @@
 SOCKET_REQUEST_PER_SEC_LIMIT = 10
-SOCKET_REXEIVE_DATA_KB_LIMIT = 10
\ No newline at end of file
+SOCKET_REXEIVE_DATA_KB_LIMIT = 10
+
+# リクエスト制限 (apps.vrmchat.utils.RateLimiter)
+# 'memory': 接続ごとにプロセス内で判定 / 'redis': ユーザごとに Redis で共有 (同じユーザの接続・プロセス間)
+SOCKET_RATE_LIMITER_BACKEND = 'memory'
+SOCKET_RATE_LIMIT_GRACE_SEC = 2 # 接続から判定を開始するまでの秒数
+
+# 接続ごとのメッセージ処理 (apps.utils.TaskSupervisor)
+# 同時実行数と実行中 + 待機中の上限. 上限を超えたメッセージには Busy を返す
+SOCKET_TASK_MAX_CONCURRENCY = 2
+SOCKET_TASK_MAX_PENDING     = 8
+
+# ストリーミング応答 (SendUserMessageChunk)
+# 小さな差分をまとめて送信してフレーム数(brotli圧縮回数)を減らす
+# 文字数 or 経過秒のどちらかに達したら送信. 0 の場合は差分ごとに送信する
+STREAM_CHUNK_COALESCE_CHARS = 24
+STREAM_CHUNK_COALESCE_SEC   = 0.15
+
+
+# WebSocket フレームの圧縮 (apps.vrmchat.utils.FrameCodec)
+# クライアントが Sec-WebSocket-Protocol で提示したもの ({PREFIX}{codec}) から優先順に選択する
+# 提示がない場合は 'br' (フレームごとに brotli)
+SOCKET_FRAME_CODEC_PREFERENCE = ['br', 'none',]
+SOCKET_SUBPROTOCOL_PREFIX     = 'vrmchat.'
+SOCKET_COMPRESS_MIN_BYTES     = 256  # これ未満のフレームは圧縮せずテキストで送る
+SOCKET_BROTLI_QUALITY         = 4
+
+# 接続中のメンバー (apps.vrmchat.utils.PresenceRegistry)
+# 'memory': プロセス内 / 'redis': Redis で共有 (Redis に接続できない場合は memory)
+PRESENCE_BACKEND       = 'redis'
+PRESENCE_HEARTBEAT_SEC = 15    # クライアントの ping でハートビートを更新する最短間隔
+PRESENCE_TTL_SEC       = 60    # ハートビートがこの秒数途絶えたメンバーは削除する
+PRESENCE_AUDIT_LOG     = False # True の場合は SocketAccess にもバックグラウンドで記録する
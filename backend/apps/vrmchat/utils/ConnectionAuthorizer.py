@@ -0,0 +1,67 @@
+"""
+WebSocket 接続時の認可 (ユーザ・ルーム・ルームの所有者・ルーム設定)
+    - connect ごとに User / Room を別々に読み出していた処理を、
+      RoomSettings から Room・作成者を select_related した 1 クエリ (スレッドの切り替え 1 回) にまとめる
+    - ルームの作成者と接続したユーザが一致しない場合は接続を拒否する
+    - 結果 (ConnectionAuthorization) は接続中保持し、以降の処理 (RoomContext の読み込みなど) に渡す
+"""
+from channels.db import database_sync_to_async
+from typing import Dict, Optional
+from api.utils import jwt_auth_get_id
+from ..models import RoomSettings
+from .RoomContextCache import room_settings_to_dict
+
+
+class ConnectionAuthorization:
+    """
+    接続したユーザとルーム (接続中は DB から読み直さない)
+    """
+
+    __slots__ = ('user', 'room_id', 'room_pk', 'room_name', 'settings', 'room_settings_model_object')
+
+    def __init__(self, room_settings_model_object):
+        room_obj                        = room_settings_model_object.room_id
+        self.user                       = room_obj.create_user
+        self.room_id                    = room_obj.room_id
+        self.room_pk                    = room_obj.pk
+        self.room_name                  = room_settings_model_object.room_name
+        self.settings: Dict[str, str]   = room_settings_to_dict(room_settings_model_object)
+        self.room_settings_model_object = room_settings_model_object
+
+
+@database_sync_to_async
+def sync_authorize_connection(user_id:int,
+                              room_id:str,
+                              ) -> Optional[ConnectionAuthorization]:
+    """
+    Args:
+        user_id (int): 接続したユーザのプライマリキー。
+        room_id (str): ルームID。
+
+    Returns:
+        Optional[ConnectionAuthorization]: ユーザ/ルームが存在しない (無効)、
+                                           またはユーザがルームの作成者でない場合は None
+    """
+    try:
+        room_settings_model_object = RoomSettings.objects.select_related('room_id', 'room_id__create_user')\
+                                                         .get(room_id__room_id               = room_id,
+                                                              room_id__is_active              = True,
+                                                              room_id__create_user            = user_id,
+                                                              room_id__create_user__is_active = True,)
+        return ConnectionAuthorization(room_settings_model_object)
+    except RoomSettings.DoesNotExist:
+        return None
+    except Exception as e:
+        print(e)
+        return None
+
+async def authorize_connection(cookies:dict,
+                               room_id:str,
+                               ) -> Optional[ConnectionAuthorization]:
+    """
+    NextAuth のセッション Cookie から接続を認可する (未ログインの場合は DB にアクセスしない)
+    """
+    user_id = jwt_auth_get_id(cookies)
+    if not user_id:
+        return None
+    return await sync_authorize_connection(user_id, room_id)
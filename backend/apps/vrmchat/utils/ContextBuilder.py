@@ -0,0 +1,208 @@
+"""
+トークン予算に合わせた履歴の構築
+    - history_len を上限に、新しいターンから予算に収まる分だけ詰める
+      予算 = min(モデルのコンテキスト長 - max_tokens, SEND_MAX_TOKENS)
+    - ターンごとのトークン数は HistoryTurn.tokens に保持し、再エンコードしない
+    - HISTORY_SUMMARY_ENABLED の場合は収まらなかった古いターンの要約を先頭に付ける
+      要約はバックグラウンドで作成して RoomContext にキャッシュし、次のターン以降で使用する
+      (返信は要約の作成を待たない)
+"""
+import asyncio
+from typing import Dict, List, Optional, Set
+from common.scripts.LlmUtils import TokenizerService, get_tokenizer
+from ..settings import (
+    SEND_MAX_TOKENS,
+    MODEL_CONTEXT_WINDOW_DICT, DEFAULT_CONTEXT_WINDOW,
+    HISTORY_SUMMARY_ENABLED, HISTORY_SUMMARY_MAX_CHARS, HISTORY_SUMMARY_SOURCE_MAX_TOKENS,
+)
+from .prompt import history_summary_prompt
+from .RoomContextCache import RoomContext, HistoryTurn, history_turns_to_messages
+
+
+class BuiltContext:
+
+    __slots__ = ('history_list', 'history_text', 'sent_tokens', 'budget_tokens', 'dropped_turns', 'is_summary_used')
+
+    def __init__(self,
+                 history_list:List[Dict[str, str]],
+                 history_text:str,
+                 sent_tokens:int,
+                 budget_tokens:int,
+                 dropped_turns:List[HistoryTurn],
+                 is_summary_used:bool,):
+        self.history_list    = history_list
+        self.history_text    = history_text
+        self.sent_tokens     = sent_tokens   # ユーザ/システム/アシスタントメッセージ + 履歴 (+ 要約)
+        self.budget_tokens   = budget_tokens
+        self.dropped_turns   = dropped_turns # 予算に収まらなかったターン (古い順)
+        self.is_summary_used = is_summary_used
+
+    @property
+    def is_over_budget(self) -> bool:
+        # 履歴を含めなくても予算を超える場合
+        return self.sent_tokens > self.budget_tokens
+
+
+def get_context_window(model_name:str) -> int:
+    return MODEL_CONTEXT_WINDOW_DICT.get(model_name, DEFAULT_CONTEXT_WINDOW)
+
+def get_turn_tokens(turn:HistoryTurn,
+                    model_name:str,
+                    tokenizer:Optional[TokenizerService] = None,
+                    ) -> int:
+    count = turn.tokens.get(model_name)
+    if count is None:
+        tokenizer = tokenizer or get_tokenizer()
+        count     = tokenizer.count_total([turn.user_message, turn.llm_response], model_name)
+        turn.tokens[model_name] = count
+    return count
+
+def summary_to_messages(summary_text:str) -> List[Dict[str, str]]:
+    return [
+        {
+            'role':    'user',
+            'content': f'(これまでの会話の要約)\n{summary_text}',
+        },
+        {
+            'role':    'assistant',
+            'content': '了解しました。',
+        },
+    ]
+
+def build_context(room_context:RoomContext,
+                  data_dict:dict,
+                  tokenizer:Optional[TokenizerService] = None,
+                  is_summary_enabled:bool = HISTORY_SUMMARY_ENABLED,
+                  ) -> BuiltContext:
+    """
+    Args:
+        data_dict (dict): user_message / system_sentence / assistant_sentence /
+                          history_len / model_name (文字列) / max_tokens を含むこと
+    """
+    try:
+        return _build_context(room_context, data_dict, tokenizer or get_tokenizer(), is_summary_enabled)
+    except Exception as e:
+        # トークン数を計算できない場合 (Encoding の読み込み失敗など) は history_len 件をそのまま使う
+        print(e)
+        history_list, history_text = room_context.get_history(int(data_dict['history_len']))
+        return BuiltContext(history_list    = history_list,
+                            history_text    = history_text,
+                            sent_tokens     = 0,
+                            budget_tokens   = int(SEND_MAX_TOKENS),
+                            dropped_turns   = [],
+                            is_summary_used = False,)
+
+def _build_context(room_context:RoomContext,
+                   data_dict:dict,
+                   tokenizer:TokenizerService,
+                   is_summary_enabled:bool,
+                   ) -> BuiltContext:
+    model_name    = data_dict['model_name']
+    budget_tokens = min(get_context_window(model_name) - int(data_dict['max_tokens']), int(SEND_MAX_TOKENS))
+    sent_tokens   = tokenizer.count_total([data_dict['user_message'],
+                                           data_dict['system_sentence'],
+                                           data_dict['assistant_sentence'],],
+                                          model_name)
+
+    history_len = int(data_dict['history_len'])
+    candidates  = list(room_context.history)[-history_len:] if history_len > 0 else []
+
+    # 新しいターンから詰める
+    remaining_tokens = budget_tokens - sent_tokens
+    included_turns   = []
+    for turn in reversed(candidates):
+        turn_tokens = get_turn_tokens(turn, model_name, tokenizer)
+        if turn_tokens > remaining_tokens:
+            break
+        included_turns.append(turn)
+        remaining_tokens -= turn_tokens
+    included_turns.reverse()
+    dropped_turns = candidates[:len(candidates)-len(included_turns)]
+
+    # 要約 (収まらなかったターンがあり、キャッシュ済みの場合)
+    summary_messages = []
+    if is_summary_enabled and dropped_turns and room_context.summary:
+        summary_messages = summary_to_messages(room_context.summary[1])
+        summary_tokens   = tokenizer.count_total([m['content'] for m in summary_messages], model_name)
+        # 要約が収まるまで古いターンを外す
+        while included_turns and summary_tokens > remaining_tokens:
+            remaining_tokens += get_turn_tokens(included_turns[0], model_name, tokenizer)
+            dropped_turns.append(included_turns.pop(0))
+        if summary_tokens <= remaining_tokens:
+            remaining_tokens -= summary_tokens
+        else:
+            summary_messages = []
+
+    history_list, history_text = history_turns_to_messages(included_turns)
+    return BuiltContext(history_list    = summary_messages + history_list,
+                        history_text    = history_text,
+                        sent_tokens     = budget_tokens - remaining_tokens,
+                        budget_tokens   = budget_tokens,
+                        dropped_turns   = dropped_turns,
+                        is_summary_used = bool(summary_messages),)
+
+
+_background_tasks: Set[asyncio.Task] = set()
+
+def schedule_history_summary(room_context:RoomContext,
+                             dropped_turns:List[HistoryTurn],
+                             llm,
+                             model_name:str,
+                             tokenizer:Optional[TokenizerService] = None,
+                             ) -> bool:
+    """
+    収まらなかったターンの要約をバックグラウンドで作成する (ルームごとに 1 つまで)
+    llm は max_tokens を HISTORY_SUMMARY_MAX_TOKENS にして作成すること
+
+    Returns:
+        bool: 要約の作成を開始した場合 True
+    """
+    if room_context.is_summarizing or not dropped_turns:
+        return False
+    newest_message_id = dropped_turns[-1].message_id
+    # 要約済み
+    if room_context.summary and room_context.summary[0] == newest_message_id:
+        return False
+    room_context.is_summarizing = True
+    task = asyncio.create_task(_create_history_summary(room_context,
+                                                       list(dropped_turns),
+                                                       llm,
+                                                       model_name,
+                                                       tokenizer or get_tokenizer(),))
+    # タスクが GC されないよう完了まで参照を保持する
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return True
+
+async def _create_history_summary(room_context:RoomContext,
+                                  dropped_turns:List[HistoryTurn],
+                                  llm,
+                                  model_name:str,
+                                  tokenizer:TokenizerService,) -> None:
+    try:
+        # 新しいターンから HISTORY_SUMMARY_SOURCE_MAX_TOKENS まで (それ以前は前回の要約で補う)
+        source_tokens = 0
+        source_turns  = []
+        for turn in reversed(dropped_turns):
+            source_tokens += get_turn_tokens(turn, model_name, tokenizer)
+            if source_turns and source_tokens > HISTORY_SUMMARY_SOURCE_MAX_TOKENS:
+                break
+            source_turns.append(turn)
+        conversation_list = []
+        if room_context.summary:
+            conversation_list.append(f'(これまでの会話の要約)\n{room_context.summary[1]}')
+        for turn in reversed(source_turns):
+            conversation_list.append(f'ユーザ: {turn.user_message}\nアシスタント: {turn.llm_response}')
+
+        messages = [{
+            'role':    'user',
+            'content': history_summary_prompt.format(maxChars     = HISTORY_SUMMARY_MAX_CHARS,
+                                                     conversation = '\n\n'.join(conversation_list),),
+        }]
+        summary_text = await llm.async_get_response(messages)
+        if summary_text:
+            room_context.summary = (dropped_turns[-1].message_id, summary_text)
+    except Exception as e:
+        print(e)
+    finally:
+        room_context.is_summarizing = False
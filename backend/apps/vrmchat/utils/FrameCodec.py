@@ -0,0 +1,129 @@
+"""
+WebSocket フレームのエンコード (JSON + 圧縮) の接続ごとのネゴシエーション
+    - クライアントは Sec-WebSocket-Protocol で対応するコーデックを提示する
+      ex. new WebSocket(url, ['vrmchat.br'])
+      サーバは SOCKET_FRAME_CODEC_PREFERENCE の順に選択して accept で返す
+      提示がない場合は従来どおり br (フレームごとに brotli.compress)
+    - codec
+        - br:   フレームごとに brotli で圧縮 (従来と同じ. クライアントはフレームごとに brotli.decompress)
+        - none: 圧縮しない
+      (フレーム間で状態を持つコーデックはクライアントにデコーダがないため扱わない)
+    - SOCKET_COMPRESS_MIN_BYTES 未満のフレームは圧縮せずテキストフレームで送る
+      (クライアントはテキストフレームを JSON としてそのまま処理する)
+    - JSON は orjson があれば使う (なければ json)
+    - クライアントからのバイトデータは各コーデックでフレームごとに展開する
+"""
+import brotli
+import json
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple, Union
+from ..settings import (
+    SOCKET_FRAME_CODEC_PREFERENCE, SOCKET_SUBPROTOCOL_PREFIX,
+    SOCKET_COMPRESS_MIN_BYTES, SOCKET_BROTLI_QUALITY,
+)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = getLogger(__name__)
+
+
+# ------------------------------
+# JSON
+def json_dumps_bytes(obj:Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson が対応していないもの (int のキー, 64bit を超える整数など) は json で処理する
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+def json_dumps(obj:Any) -> str:
+    return json_dumps_bytes(obj).decode('utf-8')
+
+def json_loads(data:Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# ------------------------------
+# codec
+class FrameCodec:
+    """
+    none: 圧縮しない (バイトデータは UTF-8 の JSON)
+
+    Args:
+        min_compress_bytes (int): これ未満のフレームはテキストフレームで送る。
+    """
+
+    name = 'none'
+
+    def __init__(self, min_compress_bytes:int = SOCKET_COMPRESS_MIN_BYTES):
+        self.min_compress_bytes = min_compress_bytes
+
+    def encode(self, message:Any) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        Returns:
+            Tuple[Optional[str], Optional[bytes]]: (text_data, bytes_data) のどちらか一方
+        """
+        data = json_dumps_bytes(message)
+        if len(data) < self.min_compress_bytes:
+            return data.decode('utf-8'), None
+        return None, self.compress(data)
+
+    def decode(self, bytes_data:bytes) -> Any:
+        return json_loads(self.decompress(bytes_data))
+
+    def compress(self, data:bytes) -> bytes:
+        return data
+
+    def decompress(self, data:bytes) -> bytes:
+        return data
+
+
+class BrotliFrameCodec(FrameCodec):
+
+    name = 'br'
+
+    def __init__(self, quality:int = SOCKET_BROTLI_QUALITY, **kwargs):
+        super().__init__(**kwargs)
+        self.quality = quality
+
+    def compress(self, data:bytes) -> bytes:
+        return brotli.compress(data, quality=self.quality)
+
+    def decompress(self, data:bytes) -> bytes:
+        return brotli.decompress(data)
+
+
+FRAME_CODEC_CLASS_DICT: Dict[str, type] = {
+    FrameCodec.name:       FrameCodec,
+    BrotliFrameCodec.name: BrotliFrameCodec,
+}
+
+
+# ------------------------------
+# negotiation
+def negotiate_frame_codec(subprotocols:Optional[List[str]],
+                          preference:List[str] = SOCKET_FRAME_CODEC_PREFERENCE,
+                          prefix:str           = SOCKET_SUBPROTOCOL_PREFIX,
+                          ) -> Tuple[FrameCodec, Optional[str]]:
+    """
+    scope['subprotocols'] からコーデックを選択する
+
+    Returns:
+        Tuple[FrameCodec, Optional[str]]: (接続ごとのコーデック, accept で返す subprotocol)
+                                          提示がない/対応するものがない場合は (br, None)
+    """
+    offered = set(subprotocols or [])
+    for name in preference:
+        subprotocol = f'{prefix}{name}'
+        if subprotocol in offered and name in FRAME_CODEC_CLASS_DICT:
+            try:
+                return FRAME_CODEC_CLASS_DICT[name](), subprotocol
+            except Exception:
+                log.exception('frame codec %s could not be created', name)
+    return BrotliFrameCodec(), None
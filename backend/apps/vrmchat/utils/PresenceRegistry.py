@@ -0,0 +1,328 @@
+"""
+ルームに接続中のメンバー (プレゼンス)
+    - connect / disconnect ごとの SocketAccess の INSERT / DELETE とルーム全件の再取得をなくす
+    - 参加/退出時は差分 (joined / left) だけを group に送信する
+      参加したユーザには SetUserAccessId で現在のメンバー一覧を返す
+    - メンバーはハートビート (クライアントの ping) で更新し、PRESENCE_TTL_SEC 途絶えたものは
+      参加/ハートビート時に削除する (disconnect が実行されなかった接続も残らない)
+    - backend
+        - memory: プロセス内 (テスト/単一プロセス用)
+        - redis:  ルームごとの hash (メンバー) と sorted set (最終ハートビート) を Lua で原子的に更新
+                  Redis に接続できない場合は memory で処理する
+    - PRESENCE_AUDIT_LOG = True の場合のみ SocketAccess にもバックグラウンドで記録する
+"""
+from channels.db import database_sync_to_async
+from django.utils import timezone
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from common.scripts.DjangoUtils import generate_uuid_hex
+from apps.utils import get_async_redis
+from ..models import Room, SocketAccess
+from ..settings import (
+    PRESENCE_BACKEND, PRESENCE_TTL_SEC, PRESENCE_AUDIT_LOG,
+)
+from .FrameCodec import json_dumps, json_loads
+
+
+def _now_ms() -> int:
+    # プロセス間で比較するため壁時計を使う
+    return int(time.time() * 1000)
+
+
+class PresenceMember:
+
+    __slots__ = ('access_id', 'user_name', 'channel_name', 'user_id', 'joined_at')
+
+    def __init__(self,
+                 access_id:str,
+                 user_name:str,
+                 channel_name:str,
+                 user_id:Optional[int] = None,
+                 joined_at:float       = 0.0,):
+        self.access_id    = access_id
+        self.user_name    = user_name
+        self.channel_name = channel_name
+        self.user_id      = user_id
+        self.joined_at    = joined_at
+
+    @classmethod
+    def create(cls, channel_name:str, connect_user=None) -> 'PresenceMember':
+        access_id = generate_uuid_hex()
+        return cls(access_id    = access_id,
+                   user_name    = '*'+access_id[:5].upper(),
+                   channel_name = channel_name,
+                   user_id      = None if connect_user is None or connect_user.is_anonymous else connect_user.pk,
+                   joined_at    = time.time(),)
+
+    def to_dict(self) -> Dict:
+        return {
+            'access_id':    self.access_id,
+            'user_name':    self.user_name,
+            'channel_name': self.channel_name,
+            'user_id':      self.user_id,
+            'joined_at':    self.joined_at,
+        }
+
+    def to_public_dict(self) -> Dict[str, str]:
+        # クライアントに送信する項目 (従来の socket_access_objs と同じ)
+        return {
+            'access_id': self.access_id,
+            'user_name': self.user_name,
+        }
+
+    @classmethod
+    def from_dict(cls, data:Dict) -> 'PresenceMember':
+        return cls(**data)
+
+
+def sort_members(members:List[PresenceMember]) -> List[PresenceMember]:
+    # 参加順 (Redis の hash は順序を保持しないため)
+    return sorted(members, key=lambda member: (member.joined_at, member.access_id))
+
+def presence_delta(joined:Optional[List[PresenceMember]] = None,
+                   left:Optional[List[PresenceMember]]   = None,) -> Dict[str, List[Dict[str, str]]]:
+    """
+    SocketConnect / SocketDisconnect で送信する差分
+    """
+    joined = joined or []
+    left   = left or []
+    return {
+        'joined': [member.to_public_dict() for member in joined],
+        'left':   [member.to_public_dict() for member in left],
+    }
+
+
+class InMemoryPresenceRegistry:
+    """
+    Returns (各メソッド):
+        expired (List[PresenceMember]): 期限切れで削除したメンバー (呼び出し側で left として通知する)
+    """
+
+    def __init__(self, ttl_sec:float = PRESENCE_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        # room_id -> access_id -> (member, 最終ハートビート(ms)) (dict の順序 = 参加順)
+        self.rooms: Dict[str, Dict[str, Tuple[PresenceMember, int]]] = {}
+
+    def _expire(self, room_id:str, now_ms:int) -> List[PresenceMember]:
+        room = self.rooms.get(room_id)
+        if not room:
+            return []
+        threshold_ms = now_ms - int(self.ttl_sec * 1000)
+        expired      = [member for member, seen_ms in room.values() if seen_ms < threshold_ms]
+        for member in expired:
+            room.pop(member.access_id, None)
+        if not room:
+            self.rooms.pop(room_id, None)
+        return expired
+
+    async def join(self, room_id:str, member:PresenceMember) -> Tuple[List[PresenceMember], List[PresenceMember]]:
+        """
+        Returns:
+            Tuple[List[PresenceMember], List[PresenceMember]]: (参加後のメンバー, expired)
+        """
+        now_ms  = _now_ms()
+        expired = self._expire(room_id, now_ms)
+        room    = self.rooms.setdefault(room_id, {})
+        room[member.access_id] = (member, now_ms)
+        return [m for m, _ in room.values()], expired
+
+    async def heartbeat(self, room_id:str, access_id:str) -> Tuple[bool, List[PresenceMember]]:
+        """
+        Returns:
+            Tuple[bool, List[PresenceMember]]: (メンバーとして残っているか, expired)
+                                               False の場合は join し直すこと
+        """
+        now_ms  = _now_ms()
+        expired = self._expire(room_id, now_ms)
+        room    = self.rooms.get(room_id, {})
+        if access_id not in room:
+            return False, expired
+        room[access_id] = (room[access_id][0], now_ms)
+        return True, expired
+
+    async def leave(self, room_id:str, access_id:str) -> Optional[PresenceMember]:
+        room  = self.rooms.get(room_id, {})
+        entry = room.pop(access_id, None)
+        if not room:
+            self.rooms.pop(room_id, None)
+        return entry[0] if entry else None
+
+    async def get_members(self, room_id:str) -> Tuple[List[PresenceMember], List[PresenceMember]]:
+        expired = self._expire(room_id, _now_ms())
+        return [m for m, _ in self.rooms.get(room_id, {}).values()], expired
+
+    async def get_member(self, room_id:str, access_id:str) -> Optional[PresenceMember]:
+        entry = self.rooms.get(room_id, {}).get(access_id)
+        return entry[0] if entry else None
+
+
+class RedisPresenceRegistry:
+
+    KEY_PREFIX = 'vrmchat:presence:'
+
+    # 期限切れのメンバーを削除して返す (各スクリプトの先頭で実行)
+    # KEYS[1]: members (hash: access_id -> member json), KEYS[2]: heartbeats (zset: access_id -> ms)
+    # ARGV[1]: now(ms), ARGV[2]: ttl(ms)
+    LUA_EXPIRE = """
+    local now     = tonumber(ARGV[1])
+    local ttl     = tonumber(ARGV[2])
+    local expired = {}
+    for _, access_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - ttl)) do
+        local member = redis.call('HGET', KEYS[1], access_id)
+        if member then
+            table.insert(expired, member)
+            redis.call('HDEL', KEYS[1], access_id)
+        end
+    end
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - ttl)
+    """
+
+    # ARGV[3]: access_id, ARGV[4]: member json
+    LUA_JOIN = LUA_EXPIRE + """
+    redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('ZADD', KEYS[2], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    redis.call('PEXPIRE', KEYS[2], ttl)
+    return {redis.call('HVALS', KEYS[1]), expired}
+    """
+
+    # ARGV[3]: access_id
+    LUA_HEARTBEAT = LUA_EXPIRE + """
+    if redis.call('HEXISTS', KEYS[1], ARGV[3]) == 0 then
+        return {0, expired}
+    end
+    redis.call('ZADD', KEYS[2], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    redis.call('PEXPIRE', KEYS[2], ttl)
+    return {1, expired}
+    """
+
+    LUA_MEMBERS = LUA_EXPIRE + """
+    return {redis.call('HVALS', KEYS[1]), expired}
+    """
+
+    def __init__(self, ttl_sec:float = PRESENCE_TTL_SEC):
+        self.ttl_sec  = ttl_sec
+        self.fallback = InMemoryPresenceRegistry(ttl_sec)
+        self._scripts: Dict[str, object] = {}
+
+    def _keys(self, room_id:str) -> List[str]:
+        return [f'{self.KEY_PREFIX}{room_id}:members', f'{self.KEY_PREFIX}{room_id}:heartbeats']
+
+    async def _eval(self, name:str, room_id:str, *args):
+        redis_client = get_async_redis()
+        script       = self._scripts.get(name)
+        if script is None:
+            script = redis_client.register_script(getattr(self, f'LUA_{name}'))
+            self._scripts[name] = script
+        # EVALSHA (未登録の場合は EVAL) で 1 往復
+        return await script(keys   = self._keys(room_id),
+                            args   = [_now_ms(), int(self.ttl_sec * 1000), *args],
+                            client = redis_client,)
+
+    @staticmethod
+    def _loads(values) -> List[PresenceMember]:
+        return [PresenceMember.from_dict(json_loads(value)) for value in values]
+
+    async def join(self, room_id:str, member:PresenceMember) -> Tuple[List[PresenceMember], List[PresenceMember]]:
+        try:
+            members, expired = await self._eval('JOIN', room_id, member.access_id, json_dumps(member.to_dict()))
+            return sort_members(self._loads(members)), self._loads(expired)
+        except Exception as e:
+            print(e)
+            return await self.fallback.join(room_id, member)
+
+    async def heartbeat(self, room_id:str, access_id:str) -> Tuple[bool, List[PresenceMember]]:
+        try:
+            is_member, expired = await self._eval('HEARTBEAT', room_id, access_id)
+            return bool(is_member), self._loads(expired)
+        except Exception as e:
+            print(e)
+            return await self.fallback.heartbeat(room_id, access_id)
+
+    async def leave(self, room_id:str, access_id:str) -> Optional[PresenceMember]:
+        member = await self.fallback.leave(room_id, access_id)
+        try:
+            members_key, heartbeats_key = self._keys(room_id)
+            async with get_async_redis().pipeline(transaction=True) as pipe:
+                pipe.hget(members_key, access_id)
+                pipe.hdel(members_key, access_id)
+                pipe.zrem(heartbeats_key, access_id)
+                value, _, _ = await pipe.execute()
+            return PresenceMember.from_dict(json_loads(value)) if value else member
+        except Exception as e:
+            print(e)
+            return member
+
+    async def get_members(self, room_id:str) -> Tuple[List[PresenceMember], List[PresenceMember]]:
+        try:
+            members, expired = await self._eval('MEMBERS', room_id)
+            return sort_members(self._loads(members)), self._loads(expired)
+        except Exception as e:
+            print(e)
+            return await self.fallback.get_members(room_id)
+
+    async def get_member(self, room_id:str, access_id:str) -> Optional[PresenceMember]:
+        try:
+            value = await get_async_redis().hget(self._keys(room_id)[0], access_id)
+            return PresenceMember.from_dict(json_loads(value)) if value else None
+        except Exception as e:
+            print(e)
+            return await self.fallback.get_member(room_id, access_id)
+
+
+_presence_registries: Dict[str, object] = {}
+
+def get_presence_registry(backend:str = PRESENCE_BACKEND):
+    """
+    PRESENCE_BACKEND に応じたレジストリを返す (プロセスで共有)
+    """
+    registry = _presence_registries.get(backend)
+    if registry is None:
+        registry = RedisPresenceRegistry() if backend == 'redis' else InMemoryPresenceRegistry()
+        _presence_registries[backend] = registry
+    return registry
+
+
+# ------------------------------
+# SocketAccess への記録 (PRESENCE_AUDIT_LOG)
+@database_sync_to_async
+def sync_record_socket_access(room_id:str,
+                              member:PresenceMember,
+                              is_join:bool,
+                              room_pk:Optional[int] = None,) -> None:
+    if is_join:
+        # room_pk (ConnectionAuthorization.room_pk) を渡した場合は Room を読み出さない
+        SocketAccess.objects.create(room_id_id        = room_pk if room_pk else Room.objects.get(room_id=room_id).pk,
+                                    access_id         = member.access_id,
+                                    user_id           = member.user_id,
+                                    user_name         = member.user_name,
+                                    channel_name      = member.channel_name,
+                                    date_last_request = timezone.now(),
+                                    date_access       = timezone.now(),)
+    else:
+        SocketAccess.objects.filter(access_id=member.access_id).delete()
+
+async def _record_socket_access(room_id:str, member:PresenceMember, is_join:bool, room_pk:Optional[int]) -> None:
+    try:
+        await sync_record_socket_access(room_id, member, is_join, room_pk)
+    except Exception as e:
+        print(e)
+
+_background_tasks: Set[asyncio.Task] = set()
+
+def schedule_presence_audit(room_id:str,
+                            member:PresenceMember,
+                            is_join:bool,
+                            is_enabled:bool       = PRESENCE_AUDIT_LOG,
+                            room_pk:Optional[int] = None,) -> None:
+    """
+    参加/退出を SocketAccess にバックグラウンドで記録する (返信は待たない)
+    """
+    if not is_enabled:
+        return
+    # タスクが GC されないよう完了まで参照を保持する
+    task = asyncio.create_task(_record_socket_access(room_id, member, is_join, room_pk))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
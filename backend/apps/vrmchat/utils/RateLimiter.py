@@ -0,0 +1,160 @@
+"""
+WebSocket メッセージのリクエスト制限 (トークンバケット)
+    - 毎メッセージ SocketAccess を読み書きしていた処理を DB を使わずに判定する
+    - 容量 SOCKET_REQUEST_PER_SEC_LIMIT / 毎秒 SOCKET_REQUEST_PER_SEC_LIMIT 補充
+      (1秒間に規定回数を超えたら遮断する従来の判定に相当)
+    - 接続から SOCKET_RATE_LIMIT_GRACE_SEC 秒間は判定しない (接続ごと)
+    - backend
+        - memory: 接続(コンシューマ)ごとにプロセス内で判定
+        - redis:  ユーザごとのバケットを Redis 上で Lua により原子的に更新し、
+                  同じユーザの接続 (複数タブ・複数プロセス) で共有する
+                  grace 期間中は Redis にアクセスしない
+                  Redis に接続できない場合は memory で判定する
+"""
+import time
+from logging import getLogger
+from typing import Dict, Optional
+from apps.utils import get_async_redis
+from ..settings import (
+    SOCKET_REQUEST_PER_SEC_LIMIT,
+    SOCKET_RATE_LIMITER_BACKEND, SOCKET_RATE_LIMIT_GRACE_SEC,
+)
+
+log = getLogger(__name__)
+
+
+class TokenBucket:
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_sec', 'opened_sec')
+
+    def __init__(self, rate:float, capacity:float, now_sec:float):
+        self.rate        = rate
+        self.capacity    = capacity
+        self.tokens      = capacity
+        self.updated_sec = now_sec
+        self.opened_sec  = now_sec
+
+    def consume(self, now_sec:float, grace_sec:float = 0) -> bool:
+        # 接続直後は判定しない
+        if now_sec - self.opened_sec < grace_sec:
+            return True
+        self.tokens      = min(self.capacity, self.tokens + (now_sec - self.updated_sec) * self.rate)
+        self.updated_sec = now_sec
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class InMemoryRateLimiter:
+
+    def __init__(self,
+                 rate_per_sec:float = SOCKET_REQUEST_PER_SEC_LIMIT,
+                 capacity:Optional[float] = None,
+                 grace_sec:float    = SOCKET_RATE_LIMIT_GRACE_SEC,):
+        self.rate_per_sec = rate_per_sec
+        self.capacity     = capacity if capacity is not None else rate_per_sec
+        self.grace_sec    = grace_sec
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def open(self, key:str) -> None:
+        self.buckets[key] = TokenBucket(self.rate_per_sec, self.capacity, time.monotonic())
+
+    async def hit(self, key:str) -> bool:
+        now_sec = time.monotonic()
+        bucket  = self.buckets.get(key)
+        if bucket is None:
+            # open 前のリクエストは接続直後とみなす
+            bucket = TokenBucket(self.rate_per_sec, self.capacity, now_sec)
+            self.buckets[key] = bucket
+        return bucket.consume(now_sec, self.grace_sec)
+
+    async def close(self, key:str) -> None:
+        self.buckets.pop(key, None)
+
+
+class RedisRateLimiter:
+
+    KEY_PREFIX = 'vrmchat:ratelimit:'
+
+    # KEYS[1]: bucket key
+    # ARGV: rate(/sec), capacity, now(ms), ttl(ms)
+    LUA_TOKEN_BUCKET = """
+    local bucket   = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local rate     = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now      = tonumber(ARGV[3])
+    local ttl      = tonumber(ARGV[4])
+    local tokens   = tonumber(bucket[1])
+    local updated  = tonumber(bucket[2])
+    if tokens == nil then
+        tokens  = capacity
+        updated = now
+    end
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate / 1000)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens  = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    return allowed
+    """
+
+    def __init__(self,
+                 rate_per_sec:float = SOCKET_REQUEST_PER_SEC_LIMIT,
+                 capacity:Optional[float] = None,
+                 grace_sec:float    = SOCKET_RATE_LIMIT_GRACE_SEC,
+                 ttl_sec:float      = 60,):
+        self.rate_per_sec = rate_per_sec
+        self.capacity     = capacity if capacity is not None else rate_per_sec
+        self.grace_sec    = grace_sec
+        # 満タンまで補充される時間より長ければよい (期限切れ = 満タン)
+        self.ttl_sec      = max(ttl_sec, self.capacity / rate_per_sec)
+        self.fallback     = InMemoryRateLimiter(rate_per_sec, capacity, grace_sec)
+        self.opened_secs: Dict[str, float] = {}
+        self._script      = None
+
+    async def open(self, key:str) -> None:
+        # 同じユーザの他の接続と共有するため Redis のバケットは初期化しない
+        await self.fallback.open(key)
+        self.opened_secs[key] = time.monotonic()
+
+    async def hit(self, key:str) -> bool:
+        # 接続直後は判定しない (Redis にアクセスしない)
+        opened_sec = self.opened_secs.get(key)
+        if opened_sec is None:
+            self.opened_secs[key] = opened_sec = time.monotonic()
+        if time.monotonic() - opened_sec < self.grace_sec:
+            return True
+        try:
+            redis_client = get_async_redis()
+            if self._script is None:
+                self._script = redis_client.register_script(self.LUA_TOKEN_BUCKET)
+            # EVALSHA (未登録の場合は EVAL) で 1 往復
+            allowed = await self._script(keys   = [self.KEY_PREFIX + key],
+                                         args   = [self.rate_per_sec,
+                                                   self.capacity,
+                                                   int(time.time() * 1000),
+                                                   int(self.ttl_sec * 1000),],
+                                         client = redis_client,)
+            return bool(allowed)
+        except Exception as e:
+            log.warning('redis rate limiter unavailable, falling back to memory: %r', e)
+            return await self.fallback.hit(key)
+
+    async def close(self, key:str) -> None:
+        # Redis のバケットは ttl_sec で期限切れになる
+        await self.fallback.close(key)
+        self.opened_secs.pop(key, None)
+
+
+def create_socket_rate_limiter(backend:str = SOCKET_RATE_LIMITER_BACKEND):
+    """
+    SOCKET_RATE_LIMITER_BACKEND に応じたリクエスト制限を返す。
+    接続ごとに作成し、key には redis で共有する単位 (ユーザ) を渡すこと。
+    """
+    if backend == 'redis':
+        return RedisRateLimiter()
+    return InMemoryRateLimiter()
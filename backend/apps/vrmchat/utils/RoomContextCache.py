@@ -0,0 +1,183 @@
+"""
+ルームごとの設定と直近の会話履歴のキャッシュ (プロセス内)
+    - 毎ターン発生していた RoomSettings / Message / Room の読み出しをなくす
+    - connect 時に DB から読み込み (warm)、以降はメッセージ保存時にその場で更新する
+    - 同じプロセス内の接続で共有し、ルームへの接続がなくなれば破棄する (参照カウント)
+    - API・管理画面から RoomSettings / Room / Message が変更された場合は
+      models.receivers からルームの group に通知し、各プロセスのキャッシュを破棄する
+      (破棄後の最初のターンで再読み込み)
+"""
+from channels.db import database_sync_to_async
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from ..models import RoomSettings, Message
+from ..settings import MAX_HISSTORY_N
+
+
+def get_room_group_name(room_id:str) -> str:
+    return f'room_{room_id}'
+
+def room_settings_to_dict(room_settings_model_object) -> Dict[str, str]:
+    return {
+        'system_sentence':    room_settings_model_object.system_sentence,
+        'assistant_sentence': room_settings_model_object.assistant_sentence,
+        'history_len':        room_settings_model_object.history_len,
+        'model_name':         room_settings_model_object.model_name,
+        'max_tokens':         room_settings_model_object.max_tokens,
+        'temperature':        room_settings_model_object.temperature,
+        'top_p':              room_settings_model_object.top_p,
+        'presence_penalty':   room_settings_model_object.presence_penalty,
+        'frequency_penalty':  room_settings_model_object.frequency_penalty,
+    }
+
+def history_turns_to_messages(turns:List['HistoryTurn']) -> Tuple[List[Dict[str, str]], str]:
+    history_message_list = []
+    history_message_text = ''
+    for turn in turns:
+        history_message_list.append({
+            'role':    'user',
+            'content': turn.user_message,
+        })
+        history_message_list.append({
+            'role':    'assistant',
+            'content': turn.llm_response,
+        })
+        history_message_text += (turn.user_message or '')+(turn.llm_response or '')
+    return history_message_list, history_message_text
+
+
+class HistoryTurn:
+    """
+    1 ターン分の会話. tokens はモデルごとのトークン数 (user_message + llm_response) のキャッシュ
+    """
+
+    __slots__ = ('message_id', 'user_message', 'llm_response', 'tokens')
+
+    def __init__(self, message_id:str, user_message:str, llm_response:str):
+        self.message_id   = message_id
+        self.user_message = user_message
+        self.llm_response = llm_response
+        self.tokens: Dict[str, int] = {}
+
+
+class RoomContext:
+    """
+    1 ルーム分の設定と直近 MAX_HISSTORY_N 件の会話 (リングバッファ)
+    summary は ContextBuilder が作成する古い会話の要約 (要約済みの最新の message_id, 要約文)
+    """
+
+    __slots__ = ('room_id', 'room_pk', 'room_name', 'settings', 'history', 'summary', 'is_summarizing')
+
+    def __init__(self,
+                 room_id:str,
+                 room_pk:int,
+                 room_name:str,
+                 settings:Dict[str, str],
+                 history_turns:List[Tuple[str, str, str]],):
+        self.room_id   = room_id
+        self.room_pk   = room_pk
+        self.room_name = room_name
+        self.settings  = settings
+        # HistoryTurn を古い順に保持
+        self.history   = deque((HistoryTurn(*turn) for turn in history_turns), maxlen=MAX_HISSTORY_N)
+        self.summary:  Optional[Tuple[str, str]] = None
+        self.is_summarizing = False
+
+    def get_settings(self) -> Dict[str, str]:
+        # 呼び出し側で書き換えるためコピーを返す
+        return dict(self.settings)
+
+    def get_history(self, history_len:int = 3) -> Tuple[List[Dict[str, str]], str]:
+        """
+        直近 history_len 件を (メッセージのリスト, 連結したテキスト) で返す
+        """
+        history_message_list = []
+        history_message_text = ''
+        if history_len > 0:
+            turns = list(self.history)[-history_len:]
+            history_message_list, history_message_text = history_turns_to_messages(turns)
+        return history_message_list, history_message_text
+
+    def append_turn(self, message_id:str, user_message:str, llm_response:str) -> None:
+        # 同じプロセスの他の接続から group 経由で同じターンが届く場合があるため重複は無視
+        for turn in self.history:
+            if turn.message_id == message_id:
+                return
+        self.history.append(HistoryTurn(message_id, user_message, llm_response))
+
+
+_room_contexts:   Dict[str, RoomContext] = {}
+_room_ref_counts: Dict[str, int]         = {}
+
+
+@database_sync_to_async
+def _load_room_context(room_id:str,
+                       room_settings_model_object = None,
+                       ) -> Optional[RoomContext]:
+    # room_settings_model_object (ConnectionAuthorization) を渡した場合は会話履歴のみ読み出す
+    try:
+        if room_settings_model_object is None:
+            room_settings_model_object = RoomSettings.objects.select_related('room_id')\
+                                                             .get(room_id__room_id  = room_id,
+                                                                  room_id__is_active = True,)
+        message_objs = Message.objects.filter(room_id   = room_settings_model_object.room_id,
+                                              is_active = True,
+                                             ).order_by('-date_create')\
+                                              .values_list('message_id', 'user_message', 'llm_response')[:MAX_HISSTORY_N]
+        return RoomContext(room_id       = room_id,
+                           room_pk       = room_settings_model_object.room_id.pk,
+                           room_name     = room_settings_model_object.room_name,
+                           settings      = room_settings_to_dict(room_settings_model_object),
+                           history_turns = list(reversed(message_objs)),) # 古いものから入れる
+    except RoomSettings.DoesNotExist:
+        return None
+    except Exception as e:
+        print(e)
+        return None
+
+async def acquire_room_context(room_id:str,
+                               room_settings_model_object = None,
+                               ) -> Optional[RoomContext]:
+    """
+    connect 時に呼び出し、キャッシュを読み込む (disconnect で release_room_context)
+    room_settings_model_object は接続時の認可で読み出し済みの RoomSettings (Room を select_related 済み)
+    """
+    _room_ref_counts[room_id] = _room_ref_counts.get(room_id, 0) + 1
+    return await get_room_context(room_id, room_settings_model_object)
+
+def release_room_context(room_id:str) -> None:
+    ref_count = _room_ref_counts.get(room_id, 0) - 1
+    if ref_count > 0:
+        _room_ref_counts[room_id] = ref_count
+    else:
+        _room_ref_counts.pop(room_id, None)
+        _room_contexts.pop(room_id, None)
+
+async def get_room_context(room_id:str,
+                           room_settings_model_object = None,
+                           ) -> Optional[RoomContext]:
+    """
+    キャッシュ済みであれば DB にアクセスせずに返す
+    """
+    room_context = _room_contexts.get(room_id)
+    if room_context is None:
+        room_context = await _load_room_context(room_id, room_settings_model_object)
+        # 接続中のルームのみ保持する
+        if room_context is not None and room_id in _room_ref_counts:
+            room_context = _room_contexts.setdefault(room_id, room_context)
+    return room_context
+
+def append_room_context_turn(room_id:str,
+                             message_id:str,
+                             user_message:str,
+                             llm_response:str,) -> None:
+    """
+    キャッシュ済みの場合のみ会話を追加する (未読み込みの場合は次のターンで DB から読み込む)
+    """
+    room_context = _room_contexts.get(room_id)
+    if room_context is not None:
+        room_context.append_turn(message_id, user_message, llm_response)
+
+def invalidate_room_context(room_id:str) -> None:
+    _room_contexts.pop(room_id, None)
+
@@ -0,0 +1,205 @@
+"""
+チャットの 1 ターン (Message / ルーム名 / トークン情報) の保存
+    - sync_commit_turns: 1 回のスレッド移動・1 トランザクションで保存
+      (Message は bulk_create、ルーム名はデフォルトのままの場合のみ条件付き UPDATE)
+    - schedule_commit_turn: RoomContext をその場で更新して保存はバックグラウンドで行う
+      ユーザへの返信(ChangeRoomName 含む)は保存を待たない
+    - TURN_WRITE_BEHIND = True の場合は TurnWriteBehindQueue に積み、
+      TURN_WRITE_BEHIND_FLUSH_SEC ごと (または TURN_WRITE_BEHIND_MAX_BATCH 件) にまとめて保存する
+    - 保存に失敗した場合は RoomContext を破棄し、次のターンで DB から読み直す
+"""
+from channels.db import database_sync_to_async
+from django.db import transaction
+import asyncio
+import weakref
+from typing import List, Optional, Set, Tuple
+from common.scripts.LlmUtils import text_modify_fnc
+from ..models import RoomSettings, Message
+from ..settings import (
+    DEFAULT_ROOM_NAME, MAX_LEN_ROOM_NAME,
+    TURN_WRITE_BEHIND, TURN_WRITE_BEHIND_FLUSH_SEC, TURN_WRITE_BEHIND_MAX_BATCH,
+)
+from .RoomContextCache import RoomContext, invalidate_room_context
+
+
+class PendingTurn:
+
+    __slots__ = ('room_id', 'room_pk', 'message_obj', 'room_name')
+
+    def __init__(self, room_id:str, room_pk:int, message_obj:Message, room_name:Optional[str] = None):
+        self.room_id     = room_id
+        self.room_pk     = room_pk
+        self.message_obj = message_obj
+        self.room_name   = room_name # デフォルトから変更する場合のみ
+
+
+def create_room_name(user_sentence:str) -> str:
+    if len(user_sentence) > MAX_LEN_ROOM_NAME:
+        return user_sentence[:MAX_LEN_ROOM_NAME-4] + '...'
+    return user_sentence
+
+def build_message_obj(room_pk:int, data_dict:dict, llm_response:str) -> Message:
+    user_settings = {
+        k: v
+        for k, v in data_dict.items()
+        if (    k.lower() != 'message_id'
+            and k.lower() != 'user_message'
+            and k.lower() != 'llm_response'
+            and k.lower() != 'tokens_info_dict'
+            and k.lower() != 'history_list'
+            and k.lower() != 'history_text'
+        )
+    }
+    return Message(room_id_id       = room_pk,
+                   message_id       = data_dict['message_id'],
+                   user_message     = data_dict['user_message'],
+                   llm_response     = llm_response,
+                   user_settings    = user_settings,
+                   tokens_info_dict = data_dict['tokens_info_dict'],
+                   history_list     = data_dict['history_list'],)
+
+@database_sync_to_async
+def sync_commit_turns(turns:List[PendingTurn]) -> List[str]:
+    """
+    複数ターンを 1 トランザクションで保存する
+
+    Returns:
+        List[str]: ルーム名が既に変更されていた(キャッシュが古い)ルームID
+    """
+    stale_room_id_list = []
+    with transaction.atomic():
+        # bulk_create は post_save を送らないため receivers でキャッシュは破棄されない
+        Message.objects.bulk_create([turn.message_obj for turn in turns],
+                                    batch_size = TURN_WRITE_BEHIND_MAX_BATCH,)
+        for turn in turns:
+            if turn.room_name:
+                is_updated = RoomSettings.objects.filter(room_id   = turn.room_pk,
+                                                         room_name = DEFAULT_ROOM_NAME,
+                                                        ).update(room_name=turn.room_name) > 0
+                if not is_updated:
+                    stale_room_id_list.append(turn.room_id)
+    return stale_room_id_list
+
+async def commit_turns(turns:List[PendingTurn]) -> bool:
+    try:
+        stale_room_id_list = await sync_commit_turns(turns)
+        for room_id in stale_room_id_list:
+            invalidate_room_context(room_id)
+        return True
+    except Exception as e:
+        print(e)
+        # キャッシュには保存できなかったターンが含まれるため読み直す
+        for turn in turns:
+            invalidate_room_context(turn.room_id)
+        return False
+
+
+class TurnWriteBehindQueue:
+    """
+    ターンを溜めてまとめて保存する (イベントループごと)
+    """
+
+    def __init__(self,
+                 flush_sec:float = TURN_WRITE_BEHIND_FLUSH_SEC,
+                 max_batch:int   = TURN_WRITE_BEHIND_MAX_BATCH,):
+        self.flush_sec   = flush_sec
+        self.max_batch   = max_batch
+        self.pending:      List[PendingTurn] = []
+        self.flush_event = asyncio.Event()
+        self.task:         Optional[asyncio.Task] = None
+
+    def put(self, turn:PendingTurn) -> None:
+        self.pending.append(turn)
+        if len(self.pending) >= self.max_batch:
+            self.flush_event.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def flush_soon(self) -> None:
+        if self.pending:
+            self.flush_event.set()
+
+    async def flush(self) -> None:
+        turns, self.pending = self.pending, []
+        if turns:
+            await commit_turns(turns)
+
+    async def _run(self) -> None:
+        while self.pending:
+            # wait_for は待機完了とキャンセルが重なるとキャンセルを握りつぶすため asyncio.wait で待つ
+            wait_task = asyncio.create_task(self.flush_event.wait())
+            try:
+                await asyncio.wait({wait_task}, timeout=self.flush_sec)
+            finally:
+                wait_task.cancel()
+            self.flush_event.clear()
+            await self.flush()
+
+
+_write_behind_queues: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TurnWriteBehindQueue]' = weakref.WeakKeyDictionary()
+_background_tasks:    Set[asyncio.Task] = set()
+
+def get_turn_write_behind_queue() -> TurnWriteBehindQueue:
+    # 実行中のイベントループから呼ぶこと
+    loop  = asyncio.get_running_loop()
+    queue = _write_behind_queues.get(loop)
+    if queue is None:
+        queue = TurnWriteBehindQueue()
+        _write_behind_queues[loop] = queue
+    return queue
+
+def schedule_commit_turn(room_context:RoomContext,
+                         data_dict:dict,
+                         is_write_behind:bool = TURN_WRITE_BEHIND,
+                         ) -> Tuple[str, str]:
+    """
+    RoomContext を更新し、保存をバックグラウンドに回す (保存は待たない)
+
+    Returns:
+        Tuple[str, str]: (保存する llm_response, ルーム名)
+    """
+    llm_response = text_modify_fnc(data_dict['llm_response'])
+    # room_name がデフォルトの場合には最初の質問を room_name に設定する
+    room_name = None
+    if room_context.room_name == DEFAULT_ROOM_NAME:
+        room_name              = create_room_name(data_dict['user_message'])
+        room_context.room_name = room_name
+    room_context.append_turn(data_dict['message_id'],
+                             data_dict['user_message'],
+                             llm_response,)
+
+    turn = PendingTurn(room_id     = room_context.room_id,
+                       room_pk     = room_context.room_pk,
+                       message_obj = build_message_obj(room_context.room_pk, data_dict, llm_response),
+                       room_name   = room_name,)
+    if is_write_behind:
+        get_turn_write_behind_queue().put(turn)
+    else:
+        # タスクが GC されないよう完了まで参照を保持する
+        task = asyncio.create_task(commit_turns([turn]))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return llm_response, room_context.room_name
+
+def flush_turn_write_behind_soon() -> None:
+    """
+    disconnect 時などに溜まっているターンの保存を早める
+    """
+    try:
+        queue = _write_behind_queues.get(asyncio.get_running_loop())
+        if queue:
+            queue.flush_soon()
+    except Exception as e:
+        print(e)
+
+async def aflush_turn_writes() -> None:
+    """
+    溜まっている/実行中の保存を完了させる (テスト/シャットダウン用)
+    """
+    loop  = asyncio.get_running_loop()
+    queue = _write_behind_queues.get(loop)
+    if queue:
+        await queue.flush()
+    tasks = [task for task in _background_tasks if task.get_loop() is loop]
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,7 +1,26 @@
-from .DatabaseSyncUtils import (
-    sync_get_room_obj,
-    get_room_settings, get_history,
-    sync_save_message_models,
-    replace_room_name_check,
+from .ConnectionAuthorizer import (
+    ConnectionAuthorization,
+    sync_authorize_connection, authorize_connection,
 )
-from .prompt import base_prompt
\ No newline at end of file
+from .prompt import base_prompt
+from .RateLimiter import create_socket_rate_limiter
+from .FrameCodec import (
+    json_dumps, json_loads,
+    negotiate_frame_codec,
+)
+from .PresenceRegistry import (
+    PresenceMember, presence_delta,
+    get_presence_registry, schedule_presence_audit,
+)
+from .RoomContextCache import (
+    get_room_group_name,
+    acquire_room_context, release_room_context,
+    get_room_context, append_room_context_turn, invalidate_room_context,
+)
+from .ContextBuilder import (
+    BuiltContext, build_context, schedule_history_summary,
+)
+from .TurnWriter import (
+    sync_commit_turns, schedule_commit_turn,
+    flush_turn_write_behind_soon, aflush_turn_writes,
+)
\ No newline at end of file
@@ -1,3 +1,11 @@
 base_prompt = """
 {userMessage}
-"""
\ No newline at end of file
+"""
+
+history_summary_prompt = """
+以下はユーザとアシスタントの過去の会話です。
+この後の会話で文脈として必要になる情報(ユーザの目的・前提・決定事項・固有名詞など)を、
+{maxChars}文字程度で簡潔に要約してください。要約のみを出力してください。
+
+{conversation}
+"""
@@ -1,43 +1,124 @@
 # AwsomeRef: https://github.com/nextauthjs/next-auth/discussions/8807#discussioncomment-8180597
+# - 暗号鍵 (HKDF) はシークレットごとに 1 回だけ導出する (NEXTAUTH_SECRETS の順に復号を試す. シークレットのローテーション用)
+# - 復号したセッションはトークンのハッシュをキーに NEXTAUTH_SESSION_CACHE_TTL_SEC まで保持する
+#   (WebSocket の接続ごとに JWE を復号しない. セッションの exp を超えては保持しない)
+# - セッションのクッキーは名前で取得する (__Secure- 付き・分割 (.0, .1, ...) に対応)
 from django.conf import settings
+import functools
+import hashlib
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from hkdf import Hkdf
 from jose.jwe import decrypt, encrypt
 
+SESSION_TOKEN_COOKIE_NAMES      = ('__Secure-next-auth.session-token', 'next-auth.session-token')
+NEXTAUTH_SESSION_CACHE_TTL_SEC  = 60
+NEXTAUTH_SESSION_CACHE_MAX_SIZE  = 1024
+
+@functools.lru_cache(maxsize=8)
 def __encryption_key(secret: str = settings.NEXTAUTH_SECRET
                     ) -> bytes:
     return Hkdf("", bytes(secret, 'utf-8')).expand(b'NextAuth.js Generated Encryption Key', 32)
 
+def get_nextauth_secrets() -> List[str]:
+    # 先頭が現在のシークレット (暗号化に使う). 以降はローテーション前のシークレット (復号のみ)
+    return list(getattr(settings, 'NEXTAUTH_SECRETS', None) or [settings.NEXTAUTH_SECRET])
+
 def encode_jwe(payload: Dict[str, Any],
-               secret:  str = settings.NEXTAUTH_SECRET,
+               secret:  Optional[str] = None,
               ) -> Optional[str]:
     try:
         if payload:
             data = bytes(json.dumps(payload), 'utf-8')
-            key  = __encryption_key(secret)
+            key  = __encryption_key(secret or get_nextauth_secrets()[0])
             return bytes.decode(encrypt(data, key), 'utf-8')
         else:
             return None
     except: return None
 
 def decode_jwe(token:  str,
-               secret: str = settings.NEXTAUTH_SECRET,
+               secret: Optional[str] = None,
               ) -> Optional[Dict[str, Any]]:
-    try:
-        decrypted = decrypt(token, __encryption_key(secret))
-        if decrypted:
-            return json.loads(bytes.decode(decrypted, 'utf-8'))
-        else:
-            return None
-    except: return None
+    for _secret in ([secret] if secret else get_nextauth_secrets()):
+        try:
+            decrypted = decrypt(token, __encryption_key(_secret))
+            if decrypted:
+                return json.loads(bytes.decode(decrypted, 'utf-8'))
+        except: pass
+    return None
+
+
+class _SessionCache:
+    """
+    復号したセッションの LRU (TTL 付き. スレッドセーフ)
+    """
+
+    def __init__(self,
+                 ttl_sec:float = NEXTAUTH_SESSION_CACHE_TTL_SEC,
+                 max_size:int  = NEXTAUTH_SESSION_CACHE_MAX_SIZE,):
+        self.ttl_sec    = ttl_sec
+        self.max_size   = max_size
+        self.stats_dict = {'hit': 0, 'miss': 0}
+        self._sessions: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock      = threading.Lock()
+
+    def get(self, key:str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._sessions.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._sessions[key]
+                self.stats_dict['miss'] += 1
+                return None
+            self._sessions.move_to_end(key)
+            self.stats_dict['hit'] += 1
+            return item[1]
+
+    def set(self, key:str, session:Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl_sec
+        if isinstance(session.get('exp'), (int, float)):
+            expires_at = min(expires_at, session['exp'])
+        with self._lock:
+            self._sessions[key] = (expires_at, session)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+session_cache = _SessionCache()
+
+def decode_session_token(token: str
+                        ) -> Optional[Dict[str, Any]]:
+    """
+    decode_jwe の結果をトークンのハッシュごとに保持する (返すセッションは変更しないこと)
+    """
+    key     = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    session = session_cache.get(key)
+    if session is None:
+        session = decode_jwe(token)
+        if session:
+            session_cache.set(key, session)
+    return session
 
 def get_session_token(scope_cookies: Optional[Dict[str, str]] = None
                      ) -> Optional[str]:
-    session_token = None
-    if scope_cookies:
-        for key, value in scope_cookies.items():
-            if 'next-auth.session-token' in key:
-                session_token = value
-                break
-    return session_token
\ No newline at end of file
+    if not scope_cookies:
+        return None
+    for name in SESSION_TOKEN_COOKIE_NAMES:
+        session_token = scope_cookies.get(name)
+        if session_token:
+            return session_token
+        # サイズが大きい場合は name.0, name.1, ... に分割される
+        chunks = []
+        while f'{name}.{len(chunks)}' in scope_cookies:
+            chunks.append(scope_cookies[f'{name}.{len(chunks)}'])
+        if chunks:
+            return ''.join(chunks)
+    return None
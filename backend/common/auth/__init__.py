@@ -1,2 +1,5 @@
 from .CustomAuthentication import CookieJWTAuthentication
-from .NextAuthDecription import encode_jwe, decode_jwe, get_session_token
\ No newline at end of file
+from .NextAuthDecription import (
+    encode_jwe, decode_jwe, decode_session_token, get_session_token,
+    get_nextauth_secrets, session_cache,
+)
\ No newline at end of file
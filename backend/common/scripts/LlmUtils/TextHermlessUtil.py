@@ -1,66 +1,242 @@
+"""
+LLM 回答の URL の無害化
+    - 許可されていないドメインの URL を削除し、http を https に変換する
+    - 正規表現はモジュール読み込み時にコンパイルし、許可ドメインは接尾辞の集合で判定する
+      (TextHermlessEngine を許可ドメインリストごとに 1 つ作成して使い回す)
+    - URL の走査は 1 回で、Markdown リンク / 「」で囲まれた URL の処理は
+      許可された URL が残り、かつ '[' / '「' を含む場合のみ行う (結果は従来の 3 段階の処理と同じ)
+    - TextHermlessStream: ストリーミングの差分を逐次無害化する
+      (チャンク境界をまたぐ URL / Markdown リンクは確定するまで保持し、それ以外は空白を待たずに返す)
+"""
 import re
-from urllib.parse import urlparse
+from typing import Dict, Iterable, Optional, Tuple
+
+# 直接 URL (従来の https?://[^\s]+ と同じ範囲. group(1) は netloc)
+URL_PATTERN        = re.compile(r'https?://(?=\S)([^\s/?#]*)\S*')
+MD_LINK_PATTERN    = re.compile(r'\[([^\]]+)\]\((https?://[^\s\)]+)\)')
+QUOTED_URL_PATTERN = re.compile(r'「(https?://[^\s]+?)」')
+NETLOC_END_PATTERN = re.compile(r'[/?#]')
+LAST_SPACE_PATTERN = re.compile(r'\s\S*\Z')
+URL_PART_PATTERN   = re.compile(r'[^\s\)]*')
+QUOTE_OPEN_PATTERN = re.compile(r'「[^\s」]*\Z') # 閉じていない「 (空白 / 」を含まずに末尾まで続く)
+
+DEFAULT_ALLOWED_DOMAINS_LIST = ['go.jp', 'or.jp', 'google.com',]
+
+
+def get_netloc(url:str) -> str:
+    """
+    urlparse(url).netloc と同じ (スキーム付きの URL のみ)
+    """
+    start = url.find('://') + 3
+    m     = NETLOC_END_PATTERN.search(url, start)
+    return url[start:m.start()] if m else url[start:]
+
+def _last_space_end(text:str, end:Optional[int] = None) -> int:
+    """
+    text[:end] の最後の空白文字の直後の位置 (空白がない場合は 0)
+    """
+    m = LAST_SPACE_PATTERN.search(text, 0, len(text) if end is None else end)
+    return m.start() + 1 if m else 0
+
+
+class TextHermlessEngine:
+
+    def __init__(self, allowed_domains_list:Iterable[str]):
+        allowed_domains_list = list(allowed_domains_list)
+        self.allowed_domains = frozenset(allowed_domains_list)
+        # 許可ドメインのラベル数 (go.jp → 2) ごとに URL のドメインの末尾を照合する
+        self.label_counts    = tuple(sorted({len(domain.split('.')) for domain in allowed_domains_list}))
+
+    def is_allowed_netloc(self, netloc:str) -> bool:
+        domain_parts = netloc.split('.')
+        for label_count in self.label_counts:
+            if '.'.join(domain_parts[-label_count:]) in self.allowed_domains:
+                return True
+        return False
+
+    def is_allowed_url(self, url:str) -> bool:
+        return self.is_allowed_netloc(get_netloc(url))
+
+    def sanitize(self, text:str) -> str:
+        if not text or 'http' not in text:
+            return text
+        text, is_url_remained = self.remove_disallowed_urls(text)
+        # 許可された URL が残っていない場合は以降の処理で変わるものはない
+        if not is_url_remained:
+            return text
+        return self.links_harmless(text)
+
+    def remove_disallowed_urls(self, text:str) -> Tuple[str, bool]:
+        """
+        Returns:
+            Tuple[str, bool]: (処理後のテキスト, 許可された URL が残っているか)
+        """
+        is_url_remained = False
+        def _filter_url(m):
+            nonlocal is_url_remained
+            if self.is_allowed_netloc(m.group(1)):
+                is_url_remained = True
+                return m.group(0).replace('http://', 'https://') # HTTPをHTTPSに変換
+            return ''
+        return URL_PATTERN.sub(_filter_url, text), is_url_remained
+
+    def links_harmless(self, text:str) -> str:
+        """
+        remove_disallowed_urls の後に Markdown リンク → 「」で囲まれた URL の順に処理する
+        """
+        if 'http' not in text:
+            return text
+        if '[' in text:
+            text = MD_LINK_PATTERN.sub(self._replace_md_link, text)
+        if '「' in text:
+            text = QUOTED_URL_PATTERN.sub(self._replace_quoted_url, text)
+        return text
+
+    def _replace_md_link(self, m) -> str:
+        link_text, url = m.groups()
+        url = url.replace('http://', 'https://')
+        if self.is_allowed_url(url):
+            return f'[{link_text}]({url})' # HTTPSに変換後、リンクを保持
+        return link_text                   # 許可されていないURLはリンクを解除
+
+    def _replace_quoted_url(self, m) -> str:
+        url = m.group(1).replace('http://', 'https://')
+        if self.is_allowed_url(url):
+            return f'「{url}」' # 許可されたURLをそのまま保持
+        return ''              # 許可されていないURLを完全に削除
+
+
+class TextHermlessStream:
+    """
+    ストリーミングの差分を逐次無害化する。
+    feed で返したテキストと flush の戻り値を結合すると、全文を text_modify_fnc で処理した結果と同じになる。
+
+    Example Usage:
+        stream = TextHermlessStream()
+        for delta in deltas:
+            send(stream.feed(delta))
+        send(stream.flush())
+    """
+
+    def __init__(self, allowed_domains_list:Iterable[str] = DEFAULT_ALLOWED_DOMAINS_LIST):
+        self.engine      = get_text_hermless_engine(allowed_domains_list)
+        self._raw_buffer = '' # 直接 URL の処理前 (最後の空白以降)
+        self._url_buffer = '' # 直接 URL の処理後・Markdown リンクの処理前
+
+    def feed(self, chunk:str) -> str:
+        self._raw_buffer += chunk
+        # 直接 URL は空白をまたがないため、最後の空白以降で URL になりうる位置 ('h' / 'http' / 'https:/' など) の手前までを確定する
+        # (日本語の文章は空白が少ないため、空白を待たずに返す)
+        cut = _pending_url_start(self._raw_buffer, _last_space_end(self._raw_buffer))
+        if cut:
+            text, _          = self.engine.remove_disallowed_urls(self._raw_buffer[:cut])
+            self._url_buffer += text
+            self._raw_buffer  = self._raw_buffer[cut:]
+        cut = self._safe_link_cut(self._url_buffer)
+        if not cut:
+            return ''
+        text, self._url_buffer = self._url_buffer[:cut], self._url_buffer[cut:]
+        return self.engine.links_harmless(text)
+
+    def flush(self) -> str:
+        text, _          = self.engine.remove_disallowed_urls(self._raw_buffer)
+        text             = self.engine.links_harmless(self._url_buffer + text)
+        self._raw_buffer = ''
+        self._url_buffer = ''
+        return text
+
+    @staticmethod
+    def _safe_link_cut(text:str) -> int:
+        """
+        Markdown リンク ([text](url)) / 「」で囲まれた URL をまたがない確定位置
+        まだリンクになりうる '[' / 閉じていない '「' の手前 (なければ全体)
+        """
+        cut = len(text)
+        i   = text.find('[')
+        while i != -1:
+            m = MD_LINK_PATTERN.match(text, i)
+            if m:
+                i = text.find('[', m.end())
+                continue
+            if _is_pending_md_link(text, i):
+                cut = i
+                break
+            i = text.find('[', i + 1)
+        m = QUOTE_OPEN_PATTERN.search(text)
+        if m and m.start() < cut:
+            cut = m.start()
+        return cut
+
+
+def _pending_url_start(text:str, start:int) -> int:
+    """
+    text[start:] (空白を含まない) で直接 URL になりうる最初の位置 (なければ len(text))
+    """
+    i = text.find('h', start)
+    while i != -1:
+        rest = text[i:i + 8]
+        if rest.startswith(('http://', 'https://')) or 'https://'.startswith(rest) or 'http://'.startswith(rest):
+            return i
+        i = text.find('h', i + 1)
+    return len(text)
+
+def _is_pending_md_link(text:str, i:int) -> bool:
+    """
+    text[i] の '[' から始まる Markdown リンクが、後続のテキスト次第でまだ成立しうるか
+    """
+    k = text.find(']', i + 1)
+    if k == -1:
+        return True  # ']' がまだない
+    if k == i + 1:
+        return False # '[]' はリンクにならない
+    if k + 1 == len(text):
+        return True  # '(' がまだない
+    if text[k + 1] != '(':
+        return False
+    # URL 部分が空白 / ')' で終わっていなければまだ伸びうる
+    return URL_PART_PATTERN.match(text, k + 2).end() == len(text)
+
+
+_engines: Dict[Tuple[str, ...], TextHermlessEngine] = {}
+
+def get_text_hermless_engine(allowed_domains_list:Iterable[str] = DEFAULT_ALLOWED_DOMAINS_LIST) -> TextHermlessEngine:
+    key    = tuple(allowed_domains_list)
+    engine = _engines.get(key)
+    if engine is None:
+        engine = TextHermlessEngine(key)
+        _engines[key] = engine
+    return engine
+
 
 def is_allowed_url(url:str, allowed_domains_list:list) -> bool:
     """
     URLが許可されたドメインリストに含まれているかどうかを判定する
     """
-    parsed_url = urlparse(url)
-    domain     = parsed_url.netloc
-    # ドメインをピリオドで分割し、最後の2要素（または必要に応じてより多くの要素）を取得する
-    domain_parts = domain.split('.')
-    for allowed_domain in allowed_domains_list:
-        allowed_parts = allowed_domain.split('.')
-        # 許可されたドメインがURLのドメインで終わっていることを確認
-        if domain_parts[-len(allowed_parts):] == allowed_parts:
-            return True
-    return False
+    return get_text_hermless_engine(allowed_domains_list).is_allowed_url(url)
 
 def remove_disallowed_urls(text:str, allowed_domains_list:list) -> str:
     """
     テキストから許可されていないドメインのURLを削除する
     """
-    url_pattern = re.compile(r'https?://[^\s]+')
-    def filter_url(m):
-        url = m.group(0).replace('http://', 'https://')  # HTTPをHTTPSに変換
-        return url if is_allowed_url(url, allowed_domains_list) else ''
-    return url_pattern.sub(filter_url, text)
+    text, _ = get_text_hermless_engine(allowed_domains_list).remove_disallowed_urls(text)
+    return text
 
 def links_harmless(text:str, allowed_domains_list:list) -> str:
     """
     Markdown形式のリンクから許可されていないドメインのURLを削除する
     """
-    md_link_pattern = re.compile(r'\[([^\]]+)\]\((https?://[^\s\)]+)\)')
-    def replace_link(m):
-        text, url = m.groups()
-        url = url.replace('http://', 'https://')  # HTTPをHTTPSに変換
-        if is_allowed_url(url, allowed_domains_list):
-            return f'[{text}]({url})'             # HTTPSに変換後、リンクを保持
-        else:
-            return text  # 許可されていないURLはリンクを解除
-    return md_link_pattern.sub(replace_link, text)
+    if '[' not in text:
+        return text
+    return MD_LINK_PATTERN.sub(get_text_hermless_engine(allowed_domains_list)._replace_md_link, text)
 
 def text_url_hermless(text:str, allowed_domains_list:list) -> str:
     """
     テキスト内のURLを処理し、許可されたドメインのURLのみを保持する
     """
-    # 直接URLとMarkdownリンクを処理
-    text = remove_disallowed_urls(text, allowed_domains_list)
-    text = links_harmless(text, allowed_domains_list)
-    # 引用符で囲まれたURLを処理する
-    quoted_url_pattern = re.compile(r'「(https?://[^\s]+?)」')
-    def filter_quoted_url(m):
-        url = m.group(1).replace('http://', 'https://')
-        if is_allowed_url(url, allowed_domains_list):
-            return f'「{url}」'  # 許可されたURLをそのまま保持
-        else:
-            return ''            # 許可されていないURLを完全に削除
-    
-    text = quoted_url_pattern.sub(filter_quoted_url, text)
-    return text
+    return get_text_hermless_engine(allowed_domains_list).sanitize(text)
 
 def text_modify_fnc(text:str,
-                    allowed_domains_list:list = ['go.jp', 'or.jp', 'google.com',],
+                    allowed_domains_list:list = DEFAULT_ALLOWED_DOMAINS_LIST,
                     ) -> str:
     text = text_url_hermless(text, allowed_domains_list)
-    return text
\ No newline at end of file
+    return text
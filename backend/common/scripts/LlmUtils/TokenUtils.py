@@ -1,5 +1,95 @@
+"""
+トークン数の計算 (現状 tiktoken (OpenAI) だけ対応)
+    - TokenizerService
+        - Encoding を model_name ごとにメモ化 (tiktoken.encoding_for_model を毎回呼ばない)
+        - encode_batch / count_batch で複数セグメントをまとめてエンコード
+        - テキストごとのトークン数はキャッシュしない
+          (会話履歴のターンごとのトークン数は RoomContext の HistoryTurn.tokens に保持する)
+    - tiktoken 非対応のモデル (gemini 等) は cl100k_base で近似する
+    - 特殊トークン文字列 (<|endoftext|> 等) も通常のテキストとして数える
+"""
 import tiktoken
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Sequence
+
+DEFAULT_ENCODING_NAME = 'cl100k_base'
+
+
+def load_encoding(model_name:Optional[str] = None) -> tiktoken.Encoding:
+    if model_name:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING_NAME)
+
+
+class TokenizerService:
+    """
+    Args:
+        encoding_loader (Callable): model_name から Encoding を返す関数 (テスト用)。
+
+    Example Usage:
+        tokenizer = get_tokenizer()
+        tokenizer.count('こんにちは', 'gpt-4o')
+        tokenizer.count_batch([user_message, system_sentence, *history], 'gpt-4o')
+    """
+
+    def __init__(self,
+                 encoding_loader:Callable[[Optional[str]], tiktoken.Encoding] = load_encoding,):
+        self.encoding_loader = encoding_loader
+        self._encodings: Dict[Optional[str], tiktoken.Encoding] = {}
+
+    def get_encoding(self, model_name:Optional[str] = None) -> tiktoken.Encoding:
+        encoding = self._encodings.get(model_name)
+        if encoding is None:
+            # 読み込みに失敗した場合はメモ化しない (次回再試行)
+            encoding = self.encoding_loader(model_name)
+            self._encodings[model_name] = encoding
+        return encoding
+
+    def encode_batch(self,
+                     segments:Sequence[str],
+                     model_name:Optional[str] = None,
+                     ) -> List[List[int]]:
+        """
+        複数セグメントをまとめてエンコードする
+        """
+        encoding = self.get_encoding(model_name)
+        return encoding.encode_ordinary_batch([segment or '' for segment in segments])
+
+    def count(self, text:str, model_name:Optional[str] = None) -> int:
+        return self.count_batch([text], model_name)[0]
+
+    def count_batch(self,
+                    segments:Sequence[str],
+                    model_name:Optional[str] = None,
+                    ) -> List[int]:
+        """
+        セグメントごとのトークン数 (空のセグメントは 0. それ以外をまとめてエンコード)
+        """
+        encoding = self.get_encoding(model_name)
+        counts   = [0] * len(segments)
+        index    = [i for i, segment in enumerate(segments) if segment]
+        if len(index) == 1:
+            counts[index[0]] = len(encoding.encode_ordinary(segments[index[0]]))
+        elif index:
+            tokens_list = encoding.encode_ordinary_batch([segments[i] for i in index])
+            for i, tokens in zip(index, tokens_list):
+                counts[i] = len(tokens)
+        return counts
+
+    def count_total(self,
+                    segments:Sequence[str],
+                    model_name:Optional[str] = None,
+                    ) -> int:
+        return sum(self.count_batch(segments, model_name))
+
+
+_tokenizer = TokenizerService()
+
+def get_tokenizer() -> TokenizerService:
+    return _tokenizer
+
 
 def calc_token(sentence:str   = '',
                model_name:str = None,
@@ -9,12 +99,7 @@ def calc_token(sentence:str   = '',
     """
     num_tokens = 0
     try:
-        if model_name:
-            encoding      = tiktoken.encoding_for_model(model_name)
-            encoding_name = encoding.name
-        else:
-            encoding_name = 'cl100k_base'
-        num_tokens = len(tiktoken.get_encoding(encoding_name).encode(sentence))
+        num_tokens = _tokenizer.count(sentence, model_name)
     except Exception as e:
         print(e)
 
@@ -29,4 +114,4 @@ def is_tokens_less_than_settings(sentence:str   = '',
         if calc_token(sentence, model_name) > max_tokens:
             return False
         else:
-            return True
\ No newline at end of file
+            return True
@@ -2,7 +2,11 @@ from .llms import AzureLlm, GcloudLlm, OpenAILlm
 from .create_messages import (
     create_messages, convert_messages_for_gemini,
 )
-from .TextHermlessUtil import text_modify_fnc
+from .TextHermlessUtil import (
+    text_modify_fnc,
+    TextHermlessEngine, TextHermlessStream, get_text_hermless_engine,
+)
 from .TokenUtils import (
     calc_token, is_tokens_less_than_settings,
+    TokenizerService, get_tokenizer,
 )
\ No newline at end of file
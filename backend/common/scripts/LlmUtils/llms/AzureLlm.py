@@ -1,7 +1,7 @@
 from rest_framework.exceptions import ValidationError
 import openai
-import asyncio
 from typing import Dict, Tuple, Union, AsyncGenerator
+from .LlmClientRegistry import get_azure_openai_client, aget_azure_openai_async_client
 
 class AzureLlm:
 
@@ -29,11 +29,11 @@ class AzureLlm:
             raise ValueError('llm parameter values error')
         # 想定外のパラメータが設定された場合の処理△
 
-        self.client = openai.AzureOpenAI(
-                                azure_endpoint = endpoint,
-                                api_key        = api_key,
-                                api_version    = api_version,
-                                http_client    = None,) # IF USE ProxyServer: httpx.Client(proxies=settings.HTTP_PROXY)
+        # クライアントは LlmClientRegistry でプロセス全体で共有する
+        # IF USE ProxyServer: LlmClientRegistry の http_client に proxy を設定
+        self.api_key     = api_key
+        self.endpoint    = endpoint
+        self.api_version = api_version
 
         self.model_name        = model_name
         self.temperature       = temperature
@@ -41,7 +41,15 @@ class AzureLlm:
         self.top_p             = top_p
         self.frequency_penalty = frequency_penalty
         self.presence_penalty  = presence_penalty
-        
+
+    @property
+    def client(self) -> openai.AzureOpenAI:
+        return get_azure_openai_client(self.api_key, self.endpoint, self.api_version)
+
+    async def aget_async_client(self) -> openai.AsyncAzureOpenAI:
+        # 実行中のイベントループから呼ぶこと (初回のみスレッドで作成する)
+        return await aget_azure_openai_async_client(self.api_key, self.endpoint, self.api_version)
+
     def get_response(self,
                      messages:list = [],
                      *,
@@ -85,8 +93,8 @@ class AzureLlm:
         if not messages or messages == []:
             return None
 
-        def sync_call():
-            return self.client.chat.completions.create(
+        async_client = await self.aget_async_client()
+        response     = await async_client.chat.completions.create(
                         model             = self.model_name,
                         messages          = messages,
                         temperature       = self.temperature,
@@ -97,7 +105,6 @@ class AzureLlm:
                         stream            = False,
                         timeout           = timeout,)
 
-        response        = await asyncio.to_thread(sync_call)
         return_responce = response.choices[0].message.content
 
         if is_return_usage_dict:
@@ -111,17 +118,20 @@ class AzureLlm:
         return return_responce
 
     async def async_get_stream_response(self,
-                                 messages:list = [],
-                                 *,
-                                 asyncio_sleep:float = 0.01,
-                                 timeout:int         = 60,
-                                 ) -> AsyncGenerator[str, None]:
-
+                                        messages:list = [],
+                                        *,
+                                        timeout:int   = 60,
+                                        ) -> AsyncGenerator[str, None]:
+        """
+        差分を非同期に返す
+        - 受信待ちはイベントループをブロックしない (AsyncStream)
+        - 呼び出し側のキャンセル/aclose 時には HTTP ストリームを閉じる
+        """
         if not messages or messages == []:
             return
 
-        def sync_call():
-            return self.client.chat.completions.create(
+        async_client = await self.aget_async_client()
+        response     = await async_client.chat.completions.create(
                         model             = self.model_name,
                         messages          = messages,
                         temperature       = self.temperature,
@@ -131,15 +141,14 @@ class AzureLlm:
                         presence_penalty  = self.presence_penalty,
                         stream            = True,
                         timeout           = timeout,)
-
-        response = await asyncio.to_thread(sync_call)
-
-        for res in response:
-            try:
-                content = res.choices[0].delta.content
-                if content == None:
+        try:
+            async for res in response:
+                try:
+                    content = res.choices[0].delta.content
+                    if content == None:
+                        content = ''
+                except:
                     content = ''
-            except:
-                content = ''
-            yield content
-            await asyncio.sleep(asyncio_sleep)
\ No newline at end of file
+                yield content
+        finally:
+            await response.close()
\ No newline at end of file
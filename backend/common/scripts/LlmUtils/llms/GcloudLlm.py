@@ -3,8 +3,21 @@ from rest_framework.exceptions import ValidationError
 from google import genai
 from google.genai import types
 import asyncio
-from typing import Dict, Tuple, Union, AsyncGenerator
+import threading
+from logging import getLogger
+from typing import Dict, Optional, Tuple, Union, AsyncGenerator
 from ..create_messages import convert_messages_for_gemini
+from .LlmClientRegistry import get_genai_client, aget_genai_client, get_llm_stream_executor
+
+log = getLogger(__name__)
+
+# ストリーム終了の目印 (async_get_stream_response)
+_STREAM_END = object()
+
+def _log_producer_exception(future:asyncio.Future) -> None:
+    # 受信中の例外は呼び出し側に渡すため、ここに届くのはそれ以外 (ストリームの close の失敗など)
+    if not future.cancelled() and future.exception() is not None:
+        log.error('gemini stream worker failed', exc_info=future.exception())
 
 class GcloudLlm:
 
@@ -29,10 +42,12 @@ class GcloudLlm:
             raise ValueError('llm parameter values error')
         # 想定外のパラメータが設定された場合の処理△
 
-        self.client = genai.Client(vertexai = True,
-                                   project  = project_name,
-                                   location = location_name,)
-        
+        # クライアントは LlmClientRegistry でプロセス全体で共有する
+        # (作成は初回の呼び出し時。非同期の呼び出し元では aget_client でスレッドで作成する)
+        self.project_name  = project_name
+        self.location_name = location_name
+        self.client:         Optional[genai.Client] = None
+
         self.model_name        = model_name
         self.generate_content_config = types.GenerateContentConfig(
             temperature         = temperature,
@@ -49,6 +64,17 @@ class GcloudLlm:
             ],
         )
 
+    def get_client(self) -> genai.Client:
+        if self.client is None:
+            self.client = get_genai_client(self.project_name, self.location_name)
+        return self.client
+
+    async def aget_client(self) -> genai.Client:
+        # 実行中のイベントループから呼ぶこと (初回のみスレッドで作成する)
+        if self.client is None:
+            self.client = await aget_genai_client(self.project_name, self.location_name)
+        return self.client
+
     def get_response(self,
                      messages:list = [],
                      *,
@@ -61,7 +87,7 @@ class GcloudLlm:
 
         system_instruction, contents = convert_messages_for_gemini(messages)
 
-        response = self.client.models.generate_content(
+        response = self.get_client().models.generate_content(
                         model              = self.model_name,
                         contents           = contents,
                         # system_instruction = system_instruction if system_instruction else None,
@@ -91,14 +117,13 @@ class GcloudLlm:
         
         system_instruction, contents = convert_messages_for_gemini(messages)
 
-        def sync_call():
-            return self.client.models.generate_content(
+        client   = await self.aget_client()
+        response = await client.aio.models.generate_content(
                         model              = self.model_name,
                         contents           = contents,
                         # system_instruction = system_instruction if system_instruction else None,
                         config             = self.generate_content_config,)
 
-        response        = await asyncio.to_thread(sync_call)
         return_responce = response.candidates[0].content.parts[0].text
 
         if is_return_usage_dict:
@@ -112,32 +137,87 @@ class GcloudLlm:
         return return_responce
 
     async def async_get_stream_response(self,
-                                 messages:list = [],
-                                 *,
-                                 asyncio_sleep:float = 0.01,
-                                 timeout:int         = 60,
-                                 ) -> AsyncGenerator[str, None]:
-
+                                        messages:list = [],
+                                        *,
+                                        timeout:int   = 60,
+                                        ) -> AsyncGenerator[str, None]:
+        """
+        差分を非同期に返す
+        - google-genai の aio ストリームはイベントループ上で同期的に受信するため、
+          同期ストリームを専用の executor (LLM_STREAM_WORKER_MAX_THREADS) のスレッドで受信し
+          asyncio.Queue 経由で受け渡す (上限を超えた場合は空きを待つ)
+        - timeout は差分ごとの待ち時間(秒)
+        - 呼び出し側のキャンセル/aclose 時にはワーカー側の受信も停止する
+        """
         if not messages or messages == []:
             return
 
         system_instruction, contents = convert_messages_for_gemini(messages)
 
-        def sync_call():
-            return self.client.models.generate_content_stream(
-                        model              = self.model_name,
-                        contents           = contents,
-                        # system_instruction = system_instruction if system_instruction else None,
-                        config             = self.generate_content_config,)
+        client       = await self.aget_client()
+        loop         = asyncio.get_running_loop()
+        queue        = asyncio.Queue()
+        cancel_event = threading.Event()
 
-        response = await asyncio.to_thread(sync_call)
+        def _put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # イベントループ終了済み
+                cancel_event.set()
 
-        for res in response:
+        def _producer():
+            response = None
             try:
-                content = res.text
-                if content == None:
-                    content = ''
-            except:
-                content = ''
-            yield content
-            await asyncio.sleep(asyncio_sleep)
\ No newline at end of file
+                # executor の空きを待つ間に呼び出し側が終了した場合はリクエストしない
+                if cancel_event.is_set():
+                    return
+                response = client.models.generate_content_stream(
+                                model              = self.model_name,
+                                contents           = contents,
+                                # system_instruction = system_instruction if system_instruction else None,
+                                config             = self.generate_content_config,)
+                for res in response:
+                    if cancel_event.is_set():
+                        break
+                    try:
+                        content = res.text
+                        if content == None:
+                            content = ''
+                    except:
+                        content = ''
+                    _put(content)
+            except Exception as e:
+                _put(e)
+            finally:
+                try:
+                    if response is not None and hasattr(response, 'close'):
+                        response.close()
+                finally:
+                    # close に失敗しても呼び出し側は終了させる (例外は _log_producer_exception)
+                    _put(_STREAM_END)
+
+        producer = loop.run_in_executor(get_llm_stream_executor(), _producer)
+        producer.add_done_callback(_log_producer_exception)
+        try:
+            while True:
+                if not queue.empty():
+                    item = queue.get_nowait()
+                else:
+                    # wait_for は受信とキャンセルが重なるとキャンセルを握りつぶすため asyncio.wait で待つ
+                    get_task = asyncio.create_task(queue.get())
+                    try:
+                        done, _ = await asyncio.wait({get_task}, timeout=timeout)
+                    finally:
+                        get_task.cancel()
+                    if not done:
+                        raise asyncio.TimeoutError()
+                    item = get_task.result()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # ワーカーは次の差分の受信後に停止する
+            cancel_event.set()
\ No newline at end of file
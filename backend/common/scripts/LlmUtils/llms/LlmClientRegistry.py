@@ -0,0 +1,225 @@
+"""
+LLM クライアントのプロセス全体での共有
+    - メッセージごとに openai.OpenAI / genai.Client を作成すると
+      TLS ハンドシェイクと認証情報の読み込みが毎回発生するため、
+      provider と認証情報をキーにクライアントを使い回す
+    - 非同期クライアント (httpx.AsyncClient) はイベントループに紐づくため、
+      イベントループごとに保持する (ループが破棄されれば自動で解放)
+    - 非同期クライアントの作成 (SSL コンテキストの読み込みなどの同期処理) と
+      httpx が初回のリクエストで読み込む anyio の asyncio バックエンドの import はスレッドで行い、
+      イベントループをブロックしない (同じループ・キーの作成が重なった場合は 1 回にまとめる)
+    - genai.Client はループをまたいで共有し、非同期の呼び出し元からは aget_genai_client で
+      スレッドで作成する
+    - 同期ストリーム (Gemini) の受信はストリームの間スレッドを占有するため、
+      デフォルトの executor (sync_to_async・DNS の解決などと共有) ではなく
+      LLM_STREAM_WORKER_MAX_THREADS を上限とする専用の executor で行う
+"""
+from django.conf import settings
+from google import genai
+import openai
+import httpx
+import asyncio
+import hashlib
+import importlib
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# httpx (httpcore) が初回のリクエストで import するモジュール
+ASYNC_BACKEND_MODULES = ('anyio._backends._asyncio', 'anyio.to_thread')
+
+_lock                = threading.Lock()
+_create_lock         = threading.Lock()
+_stream_executor: Optional[ThreadPoolExecutor] = None
+_sync_clients:  Dict[Tuple[str, str], Any] = {}
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], Any]]' = weakref.WeakKeyDictionary()
+_async_pending: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], asyncio.Task]]' = weakref.WeakKeyDictionary()
+
+
+def _credential_key(*values: Optional[str]) -> str:
+    """
+    認証情報をそのままキーに持たないようにハッシュ化する
+    """
+    joined = '\x00'.join('' if value is None else str(value) for value in values)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections           = getattr(settings, 'LLM_HTTP_MAX_CONNECTIONS', 100),
+                        max_keepalive_connections = getattr(settings, 'LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS', 20),
+                        keepalive_expiry          = getattr(settings, 'LLM_HTTP_KEEPALIVE_EXPIRY_SEC', 30.0),)
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(timeout = 600.0,
+                         connect = getattr(settings, 'LLM_HTTP_CONNECT_TIMEOUT_SEC', 5.0),)
+
+def _create_with_backend(factory: Callable[[], Any]) -> Any:
+    for module_name in ASYNC_BACKEND_MODULES:
+        importlib.import_module(module_name)
+    return factory()
+
+def _get_or_create_sync(key: Tuple[str, str], factory: Callable[[], Any]) -> Any:
+    with _lock:
+        client = _sync_clients.get(key)
+    if client is not None:
+        return client
+    # 作成中は _lock を保持しない (イベントループ側からの参照をブロックしない)
+    with _create_lock:
+        with _lock:
+            client = _sync_clients.get(key)
+        if client is None:
+            client = factory()
+            with _lock:
+                _sync_clients[key] = client
+    return client
+
+async def _aget_or_create_async(key: Tuple[str, str], factory: Callable[[], Any]) -> Any:
+    # 実行中のイベントループから呼ぶこと
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.get(loop)
+        if loop_clients is None:
+            loop_clients         = {}
+            _async_clients[loop] = loop_clients
+        client = loop_clients.get(key)
+        if client is not None:
+            return client
+        loop_pending = _async_pending.get(loop)
+        if loop_pending is None:
+            loop_pending         = {}
+            _async_pending[loop] = loop_pending
+        task = loop_pending.get(key)
+        if task is None:
+            task              = loop.create_task(_create_async(loop, key, factory, loop_clients, loop_pending))
+            loop_pending[key] = task
+    # 呼び出し元がキャンセルされても作成は続ける
+    return await asyncio.shield(task)
+
+async def _create_async(loop: asyncio.AbstractEventLoop,
+                        key: Tuple[str, str],
+                        factory: Callable[[], Any],
+                        loop_clients: Dict[Tuple[str, str], Any],
+                        loop_pending: Dict[Tuple[str, str], asyncio.Task],
+                        ) -> Any:
+    try:
+        client = await loop.run_in_executor(None, _create_with_backend, factory)
+        with _lock:
+            loop_clients[key] = client
+        return client
+    finally:
+        with _lock:
+            loop_pending.pop(key, None)
+
+
+# ------------------------------
+# OpenAI
+def get_openai_client(api_key: str,
+                      base_url: Optional[str] = None,
+                      ) -> openai.OpenAI:
+    key = ('openai', _credential_key(api_key, base_url))
+    return _get_or_create_sync(key, lambda: openai.OpenAI(
+                                                api_key     = api_key,
+                                                base_url    = base_url,
+                                                http_client = openai.DefaultHttpxClient(limits  = _http_limits(),
+                                                                                        timeout = _http_timeout(),),))
+
+async def aget_openai_async_client(api_key: str,
+                                   base_url: Optional[str] = None,
+                                   ) -> openai.AsyncOpenAI:
+    key = ('openai', _credential_key(api_key, base_url))
+    return await _aget_or_create_async(key, lambda: openai.AsyncOpenAI(
+                                                api_key     = api_key,
+                                                base_url    = base_url,
+                                                http_client = openai.DefaultAsyncHttpxClient(limits  = _http_limits(),
+                                                                                             timeout = _http_timeout(),),))
+
+# ------------------------------
+# Azure OpenAI
+def get_azure_openai_client(api_key: str,
+                            endpoint: str,
+                            api_version: str,
+                            ) -> openai.AzureOpenAI:
+    key = ('azure', _credential_key(api_key, endpoint, api_version))
+    return _get_or_create_sync(key, lambda: openai.AzureOpenAI(
+                                                azure_endpoint = endpoint,
+                                                api_key        = api_key,
+                                                api_version    = api_version,
+                                                http_client    = openai.DefaultHttpxClient(limits  = _http_limits(),
+                                                                                           timeout = _http_timeout(),),))
+
+async def aget_azure_openai_async_client(api_key: str,
+                                         endpoint: str,
+                                         api_version: str,
+                                         ) -> openai.AsyncAzureOpenAI:
+    key = ('azure', _credential_key(api_key, endpoint, api_version))
+    return await _aget_or_create_async(key, lambda: openai.AsyncAzureOpenAI(
+                                                azure_endpoint = endpoint,
+                                                api_key        = api_key,
+                                                api_version    = api_version,
+                                                http_client    = openai.DefaultAsyncHttpxClient(limits  = _http_limits(),
+                                                                                                timeout = _http_timeout(),),))
+
+# ------------------------------
+# Gcloud (Vertex AI)
+def get_genai_client(project_name: str,
+                     location_name: str,
+                     ) -> genai.Client:
+    """
+    genai.Client は認証情報を保持するため共有する
+    (client.aio も同じ認証情報を使う)
+    """
+    key = ('gcloud', _credential_key(project_name, location_name))
+    return _get_or_create_sync(key, lambda: genai.Client(vertexai = True,
+                                                         project  = project_name,
+                                                         location = location_name,))
+
+async def aget_genai_client(project_name: str,
+                            location_name: str,
+                            ) -> genai.Client:
+    """
+    get_genai_client と同じクライアントを返す
+    初回の作成 (認証情報・トランスポートの準備) はスレッドで行い、イベントループをブロックしない
+    """
+    key = ('gcloud', _credential_key(project_name, location_name))
+    with _lock:
+        client = _sync_clients.get(key)
+    if client is not None:
+        return client
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_genai_client, project_name, location_name)
+
+
+# ------------------------------
+# 同期ストリームの受信
+def get_llm_stream_executor() -> ThreadPoolExecutor:
+    global _stream_executor
+    with _lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(max_workers        = getattr(settings, 'LLM_STREAM_WORKER_MAX_THREADS', 32),
+                                                  thread_name_prefix = 'llm-stream',)
+        return _stream_executor
+
+
+# ------------------------------
+# 管理
+def get_llm_client_registry_stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            'sync_clients':  len(_sync_clients),
+            'event_loops':   len(_async_clients),
+            'async_clients': sum(len(v) for v in _async_clients.values()),
+            'stream_threads': len(_stream_executor._threads) if _stream_executor is not None else 0,
+        }
+
+async def aclose_llm_async_clients() -> None:
+    """
+    実行中のイベントループに紐づく非同期クライアントを閉じる (テスト/シャットダウン用)
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.pop(loop, {})
+    for client in loop_clients.values():
+        try:
+            await client.close()
+        except Exception as e:
+            print(e)
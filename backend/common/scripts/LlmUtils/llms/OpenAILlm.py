@@ -1,7 +1,7 @@
 from rest_framework.exceptions import ValidationError
 import openai
-import asyncio
-from typing import Dict, Tuple, Union, AsyncGenerator
+from typing import Dict, Optional, Tuple, Union, AsyncGenerator
+from .LlmClientRegistry import get_openai_client, aget_openai_async_client
 
 class OpenAILlm:
 
@@ -9,6 +9,7 @@ class OpenAILlm:
                  model_name:str = 'gpt-3.5-turbo',
                  api_key:str    = None,
                  *,
+                 base_url:Optional[str]  = None,
                  temperature:float       = 1.2,
                  max_tokens:int          = 128,
                  top_p:float             = 1.0,
@@ -23,16 +24,26 @@ class OpenAILlm:
             raise ValueError('llm parameter values error')
         # 想定外のパラメータが設定された場合の処理△
 
-        self.client = openai.OpenAI(api_key     = api_key,
-                                    http_client = None,) # IF USE ProxyServer: httpx.Client(proxies=settings.HTTP_PROXY)
-        
+        # クライアントは LlmClientRegistry でプロセス全体で共有する
+        # IF USE ProxyServer: LlmClientRegistry の http_client に proxy を設定
+        self.api_key  = api_key
+        self.base_url = base_url
+
         self.model_name        = model_name
         self.temperature       = temperature
         self.max_tokens        = max_tokens
         self.top_p             = top_p
         self.frequency_penalty = frequency_penalty
         self.presence_penalty  = presence_penalty
-        
+
+    @property
+    def client(self) -> openai.OpenAI:
+        return get_openai_client(self.api_key, self.base_url)
+
+    async def aget_async_client(self) -> openai.AsyncOpenAI:
+        # 実行中のイベントループから呼ぶこと (初回のみスレッドで作成する)
+        return await aget_openai_async_client(self.api_key, self.base_url)
+
     def get_response(self,
                      messages:list = [],
                      *,
@@ -76,8 +87,8 @@ class OpenAILlm:
         if not messages or messages == []:
             return None
 
-        def sync_call():
-            return self.client.chat.completions.create(
+        async_client = await self.aget_async_client()
+        response     = await async_client.chat.completions.create(
                         model             = self.model_name,
                         messages          = messages,
                         temperature       = self.temperature,
@@ -88,7 +99,6 @@ class OpenAILlm:
                         stream            = False,
                         timeout           = timeout,)
 
-        response        = await asyncio.to_thread(sync_call)
         return_responce = response.choices[0].message.content
 
         if is_return_usage_dict:
@@ -102,17 +112,20 @@ class OpenAILlm:
         return return_responce
 
     async def async_get_stream_response(self,
-                                 messages:list = [],
-                                 *,
-                                 asyncio_sleep:float = 0.01,
-                                 timeout:int         = 60,
-                                 ) -> AsyncGenerator[str, None]:
-
+                                        messages:list = [],
+                                        *,
+                                        timeout:int   = 60,
+                                        ) -> AsyncGenerator[str, None]:
+        """
+        差分を非同期に返す
+        - 受信待ちはイベントループをブロックしない (AsyncStream)
+        - 呼び出し側のキャンセル/aclose 時には HTTP ストリームを閉じる
+        """
         if not messages or messages == []:
             return
 
-        def sync_call():
-            return self.client.chat.completions.create(
+        async_client = await self.aget_async_client()
+        response     = await async_client.chat.completions.create(
                         model             = self.model_name,
                         messages          = messages,
                         temperature       = self.temperature,
@@ -122,15 +135,14 @@ class OpenAILlm:
                         presence_penalty  = self.presence_penalty,
                         stream            = True,
                         timeout           = timeout,)
-
-        response = await asyncio.to_thread(sync_call)
-
-        for res in response:
-            try:
-                content = res.choices[0].delta.content
-                if content == None:
+        try:
+            async for res in response:
+                try:
+                    content = res.choices[0].delta.content
+                    if content == None:
+                        content = ''
+                except:
                     content = ''
-            except:
-                content = ''
-            yield content
-            await asyncio.sleep(asyncio_sleep)
\ No newline at end of file
+                yield content
+        finally:
+            await response.close()
\ No newline at end of file
@@ -1,3 +1,6 @@
 from .AzureLlm import AzureLlm
 from .GcloudLlm import GcloudLlm
-from .OpenAILlm import OpenAILlm
\ No newline at end of file
+from .OpenAILlm import OpenAILlm
+from .LlmClientRegistry import (
+    get_llm_client_registry_stats, aclose_llm_async_clients,
+)
\ No newline at end of file
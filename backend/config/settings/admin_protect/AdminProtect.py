@@ -1,13 +1,37 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import HttpResponseForbidden
 from common.scripts.DjangoUtils import RequestUtil
 
 class AdminProtect:
-    
+
+    # 判定は settings の参照のみのため sync/async の両方に対応する
+    # (ASGI では async で動作し、リクエストごとにスレッドを移動しない)
+    sync_capable  = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        forbidden_response = self.get_forbidden_response(request)
+        if forbidden_response is not None:
+            return forbidden_response
+        response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        forbidden_response = self.get_forbidden_response(request)
+        if forbidden_response is not None:
+            return forbidden_response
+        response = await self.get_response(request)
+        return response
+
+    def get_forbidden_response(self, request):
 
         url = request.get_full_path()
         
@@ -19,8 +43,7 @@ class AdminProtect:
 
             # 許可IPアドレスリストが空の場合には全てのIPを許可
             if settings.ALLOWED_IP_ADMIN == ['']:
-                response = self.get_response(request)
-                return response
+                return None
 
             # 送信元IPが許可IPアドレスリストに含まれていない場合はForbiddenを返す
             if ip not in settings.ALLOWED_IP_ADMIN:
@@ -28,5 +51,4 @@ class AdminProtect:
                     print(f'config.settings.admin_protect.AdminProtect BLOCK: {ip}')
                 return HttpResponseForbidden()
 
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        return None
\ No newline at end of file
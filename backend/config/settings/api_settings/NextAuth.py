@@ -6,4 +6,8 @@ env = read_env(settings.BASE_DIR)
 
 # common.auth.NextAuthDecription.py で使用
 # next-auth.session-token を復号する
-NEXTAUTH_SECRET = env.get_value('NEXTAUTH_SECRET',str)
\ No newline at end of file
+NEXTAUTH_SECRET = env.get_value('NEXTAUTH_SECRET',str)
+
+# ローテーション前のシークレット (, 区切り. 古いセッションの復号のみに使う)
+NEXTAUTH_SECRET_PREVIOUS = env.get_value('NEXTAUTH_SECRET_PREVIOUS',str,default='')
+NEXTAUTH_SECRETS         = [NEXTAUTH_SECRET] + [secret for secret in NEXTAUTH_SECRET_PREVIOUS.split(',') if secret]
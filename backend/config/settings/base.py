@@ -166,6 +166,11 @@ try:
     from .extra_settings.ChannelLayers import *
 except ImportError as e:
     print('ImportError occurred: ', e)
+# [LOAD extra_settings] Redis.py
+try:
+    from .extra_settings.Redis import *
+except ImportError as e:
+    print('ImportError occurred: ', e)
 
 # [LOAD security] PasswordHashers.py
 try:
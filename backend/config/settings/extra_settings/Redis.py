@@ -0,0 +1,9 @@
+from django.conf import settings
+
+# LOAD SECRET STEEINGS
+from config.settings.read_env import read_env
+env = read_env(settings.BASE_DIR)
+
+# ChannelLayers 以外で Redis を直接使う処理 (apps.utils.RedisUtils) の接続先
+# ex. WebSocket のリクエスト制限
+REDIS_URL = f"redis://{env.get_value('REDIS_HOST',str)}:{env.get_value('REDIS_PORT',int)}/0"
@@ -5,20 +5,21 @@
 # DRF においては API 単位でスロット制限をかける
 # 本 middleware はバックエンド全体で攻撃を受けた際に
 # アクセス遮断と IP アドレスを DB に保存して長期間アクセスを制限するもの
+# sync/async の両方に対応する (ASGI では async で動作し、リクエストごとにスレッドを移動しない)
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
-from django.core.cache import cache
-from django.utils.deprecation import MiddlewareMixin
 from django.utils.translation import gettext_lazy as _
 from rest_framework.status import HTTP_403_FORBIDDEN, HTTP_429_TOO_MANY_REQUESTS
 from rest_framework.renderers import JSONRenderer
 from django.http import HttpResponse
-from apps.access_security.models import BlockIpList, AccessSecurity
+from apps.access_security.models import AccessSecurity
+from apps.access_security.utils import (
+    IpRateLimiter, IpBlocklist, IP_STATUS_PASS, IP_STATUS_BLOCK,
+    get_google_bot_verifier,
+)
 from common.scripts.DjangoUtils import RequestUtil
 
-import subprocess
-import time
-
 # LOAD SECRET STEEINGS
 from config.settings.read_env import read_env
 env = read_env(settings.BASE_DIR)
@@ -32,122 +33,152 @@ BLOCKLIST_EFFECTIVE_DAYS  = env.get_value('BLOCKLIST_EFFECTIVE_DAYS',int)  # ブ
 # 登録済みブロックリストからのアクセスを遮断
 REGISTERED_BLOCK_IP_LIST_READ_FREC = env.get_value('REGISTERED_BLOCK_IP_LIST_READ_FREC',int) # DBを再読み込みするまでの時間(分)
 
-PASS_IP_LIST    = 'pass_ip_list'
-BLOCK_IP_LIST   = 'block_ip_list'
-CONTROL_IP_LIST = 'control_ip_list'
-CONTROL_IP_LIST_DEFAULT = {
-    PASS_IP_LIST:  [],
-    BLOCK_IP_LIST: [],
-}
+# 登録済みブロックリストの索引 (BlockIpList の保存・削除で作成し直す)
+registered_ip_blocklist = IpBlocklist(cache_timeout_sec=REGISTERED_BLOCK_IP_LIST_READ_FREC*60)
 
-class AccessSecurityMiddleware(MiddlewareMixin):
+# IP ごとのスライディングウィンドウカウンタ・パスリスト・ブロックリスト (キャッシュに IP ごとのキーで保存)
+ip_rate_limiter = IpRateLimiter(window_sec        = ACCESS_COUNT_SECONDS_TIME,
+                                block_timeout_sec = 60*60*24*BLOCKLIST_EFFECTIVE_DAYS,
+                                pass_timeout_sec  = 60*60*24*365,)
 
-    def process_response(self, request, response):
-        if settings.DEBUG:
-            print('run: AccessSecurityMiddleware', end='')
+class AccessSecurityMiddleware:
 
-        # 全ページ(static,media以外)にキャッシュ禁止のHTTPヘッダーを付加し、キャッシュ禁止▽
-        if request.path_info.startswith('/static/') or request.path_info.startswith('/media/'):
-            response['Cache-Control'] = 'public, max-age=315360000, immutable'
-        else:
-            response['Cache-Control'] = 'max-age=0, no-cache, no-store, must-revalidate, private'
-        # 全ページ(static,media以外)にキャッシュ禁止のHTTPヘッダーを付加し、キャッシュ禁止△
+    sync_capable  = True
+    async_capable = True
 
-        request_util = RequestUtil(request)
-        ip           = request_util.get_ip()
-        if settings.DEBUG:
-            print(f'[ip]: {ip}')
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return await self.aprocess_response(request, response)
+
+    def process_response(self, request, response):
+        ip = self._prepare(request, response)
         # 登録済みブロックリストに基づくアクセス遮断▽
         if is_registered_block_ip(ip):
-            AccessSecurity.objects.insert_access_log(request, 'REGISTERED_IP_BLOCK')
-            if settings.DEBUG:
-                print('info: config.settings.security.AccessSecurityMiddleware(line 57), REGISTERED_IP_BLOCK')
-            return HttpResponse(
-                content      = JSONRenderer().render({'detail': _('アクセスが制限されています')}),
-                content_type = 'application/json',
-                status       = HTTP_403_FORBIDDEN,)
+            return self._registered_ip_block_response(request)
         # 登録済みブロックリストに基づくアクセス遮断△
-        
+
         # 一定期間の大量アクセスに基づくアクセス遮断▽
-        control_ip_list = cache.get(CONTROL_IP_LIST, CONTROL_IP_LIST_DEFAULT)
-        
+        ip_status, access_count = ip_rate_limiter.hit(ip)
+
         # パスリスト通過
-        if ip in control_ip_list[PASS_IP_LIST]: return
-        # ブロックリスト拒否
-        if ip in control_ip_list[BLOCK_IP_LIST]:
-            # ブロックリスト対象のIPで期限を確認
-            if cache.get('block_ip_' + ip) is None:
-                # 期限切れならブロックリストから除外
-                control_ip_list[BLOCK_IP_LIST].remove(ip)
-                cache.set(CONTROL_IP_LIST, control_ip_list)
-            else:
-                # ログ記録
-                AccessSecurity.objects.insert_access_log(request, 'IP_BLOCK')
-                if settings.DEBUG:
-                    print('info: config.settings.security.AccessSecurityMiddleware(line 80), IP_BLOCK')
-                return HttpResponse(
-                    content      = JSONRenderer().render({'detail': _('リクエストの処理は絞られました')}),
-                    content_type = 'application/json',
-                    status       = HTTP_429_TOO_MANY_REQUESTS,)
-
-        ip_time_list = cache.get(ip, [])
-        time_temp    = time.time()
-        
-        # 設定時間前の更新記録(キャッシュ)を削除
-        while ip_time_list and (time_temp - ip_time_list[-1]) > ACCESS_COUNT_SECONDS_TIME:
-            ip_time_list.pop()
-        ip_time_list.insert(0, time_temp)
-        cache.set(ip, ip_time_list, timeout=ACCESS_COUNT_SECONDS_TIME)
-        
+        if ip_status == IP_STATUS_PASS:
+            return response
+        # ブロックリスト拒否 (期限切れのキーはキャッシュから消える)
+        if ip_status == IP_STATUS_BLOCK:
+            return self._throttled_response(request, 'IP_BLOCK')
+
         # ブロックリスト登録
-        if len(ip_time_list) > N_TIMES_TO_ADD_BLOCKLIST:
-            control_ip_list[BLOCK_IP_LIST].append(ip)
+        if access_count > N_TIMES_TO_ADD_BLOCKLIST:
             # 該当IPは設定期間アクセス遮断
-            cache.set(CONTROL_IP_LIST, control_ip_list, timeout=60*60*24*BLOCKLIST_EFFECTIVE_DAYS)
-            cache.set('block_ip_' + ip, '', timeout=60*60*24*BLOCKLIST_EFFECTIVE_DAYS)
-            # ログ記録
-            AccessSecurity.objects.insert_access_log(request, 'SET_BLOCK_IP')
-            if settings.DEBUG:
-                print('info: config.settings.security.AccessSecurityMiddleware(line 105), SET_BLOCK_IP')
-
-        # アクセス拒否        
-        if len(ip_time_list) > N_TIMES_TO_BLOCK_ACCESS:
+            ip_rate_limiter.block(ip)
+            self._insert_access_log(request, 'SET_BLOCK_IP')
+
+        # アクセス拒否
+        if access_count > N_TIMES_TO_BLOCK_ACCESS:
             if is_google_bot(ip):
-                # googlebotのIPをパスリストに登録する
-                control_ip_list[PASS_IP_LIST].append(ip)
-                cache.set(CONTROL_IP_LIST, control_ip_list, timeout=60*60*24*365)
+                # googlebotのIPをパスリストに登録する (判定中はアクセス拒否する)
+                ip_rate_limiter.allow(ip)
                 # ログ記録(googlebotのIPをパスリスト: 特に不要であればコメントアウト)
-                # AccessSecurity.objects.insert_access_log(request, 'SET_PASS_IP')
+                # self._insert_access_log(request, 'SET_PASS_IP')
+            else:
+                return self._throttled_response(request, 'COUNT_BLOCK')
+        # 一定期間の大量アクセスに基づくアクセス遮断△
+
+        return response
+
+    async def aprocess_response(self, request, response):
+        # process_response の async 版 (キャッシュは acache_call, DB は database_sync_to_async)
+        ip = self._prepare(request, response)
+        # 登録済みブロックリストに基づくアクセス遮断▽
+        if await ais_registered_block_ip(ip):
+            return self._registered_ip_block_response(request)
+        # 登録済みブロックリストに基づくアクセス遮断△
+
+        # 一定期間の大量アクセスに基づくアクセス遮断▽
+        ip_status, access_count = await ip_rate_limiter.ahit(ip)
+
+        # パスリスト通過
+        if ip_status == IP_STATUS_PASS:
+            return response
+        # ブロックリスト拒否 (期限切れのキーはキャッシュから消える)
+        if ip_status == IP_STATUS_BLOCK:
+            return self._throttled_response(request, 'IP_BLOCK')
+
+        # ブロックリスト登録
+        if access_count > N_TIMES_TO_ADD_BLOCKLIST:
+            # 該当IPは設定期間アクセス遮断
+            await ip_rate_limiter.ablock(ip)
+            self._insert_access_log(request, 'SET_BLOCK_IP')
+
+        # アクセス拒否
+        if access_count > N_TIMES_TO_BLOCK_ACCESS:
+            if await ais_google_bot(ip):
+                # googlebotのIPをパスリストに登録する (判定中はアクセス拒否する)
+                await ip_rate_limiter.aallow(ip)
             else:
-                # ログ記録
-                AccessSecurity.objects.insert_access_log(request, 'COUNT_BLOCK')
-                if settings.DEBUG:
-                    print('info: config.settings.security.AccessSecurityMiddleware(line 118), COUNT_BLOCK')
-                return HttpResponse(
-                    content      = JSONRenderer().render({'detail': _('リクエストの処理は絞られました')}),
-                    content_type = 'application/json',
-                    status       = HTTP_429_TOO_MANY_REQUESTS,)
+                return self._throttled_response(request, 'COUNT_BLOCK')
         # 一定期間の大量アクセスに基づくアクセス遮断△
 
         return response
 
-# 登録済みブロックリストをキャッシュに保存
+    # ------------------------------
+    def _prepare(self, request, response) -> str:
+        if settings.DEBUG:
+            print('run: AccessSecurityMiddleware', end='')
+
+        # 全ページ(static,media以外)にキャッシュ禁止のHTTPヘッダーを付加し、キャッシュ禁止▽
+        if request.path_info.startswith('/static/') or request.path_info.startswith('/media/'):
+            response['Cache-Control'] = 'public, max-age=315360000, immutable'
+        else:
+            response['Cache-Control'] = 'max-age=0, no-cache, no-store, must-revalidate, private'
+        # 全ページ(static,media以外)にキャッシュ禁止のHTTPヘッダーを付加し、キャッシュ禁止△
+
+        ip = RequestUtil(request).get_ip()
+        if settings.DEBUG:
+            print(f'[ip]: {ip}')
+        return ip
+
+    def _insert_access_log(self, request, type:str) -> None:
+        # ログ記録 (バッファに積むだけで DB にはアクセスしない. sync/async 共通)
+        AccessSecurity.objects.insert_access_log(request, type)
+        if settings.DEBUG:
+            print(f'info: config.settings.security.AccessSecurityMiddleware, {type}')
+
+    def _registered_ip_block_response(self, request) -> HttpResponse:
+        self._insert_access_log(request, 'REGISTERED_IP_BLOCK')
+        return HttpResponse(
+            content      = JSONRenderer().render({'detail': _('アクセスが制限されています')}),
+            content_type = 'application/json',
+            status       = HTTP_403_FORBIDDEN,)
+
+    def _throttled_response(self, request, type:str) -> HttpResponse:
+        self._insert_access_log(request, type)
+        return HttpResponse(
+            content      = JSONRenderer().render({'detail': _('リクエストの処理は絞られました')}),
+            content_type = 'application/json',
+            status       = HTTP_429_TOO_MANY_REQUESTS,)
+
+# 登録済みブロックリストに含まれるか判定する (IP アドレス・CIDR)
 def is_registered_block_ip(ip) -> bool:
-    # cacheからIPを抜き出す。
-    registered_block_ips = cache.get('registered_block_ip_objs')
-
-    # cacheにない場合、DBから情報を抜き取り格納する。
-    if registered_block_ips is None:
-        registered_block_ips = list(BlockIpList.objects.all())
-        cache.set('registered_block_ip_objs', registered_block_ips, REGISTERED_BLOCK_IP_LIST_READ_FREC*60)
-
-    registered_black_ip_list = [registered_block_ip.ip for registered_block_ip in registered_block_ips]
-    return ip in registered_black_ip_list
-
-# googlebotか判定する
-def is_google_bot(ip):
-    try:
-        host = subprocess.run(['host', ip], stdout=subprocess.PIPE).stdout.decode().replace('\n', '')
-        return host.endswith(('googlebot.com', 'google.com'))
-    except:
-        return False
\ No newline at end of file
+    return registered_ip_blocklist.is_blocked(ip)
+
+async def ais_registered_block_ip(ip) -> bool:
+    return await registered_ip_blocklist.ais_blocked(ip)
+
+# googlebotか判定する (逆引き・正引きはバックグラウンドで行い、判定が出るまでは False)
+def is_google_bot(ip) -> bool:
+    return get_google_bot_verifier().is_google_bot(ip)
+
+async def ais_google_bot(ip) -> bool:
+    return await get_google_bot_verifier().ais_google_bot(ip)
@@ -25,4 +25,18 @@ except: AZURE_SPEECH_SERVICES_REGION = None
 try:    GCLOUD_PROJECT_NAME = env.get_value('GCLOUD_PROJECT_NAME',str)
 except: GCLOUD_PROJECT_NAME = None
 try:    GCLOUD_LOCATION_NAME = env.get_value('GCLOUD_LOCATION_NAME',str)
-except: GCLOUD_LOCATION_NAME = None
\ No newline at end of file
+except: GCLOUD_LOCATION_NAME = None
+# LLM クライアントの HTTP 接続プール
+# common.scripts.LlmUtils.llms.LlmClientRegistry でプロセス全体で共有する
+try:    LLM_HTTP_MAX_CONNECTIONS = env.get_value('LLM_HTTP_MAX_CONNECTIONS',int)
+except: LLM_HTTP_MAX_CONNECTIONS = 100
+try:    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = env.get_value('LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS',int)
+except: LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+try:    LLM_HTTP_KEEPALIVE_EXPIRY_SEC = env.get_value('LLM_HTTP_KEEPALIVE_EXPIRY_SEC',float)
+except: LLM_HTTP_KEEPALIVE_EXPIRY_SEC = 30.0
+try:    LLM_HTTP_CONNECT_TIMEOUT_SEC = env.get_value('LLM_HTTP_CONNECT_TIMEOUT_SEC',float)
+except: LLM_HTTP_CONNECT_TIMEOUT_SEC = 5.0
+# Gemini の同期ストリームを受信するワーカースレッド数の上限
+# (ストリームの間スレッドを占有するため、sync_to_async などが使うデフォルトの executor とは分ける)
+try:    LLM_STREAM_WORKER_MAX_THREADS = env.get_value('LLM_STREAM_WORKER_MAX_THREADS',int)
+except: LLM_STREAM_WORKER_MAX_THREADS = 32
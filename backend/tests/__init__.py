@@ -1,3 +1,5 @@
 from .accounts import *
 from .api import *
-from .config import *
\ No newline at end of file
+from .apps import *
+from .config import *
+from .scripts import *
\ No newline at end of file
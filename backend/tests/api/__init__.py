@@ -1,3 +1,5 @@
 from .accounts import *
+from .third_party import *
 from .token import *
+from .utils import *
 from .v1 import *
\ No newline at end of file
@@ -0,0 +1 @@
+from .azure import *
@@ -0,0 +1 @@
+from .speech_services import *
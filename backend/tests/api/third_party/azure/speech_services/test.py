@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+import asyncio
+import time
+from api.third_party.v1.azure.speech_services.utils import AzureSpeechTokenBroker
+from tests.common import create_test_user, StubStsServer
+
+
+def set_cached_token(region:str, access_token:str, remaining_sec:float) -> None:
+    cache.set(f'azure_speech_token:{region}',
+              {'access_token': access_token, 'expires_at': time.time() + remaining_sec},
+              timeout = int(remaining_sec) + 1,)
+
+
+class AzureSpeechTokenBrokerTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _run(self, main, **server_kwargs):
+        async def _main():
+            server = StubStsServer(**server_kwargs)
+            await server.start()
+            broker = AzureSpeechTokenBroker('dummy-key', url_template=server.url_template, timeout_sec=0.2)
+            try:
+                return await main(server, broker)
+            finally:
+                await broker.aclose()
+                await server.stop()
+        return asyncio.run(_main())
+
+    def test_single_flight(self):
+        """ 同時に取得しても STS へのリクエストは 1 回で、以降はキャッシュから返す """
+        async def _main(server, broker):
+            tokens = await asyncio.gather(*[broker.get_token('japaneast') for _ in range(20)])
+            token  = await broker.get_token('japaneast')
+            return server, broker.stats(), tokens + [token]
+        server, stats, tokens = self._run(_main, response_delay=0.05)
+        self.assertEqual(server.request_count, 1)
+        self.assertEqual(server.subscription_keys, ['dummy-key'])
+        self.assertEqual({token.access_token for token in tokens}, {'token-1'})
+        self.assertEqual((stats['miss'], stats['hit']), (20, 1))
+        self.assertTrue(540 - 5 <= tokens[0].max_age <= 540)
+
+    def test_region(self):
+        """ リージョンごとに 1 つ (コネクションは使い回す) """
+        async def _main(server, broker):
+            east = await broker.get_token('japaneast')
+            west = await broker.get_token('japanwest')
+            return server, east, west
+        server, east, west = self._run(_main)
+        self.assertEqual(server.regions, ['japaneast', 'japanwest'])
+        self.assertEqual(server.connection_count, 1)
+        self.assertEqual((east.region, west.region), ('japaneast', 'japanwest'))
+        self.assertNotEqual(east.access_token, west.access_token)
+
+    def test_refresh_ahead(self):
+        """ 期限が近いトークンは待たずに返して、バックグラウンドで更新する """
+        set_cached_token('japaneast', 'old-token', remaining_sec=100)
+        async def _main(server, broker):
+            tokens = [await broker.get_token('japaneast') for _ in range(5)]
+            await asyncio.sleep(0.1)
+            tokens.append(await broker.get_token('japaneast'))
+            return server, broker.stats(), tokens
+        server, stats, tokens = self._run(_main, response_delay=0.02)
+        self.assertEqual([token.access_token for token in tokens], ['old-token'] * 5 + ['token-1'])
+        self.assertEqual(server.request_count, 1)
+        self.assertEqual(stats['refresh'], 1)
+
+    def test_failure(self):
+        """ 取得に失敗した場合は None / 更新に失敗した場合は期限まで前のトークン """
+        async def _main(server, broker):
+            token = await broker.get_token('japaneast')
+            set_cached_token('japanwest', 'old-token', remaining_sec=100)
+            await broker.get_token('japanwest')
+            await asyncio.sleep(0.05)
+            stale = await broker.get_token('japanwest')
+            return token, stale, broker.stats()
+        token, stale, stats = self._run(_main, status_code=500)
+        self.assertIsNone(token)
+        self.assertEqual(stale.access_token, 'old-token')
+        self.assertEqual(stats['error'], 2)
+
+    def test_timeout(self):
+        async def _main(server, broker):
+            start = time.perf_counter()
+            token = await broker.get_token('japaneast')
+            return token, time.perf_counter() - start
+        token, elapsed = self._run(_main, response_delay=1.0)
+        self.assertIsNone(token)
+        self.assertLess(elapsed, 0.8)
+
+
+@override_settings(AZURE_SPEECH_SERVICES_SUBSCRIPTION_KEY='dummy-key', AZURE_SPEECH_SERVICES_REGION='japaneast')
+class GetTokenOrRefreshViewTest(APITestCase):
+
+    TARGET_URL = reverse('api.third_party.v1:api.third_party.v1.azure:api.third_party.v1.azure.speech_services:get_or_refresh')
+
+    def setUp(self):
+        cache.clear()
+        self.user, _, _ = create_test_user(is_active=True)
+
+    def test_shared_token(self):
+        """ [POST] 共有のトークンを返し、Cookie はトークンの期限まで """
+        set_cached_token('japaneast', 'shared-token', remaining_sec=300)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.TARGET_URL, {'set_cookie_prefix': 'test-'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'access_token': 'shared-token', 'region': 'japaneast'})
+        cookie = response.cookies['test-speech-token']
+        self.assertEqual(cookie.value, 'shared-token:japaneast')
+        self.assertTrue(290 <= int(cookie['max-age']) <= 300)
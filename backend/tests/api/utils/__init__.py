@@ -0,0 +1 @@
+from .jwt_auth_get_id import *
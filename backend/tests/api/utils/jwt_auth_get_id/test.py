@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+import hashlib
+import time
+# テストパッケージ名 (tests.api.utils.jwt_auth_get_id) を関数で上書きしないよう別名で import する
+from api.utils.jwt_auth_get_id import jwt_auth_get_id as get_user_id
+from common.auth import encode_jwe, decode_session_token, get_session_token, session_cache
+from tests.common import create_test_user
+
+OLD_SECRET = 'old-nextauth-secret'
+NEW_SECRET = 'new-nextauth-secret'
+
+
+class GetSessionTokenTest(SimpleTestCase):
+
+    def test_cookie_name(self):
+        """ 名前が一致するクッキーのみ (__Secure- を優先) """
+        self.assertEqual(get_session_token({'next-auth.session-token': 'a'}), 'a')
+        self.assertEqual(get_session_token({'next-auth.session-token': 'a', '__Secure-next-auth.session-token': 'b'}), 'b')
+        self.assertIsNone(get_session_token({'next-auth.session-token-old': 'a', 'csrftoken': 'c'}))
+        self.assertIsNone(get_session_token(None))
+
+    def test_chunked(self):
+        """ 分割されたクッキー (.0, .1, ...) は順に連結する """
+        cookies = {'__Secure-next-auth.session-token.1': 'def', '__Secure-next-auth.session-token.0': 'abc', 'other': 'x'}
+        self.assertEqual(get_session_token(cookies), 'abcdef')
+
+
+class JwtAuthGetIdTest(TestCase):
+
+    def setUp(self):
+        session_cache.clear()
+        self.user, _, _ = create_test_user()
+        self.session    = {'accessToken': str(AccessToken.for_user(self.user)), 'exp': int(time.time()) + 3600}
+
+    def test_session_cache(self):
+        """ 同じトークンは 2 回目以降復号しない """
+        token   = encode_jwe(self.session)
+        cookies = {'next-auth.session-token': token}
+        stats   = dict(session_cache.stats_dict)
+        self.assertEqual([get_user_id(cookies) for _ in range(3)], [self.user.id] * 3)
+        self.assertEqual(session_cache.stats_dict['miss'] - stats['miss'], 1)
+        self.assertEqual(session_cache.stats_dict['hit'] - stats['hit'], 2)
+
+    def test_expired_session(self):
+        """ exp を過ぎたセッションは保持しない """
+        token = encode_jwe({**self.session, 'exp': int(time.time()) - 1})
+        decode_session_token(token)
+        self.assertIsNone(session_cache.get(hashlib.sha256(token.encode('utf-8')).hexdigest()))
+
+    def test_rotation(self):
+        """ ローテーション前のシークレットで暗号化したセッションも復号する """
+        token = encode_jwe(self.session, secret=OLD_SECRET)
+        with override_settings(NEXTAUTH_SECRETS=[NEW_SECRET, OLD_SECRET]):
+            self.assertEqual(get_user_id({'next-auth.session-token': token}), self.user.id)
+        session_cache.clear()
+        with override_settings(NEXTAUTH_SECRETS=[NEW_SECRET]):
+            self.assertIsNone(get_user_id({'next-auth.session-token': token}))
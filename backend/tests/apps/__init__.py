@@ -0,0 +1,4 @@
+from .access_security import *
+from .third_party import *
+from .utils import *
+from .vrmchat import *
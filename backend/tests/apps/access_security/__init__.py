@@ -0,0 +1,4 @@
+from .access_log import *
+from .blocklist import *
+from .bot_verifier import *
+from .rate_limiter import *
@@ -0,0 +1,49 @@
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.access_security.models import AccessSecurity
+from apps.access_security.utils import AccessLogWriter
+
+
+class AccessLogWriterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.writer = AccessLogWriter(is_background=False, buffer_size=5, max_batch=2)
+
+    def test_dedupe(self):
+        """ 同じ (IP, type) は 1 回だけ記録し、リクエストの処理では DB にアクセスしない """
+        with self.assertNumQueries(0):
+            results = [self.writer.enqueue('192.0.2.1', 'IP_BLOCK') for _ in range(10)]
+            self.writer.enqueue('192.0.2.1', 'COUNT_BLOCK')
+            self.writer.enqueue('192.0.2.2', 'IP_BLOCK')
+        self.assertEqual(results, [True] + [False] * 9)
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(AccessSecurity.objects.count(), 3)
+        self.assertEqual(AccessSecurity.objects.filter(ip='192.0.2.1').count(), 2)
+        self.assertEqual(self.writer.stats()['deduped'], 9)
+
+    def test_dedupe_between_processes(self):
+        """ 他のプロセスで記録済みの (IP, type) はキャッシュで除く """
+        other = AccessLogWriter(is_background=False)
+        other.enqueue('192.0.2.1', 'IP_BLOCK')
+        self.assertEqual(other.flush(), 1)
+        self.assertTrue(self.writer.enqueue('192.0.2.1', 'IP_BLOCK'))
+        self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(AccessSecurity.objects.count(), 1)
+
+    def test_overload(self):
+        """ バッファが一杯の場合は記録せず件数だけ数える """
+        results = [self.writer.enqueue(f'192.0.2.{i}', 'COUNT_BLOCK') for i in range(8)]
+        self.assertEqual(results, [True] * 5 + [False] * 3)
+        self.assertEqual(self.writer.dropped_dict, {'COUNT_BLOCK': 3})
+        self.assertEqual(self.writer.flush(), 5)
+        self.assertEqual(self.writer.dropped_dict, {})
+        self.assertEqual(self.writer.stats()['pending'], 0)
+
+    @override_settings(IS_ADMIN_NOTICE=True, ADMIN_EMAIL_LIST='admin@example.com', DEFAULT_FROM_EMAIL='noreply@example.com')
+    def test_admin_notice(self):
+        """ bulk_create でも SET_BLOCK_IP は管理者に通知する """
+        self.writer.enqueue('192.0.2.1', 'SET_BLOCK_IP')
+        self.writer.flush()
+        self.assertEqual(len(mail.outbox), 1)
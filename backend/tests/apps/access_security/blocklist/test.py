@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from apps.access_security.models import BlockIpList
+from apps.access_security.utils import IpBlocklist, IpBlocklistIndex
+
+
+class IpBlocklistIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = IpBlocklistIndex.from_entries([
+            ('192.0.2.1',    None),
+            ('198.51.100.0', 24),
+            ('10.0.0.0',     8),
+            ('2001:db8::1',  None),
+            ('2001:db8:1::', 48),
+            ('203.0.113.5',  32),
+            ('invalid',      None),
+        ])
+
+    def test_contains(self):
+        for ip in ['192.0.2.1', '198.51.100.255', '10.255.0.1', '203.0.113.5',
+                   '2001:db8::1', '2001:0db8:0000:0000:0000:0000:0000:0001', '2001:db8:1:ffff::1', '::ffff:198.51.100.1']:
+            self.assertTrue(self.index.contains(ip), ip)
+        for ip in ['192.0.2.2', '198.51.101.0', '11.0.0.1', '2001:db8::2', '2001:db8:2::1', 'invalid', '']:
+            self.assertFalse(self.index.contains(ip), ip)
+        self.assertEqual(self.index.size, 6)
+
+    def test_data(self):
+        """ キャッシュの形式から同じ索引を作成できる """
+        index = IpBlocklistIndex.from_data(self.index.to_data())
+        self.assertEqual(index.exact, self.index.exact)
+        self.assertEqual(index.networks, self.index.networks)
+
+
+class IpBlocklistTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.blocklist = IpBlocklist(local_ttl_sec=60)
+
+    def test_local_copy(self):
+        """ DB は 1 回だけ読み、以降はプロセスの索引で判定する """
+        BlockIpList.objects.create(ip='192.0.2.1')
+        with self.assertNumQueries(1):
+            results = [self.blocklist.is_blocked('192.0.2.1') for _ in range(10)]
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(self.blocklist.stats_dict, {'local': 9, 'cache': 0, 'db': 1})
+
+    def test_shared_cache(self):
+        """ 他のプロセスはキャッシュの索引を使う """
+        BlockIpList.objects.create(ip='198.51.100.0', prefixlen=24)
+        self.blocklist.is_blocked('192.0.2.1')
+        other = IpBlocklist(local_ttl_sec=60)
+        with self.assertNumQueries(0):
+            self.assertTrue(other.is_blocked('198.51.100.7'))
+        self.assertEqual(other.stats_dict['cache'], 1)
+
+    def test_invalidate(self):
+        """ BlockIpList の保存・削除で作成し直す """
+        self.assertFalse(self.blocklist.is_blocked('192.0.2.1'))
+        block_ip = BlockIpList.objects.create(ip='192.0.2.1')
+        self.assertTrue(self.blocklist.is_blocked('192.0.2.1'))
+        block_ip.delete()
+        self.assertFalse(self.blocklist.is_blocked('192.0.2.1'))
+        self.assertEqual(self.blocklist.stats_dict['db'], 3)
@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from unittest import mock
+import threading
+import time
+from apps.access_security.utils import GoogleBotVerifier, SocketDnsResolver
+from tests.common import FakeDnsResolver
+
+GOOGLE_BOT_IP   = '66.249.66.1'
+GOOGLE_BOT_HOST = 'crawl-66-249-66-1.googlebot.com'
+
+
+class GoogleBotVerifierTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _create_verifier(self, **resolver_kwargs) -> GoogleBotVerifier:
+        resolver = FakeDnsResolver(ptr = {GOOGLE_BOT_IP: GOOGLE_BOT_HOST + '.',
+                                          '192.0.2.1':   GOOGLE_BOT_HOST,       # PTR の詐称
+                                          '192.0.2.2':   'example.com',},
+                                   a   = {GOOGLE_BOT_HOST: [GOOGLE_BOT_IP]},
+                                   **resolver_kwargs,)
+        verifier = GoogleBotVerifier(resolver=resolver)
+        self.addCleanup(verifier.shutdown)
+        return verifier
+
+    def _wait_verdict(self, verifier:GoogleBotVerifier, ip:str, timeout:float = 2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            verdict = verifier.get_verdict(ip)
+            if verdict is not None:
+                return verdict
+            time.sleep(0.01)
+        return None
+
+    def test_forward_confirmed(self):
+        """ 逆引きのホスト名を正引きして元の IP に戻る場合のみ googlebot """
+        verifier = self._create_verifier()
+        self.assertTrue(verifier.verify(GOOGLE_BOT_IP))
+        self.assertFalse(verifier.verify('192.0.2.1'))
+        self.assertFalse(verifier.verify('192.0.2.2'))
+        self.assertFalse(verifier.verify('192.0.2.3'))
+        self.assertEqual(verifier.resolver.forward_count, 2)
+
+    def test_background(self):
+        """ 判定が出るまでは None (リクエストの処理では待たない)、以降はキャッシュから返す """
+        verifier = self._create_verifier(delay=0.1)
+        start    = time.perf_counter()
+        verdicts = [verifier.get_verdict(GOOGLE_BOT_IP) for _ in range(10)]
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(verdicts, [None] * 10)
+        self.assertFalse(verifier.is_google_bot(GOOGLE_BOT_IP))
+        self.assertTrue(self._wait_verdict(verifier, GOOGLE_BOT_IP))
+        self.assertTrue(verifier.is_google_bot(GOOGLE_BOT_IP))
+        self.assertEqual(verifier.resolver.reverse_count, 1)
+
+    def test_timeout(self):
+        """ タイムアウトは googlebot でない (negative の期間はキャッシュ) """
+        verifier = self._create_verifier(delay=1.0, timeout_sec=0.05)
+        verifier.get_verdict(GOOGLE_BOT_IP)
+        self.assertIs(self._wait_verdict(verifier, GOOGLE_BOT_IP), False)
+        self.assertEqual(verifier.stats()['error'], 1)
+
+    def test_max_pending(self):
+        verifier             = self._create_verifier(delay=0.2)
+        verifier.max_pending = 2
+        for i in range(5):
+            verifier.get_verdict(f'192.0.2.{i}')
+        stats = verifier.stats()
+        self.assertEqual((stats['scheduled'], stats['skipped']), (2, 3))
+
+    def test_socket_resolver_timeout(self):
+        """ SocketDnsResolver は名前解決を待つ時間を区切る """
+        resolver = SocketDnsResolver(timeout_sec=0.05)
+        start    = time.perf_counter()
+        with self.assertRaises(OSError):
+            resolver.reverse('invalid ip')
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_socket_resolver_threads_bounded(self):
+        """ SocketDnsResolver は応答しない名前解決が続いてもスレッド数が上限を超えない """
+        release  = threading.Event()
+        resolver = SocketDnsResolver(timeout_sec=0.02, max_threads=2)
+        self.addCleanup(resolver.shutdown, wait=False)
+        self.addCleanup(release.set)
+        def _gethostbyaddr(ip):
+            release.wait()
+            return GOOGLE_BOT_HOST, [], [ip]
+        with mock.patch('socket.gethostbyaddr', side_effect=_gethostbyaddr):
+            for i in range(10):
+                with self.assertRaises(TimeoutError):
+                    resolver.reverse(f'192.0.2.{i}')
+            dns_threads = [thread for thread in threading.enumerate() if thread.name.startswith('GoogleBotDns')]
+            self.assertEqual(len(dns_threads), 2)
+            # 応答が戻ればスレッドは再利用される
+            release.set()
+            time.sleep(0.05)
+            self.assertEqual(resolver.reverse(GOOGLE_BOT_IP), GOOGLE_BOT_HOST)
@@ -0,0 +1 @@
+from .test import *
@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from apps.access_security.utils import (
+    IpRateLimiter,
+    IP_STATUS_PASS, IP_STATUS_BLOCK, IP_STATUS_COUNT,
+)
+
+
+class IpRateLimiterTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.limiter = IpRateLimiter(window_sec=5, block_timeout_sec=60, key_prefix='test_access_security')
+
+    def test_count(self):
+        """ ウィンドウ内の回数を IP ごとに数える """
+        counts = [self.limiter.hit('192.0.2.1', now=100.0 + i * 0.1)[1] for i in range(10)]
+        self.assertEqual(counts, list(range(1, 11)))
+        self.assertEqual(self.limiter.hit('192.0.2.2', now=101.0), (IP_STATUS_COUNT, 1))
+
+    def test_sliding_window(self):
+        """ 前回のウィンドウの回数は経過割合で減る (ウィンドウの境界でリセットされない) """
+        for _ in range(100):
+            self.limiter.hit('192.0.2.1', now=104.0)
+        # 前回 100 回 × 残り 80% + 今回 1 回
+        _, count = self.limiter.hit('192.0.2.1', now=106.0)
+        self.assertAlmostEqual(count, 81.0)
+        # 2 ウィンドウ後は数えない
+        _, count = self.limiter.hit('192.0.2.1', now=115.0)
+        self.assertEqual(count, 1)
+
+    def test_block_and_allow(self):
+        """ ブロック・パスは IP ごと (他の IP に影響しない) """
+        self.limiter.block('192.0.2.1')
+        self.limiter.allow('192.0.2.2')
+        self.assertEqual(self.limiter.hit('192.0.2.1'), (IP_STATUS_BLOCK, 0))
+        self.assertEqual(self.limiter.hit('192.0.2.2'), (IP_STATUS_PASS, 0))
+        self.assertEqual(self.limiter.hit('192.0.2.3')[0], IP_STATUS_COUNT)
+        self.assertTrue(self.limiter.is_blocked('192.0.2.1'))
+        self.assertFalse(self.limiter.is_blocked('192.0.2.3'))
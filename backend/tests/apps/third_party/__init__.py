@@ -0,0 +1 @@
+from .gcloud import *
\ No newline at end of file
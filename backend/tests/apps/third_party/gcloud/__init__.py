@@ -0,0 +1,4 @@
+from .speech_clients import *
+from .stt_preprocessor import *
+from .stt_session import *
+from .tts_pipeline import *
\ No newline at end of file
@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase
+import asyncio
+from google.cloud.speech_v1 import (
+    RecognitionConfig, StreamingRecognitionConfig, StreamingRecognizeRequest,
+)
+from apps.third_party.gcloud.stt_tts.utils import (
+    get_speech_async_client, get_tts_async_client,
+    get_speech_client_registry_stats, aclose_speech_async_clients,
+    SttSessionManager, TtsPipeline, TtsAudioCache,
+)
+from tests.common import FakeSpeechServer
+
+
+async def recognize(client, n_chunks:int = 3) -> list:
+    async def _request_generator():
+        yield StreamingRecognizeRequest(streaming_config=StreamingRecognitionConfig(
+                                            config          = RecognitionConfig(language_code='ja-JP'),
+                                            interim_results = True,))
+        for _ in range(n_chunks):
+            yield StreamingRecognizeRequest(audio_content=b'\x00' * 640)
+    results = []
+    async for response in await client.streaming_recognize(_request_generator()):
+        for result in response.results:
+            results.append((result.alternatives[0].transcript, result.is_final))
+    return results
+
+
+class SpeechClientRegistryTest(SimpleTestCase):
+
+    def test_pool(self):
+        """ [SPEECH] イベントループごとに pool_size 個まで作成し、以降は順に割り当てる """
+        async def _main():
+            server  = FakeSpeechServer()
+            await server.start()
+            clients = [get_speech_async_client(endpoint=server.endpoint, is_insecure=True, pool_size=2) for _ in range(5)]
+            tts     = get_tts_async_client(endpoint=server.endpoint, is_insecure=True, pool_size=2)
+            stats   = get_speech_client_registry_stats()
+            await aclose_speech_async_clients()
+            await server.stop()
+            return clients, tts, stats
+        clients, tts, stats = asyncio.run(_main())
+        self.assertEqual(len({id(client) for client in clients}), 2)
+        self.assertIs(clients[2], clients[0])
+        self.assertIs(clients[3], clients[1])
+        self.assertNotIn(tts, clients)
+        self.assertEqual(stats['channels'], 3)
+        self.assertEqual(stats['assigned'], 6)
+        # 閉じたイベントループのクライアントは残らない
+        self.assertEqual(get_speech_client_registry_stats()['channels'], 0)
+
+    def test_streaming_recognize(self):
+        """ [SPEECH] 多数のストリーミング認識を共有チャネルで同時に実行する """
+        async def _main():
+            server  = FakeSpeechServer(chunk_delay=0.005)
+            await server.start()
+            results = await asyncio.gather(*[
+                recognize(get_speech_async_client(endpoint=server.endpoint, is_insecure=True, pool_size=2))
+                for _ in range(30)
+            ])
+            await aclose_speech_async_clients()
+            await server.stop()
+            return server, results
+        server, results = asyncio.run(_main())
+        self.assertTrue(all(result == [('1回目', False), ('2回目', False), ('3回目', False), ('3回目', True)] for result in results))
+        self.assertEqual(server.stream_count, 30)
+        self.assertGreater(server.max_active_streams, 2)
+        self.assertLessEqual(len(server.peers), 2)
+
+    def test_tts(self):
+        """ [SPEECH] 共有の Text-to-Speech クライアントで合成する """
+        async def _main():
+            server   = FakeSpeechServer()
+            await server.start()
+            pipeline = TtsPipeline(client = get_tts_async_client(endpoint=server.endpoint, is_insecure=True),
+                                   cache  = TtsAudioCache(cache_dir=None),)
+            results  = [audio async for _, _, audio in pipeline.stream('こんにちは、元気ですか。今日は晴れですね。')]
+            await aclose_speech_async_clients()
+            await server.stop()
+            return results
+        self.assertEqual(asyncio.run(_main()),
+                         ['OggSこんにちは、元気ですか。'.encode('utf-8'), 'OggS今日は晴れですね。'.encode('utf-8')])
+
+
+class SttSessionManagerTest(SimpleTestCase):
+
+    def test_limit(self):
+        """ [SPEECH] 上限を超えるストリーミング認識は開始しない """
+        manager = SttSessionManager(max_sessions=2)
+        leases  = [manager.try_acquire(owner=f'channel{i}') for i in range(3)]
+        self.assertIsNone(leases[2])
+        self.assertEqual(manager.stats()['utilization'], 1.0)
+        leases[0].release()
+        leases[0].release() # 複数回呼んでも 1 回
+        self.assertIsNotNone(manager.try_acquire())
+        stats = manager.stats()
+        self.assertEqual((stats['active'], stats['peak'], stats['started'], stats['completed'], stats['rejected']),
+                         (2, 2, 3, 1, 1))
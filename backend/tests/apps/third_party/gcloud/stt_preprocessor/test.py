@@ -0,0 +1,132 @@
+from django.test import SimpleTestCase
+import numpy as np
+import struct
+from apps.third_party.gcloud.stt_tts.utils import (
+    SttAudioPreprocessor, LinearResampler, decode_audio_chunk, get_dbfs,
+)
+
+
+def make_wav(samples:np.ndarray, sample_rate:int = 16000, channels:int = 1) -> bytes:
+    """
+    RecordRTC (StereoAudioRecorder) の Blob と同じ PCM16 の WAV
+    """
+    data = np.asarray(samples, dtype='<i2').tobytes()
+    fmt  = struct.pack('<HHIIHH', 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16)
+    return (b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVE'
+            + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+            + b'data' + struct.pack('<I', len(data)) + data)
+
+def make_tone(ms:int, sample_rate:int = 16000, amplitude:float = 8000.0) -> np.ndarray:
+    t = np.arange(sample_rate * ms // 1000) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+
+def make_silence(ms:int, sample_rate:int = 16000) -> np.ndarray:
+    return np.zeros(sample_rate * ms // 1000, dtype=np.int16)
+
+def feed(preprocessor:SttAudioPreprocessor, samples:np.ndarray, sample_rate:int = 16000, slice_ms:int = 25):
+    """
+    timeSlice ごとの WAV にして渡し、(送信した LINEAR16 のリスト, 終了したチャンクの番号) を返す
+    """
+    step      = sample_rate * slice_ms // 1000
+    sent      = []
+    end_index = None
+    for i, start in enumerate(range(0, len(samples), step)):
+        audio_content, is_end = preprocessor.process(make_wav(samples[start:start+step], sample_rate))
+        if audio_content:
+            sent.append(audio_content)
+        if is_end and end_index is None:
+            end_index = i
+    return sent, end_index
+
+
+class DecodeAudioChunkTest(SimpleTestCase):
+
+    def test_wav_stereo(self):
+        stereo          = np.array([[1000, 3000], [-2000, -4000]], dtype=np.int16).reshape(-1)
+        samples, rate   = decode_audio_chunk(make_wav(stereo, sample_rate=48000, channels=2))
+        self.assertEqual(rate, 48000)
+        self.assertEqual(samples.tolist(), [2000.0, -3000.0])
+
+    def test_raw_linear16(self):
+        samples, rate = decode_audio_chunk(np.array([1, -1], dtype='<i2').tobytes(), default_sample_rate=8000)
+        self.assertEqual(rate, 8000)
+        self.assertEqual(samples.tolist(), [1.0, -1.0])
+
+    def test_dbfs(self):
+        self.assertLess(get_dbfs(make_silence(10).astype(np.float32)), -100.0)
+        self.assertAlmostEqual(get_dbfs(np.full(160, 32768.0, dtype=np.float32)), 0.0)
+
+
+class LinearResamplerTest(SimpleTestCase):
+
+    def test_continuous_across_chunks(self):
+        # 48k のランプを分割して変換しても 1 回で変換した場合と同じになる
+        ramp      = np.arange(4800, dtype=np.float32)
+        whole     = LinearResampler(16000).process(ramp, 48000)
+        resampler = LinearResampler(16000)
+        pieces    = np.concatenate([resampler.process(ramp[i:i+1200], 48000) for i in range(0, 4800, 1200)])
+        self.assertEqual(len(pieces), len(whole))
+        np.testing.assert_allclose(pieces, whole)
+        np.testing.assert_allclose(np.diff(pieces), 3.0)
+
+    def test_same_rate(self):
+        samples = np.arange(10, dtype=np.float32)
+        self.assertIs(LinearResampler(16000).process(samples, 16000), samples)
+
+
+class SttAudioPreprocessorTest(SimpleTestCase):
+
+    def test_coalesce(self):
+        # 25 ms のチャンクを 100 ms にまとめる
+        preprocessor = SttAudioPreprocessor(end_silence_ms=0)
+        sent, _      = feed(preprocessor, make_tone(1000))
+        self.assertEqual(len(sent), 10)
+        self.assertTrue(all(len(audio_content) == 1600 * 2 for audio_content in sent))
+
+    def test_resample(self):
+        preprocessor = SttAudioPreprocessor(end_silence_ms=0)
+        sent, _      = feed(preprocessor, make_tone(1000, sample_rate=48000), sample_rate=48000)
+        self.assertEqual(sum(len(audio_content) for audio_content in sent) // 2, 16000)
+
+    def test_silence_is_not_sent(self):
+        preprocessor  = SttAudioPreprocessor()
+        sent, end_idx = feed(preprocessor, make_silence(2000))
+        self.assertEqual(sent, [])
+        self.assertIsNone(end_idx)
+        self.assertEqual(preprocessor.flush(), b'')
+        self.assertEqual(preprocessor.stats()['dropped_ms'], 2000)
+
+    def test_preroll_hangover_and_end(self):
+        preprocessor  = SttAudioPreprocessor(preroll_ms=200, hangover_ms=300, end_silence_ms=800)
+        samples       = np.concatenate((make_silence(1000), make_tone(500), make_silence(1000)))
+        sent, end_idx = feed(preprocessor, samples)
+        # preroll 200 + 発話 500 + hangover 300
+        self.assertEqual(sum(len(audio_content) for audio_content in sent) // 2, 16000)
+        # 発話 (1000〜1500 ms) の後 800 ms の無音で終了する
+        self.assertEqual(end_idx, (1500 + 800) // 25 - 1)
+        stats = preprocessor.stats()
+        self.assertEqual(stats['utterances'], 1)
+        self.assertEqual(stats['sent_ms'], 1000)
+
+    def test_noise_floor(self):
+        # 無音区間の背景雑音 (約 -65 dBFS) を学習して閾値を上げる
+        preprocessor = SttAudioPreprocessor(threshold_dbfs=-60.0, noise_margin_db=10.0)
+        rng          = np.random.default_rng(0)
+        noise        = rng.normal(0, 18, 16000 * 2).astype(np.int16)
+        sent, _      = feed(preprocessor, noise)
+        self.assertEqual(sent, [])
+        self.assertGreater(preprocessor.threshold, -60.0)
+        # threshold_dbfs を超えても背景雑音 + noise_margin_db 以下の音 (約 -59 dBFS) は送らない
+        sent, _      = feed(preprocessor, noise[:1600] * 2)
+        self.assertEqual(sent, [])
+        sent, _      = feed(preprocessor, make_tone(300))
+        self.assertTrue(sent)
+
+    def test_flush(self):
+        # 発話中の端数は sttend で送り、状態は初期化する
+        preprocessor = SttAudioPreprocessor()
+        sent, _      = feed(preprocessor, make_tone(150))
+        self.assertEqual(sum(len(audio_content) for audio_content in sent) // 2, 1600)
+        self.assertEqual(len(preprocessor.flush()) // 2, 800)
+        self.assertFalse(preprocessor.is_speech)
+        self.assertEqual(preprocessor.flush(), b'')
@@ -0,0 +1,183 @@
+from django.test import SimpleTestCase
+import asyncio
+import json
+from apps.third_party.gcloud.stt_tts.consumers import ThirdPartyGcloudSttTtsConsumer
+from apps.third_party.gcloud.stt_tts.utils import (
+    get_speech_async_client, aclose_speech_async_clients, get_stt_session_manager,
+    SttSession, SttSessionManager,
+    STT_SESSION_IDLE, STT_SESSION_STREAMING, STT_SESSION_DRAINING, STT_SESSION_CLOSED,
+)
+from tests.apps.third_party.gcloud.stt_preprocessor.test import make_wav, make_tone, make_silence
+from tests.common import FakeSpeechServer
+
+
+async def consume(session:SttSession, received:list):
+    async for audio_content in session.iter_audio():
+        received.append(audio_content)
+
+def create_consumer(server:FakeSpeechServer):
+    """
+    connect (認証) を通さずに STT の部分だけ初期化する
+    """
+    consumer              = ThirdPartyGcloudSttTtsConsumer()
+    consumer.channel_name = 'test.stt'
+    consumer.stt_client   = get_speech_async_client(endpoint=server.endpoint, is_insecure=True)
+    consumer.sent         = []
+    async def _send(text_data=None, bytes_data=None, close=False):
+        consumer.sent.append(json.loads(text_data))
+    consumer.send = _send
+    consumer._init_stt()
+    return consumer
+
+async def send_utterance(consumer, samples, is_sttend:bool = True):
+    for start in range(0, len(samples), 400):
+        await consumer._handle_audio(make_wav(samples[start:start+400]))
+    if is_sttend:
+        await consumer._handle_audio(b'sttend')
+
+async def wait_sessions_closed(consumer, timeout:float = 3.0):
+    for _ in range(int(timeout / 0.01)):
+        if not consumer.stt_sessions:
+            return
+        await asyncio.sleep(0.01)
+
+
+class SttSessionTest(SimpleTestCase):
+
+    def test_transition(self):
+        async def _main():
+            manager  = SttSessionManager(max_sessions=1)
+            session  = SttSession(0, manager.try_acquire())
+            received = []
+            states   = [session.state]
+            session.start(consume(session, received))
+            states.append(session.state)
+            self.assertTrue(session.put_audio(b'a'))
+            self.assertTrue(session.drain())
+            states.append(session.state)
+            # draining 以降は音声を送らない
+            self.assertFalse(session.put_audio(b'b'))
+            self.assertFalse(session.drain())
+            await session.task
+            await session.aclose()
+            states.append(session.state)
+            with self.assertRaises(ValueError):
+                session.start(consume(session, received))
+            return states, received, manager.stats()
+        states, received, stats = asyncio.run(_main())
+        self.assertEqual(states, [STT_SESSION_IDLE, STT_SESSION_STREAMING, STT_SESSION_DRAINING, STT_SESSION_CLOSED])
+        self.assertEqual(received, [b'a'])
+        self.assertEqual((stats['active'], stats['completed']), (0, 1))
+
+    def test_deadline(self):
+        async def _main():
+            # streaming の最大時間 → draining
+            session = SttSession(0, max_sec=0.02, drain_timeout_sec=0.05)
+            session.start(asyncio.sleep(10))
+            await asyncio.sleep(0.03)
+            is_drained = session.state == STT_SESSION_DRAINING
+            # draining の期限切れ → 認識タスクをキャンセル
+            await asyncio.sleep(0.08)
+            is_cancelled = session.task.cancelled()
+            await session.aclose()
+            return is_drained, session.is_expired, is_cancelled, session._timer
+        is_drained, is_expired, is_cancelled, timer = asyncio.run(_main())
+        self.assertTrue(is_drained)
+        self.assertTrue(is_expired)
+        self.assertTrue(is_cancelled)
+        self.assertIsNone(timer)
+
+    def test_single_timer(self):
+        async def _main():
+            # タイマーは 1 つだけ (状態が変わると前の期限は取り消す)
+            session         = SttSession(0, max_sec=10, drain_timeout_sec=10)
+            session.start(asyncio.sleep(10))
+            streaming_timer = session._timer
+            session.drain()
+            draining_timer  = session._timer
+            await session.aclose()
+            return streaming_timer, draining_timer, session._timer
+        streaming_timer, draining_timer, timer = asyncio.run(_main())
+        self.assertTrue(streaming_timer.cancelled())
+        self.assertTrue(draining_timer.cancelled())
+        self.assertIsNot(streaming_timer, draining_timer)
+        self.assertIsNone(timer)
+
+    def test_close_idempotent(self):
+        async def _main():
+            manager = SttSessionManager(max_sessions=1)
+            session = SttSession(0, manager.try_acquire())
+            session.start(asyncio.sleep(10))
+            await session.aclose()
+            await session.aclose()
+            return session.close(), session.task.cancelled(), manager.stats()
+        is_closed, is_cancelled, stats = asyncio.run(_main())
+        self.assertFalse(is_closed)
+        self.assertTrue(is_cancelled)
+        self.assertEqual((stats['active'], stats['completed']), (0, 1))
+
+
+class SttConsumerSessionTest(SimpleTestCase):
+
+    def _run(self, main):
+        async def _main():
+            server = FakeSpeechServer()
+            await server.start()
+            try:
+                return await main(server)
+            finally:
+                await aclose_speech_async_clients()
+                await server.stop()
+        return asyncio.run(_main())
+
+    def test_rapid_cycles(self):
+        """ 発話の開始/終了を続けても is_end は発話ごとに 1 回で、セッションは全て閉じる """
+        n_cycles = 20
+        async def _main(server):
+            active   = get_stt_session_manager().stats()['active']
+            consumer = create_consumer(server)
+            for i in range(n_cycles):
+                # 発話 / 無音のみ / 音声なしを交互に
+                if i % 3 == 0:
+                    await send_utterance(consumer, make_tone(300))
+                elif i % 3 == 1:
+                    await send_utterance(consumer, make_silence(100))
+                else:
+                    await consumer._handle_audio(b'sttend')
+            await wait_sessions_closed(consumer)
+            return consumer, server, get_stt_session_manager().stats()['active'] - active
+        consumer, server, active = self._run(_main)
+        is_end_list = [message for message in consumer.sent if message['is_end']]
+        self.assertEqual(len(is_end_list), n_cycles)
+        self.assertEqual(server.stream_count, len(range(0, n_cycles, 3)))
+        self.assertEqual(consumer.stt_sessions, {})
+        self.assertIsNone(consumer.stt_session)
+        self.assertEqual(active, 0)
+
+    def test_auto_end(self):
+        """ 発話後の無音で終了した場合、後から届く b'sttend' では is_end を送らない """
+        async def _main(server):
+            consumer = create_consumer(server)
+            await send_utterance(consumer, make_tone(300), is_sttend=False)
+            await send_utterance(consumer, make_silence(1000), is_sttend=False)
+            await wait_sessions_closed(consumer)
+            await consumer._handle_audio(b'sttend')
+            return consumer
+        consumer = self._run(_main)
+        self.assertEqual([message['is_end'] for message in consumer.sent].count(True), 1)
+        self.assertTrue(any(message['is_final'] and message['transcript'] for message in consumer.sent))
+        self.assertEqual(consumer.stt_utterance_state, 'idle')
+
+    def test_cleanup(self):
+        """ 切断時は is_end を送らずに枠を返却する """
+        async def _main(server):
+            active   = get_stt_session_manager().stats()['active']
+            consumer = create_consumer(server)
+            await send_utterance(consumer, make_tone(300), is_sttend=False)
+            for session in list(consumer.stt_sessions.values()):
+                await consumer._cleanup_session(session)
+            return consumer, get_stt_session_manager().stats()['active'] - active
+        consumer, active = self._run(_main)
+        self.assertFalse(any(message['is_end'] for message in consumer.sent))
+        self.assertEqual(consumer.stt_sessions, {})
+        self.assertEqual(active, 0)
@@ -0,0 +1,183 @@
+from django.test import SimpleTestCase
+import asyncio
+import os
+import tempfile
+import time
+from apps.third_party.gcloud.stt_tts.utils import (
+    TtsAudioCache, TtsPipeline, make_tts_cache_key, split_tts_sentences,
+    encode_tts_audio_frame, decode_tts_audio_frame,
+)
+
+
+class FakeResponse:
+    def __init__(self, audio_content:bytes):
+        self.audio_content = audio_content
+
+class FakeTtsClient:
+    """
+    TextToSpeechAsyncClient の代わり (文字数に比例して合成に時間がかかる)
+    """
+    def __init__(self, sec_per_char:float = 0.002):
+        self.sec_per_char = sec_per_char
+        self.texts        = []
+        self.running      = 0
+        self.max_running  = 0
+
+    async def synthesize_speech(self, request:dict) -> FakeResponse:
+        text = request['input'].text
+        self.texts.append(text)
+        self.running    += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(len(text) * self.sec_per_char)
+        finally:
+            self.running -= 1
+        return FakeResponse(f'ogg:{text}'.encode('utf-8'))
+
+
+class SplitTtsSentencesTest(SimpleTestCase):
+
+    def test_split(self):
+        """ [TTS] 文末で分割し、短い文はまとめる """
+        self.assertEqual(split_tts_sentences('こんにちは。今日はいい天気ですね！散歩に行きましょうか？'),
+                         ['こんにちは。今日はいい天気ですね！', '散歩に行きましょうか？'])
+        self.assertEqual(split_tts_sentences('はい。そうです。わかりました。'), ['はい。そうです。わかりました。'])
+        self.assertEqual(split_tts_sentences('一行目のテキスト\n二行目のテキスト'), ['一行目のテキスト', '二行目のテキスト'])
+        self.assertEqual(split_tts_sentences(' \n'), [])
+
+    def test_split_long(self):
+        """ [TTS] max_chars を超える文は読点で分割し、テキストは失われない """
+        text      = 'とても長い文章です、' * 30 + '終わり。'
+        sentences = split_tts_sentences(text, max_chars=50)
+        self.assertTrue(all(len(sentence) <= 50 for sentence in sentences))
+        self.assertTrue(all(sentence.endswith('、') for sentence in sentences[:-1]))
+        self.assertEqual(''.join(sentences), text)
+
+
+class TtsAudioCacheTest(SimpleTestCase):
+
+    def test_key(self):
+        """ [TTS] キーはテキスト・音声・音声設定で変わる """
+        voice  = {'name': 'ja-JP-Neural2-B', 'language_code': 'ja-JP'}
+        config = {'audio_encoding': 'OGG_OPUS', 'speaking_rate': 1.0}
+        key    = make_tts_cache_key('こんにちは。', voice, config)
+        self.assertEqual(key, make_tts_cache_key('こんにちは。', dict(reversed(list(voice.items()))), config))
+        self.assertNotEqual(key, make_tts_cache_key('こんばんは。', voice, config))
+        self.assertNotEqual(key, make_tts_cache_key('こんにちは。', {**voice, 'name': 'ja-JP-Neural2-C'}, config))
+        self.assertNotEqual(key, make_tts_cache_key('こんにちは。', voice, {**config, 'speaking_rate': 1.2}))
+
+    def test_memory_lru(self):
+        """ [TTS] メモリは合計バイト数を上限に古いものから削除する """
+        async def _main():
+            cache = TtsAudioCache(memory_max_bytes=30, cache_dir=None)
+            for key in ['a', 'b', 'c']:
+                await cache.put(key, b'x' * 10)
+            await cache.get('a') # a を新しくする
+            await cache.put('d', b'x' * 10)
+            return [await cache.get(key) is not None for key in ['a', 'b', 'c', 'd']], cache.stats()
+        result, stats = asyncio.run(_main())
+        self.assertEqual(result, [True, False, True, True])
+        self.assertEqual(stats['memory_bytes'], 30)
+
+    def test_disk(self):
+        """ [TTS] ディスクに保存し、別のインスタンス (再起動後) でも使う. 上限を超えたら古いものから削除する """
+        async def _main(cache_dir:str):
+            cache = TtsAudioCache(cache_dir=cache_dir, disk_max_bytes=1000)
+            await cache.put('aa01', b'x' * 400)
+            await cache.put('bb02', b'y' * 400)
+            # 更新日時の順を確定させる
+            os.utime(cache._get_path('aa01'), (time.time() - 10, time.time() - 10))
+            cache = TtsAudioCache(cache_dir=cache_dir, disk_max_bytes=1000)
+            data  = await cache.get('bb02')
+            await cache.put('cc03', b'z' * 400)
+            cache = TtsAudioCache(cache_dir=cache_dir, disk_max_bytes=1000)
+            return data, cache.stats_dict['disk_hits'], [await cache.get(key) is not None for key in ['aa01', 'bb02', 'cc03']]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            data, disk_hits, result = asyncio.run(_main(cache_dir))
+        self.assertEqual(data, b'y' * 400)
+        self.assertEqual(disk_hits, 0)
+        self.assertEqual(result, [False, True, True])
+
+    def test_coalesce(self):
+        """ [TTS] 同じキーの合成中に要求された場合は合成を 1 回にする """
+        async def _main():
+            cache = TtsAudioCache(cache_dir=None)
+            calls = []
+            async def _create():
+                calls.append(True)
+                await asyncio.sleep(0.01)
+                return b'audio'
+            results = await asyncio.gather(*[cache.get_or_create('key', _create) for _ in range(5)])
+            return results, calls, cache.stats_dict['coalesced']
+        results, calls, coalesced = asyncio.run(_main())
+        self.assertEqual(results, [b'audio'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(coalesced, 4)
+
+    def test_coalesce_cancel(self):
+        """ [TTS] 合成していた側がキャンセルされた場合、待っていた側が改めて合成する """
+        async def _main():
+            cache = TtsAudioCache(cache_dir=None)
+            calls = []
+            async def _create():
+                calls.append(True)
+                await asyncio.sleep(0.02)
+                return b'audio'
+            first  = asyncio.create_task(cache.get_or_create('key', _create))
+            await asyncio.sleep(0.005)
+            second = asyncio.create_task(cache.get_or_create('key', _create))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            return await second, len(calls)
+        self.assertEqual(asyncio.run(_main()), (b'audio', 2))
+
+
+class TtsPipelineTest(SimpleTestCase):
+
+    def test_stream(self):
+        """ [TTS] 文の順に返し、先頭の文は全文の合成を待たずに返す """
+        text = '最初の短い文です。' + '二番目はとても長い文章になっていて合成に時間がかかります。' * 3 + '最後の文です。'
+        async def _main():
+            client   = FakeTtsClient()
+            pipeline = TtsPipeline(client=client, cache=TtsAudioCache(cache_dir=None), max_concurrency=2)
+            start    = time.perf_counter()
+            results  = []
+            async for index, count, audio_content in pipeline.stream(text):
+                results.append((index, count, audio_content, time.perf_counter() - start))
+            return client, results
+        client, results = asyncio.run(_main())
+        sentences = split_tts_sentences(text)
+        self.assertEqual([r[0] for r in results], list(range(len(sentences))))
+        self.assertEqual([r[2] for r in results], [f'ogg:{s}'.encode('utf-8') for s in sentences])
+        self.assertEqual(client.max_running, 2)
+        # 先頭の文は最も長い文の合成より先に届く
+        self.assertLess(results[0][3], max(len(s) for s in sentences) * client.sec_per_char)
+
+    def test_cache(self):
+        """ [TTS] 同じ文はキャッシュから返す """
+        async def _main():
+            client   = FakeTtsClient(sec_per_char=0)
+            pipeline = TtsPipeline(client=client, cache=TtsAudioCache(cache_dir=None))
+            first    = [audio async for _, _, audio in pipeline.stream('おはようございます。今日も一日頑張りましょう。')]
+            second   = [audio async for _, _, audio in pipeline.stream('おはようございます。')]
+            return client.texts, first, second
+        texts, first, second = asyncio.run(_main())
+        self.assertEqual(texts, ['おはようございます。', '今日も一日頑張りましょう。'])
+        self.assertEqual(second, first[:1])
+
+    def test_stream_cancel(self):
+        """ [TTS] 途中で止めた場合は残りの合成をキャンセルする """
+        async def _main():
+            client   = FakeTtsClient(sec_per_char=0.01)
+            pipeline = TtsPipeline(client=client, cache=TtsAudioCache(cache_dir=None), max_concurrency=3)
+            stream   = pipeline.stream('一番目の文です。二番目の文です。三番目の文です。')
+            await stream.__anext__()
+            await stream.aclose()
+            return client.running
+        self.assertEqual(asyncio.run(_main()), 0)
+
+    def test_frame(self):
+        """ [TTS] バイナリフレームのヘッダと音声を分離できる """
+        header = {'cmd': 'tts', 'ok': True, 'requestId': 3, 'index': 0, 'count': 2}
+        frame  = encode_tts_audio_frame(header, b'OggS\x00\x01')
+        self.assertEqual(decode_tts_audio_frame(frame), (header, b'OggS\x00\x01'))
@@ -0,0 +1 @@
+from .task_supervisor import *
\ No newline at end of file
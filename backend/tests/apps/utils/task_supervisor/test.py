@@ -0,0 +1,109 @@
+from django.test import SimpleTestCase
+import asyncio
+from apps.utils import TaskSupervisor, get_task_supervisor_stats
+
+
+class TaskSupervisorTest(SimpleTestCase):
+
+    def test_concurrency_limit(self):
+        """ [TASK] 同時に実行するタスクが max_concurrency を超えないこと """
+        async def _main():
+            supervisor = TaskSupervisor(max_concurrency=2, max_pending=10)
+            running    = 0
+            max_running = 0
+            async def _work():
+                nonlocal running, max_running
+                running    += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running    -= 1
+            for _ in range(6):
+                self.assertTrue(supervisor.submit(_work))
+            while supervisor.pending:
+                await asyncio.sleep(0.005)
+            return max_running, supervisor.stats()
+        max_running, stats = asyncio.run(_main())
+        self.assertEqual(max_running, 2)
+        self.assertEqual(stats['completed'], 6)
+        self.assertEqual(stats['max_pending'], 6)
+
+    def test_ordered_by_key(self):
+        """ [TASK] 同じ key のタスクは受信順に 1 つずつ実行すること """
+        async def _main():
+            supervisor = TaskSupervisor(max_concurrency=4, max_pending=10)
+            events     = []
+            async def _work(i:int, delay:float):
+                events.append(('start', i))
+                await asyncio.sleep(delay)
+                events.append(('end', i))
+            for i, delay in enumerate([0.03, 0.01, 0.0]):
+                supervisor.submit(_work, i, delay, key='room')
+            while supervisor.pending:
+                await asyncio.sleep(0.005)
+            return events
+        self.assertEqual(asyncio.run(_main()),
+                         [('start', 0), ('end', 0), ('start', 1), ('end', 1), ('start', 2), ('end', 2)])
+
+    def test_backpressure(self):
+        """ [TASK] 実行中 + 待機中が max_pending に達したら受け付けないこと """
+        async def _main():
+            supervisor = TaskSupervisor(max_concurrency=1, max_pending=2)
+            gate       = asyncio.Event()
+            results    = [supervisor.submit(gate.wait, key='room') for _ in range(3)]
+            depth      = supervisor.queue_depth
+            gate.set()
+            while supervisor.pending:
+                await asyncio.sleep(0.005)
+            # 処理が終われば再び受け付ける
+            results.append(supervisor.submit(gate.wait))
+            await supervisor.close()
+            return results, depth, supervisor.stats()
+        results, depth, stats = asyncio.run(_main())
+        self.assertEqual(results, [True, True, False, True])
+        self.assertEqual(depth, 2)
+        self.assertEqual(stats['dropped'], 1)
+
+    def test_close_cancels_tasks(self):
+        """ [TASK] close で実行中/待機中のタスクをキャンセルし、finally を実行すること """
+        async def _main():
+            supervisor = TaskSupervisor(max_concurrency=1, max_pending=10)
+            closed     = []
+            async def _stream(i:int):
+                try:
+                    await asyncio.sleep(10)
+                finally:
+                    # LLM のストリームを閉じる処理に相当
+                    closed.append(i)
+            for i in range(3):
+                supervisor.submit(_stream, i, key='room')
+            supervisor.submit(_stream, 3)
+            await asyncio.sleep(0.01)
+            before = get_task_supervisor_stats()['cancelled']
+            await supervisor.close()
+            after  = get_task_supervisor_stats()['cancelled']
+            return closed, supervisor.stats(), after - before, supervisor.submit(_stream, 4)
+        closed, stats, cancelled, is_submitted = asyncio.run(_main())
+        # 開始済みの 0 のみ finally が実行される (3 は同時実行数の空き待ち)
+        self.assertEqual(closed, [0])
+        self.assertEqual(stats['cancelled'], 4)
+        self.assertEqual(cancelled, 4)
+        self.assertEqual(stats['pending'], 0)
+        self.assertFalse(is_submitted)
+
+    def test_failed_task(self):
+        """ [TASK] 例外は失敗として数え、後続のタスクを止めないこと """
+        async def _main():
+            supervisor = TaskSupervisor(max_concurrency=1, max_pending=10)
+            done       = []
+            async def _fail():
+                raise ValueError('test')
+            async def _ok():
+                done.append(True)
+            supervisor.submit(_fail, key='room')
+            supervisor.submit(_ok, key='room')
+            while supervisor.pending:
+                await asyncio.sleep(0.005)
+            return done, supervisor.stats()
+        done, stats = asyncio.run(_main())
+        self.assertEqual(done, [True])
+        self.assertEqual((stats['failed'], stats['completed']), (1, 1))
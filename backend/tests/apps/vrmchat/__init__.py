@@ -0,0 +1,8 @@
+from .room_context import *
+from .context_builder import *
+from .frame_codec import *
+from .presence import *
+from .connection_auth import *
+from .query_plan import *
+from .stream_response import *
+from .rate_limiter import *
\ No newline at end of file
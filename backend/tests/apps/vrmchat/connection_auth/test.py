@@ -0,0 +1,73 @@
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from apps.vrmchat.models import Room, Message
+from apps.vrmchat.settings import DEFAULT_ROOM_NAME
+from apps.vrmchat.utils import (
+    sync_authorize_connection, authorize_connection,
+    acquire_room_context, release_room_context,
+)
+from tests.common import create_test_user
+
+
+def get_select_sql_list(context) -> list:
+    return [q['sql'] for q in context.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+
+
+class ConnectionAuthorizerTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user, _, _       = create_test_user()
+        self.other_user, _, _ = create_test_user(email='otheruser@example.com')
+        self.room             = Room.objects.create(create_user=self.user)
+        Message.objects.create(room_id      = self.room,
+                               user_message = 'user0',
+                               llm_response = 'llm0',)
+
+    def _authorize(self, user_id, room_id):
+        with CaptureQueriesContext(connection) as context:
+            connection_auth = async_to_sync(sync_authorize_connection)(user_id, room_id)
+        return connection_auth, get_select_sql_list(context)
+
+    def test_authorize(self):
+        """ [ConnectionAuthorizer] ユーザ・ルーム・ルーム設定を 1 クエリで取得すること """
+        connection_auth, sql_list = self._authorize(self.user.pk, self.room.room_id)
+        self.assertEqual(len(sql_list), 1)
+        self.assertEqual(connection_auth.user, self.user)
+        self.assertEqual((connection_auth.room_id, connection_auth.room_pk), (self.room.room_id, self.room.pk))
+        self.assertEqual(connection_auth.room_name, DEFAULT_ROOM_NAME)
+        self.assertEqual(connection_auth.settings['history_len'], 1)
+
+    def test_reject(self):
+        """ [ConnectionAuthorizer] ルームの作成者でない / 無効なルーム / 無効なユーザは拒否すること """
+        self.assertIsNone(self._authorize(self.other_user.pk, self.room.room_id)[0])
+        self.assertIsNone(self._authorize(self.user.pk, 'not-exist-room')[0])
+        Room.objects.filter(pk=self.room.pk).update(is_active=False)
+        self.assertIsNone(self._authorize(self.user.pk, self.room.room_id)[0])
+        Room.objects.filter(pk=self.room.pk).update(is_active=True)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self._authorize(self.user.pk, self.room.room_id)[0])
+
+    def test_no_session(self):
+        """ [ConnectionAuthorizer] セッション Cookie がない場合は DB にアクセスしないこと """
+        with CaptureQueriesContext(connection) as context:
+            connection_auth = async_to_sync(authorize_connection)({}, self.room.room_id)
+        self.assertIsNone(connection_auth)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_room_context_reuse(self):
+        """ [ConnectionAuthorizer] RoomContext の読み込みではルーム設定を読み直さないこと """
+        connection_auth, _ = self._authorize(self.user.pk, self.room.room_id)
+        try:
+            with CaptureQueriesContext(connection) as context:
+                room_context = async_to_sync(acquire_room_context)(self.room.room_id,
+                                                                   connection_auth.room_settings_model_object)
+            sql_list = get_select_sql_list(context)
+            self.assertEqual(len(sql_list), 1)
+            self.assertIn('vrmchat_message_model', sql_list[0])
+            self.assertEqual(room_context.room_pk, self.room.pk)
+            self.assertEqual([h['content'] for h in room_context.get_history(1)[0]], ['user0', 'llm0'])
+        finally:
+            release_room_context(self.room.room_id)
@@ -0,0 +1,106 @@
+from django.test import SimpleTestCase
+from unittest import mock
+import asyncio
+import tiktoken
+from common.scripts.LlmUtils import TokenizerService
+from apps.vrmchat.settings import HISTORY_SUMMARY_MAX_CHARS
+from apps.vrmchat.utils import build_context, schedule_history_summary
+from apps.vrmchat.utils.RoomContextCache import RoomContext
+
+
+def _byte_encoding_loader(model_name=None):
+    return tiktoken.Encoding(name            = 'test_bytes',
+                             pat_str         = r"""\S+|\s+""",
+                             mergeable_ranks = {bytes([i]): i for i in range(256)},
+                             special_tokens  = {},)
+
+class _FakeLlm:
+    def __init__(self):
+        self.call_count = 0
+        self.messages   = None
+    async def async_get_response(self, messages):
+        self.call_count += 1
+        self.messages    = messages
+        await asyncio.sleep(0.01)
+        return 'summary'
+
+
+class ContextBuilderTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tokenizer    = TokenizerService(encoding_loader=_byte_encoding_loader)
+        # 1 ターン = 10 トークン ('uuuuu' + 'aaaaa')
+        self.room_context = RoomContext(room_id       = 'room',
+                                        room_pk       = 1,
+                                        room_name     = 'room',
+                                        settings      = {},
+                                        history_turns = [(f'm{i}', f'u{i:04d}', f'a{i:04d}') for i in range(10)],)
+
+    def _data_dict(self, history_len:int = 10, max_tokens:int = 8000, user_message:str = 'hello'):
+        return {
+            'user_message':       user_message,
+            'system_sentence':    None,
+            'assistant_sentence': None,
+            'history_len':        history_len,
+            'model_name':         'gpt-4',  # コンテキスト長 8192
+            'max_tokens':         max_tokens,
+        }
+
+    def test_pack_newest_first(self):
+        """ [CONTEXT] 予算(コンテキスト長 - max_tokens)に収まる新しいターンだけを送ること """
+        # 予算 192 - user_message 5 = 187 → 全 10 ターン (100) が収まる
+        built_context = build_context(self.room_context, self._data_dict(), self.tokenizer, is_summary_enabled=False)
+        self.assertEqual(len(built_context.history_list), 20)
+        self.assertEqual(built_context.sent_tokens, 105)
+        # 予算 42 - 5 = 37 → 新しい 3 ターン
+        built_context = build_context(self.room_context, self._data_dict(max_tokens=8150), self.tokenizer, is_summary_enabled=False)
+        self.assertEqual([h['content'] for h in built_context.history_list][::2], ['u0007', 'u0008', 'u0009'])
+        self.assertEqual([turn.message_id for turn in built_context.dropped_turns], [f'm{i}' for i in range(7)])
+        self.assertFalse(built_context.is_over_budget)
+
+    def test_history_len_upper_bound(self):
+        """ [CONTEXT] history_len を超えて履歴を含めないこと """
+        built_context = build_context(self.room_context, self._data_dict(history_len=2), self.tokenizer, is_summary_enabled=False)
+        self.assertEqual(len(built_context.history_list), 4)
+        self.assertEqual(built_context.dropped_turns, [])
+
+    def test_over_budget(self):
+        """ [CONTEXT] 履歴なしでも予算を超える場合のみ is_over_budget になること """
+        built_context = build_context(self.room_context, self._data_dict(max_tokens=8150, user_message='x'*50), self.tokenizer)
+        self.assertTrue(built_context.is_over_budget)
+        self.assertEqual(built_context.history_list, [])
+
+    def test_turn_tokens_cached(self):
+        """ [CONTEXT] ターンのトークン数を保持し再エンコードしないこと """
+        build_context(self.room_context, self._data_dict(), self.tokenizer)
+        turn_texts = {text for turn in self.room_context.history for text in (turn.user_message, turn.llm_response)}
+        with mock.patch.object(self.tokenizer, 'count_batch', wraps=self.tokenizer.count_batch) as count_batch:
+            build_context(self.room_context, self._data_dict(), self.tokenizer)
+        encoded_texts = {text for call in count_batch.call_args_list for text in call.args[0]}
+        self.assertFalse(encoded_texts & turn_texts)
+        self.assertEqual(self.room_context.history[0].tokens['gpt-4'], 10)
+
+    def test_summary(self):
+        """ [CONTEXT] 収まらなかったターンの要約を 1 回だけ作成し、次のターンで先頭に付けること """
+        llm       = _FakeLlm()
+        data_dict = self._data_dict(max_tokens=8100) # 予算 92 - 5 = 87 → 8 ターン
+        built_context = build_context(self.room_context, data_dict, self.tokenizer, is_summary_enabled=True)
+        self.assertFalse(built_context.is_summary_used)
+
+        async def _main():
+            self.assertTrue(schedule_history_summary(self.room_context, built_context.dropped_turns, llm, 'gpt-4', self.tokenizer))
+            # 作成中は重複して作成しない
+            self.assertFalse(schedule_history_summary(self.room_context, built_context.dropped_turns, llm, 'gpt-4', self.tokenizer))
+            await asyncio.sleep(0.05)
+        asyncio.run(_main())
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual(self.room_context.summary, ('m1', 'summary'))
+        # 要約の長さは文字数で指示する (トークン数ではない)
+        self.assertIn(f'{HISTORY_SUMMARY_MAX_CHARS}文字', llm.messages[0]['content'])
+
+        built_context = build_context(self.room_context, data_dict, self.tokenizer, is_summary_enabled=True)
+        self.assertTrue(built_context.is_summary_used)
+        self.assertTrue(built_context.history_list[0]['content'].endswith('summary'))
+        # 要約が収まるよう古いターンを外していること
+        self.assertLess(len(built_context.history_list) - 2, 16)
+        self.assertLessEqual(built_context.sent_tokens, built_context.budget_tokens)
@@ -0,0 +1,71 @@
+from django.test import SimpleTestCase
+from unittest import mock
+import brotli
+from apps.vrmchat.utils.FrameCodec import (
+    FrameCodec, BrotliFrameCodec,
+    json_dumps, json_loads, negotiate_frame_codec,
+)
+
+
+def create_chunk_message(index:int, delta:str = 'こんにちは。今日はいい天気ですね。' * 10) -> dict:
+    return {
+        'cmd':    'SendUserMessageChunk',
+        'status': 200,
+        'ok':     True,
+        'data': {
+            'messageId': 'a' * 32,
+            'index':     index,
+            'delta':     delta,
+        },
+    }
+
+
+class FrameCodecTest(SimpleTestCase):
+
+    def test_json_fallback(self):
+        """ [FRAME] orjson が扱えない型は json で処理すること """
+        self.assertEqual(json_loads(json_dumps({'message': 'テスト', 'n': 1})), {'message': 'テスト', 'n': 1})
+        self.assertEqual(json_loads(json_dumps({1: 'a'})), {'1': 'a'})
+        self.assertEqual(json_loads(json_dumps({'n': 2**70})), {'n': 2**70})
+
+    def test_small_frame_is_text(self):
+        """ [FRAME] SOCKET_COMPRESS_MIN_BYTES 未満のフレームは圧縮しないこと """
+        message = {'cmd': 'ping'}
+        for codec in (FrameCodec(), BrotliFrameCodec()):
+            text_data, bytes_data = codec.encode(message)
+            self.assertIsNone(bytes_data)
+            self.assertEqual(json_loads(text_data), message)
+
+    def test_brotli_frame(self):
+        """ [FRAME] br はフレームごとに brotli.decompress で展開できること """
+        message               = create_chunk_message(0)
+        text_data, bytes_data = BrotliFrameCodec().encode(message)
+        self.assertIsNone(text_data)
+        self.assertEqual(json_loads(brotli.decompress(bytes_data)), message)
+
+    def test_negotiate(self):
+        """ [FRAME] 提示された subprotocol から優先順に選択し、提示がない場合は br (従来) とすること """
+        cases = [
+            (None, 'br', None),
+            ([], 'br', None),
+            (['unknown'], 'br', None),
+            # フレーム間で状態を持つコーデックは扱わない
+            (['vrmchat.br-stream', 'vrmchat.zstd'], 'br', None),
+            (['vrmchat.none', 'vrmchat.br'], 'br', 'vrmchat.br'),
+            (['vrmchat.none'], 'none', 'vrmchat.none'),
+        ]
+        for subprotocols, codec_name, expected_subprotocol in cases:
+            codec, subprotocol = negotiate_frame_codec(subprotocols)
+            self.assertEqual(codec.name, codec_name)
+            self.assertEqual(subprotocol, expected_subprotocol)
+
+    def test_negotiate_codec_error(self):
+        """ [FRAME] コーデックの作成に失敗した場合はログに残して br とすること """
+        class _BrokenFrameCodec(FrameCodec):
+            def __init__(self, **kwargs):
+                raise RuntimeError('broken codec')
+        with mock.patch.dict('apps.vrmchat.utils.FrameCodec.FRAME_CODEC_CLASS_DICT', {'none': _BrokenFrameCodec}):
+            with self.assertLogs('apps.vrmchat.utils.FrameCodec', level='ERROR') as logs:
+                codec, subprotocol = negotiate_frame_codec(['vrmchat.none'])
+        self.assertEqual((codec.name, subprotocol), ('br', None))
+        self.assertIn('broken codec', '\n'.join(logs.output))
@@ -0,0 +1,130 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TransactionTestCase
+import asyncio
+import time
+from apps.utils import get_async_redis, TaskSupervisor
+from apps.vrmchat.consumers import VrmchatConsumer
+from apps.vrmchat.models import Room, SocketAccess
+from apps.vrmchat.settings import PRESENCE_HEARTBEAT_SEC
+from apps.vrmchat.utils import PresenceMember, presence_delta, schedule_presence_audit
+from apps.vrmchat.utils.PresenceRegistry import InMemoryPresenceRegistry, RedisPresenceRegistry
+from tests.common import create_test_user
+
+
+class PresenceRegistryTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user, _, _ = create_test_user()
+        self.room       = Room.objects.create(create_user=self.user)
+        self.room_id    = str(self.room.room_id)
+
+    def _check_registry(self, registry):
+        """
+        join / heartbeat / leave と期限切れの削除 (ttl_sec=0.2 のレジストリ)
+        """
+        async def _main():
+            member_a = PresenceMember.create('channel_a', self.user)
+            member_b = PresenceMember.create('channel_b')
+            members, expired = await registry.join(self.room_id, member_a)
+            self.assertEqual([m.access_id for m in members], [member_a.access_id])
+            self.assertEqual(expired, [])
+            members, _ = await registry.join(self.room_id, member_b)
+            # 参加順
+            self.assertEqual([m.access_id for m in members], [member_a.access_id, member_b.access_id])
+            self.assertEqual((await registry.get_member(self.room_id, member_a.access_id)).user_id, self.user.pk)
+
+            # b だけハートビートを続け、a は期限切れになる
+            await asyncio.sleep(0.12)
+            self.assertEqual(await registry.heartbeat(self.room_id, member_b.access_id), (True, []))
+            await asyncio.sleep(0.12)
+            is_member, expired = await registry.heartbeat(self.room_id, member_b.access_id)
+            self.assertTrue(is_member)
+            self.assertEqual([m.access_id for m in expired], [member_a.access_id])
+            # 期限切れのメンバーは 1 回だけ返す / ハートビートは False (join し直す)
+            self.assertEqual(await registry.heartbeat(self.room_id, member_a.access_id), (False, []))
+
+            left_member = await registry.leave(self.room_id, member_b.access_id)
+            self.assertEqual(left_member.channel_name, 'channel_b')
+            self.assertIsNone(await registry.leave(self.room_id, member_b.access_id))
+            self.assertEqual(await registry.get_members(self.room_id), ([], []))
+        async_to_sync(_main)()
+
+    def test_in_memory_registry(self):
+        """ [PRESENCE] InMemoryPresenceRegistry """
+        self._check_registry(InMemoryPresenceRegistry(ttl_sec=0.2))
+
+    def test_redis_registry(self):
+        """ [PRESENCE] RedisPresenceRegistry (Redis に接続できない場合はスキップ) """
+        async def _ping():
+            try:
+                return await get_async_redis().ping()
+            except Exception:
+                return False
+        if not async_to_sync(_ping)():
+            self.skipTest('redis unavailable')
+        self._check_registry(RedisPresenceRegistry(ttl_sec=0.2))
+
+    def test_presence_delta(self):
+        """ [PRESENCE] 差分には access_id と user_name だけを含めること """
+        member = PresenceMember.create('channel_a', self.user)
+        self.assertEqual(presence_delta(joined=[member]),
+                         {'joined': [{'access_id': member.access_id, 'user_name': member.user_name}], 'left': []})
+        self.assertEqual(presence_delta(left=[member])['joined'], [])
+        self.assertEqual(presence_delta(), {'joined': [], 'left': []})
+
+    def test_audit_log(self):
+        """ [PRESENCE] PRESENCE_AUDIT_LOG が有効な場合のみ SocketAccess に記録すること """
+        from apps.vrmchat.utils.PresenceRegistry import _background_tasks
+        member = PresenceMember.create('channel_a', self.user)
+        async def _main(is_join:bool, is_enabled:bool):
+            schedule_presence_audit(self.room_id, member, is_join=is_join, is_enabled=is_enabled)
+            await asyncio.gather(*_background_tasks)
+
+        async_to_sync(_main)(True, False)
+        self.assertFalse(SocketAccess.objects.exists())
+        async_to_sync(_main)(True, True)
+        self.assertEqual(SocketAccess.objects.get(access_id=member.access_id).channel_name, 'channel_a')
+        async_to_sync(_main)(False, True)
+        self.assertFalse(SocketAccess.objects.exists())
+
+
+class _SlowHeartbeatRegistry(InMemoryPresenceRegistry):
+    """
+    heartbeat の呼び出し回数を数え、release されるまで完了しない
+    """
+    def __init__(self):
+        super().__init__()
+        self.heartbeat_count = 0
+        self.release         = asyncio.Event()
+
+    async def heartbeat(self, room_id, access_id):
+        self.heartbeat_count += 1
+        await self.release.wait()
+        return True, []
+
+
+class PresenceHeartbeatTest(SimpleTestCase):
+
+    def test_ping_outside_task_supervisor(self):
+        """ [PRESENCE] ping のハートビートは task_supervisor を使わず、処理中は重複して実行しないこと """
+        async def _main():
+            consumer                           = VrmchatConsumer()
+            consumer.room_id                   = 'room'
+            consumer.is_frame_codec_negotiated = False
+            consumer.task_supervisor           = TaskSupervisor(max_concurrency=1, max_pending=1)
+            consumer.presence_registry         = _SlowHeartbeatRegistry()
+            consumer.presence_member           = PresenceMember.create('channel_a')
+            consumer.presence_heartbeat_time   = asyncio.get_running_loop().time() - PRESENCE_HEARTBEAT_SEC
+            for _ in range(3):
+                await consumer.receive(text_data='{"cmd": "ping"}')
+            await asyncio.sleep(0)
+            self.assertEqual(consumer.presence_registry.heartbeat_count, 1)
+            self.assertEqual(consumer.task_supervisor.stats()['submitted'], 0)
+            self.assertEqual(consumer.task_supervisor.stats()['dropped'], 0)
+            consumer.presence_registry.release.set()
+            await consumer.presence_heartbeat_task
+            # PRESENCE_HEARTBEAT_SEC 以内の ping はタスクを作成しない
+            await consumer.receive(text_data='{"cmd": "ping"}')
+            self.assertTrue(consumer.presence_heartbeat_task.done())
+            self.assertEqual(consumer.presence_registry.heartbeat_count, 1)
+        async_to_sync(_main)()
@@ -0,0 +1 @@
+from .test import *
\ No newline at end of file
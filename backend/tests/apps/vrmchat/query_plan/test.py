@@ -0,0 +1,134 @@
+import re
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from apps.vrmchat.models import Room, RoomSettings, Message, SocketAccess
+from apps.vrmchat.settings import MAX_HISSTORY_N
+
+User = get_user_model()
+
+SEED_USERS              = 1000
+SEED_ROOMS_PER_USER     = 10
+SEED_MESSAGES_PER_ROOM  = 10   # 1000 * 10 * 10 = 100k
+SEED_LONG_ROOM_MESSAGES = 1000 # 会話履歴を確認するルーム (LIMIT より十分多い件数)
+SEED_SOCKET_ACCESSES    = 10000
+SEED_BATCH_SIZE         = 5000
+
+ROOM_TABLE          = Room._meta.db_table
+ROOM_SETTINGS_TABLE = RoomSettings._meta.db_table
+MESSAGE_TABLE       = Message._meta.db_table
+SOCKET_ACCESS_TABLE = SocketAccess._meta.db_table
+USER_TABLE          = User._meta.db_table
+
+
+def get_full_scan_tables(plan:str) -> set:
+    """
+    実行計画で全件を走査しているテーブル
+        - sqlite:     SCAN <table> (USING COVERING INDEX も全件走査)
+        - postgresql: Seq Scan on <table>
+    """
+    if connection.vendor == 'sqlite':
+        pattern = r'\bSCAN (?:TABLE )?"?(\w+)'
+    else:
+        pattern = r'\bSeq Scan on "?(\w+)'
+    return set(re.findall(pattern, plan))
+
+def has_sort(plan:str) -> bool:
+    if connection.vendor == 'sqlite':
+        return 'USE TEMP B-TREE FOR ORDER BY' in plan
+    return re.search(r'(?:^|->)\s*(?:Incremental )?Sort\b', plan, re.MULTILINE) is not None
+
+
+class HotQueryPlanTest(TestCase):
+    """
+    シードしたデータ (メッセージ 100k 件) で頻繁に実行されるクエリの実行計画を確認する
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return
+        User.objects.bulk_create([User(unique_account_id = f'queryplan-user-{i}',
+                                       email             = f'queryplan{i}@example.com',
+                                       is_active         = True,
+                                       password          = '!',)
+                                  for i in range(SEED_USERS)],
+                                 batch_size = SEED_BATCH_SIZE,)
+        users = list(User.objects.filter(unique_account_id__startswith='queryplan-user-'))
+        # 実際の書き込みと同様に、ルーム・メッセージはユーザ/ルームをまたいで時系列に作成する
+        # (ルームごとに連続して作成すると room_id の相関が高くなり、プランナの選択が実運用と変わる)
+        # bulk_create は post_save (RoomSettings の作成) を実行しないため RoomSettings も作成する
+        Room.objects.bulk_create([Room(create_user = user,
+                                       room_id     = f'queryplan-room-{user.pk}-{i}',
+                                       is_active   = i % 10 != 0,)
+                                  for i in range(SEED_ROOMS_PER_USER) for user in users],
+                                 batch_size = SEED_BATCH_SIZE,)
+        rooms = list(Room.objects.filter(room_id__startswith='queryplan-room-'))
+        RoomSettings.objects.bulk_create([RoomSettings(room_id=room) for room in rooms],
+                                         batch_size = SEED_BATCH_SIZE,)
+        Message.objects.bulk_create([Message(room_id      = room,
+                                             message_id   = f'queryplan-message-{room.pk}-{i}',
+                                             user_message = 'user',
+                                             llm_response = 'llm',
+                                             is_active    = i % 10 != 0,)
+                                     for i in range(SEED_MESSAGES_PER_ROOM) for room in rooms],
+                                    batch_size = SEED_BATCH_SIZE,)
+        # 会話が長く続いているルーム (直近 N 件のみをインデックスの順に読むこと)
+        cls.long_room = next(room for room in rooms if room.is_active)
+        Message.objects.bulk_create([Message(room_id      = cls.long_room,
+                                             message_id   = f'queryplan-long-message-{i}',
+                                             user_message = 'user',
+                                             llm_response = 'llm',)
+                                     for i in range(SEED_LONG_ROOM_MESSAGES)],
+                                    batch_size = SEED_BATCH_SIZE,)
+        SocketAccess.objects.bulk_create([SocketAccess(room_id      = rooms[i % len(rooms)],
+                                                       access_id    = f'queryplan-access-{i}',
+                                                       channel_name = f'queryplan-channel-{i}',)
+                                          for i in range(SEED_SOCKET_ACCESSES)],
+                                         batch_size = SEED_BATCH_SIZE,)
+        # 統計情報を更新する (シード直後はプランナがテーブルの件数を知らない)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[0]
+        cls.room = cls.long_room
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'query plan is not checked on {connection.vendor}')
+
+    def assertNoFullScan(self, queryset, tables:set):
+        plan = queryset.explain()
+        self.assertFalse(get_full_scan_tables(plan) & tables, plan)
+        return plan
+
+    def test_seed(self):
+        self.assertEqual(Message.objects.count(), SEED_USERS * SEED_ROOMS_PER_USER * SEED_MESSAGES_PER_ROOM + SEED_LONG_ROOM_MESSAGES)
+
+    def test_room_context_history(self):
+        """ [QueryPlan] 会話履歴 (RoomContext の読み込み) をインデックスからソートせずに取得すること """
+        queryset = Message.objects.filter(room_id   = self.long_room,
+                                          is_active = True,
+                                         ).order_by('-date_create')\
+                                          .values_list('message_id', 'user_message', 'llm_response')[:MAX_HISSTORY_N]
+        plan = self.assertNoFullScan(queryset, {MESSAGE_TABLE})
+        self.assertFalse(has_sort(plan), plan)
+
+    def test_room_name_list(self):
+        """ [QueryPlan] ルーム一覧 (RoomSettingsRoomNameListViewSet) """
+        queryset = RoomSettings.objects.filter(room_id__create_user = self.user,
+                                               room_id__is_active   = True,)
+        self.assertNoFullScan(queryset, {ROOM_TABLE, ROOM_SETTINGS_TABLE})
+
+    def test_connection_authorization(self):
+        """ [QueryPlan] WebSocket 接続時の認可 (ConnectionAuthorizer) """
+        queryset = RoomSettings.objects.select_related('room_id', 'room_id__create_user')\
+                                       .filter(room_id__room_id               = self.room.room_id,
+                                               room_id__is_active              = True,
+                                               room_id__create_user            = self.room.create_user_id,
+                                               room_id__create_user__is_active = True,)
+        self.assertNoFullScan(queryset, {ROOM_TABLE, ROOM_SETTINGS_TABLE, USER_TABLE})
+
+    def test_socket_access(self):
+        """ [QueryPlan] SocketAccess (channel_name / access_id) """
+        self.assertNoFullScan(SocketAccess.objects.filter(channel_name='queryplan-channel-1'), {SOCKET_ACCESS_TABLE})
+        self.assertNoFullScan(SocketAccess.objects.filter(access_id='queryplan-access-1'), {SOCKET_ACCESS_TABLE})
@@ -0,0 +1,137 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from unittest import mock
+import json
+from apps.utils import get_async_redis
+from apps.vrmchat.consumers import VrmchatConsumer
+from apps.vrmchat.utils.RateLimiter import TokenBucket, InMemoryRateLimiter, RedisRateLimiter
+
+RATE_LIMITER_MODULE = 'apps.vrmchat.utils.RateLimiter'
+
+
+class _FakeClock:
+    """
+    time.monotonic / time.time の代わり
+    """
+    def __init__(self):
+        self.now_sec = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now_sec
+
+    def time(self) -> float:
+        return self.now_sec
+
+
+class _FakeTaskSupervisor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fnc, *args, **kwargs) -> bool:
+        self.submitted.append(args)
+        return True
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_refill_rate(self):
+        """ [RATE] 容量まで連続で許可し、以降は rate で補充した分だけ許可すること """
+        bucket = TokenBucket(rate=10, capacity=10, now_sec=0)
+        self.assertEqual([bucket.consume(0) for _ in range(11)], [True] * 10 + [False])
+        # 0.1 秒で 1 回分
+        self.assertEqual([bucket.consume(0.1) for _ in range(2)], [True, False])
+        # 補充は容量まで
+        self.assertEqual([bucket.consume(100) for _ in range(11)], [True] * 10 + [False])
+
+    def test_grace(self):
+        """ [RATE] 接続から grace_sec 秒間は判定せず、トークンも消費しないこと """
+        bucket = TokenBucket(rate=10, capacity=10, now_sec=0)
+        self.assertTrue(all(bucket.consume(1.9, grace_sec=2) for _ in range(100)))
+        self.assertEqual([bucket.consume(2.0, grace_sec=2) for _ in range(11)], [True] * 10 + [False])
+
+
+class SocketRateLimiterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = _FakeClock()
+        patcher    = mock.patch(f'{RATE_LIMITER_MODULE}.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_in_memory_rate_limiter(self):
+        """ [RATE] InMemoryRateLimiter は open からの grace 後に容量を超えたら遮断すること """
+        async def _main():
+            limiter = InMemoryRateLimiter(rate_per_sec=2, grace_sec=1)
+            await limiter.open('user:1')
+            self.assertTrue(all([await limiter.hit('user:1') for _ in range(10)]))
+            self.clock.now_sec += 1
+            self.assertEqual([await limiter.hit('user:1') for _ in range(3)], [True, True, False])
+            self.clock.now_sec += 0.5
+            self.assertEqual([await limiter.hit('user:1') for _ in range(2)], [True, False])
+            await limiter.close('user:1')
+            self.assertEqual(limiter.buckets, {})
+        async_to_sync(_main)()
+
+    def test_redis_rate_limiter_grace(self):
+        """ [RATE] RedisRateLimiter は grace 期間中 Redis にアクセスせず、接続できない場合は memory で判定すること """
+        async def _main():
+            with mock.patch(f'{RATE_LIMITER_MODULE}.get_async_redis', side_effect=ConnectionError) as get_async_redis:
+                limiter = RedisRateLimiter(rate_per_sec=2, grace_sec=1)
+                await limiter.open('user:1')
+                self.assertTrue(all([await limiter.hit('user:1') for _ in range(10)]))
+                self.assertEqual(get_async_redis.call_count, 0)
+                self.clock.now_sec += 1
+                with self.assertLogs(RATE_LIMITER_MODULE, level='WARNING'):
+                    self.assertEqual([await limiter.hit('user:1') for _ in range(3)], [True, True, False])
+                self.assertEqual(get_async_redis.call_count, 3)
+                await limiter.close('user:1')
+                self.assertEqual(limiter.opened_secs, {})
+        async_to_sync(_main)()
+
+    def test_redis_rate_limiter_shared_by_user(self):
+        """ [RATE] RedisRateLimiter のバケットは同じユーザの接続で共有すること (Redis に接続できない場合はスキップ) """
+        async def _main():
+            try:
+                await get_async_redis().ping()
+            except Exception:
+                self.skipTest('redis unavailable')
+            key = 'user:test_rate_limiter'
+            await get_async_redis().delete(RedisRateLimiter.KEY_PREFIX + key)
+            limiter_a = RedisRateLimiter(rate_per_sec=2, grace_sec=0)
+            limiter_b = RedisRateLimiter(rate_per_sec=2, grace_sec=0)
+            await limiter_a.open(key)
+            await limiter_b.open(key)
+            self.assertEqual([await limiter_a.hit(key), await limiter_b.hit(key), await limiter_a.hit(key)], [True, True, False])
+            # 接続し直してもバケットは初期化されない
+            await limiter_a.close(key)
+            await limiter_a.open(key)
+            self.assertFalse(await limiter_a.hit(key))
+            self.clock.now_sec += 0.5
+            self.assertEqual([await limiter_b.hit(key), await limiter_a.hit(key)], [True, False])
+            await get_async_redis().delete(RedisRateLimiter.KEY_PREFIX + key)
+        async_to_sync(_main)()
+
+
+class ConsumerRateLimitTest(SimpleTestCase):
+
+    def test_over_limit_close(self):
+        """ [RATE] 制限を超えたメッセージには wsClose を返し、メイン処理に渡さないこと """
+        sent_list = []
+        consumer  = VrmchatConsumer()
+        async def _self_send_message(message_data, is_send_bytes_data=False):
+            sent_list.append(message_data)
+        consumer._self_send_message        = _self_send_message
+        consumer.room_id                   = 'room'
+        consumer.is_frame_codec_negotiated = False
+        consumer.task_supervisor           = _FakeTaskSupervisor()
+        consumer.rate_limiter              = InMemoryRateLimiter(rate_per_sec=2, grace_sec=0)
+        consumer.rate_limiter_key          = 'user:1'
+        text_data = json.dumps({'cmd': 'SendUserMessage', 'data': {'message': 'こんにちは'}})
+        async def _main():
+            await consumer.rate_limiter.open(consumer.rate_limiter_key)
+            for _ in range(3):
+                await consumer.receive(text_data=text_data)
+        async_to_sync(_main)()
+        self.assertEqual([m['cmd'] for m in sent_list], ['wsClose'])
+        # receiverMessage を返すため submit はされるが、data_json は None
+        self.assertEqual([args[0] is not None for args in consumer.task_supervisor.submitted], [True, True, False])
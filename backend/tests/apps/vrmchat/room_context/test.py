@@ -0,0 +1,97 @@
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from apps.vrmchat.models import Room, RoomSettings, Message
+from apps.vrmchat.settings import DEFAULT_ROOM_NAME
+from apps.vrmchat.utils import (
+    acquire_room_context, release_room_context, get_room_context,
+    schedule_commit_turn, aflush_turn_writes,
+)
+from tests.common import create_test_user
+
+
+TRANSACTION_SQL_SET = {'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE'}
+
+
+class RoomContextCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user, _, _ = create_test_user()
+        self.room       = Room.objects.create(create_user=self.user)
+        for i in range(3):
+            Message.objects.create(room_id      = self.room,
+                                   user_message = f'user{i}',
+                                   llm_response = f'llm{i}',)
+        self.room_context = async_to_sync(acquire_room_context)(self.room.room_id)
+
+    def tearDown(self):
+        release_room_context(self.room.room_id)
+
+    def _commit_turns(self, message_id_list, is_write_behind:bool = False):
+        """
+        ターンを保存し、(llm_response, room_name) のリストと実行されたクエリを返す
+        """
+        async def _main():
+            result_list = []
+            for message_id in message_id_list:
+                room_context = await get_room_context(self.room.room_id)
+                data_dict    = room_context.get_settings()
+                data_dict.update({
+                    'message_id':       message_id,
+                    'user_message':     f'question {message_id}',
+                    'llm_response':     'answer',
+                    'tokens_info_dict': {'sent_tokens': 1, 'generated_tokens': 1},
+                    'history_list':     [],
+                    'history_text':     '',
+                })
+                result_list.append(schedule_commit_turn(room_context, data_dict, is_write_behind=is_write_behind))
+            await aflush_turn_writes()
+            return result_list
+        with CaptureQueriesContext(connection) as context:
+            result_list = async_to_sync(_main)()
+        # BEGIN / COMMIT / SAVEPOINT などのトランザクション制御は除外
+        sql_list = [q['sql'] for q in context.captured_queries
+                    if q['sql'].lstrip().split(' ', 1)[0].upper() not in TRANSACTION_SQL_SET]
+        return result_list, sql_list
+
+    def test_warm_on_acquire(self):
+        """ [RoomContext] 接続時に設定と会話履歴を読み込むこと """
+        self.assertEqual(self.room_context.room_name, DEFAULT_ROOM_NAME)
+        self.assertEqual(self.room_context.get_settings()['history_len'], 1)
+        history_list, history_text = self.room_context.get_history(2)
+        self.assertEqual([h['content'] for h in history_list], ['user1', 'llm1', 'user2', 'llm2'])
+        self.assertEqual(history_text, 'user1llm1user2llm2')
+
+    def test_commit_turn(self):
+        """ [RoomContext] 1 ターンを DB を読まずに 1 トランザクションで保存すること """
+        result_list, sql_list = self._commit_turns(['message-1', 'message-2'])
+        self.assertEqual(result_list, [('answer', 'question message-1'), ('answer', 'question message-1')])
+        # 1 ターン目: INSERT + ルーム名の UPDATE / 2 ターン目: INSERT のみ
+        self.assertEqual(len(sql_list), 3)
+        self.assertFalse([sql for sql in sql_list if sql.lstrip().upper().startswith('SELECT')])
+        self.assertEqual(RoomSettings.objects.get(room_id=self.room).room_name, 'question message-1')
+        self.assertEqual(Message.objects.filter(room_id=self.room).count(), 5)
+        history_list, _ = self.room_context.get_history(2)
+        self.assertEqual([h['content'] for h in history_list], ['question message-1', 'answer', 'question message-2', 'answer'])
+
+    def test_commit_turn_write_behind(self):
+        """ [RoomContext] write-behind ではまとめて bulk_create すること """
+        _, sql_list = self._commit_turns([f'message-{i}' for i in range(10)], is_write_behind=True)
+        self.assertEqual(len([sql for sql in sql_list if sql.lstrip().upper().startswith('INSERT')]), 1)
+        self.assertEqual(Message.objects.filter(room_id=self.room).count(), 13)
+
+    def test_invalidate_on_room_settings_save(self):
+        """ [RoomContext] RoomSettings の変更(API/管理画面)でキャッシュが破棄されること """
+        room_settings_obj             = RoomSettings.objects.get(room_id=self.room)
+        room_settings_obj.history_len = 5
+        room_settings_obj.save()
+        room_context = async_to_sync(get_room_context)(self.room.room_id)
+        self.assertIsNot(room_context, self.room_context)
+        self.assertEqual(room_context.get_settings()['history_len'], 5)
+
+    def test_release(self):
+        """ [RoomContext] 接続がなくなったルームのキャッシュを保持しないこと """
+        release_room_context(self.room.room_id)
+        room_context = async_to_sync(acquire_room_context)(self.room.room_id)
+        self.assertIsNot(room_context, self.room_context)
@@ -0,0 +1,112 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from unittest import mock
+import asyncio
+from common.scripts.LlmUtils import text_modify_fnc
+from apps.vrmchat.consumers import VrmchatConsumer
+
+CONSUMER_MODULE = 'apps.vrmchat.consumers.VrmchatConsumer'
+
+
+class _FakeStream:
+    """
+    llm.async_get_stream_response の戻り値 (aclose の呼び出しを記録する)
+    """
+    def __init__(self, deltas, sent_list, error=None, is_wait=False):
+        self.deltas      = list(deltas)
+        self.sent_list   = sent_list
+        self.error       = error
+        self.is_wait     = is_wait
+        self.sent_counts = [] # 各差分を返す時点で送信済みのメッセージ数
+        self.is_aclosed  = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.deltas:
+            self.sent_counts.append(len(self.sent_list))
+            return self.deltas.pop(0)
+        if self.error:
+            raise self.error
+        if self.is_wait:
+            await asyncio.Event().wait()
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        self.is_aclosed = True
+
+
+class _FakeLlm:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def async_get_stream_response(self, messages):
+        return self.stream
+
+
+class StreamLlmResponseTest(SimpleTestCase):
+
+    def setUp(self):
+        self.sent_list = []
+        self.consumer  = VrmchatConsumer()
+        async def _self_send_message(message_data, is_send_bytes_data=False):
+            self.sent_list.append(message_data)
+        self.consumer._self_send_message = _self_send_message
+        # 時間ではなく文字数でまとめる
+        for name, value in (('STREAM_CHUNK_COALESCE_CHARS', 10), ('STREAM_CHUNK_COALESCE_SEC', 60)):
+            patcher = mock.patch(f'{CONSUMER_MODULE}.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _run(self, stream):
+        return async_to_sync(self.consumer._stream_llm_response)(_FakeLlm(stream), [], 'message_id', False)
+
+    def test_coalesce(self):
+        """ 最初の差分は即時送信し、以降はまとめて送信すること """
+        deltas = ['こんにちは'] + ['あ'] * 25
+        stream = _FakeStream(deltas, self.sent_list)
+        self.assertEqual(self._run(stream), ''.join(deltas))
+        # 2 つ目の差分を読む前に 1 つ目を送信済み
+        self.assertEqual(stream.sent_counts[:2], [0, 1])
+        chunks = [m['data'] for m in self.sent_list if m['cmd'] == 'SendUserMessageChunk']
+        self.assertEqual([c['delta'] for c in chunks], ['こんにちは', 'あ' * 10, 'あ' * 10, 'あ' * 5])
+        self.assertEqual([c['index'] for c in chunks], [0, 1, 2, 3])
+        self.assertTrue(stream.is_aclosed)
+
+    def test_end_payload(self):
+        """ End の llmResponse / 送信した差分の結合が保存する内容 (text_modify_fnc) と同じになること """
+        deltas = ['詳細は https://ev', 'il.com/a と [リンク](http://go', '.jp/a) と「http://evil.com」', 'です。']
+        stream = _FakeStream(deltas, self.sent_list)
+        llm_response = self._run(stream)
+        self.assertEqual(llm_response, ''.join(deltas))
+        end = self.sent_list[-1]
+        self.assertEqual(end['cmd'], 'SendUserMessageEnd')
+        chunks = [m['data']['delta'] for m in self.sent_list[:-1]]
+        self.assertEqual(end['data'], {'messageId':   'message_id',
+                                       'chunkCount':  len(chunks),
+                                       'llmResponse': text_modify_fnc(llm_response),})
+        self.assertEqual(''.join(chunks), text_modify_fnc(llm_response))
+        self.assertNotIn('evil', end['data']['llmResponse'])
+
+    def test_aclose_on_error(self):
+        """ LLM のエラー時はストリームを閉じ、End を送信しないこと """
+        stream = _FakeStream(['こんにちは'], self.sent_list, error=RuntimeError('stream error'))
+        with self.assertRaises(RuntimeError):
+            self._run(stream)
+        self.assertTrue(stream.is_aclosed)
+        self.assertEqual([m['cmd'] for m in self.sent_list], ['SendUserMessageChunk'])
+
+    def test_aclose_on_cancel(self):
+        """ 切断などでタスクがキャンセルされた場合もストリームを閉じること """
+        stream = _FakeStream(['こんにちは'], self.sent_list, is_wait=True)
+        async def _main():
+            task = asyncio.create_task(self.consumer._stream_llm_response(_FakeLlm(stream), [], 'message_id', False))
+            while not self.sent_list:
+                await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        async_to_sync(_main)()
+        self.assertTrue(stream.is_aclosed)
+        self.assertEqual([m['cmd'] for m in self.sent_list], ['SendUserMessageChunk'])
@@ -0,0 +1,2 @@
+# ベンチマークは通常のテスト(test*.py)から除外しているため個別に実行する
+# ex. python manage.py test tests.benchmarks.llm_clients.bench
@@ -0,0 +1,109 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+import random
+import time
+import tracemalloc
+from apps.access_security.utils import IpRateLimiter, IP_STATUS_PASS, IP_STATUS_BLOCK
+from ..utils import print_benchmark_result
+
+ACCESS_COUNT_SECONDS_TIME = 5
+N_TIMES_TO_BLOCK_ACCESS   = 100
+N_TIMES_TO_ADD_BLOCKLIST  = 1000
+
+PASS_IP_LIST    = 'pass_ip_list'
+BLOCK_IP_LIST   = 'block_ip_list'
+CONTROL_IP_LIST = 'control_ip_list'
+
+
+def legacy_check_ip(cache:LocMemCache, ip:str) -> bool:
+    """
+    旧実装 (AccessSecurityMiddleware.process_response) の判定 (ログ記録・googlebot の判定は除く)
+    """
+    control_ip_list = cache.get(CONTROL_IP_LIST, {PASS_IP_LIST: [], BLOCK_IP_LIST: []})
+    if ip in control_ip_list[PASS_IP_LIST]: return True
+    if ip in control_ip_list[BLOCK_IP_LIST]:
+        if cache.get('block_ip_' + ip) is None:
+            control_ip_list[BLOCK_IP_LIST].remove(ip)
+            cache.set(CONTROL_IP_LIST, control_ip_list)
+        else:
+            return False
+    ip_time_list = cache.get(ip, [])
+    time_temp    = time.time()
+    while ip_time_list and (time_temp - ip_time_list[-1]) > ACCESS_COUNT_SECONDS_TIME:
+        ip_time_list.pop()
+    ip_time_list.insert(0, time_temp)
+    cache.set(ip, ip_time_list, timeout=ACCESS_COUNT_SECONDS_TIME)
+    if len(ip_time_list) > N_TIMES_TO_ADD_BLOCKLIST:
+        control_ip_list[BLOCK_IP_LIST].append(ip)
+        cache.set(CONTROL_IP_LIST, control_ip_list)
+        cache.set('block_ip_' + ip, '')
+    return len(ip_time_list) <= N_TIMES_TO_BLOCK_ACCESS
+
+def check_ip(limiter:IpRateLimiter, ip:str) -> bool:
+    ip_status, access_count = limiter.hit(ip)
+    if ip_status == IP_STATUS_PASS:
+        return True
+    if ip_status == IP_STATUS_BLOCK:
+        return False
+    if access_count > N_TIMES_TO_ADD_BLOCKLIST:
+        limiter.block(ip)
+    return access_count <= N_TIMES_TO_BLOCK_ACCESS
+
+
+class AccessSecurityBenchmark(SimpleTestCase):
+    """
+    AccessSecurityMiddleware の 1 リクエストあたりのアクセス計測コスト(μs)とキャッシュのメモリを比較する
+      - distinct: 10,000 個の IP から N 回 (うち 1 % は 1 つの IP からの大量アクセス)
+      - burst:    10 個の IP からそれぞれ N_BURST 回 (旧実装はリストが伸びるほど遅くなる)
+      - legacy: IP ごとのタイムスタンプのリスト + 共有のパス/ブロックリスト (旧実装)
+      - sliding_window: IpRateLimiter (IP ごとのカウンタ 2 つ + パス/ブロックのキー)
+      - キャッシュは 10,000 IP が入る LocMemCache (default の MAX_ENTRIES=300 では間引かれるため)
+    """
+
+    N_IPS   = 10000
+    N       = 50000
+    N_BURST = 1000
+
+    def setUp(self):
+        self.cache = LocMemCache('bench_access_security', {'OPTIONS': {'MAX_ENTRIES': self.N_IPS * 10}})
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def _get_ips(self) -> list:
+        rng = random.Random(0)
+        ips = [f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(self.N_IPS)]
+        return [ips[rng.randrange(self.N_IPS)] if rng.random() > 0.01 else '192.0.2.1' for _ in range(self.N)]
+
+    def _measure(self, fnc, ips:list) -> dict:
+        self.cache.clear()
+        start   = time.perf_counter()
+        blocked = sum(0 if fnc(ip) else 1 for ip in ips)
+        elapsed = time.perf_counter() - start
+        # キャッシュのメモリ (計測のオーバーヘッドを含めないように、もう 1 回実行して計る)
+        self.cache.clear()
+        tracemalloc.start()
+        for ip in ips:
+            fnc(ip)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'us_per_request': round(elapsed / len(ips) * 1e6, 3),
+            'cache_kib':      round(size / 1024, 1),
+            'keys':           len(self.cache._cache),
+            'blocked':        blocked,
+        }
+
+    def test_bench_access_security(self):
+        """ [BENCH] IP ごとのアクセス計測 """
+        ips     = self._get_ips()
+        bursts  = [f'192.0.2.{i % 10}' for i in range(10 * self.N_BURST)]
+        limiter = IpRateLimiter(window_sec=ACCESS_COUNT_SECONDS_TIME, block_timeout_sec=60, cache=self.cache)
+        rows    = {
+            'distinct/legacy':         self._measure(lambda ip: legacy_check_ip(self.cache, ip), ips),
+            'distinct/sliding_window': self._measure(lambda ip: check_ip(limiter, ip), ips),
+            'burst/legacy':            self._measure(lambda ip: legacy_check_ip(self.cache, ip), bursts),
+            'burst/sliding_window':    self._measure(lambda ip: check_ip(limiter, ip), bursts),
+        }
+        print_benchmark_result('access_security', rows)
+        self.assertGreater(rows['distinct/sliding_window']['blocked'], 0)
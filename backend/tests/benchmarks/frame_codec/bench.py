@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase
+import brotli
+import json
+import time
+from apps.vrmchat.utils.FrameCodec import FrameCodec, BrotliFrameCodec
+from ..utils import print_benchmark_result
+
+
+def create_send_user_message_frames(n_chunks:int = 40) -> list:
+    """
+    1 回の SendUserMessage (ストリーミング) で送信するフレーム
+    SendUserMessageChunk x n_chunks + SendUserMessageEnd
+    """
+    message_id = 'f3b1c2d4e5f60718293a4b5c6d7e8f90'
+    deltas     = [f'{i}番目の文です。VRM のキャラクターがお返事します。' for i in range(n_chunks)]
+    frames     = []
+    for i, delta in enumerate(deltas):
+        frames.append({
+            'cmd':    'SendUserMessageChunk',
+            'status': 200,
+            'ok':     True,
+            'data': {
+                'messageId': message_id,
+                'index':     i,
+                'delta':     delta,
+            },
+        })
+    frames.append({
+        'cmd':    'SendUserMessageEnd',
+        'status': 200,
+        'ok':     True,
+        'data': {
+            'messageId':   message_id,
+            'chunkCount':  n_chunks,
+            'llmResponse': ''.join(deltas),
+        },
+    })
+    return frames
+
+def legacy_encode(message) -> bytes:
+    """
+    旧実装 (send_bytes_data_message)
+    """
+    return brotli.compress(json.dumps(message).encode('utf-8'), quality=4)
+
+
+class FrameCodecBenchmark(SimpleTestCase):
+    """
+    SendUserMessage 1 回分のフレームのエンコードコスト(μs/フレーム)と送信サイズ(bytes/フレーム)を比較する
+      - legacy:    json.dumps + brotli.compress(quality=4) (旧実装)
+      - br:            orjson + brotli
+      - none:          圧縮なし
+      - br(threshold): br で SOCKET_COMPRESS_MIN_BYTES 未満はテキストで送る (既定の設定)
+    """
+
+    N = 50
+
+    def _measure(self, create_encode_fnc) -> dict:
+        """
+        create_encode_fnc: 1 回の応答 (接続) ごとに呼び出し、フレームをエンコードする関数を返す
+        """
+        frames      = create_send_user_message_frames()
+        total_bytes = 0
+        elapsed     = 0.0
+        for _ in range(self.N):
+            encode_fnc  = create_encode_fnc()
+            total_bytes = 0
+            start       = time.perf_counter()
+            for frame in frames:
+                total_bytes += len(encode_fnc(frame))
+            elapsed += time.perf_counter() - start
+        return {
+            'us_per_frame':    round(elapsed / (self.N * len(frames)) * 1e6, 3),
+            'bytes_per_frame': round(total_bytes / len(frames), 1),
+        }
+
+    def test_bench_frame_codec(self):
+        """ [BENCH] WebSocket フレームのエンコード """
+        def _codec_encode(codec_class, **kwargs):
+            def _create_encode_fnc():
+                codec = codec_class(**kwargs)
+                def _encode(frame):
+                    text_data, bytes_data = codec.encode(frame)
+                    return bytes_data if bytes_data is not None else text_data.encode('utf-8')
+                return _encode
+            return _create_encode_fnc
+
+        rows = {'legacy': self._measure(lambda: legacy_encode)}
+        for codec_class in (BrotliFrameCodec, FrameCodec):
+            rows[codec_class.name] = self._measure(_codec_encode(codec_class, min_compress_bytes=0))
+        # SOCKET_COMPRESS_MIN_BYTES (小さい差分はテキストで送る)
+        rows['br(threshold)'] = self._measure(_codec_encode(BrotliFrameCodec))
+        print_benchmark_result('FrameCodec (SendUserMessage)', rows)
+        self.assertLess(rows['br(threshold)']['us_per_frame'], rows['legacy']['us_per_frame'])
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+import random
+from apps.access_security.models import BlockIpList
+from apps.access_security.utils import IpBlocklist
+from ..utils import print_benchmark_result, measure_us_per_call
+
+
+def legacy_is_registered_block_ip(ip) -> bool:
+    """
+    旧実装 (AccessSecurityMiddleware.is_registered_block_ip)
+    """
+    registered_block_ips = cache.get('registered_block_ip_objs')
+    if registered_block_ips is None:
+        registered_block_ips = list(BlockIpList.objects.all())
+        cache.set('registered_block_ip_objs', registered_block_ips, 60*60)
+    registered_black_ip_list = [registered_block_ip.ip for registered_block_ip in registered_block_ips]
+    return ip in registered_black_ip_list
+
+
+class IpBlocklistBenchmark(TestCase):
+    """
+    登録済みブロックリストの 1 リクエストあたりの判定コスト(μs)を登録数ごとに比較する
+      - legacy: モデルのインスタンスのリストをキャッシュから読み、IP のリストを作成して線形探索 (旧実装)
+      - index:  IpBlocklist (プロセスの索引. 1 % は CIDR)
+    """
+
+    N_ENTRIES_LIST = [100, 1000, 10000]
+
+    def _create_entries(self, n:int) -> None:
+        rng = random.Random(n)
+        BlockIpList.objects.all().delete()
+        BlockIpList.objects.bulk_create([
+            BlockIpList(ip=f'10.{rng.randrange(256)}.{rng.randrange(256)}.0', prefixlen=24) if i % 100 == 0 else
+            BlockIpList(ip=f'172.{rng.randrange(16, 32)}.{rng.randrange(256)}.{rng.randrange(256)}')
+            for i in range(n)
+        ])
+
+    def test_bench_ip_blocklist(self):
+        """ [BENCH] 登録済みブロックリスト """
+        rows = {}
+        for n in self.N_ENTRIES_LIST:
+            self._create_entries(n)
+            cache.clear()
+            ip_blocklist = IpBlocklist(local_ttl_sec=60)
+            legacy_is_registered_block_ip('192.0.2.1')
+            ip_blocklist.is_blocked('192.0.2.1')
+            n_calls = max(100000 // n, 20)
+            rows[f'{n}/legacy'] = {'us_per_request': measure_us_per_call(lambda: legacy_is_registered_block_ip('192.0.2.1'), n=n_calls)}
+            rows[f'{n}/index']  = {'us_per_request': measure_us_per_call(lambda: ip_blocklist.is_blocked('192.0.2.1'), n=10000)}
+        cache.clear()
+        print_benchmark_result('ip_blocklist', rows)
@@ -0,0 +1,74 @@
+from django.test import SimpleTestCase
+import asyncio
+import openai
+import threading
+import time
+from common.scripts.LlmUtils.llms import OpenAILlm, aclose_llm_async_clients
+from tests.common import StubLlmServer
+from ..utils import print_benchmark_result
+
+MESSAGES = [{'role': 'user', 'content': 'hello'}]
+
+
+class LlmClientPoolBenchmark(SimpleTestCase):
+    """
+    同時ルーム数に対する LLM 呼び出しのスレッド数と TCP 接続数(=TLS ハンドシェイク回数)を比較する
+      - legacy: メッセージごとに openai.OpenAI を作成し asyncio.to_thread で実行 (旧実装)
+      - pooled: LlmClientRegistry の共有 AsyncOpenAI を使用 (現実装)
+    """
+
+    ROOMS_LIST = [10, 50, 100]
+    ROUNDS     = 3
+
+    def _run(self, rooms:int, call_factory):
+        async def _main():
+            server = StubLlmServer(response_delay=0.02)
+            await server.start()
+            peak_threads = threading.active_count()
+            stop         = asyncio.Event()
+
+            async def _sample_threads():
+                nonlocal peak_threads
+                while not stop.is_set():
+                    peak_threads = max(peak_threads, threading.active_count())
+                    await asyncio.sleep(0.005)
+
+            sampler = asyncio.create_task(_sample_threads())
+            start   = time.perf_counter()
+            for _ in range(self.ROUNDS):
+                await asyncio.gather(*[call_factory(server.base_url) for _ in range(rooms)])
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await sampler
+            await aclose_llm_async_clients()
+            await server.stop()
+            return {
+                'connections':  server.connection_count,
+                'requests':     server.request_count,
+                'peak_threads': peak_threads,
+                'elapsed_ms':   round(elapsed * 1000, 1),
+            }
+        return asyncio.run(_main())
+
+    def test_bench_llm_client_pool(self):
+        """ [BENCH] LLM クライアント共有とネイティブ非同期化 """
+
+        async def _legacy_call(base_url:str):
+            def sync_call():
+                client = openai.OpenAI(api_key='dummy', base_url=base_url)
+                return client.chat.completions.create(model='stub', messages=MESSAGES)
+            return await asyncio.to_thread(sync_call)
+
+        async def _pooled_call(base_url:str):
+            llm = OpenAILlm(api_key='dummy', base_url=base_url, model_name='stub')
+            return await llm.async_get_response(MESSAGES)
+
+        rows = {}
+        for rooms in self.ROOMS_LIST:
+            rows[f'legacy rooms={rooms}'] = self._run(rooms, _legacy_call)
+            rows[f'pooled rooms={rooms}'] = self._run(rooms, _pooled_call)
+        print_benchmark_result('LlmClientRegistry', rows)
+
+        # 共有クライアントでは接続数がラウンド数に比例せず使い回されること
+        for rooms in self.ROOMS_LIST:
+            self.assertLessEqual(rows[f'pooled rooms={rooms}']['connections'], rooms)
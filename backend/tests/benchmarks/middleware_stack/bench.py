@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.core.handlers.base import BaseHandler
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import path
+import asyncio
+import time
+from config.settings.admin_protect.AdminProtect import AdminProtect
+from config.settings.security.AccessSecurityMiddleware import AccessSecurityMiddleware, registered_ip_blocklist
+from ..utils import print_benchmark_result
+
+
+class SyncAccessSecurityMiddleware(AccessSecurityMiddleware):
+    """ 旧実装と同じく sync のみ (ASGI では sync_to_async でスレッドを移動する) """
+    async_capable = False
+
+class SyncAdminProtect(AdminProtect):
+    async_capable = False
+
+
+async def bench_view(request):
+    return HttpResponse('ok')
+
+urlpatterns = [
+    path('bench/', bench_view),
+]
+
+SYNC_MIDDLEWARE = [
+    'tests.benchmarks.middleware_stack.bench.SyncAccessSecurityMiddleware',
+    'tests.benchmarks.middleware_stack.bench.SyncAdminProtect',
+]
+ASYNC_MIDDLEWARE = [
+    'config.settings.security.AccessSecurityMiddleware.AccessSecurityMiddleware',
+    'config.settings.admin_protect.AdminProtect.AdminProtect',
+]
+
+
+class MiddlewareStackBenchmark(TestCase):
+    """
+    ASGI (async のハンドラ) で AccessSecurityMiddleware + AdminProtect を通したリクエストのレイテンシ(μs)を比較する
+      - BaseHandler.load_middleware(is_async=True) のミドルウェアチェーンを直接呼ぶ
+        (AsyncClient のシグナルなどのオーバーヘッドを含めない)
+      - sync:  sync のみのミドルウェア (sync_to_async でスレッドを移動する)
+      - async: async に対応したミドルウェア (LocMemCache はイベントループから直接操作する)
+      - none:  ミドルウェアなし (ハンドラのオーバーヘッド)
+      - 同時実行は CONCURRENCY 件 (IP は 1 リクエストごとに変えて制限にかからないようにする)
+    """
+
+    N           = 5000
+    CONCURRENCY = 20
+
+    def _measure(self, middleware:list) -> dict:
+        with override_settings(MIDDLEWARE=middleware, ROOT_URLCONF=__name__):
+            handler = BaseHandler()
+            handler.load_middleware(is_async=True)
+            factory = RequestFactory()
+            async def _main():
+                latencies = []
+                async def _request(i:int):
+                    request  = factory.get('/bench/', HTTP_X_FORWARDED_FOR=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}')
+                    start    = time.perf_counter()
+                    response = await handler.get_response_async(request)
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200
+                # ウォームアップ
+                await _request(self.N)
+                latencies.clear()
+                start = time.perf_counter()
+                for i in range(0, self.N, self.CONCURRENCY):
+                    await asyncio.gather(*[_request(j) for j in range(i, i + self.CONCURRENCY)])
+                elapsed = time.perf_counter() - start
+                latencies.sort()
+                return {
+                    'us_per_request': round(elapsed / self.N * 1e6, 1),
+                    'p50_us':         round(latencies[len(latencies) // 2] * 1e6, 1),
+                    'p99_us':         round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+                }
+            cache.clear()
+            return asyncio.run(_main())
+
+    def test_bench_middleware_stack(self):
+        """ [BENCH] ミドルウェアのオーバーヘッド (ASGI) """
+        registered_ip_blocklist.is_blocked('198.51.100.0')
+        rows = {
+            'none':  self._measure([]),
+            'sync':  self._measure(SYNC_MIDDLEWARE),
+            'async': self._measure(ASYNC_MIDDLEWARE),
+        }
+        print_benchmark_result('middleware_stack', rows)
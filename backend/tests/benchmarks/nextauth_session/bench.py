@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.test import TestCase
+from hkdf import Hkdf
+from jose.jwe import decrypt
+from rest_framework_simplejwt.tokens import AccessToken
+import json
+import time
+from api.utils import jwt_auth_get_id
+from common.auth import encode_jwe, decode_jwe, get_session_token, session_cache
+from tests.common import create_test_user
+from ..utils import print_benchmark_result, measure_us_per_call
+
+
+def legacy_jwt_auth_get_id(scope_cookies:dict):
+    """
+    旧実装 (接続ごとに HKDF・JWE の復号、クッキーは部分一致で走査)
+    """
+    session_token = None
+    for key, value in scope_cookies.items():
+        if 'next-auth.session-token' in key:
+            session_token = value
+            break
+    if not session_token:
+        return None
+    key     = Hkdf("", bytes(settings.NEXTAUTH_SECRET, 'utf-8')).expand(b'NextAuth.js Generated Encryption Key', 32)
+    session = json.loads(bytes.decode(decrypt(session_token, key), 'utf-8'))
+    return AccessToken(session['accessToken'])[settings.SIMPLE_JWT['USER_ID_CLAIM']]
+
+
+class NextAuthSessionBenchmark(TestCase):
+    """
+    WebSocket の接続時の認証 (jwt_auth_get_id) のコスト(μs)を比較する
+      - legacy:         HKDF + JWE の復号 + AccessToken の検証 (旧実装)
+      - key_cached:     暗号鍵は導出済み、セッションは毎回復号 (初回接続)
+      - session_cached: 復号済みのセッションを使う (再接続)
+      - cookie のみ:    get_session_token (クッキー 20 個、部分一致の走査 / 名前で取得)
+    """
+
+    N = 2000
+
+    def test_bench_nextauth_session(self):
+        """ [BENCH] 接続時の認証 """
+        user, _, _ = create_test_user()
+        token      = encode_jwe({'accessToken': str(AccessToken.for_user(user)), 'exp': int(time.time()) + 3600})
+        cookies    = {**{f'cookie-{i}': 'x' * 32 for i in range(19)}, 'next-auth.session-token': token}
+        assert legacy_jwt_auth_get_id(cookies) == jwt_auth_get_id(cookies) == user.id
+
+        def _key_cached():
+            session_cache.clear()
+            return jwt_auth_get_id(cookies)
+
+        def _legacy_cookie():
+            for key, value in cookies.items():
+                if 'next-auth.session-token' in key:
+                    return value
+
+        rows = {
+            'legacy':         {'us_per_call': measure_us_per_call(lambda: legacy_jwt_auth_get_id(cookies), n=self.N)},
+            'key_cached':     {'us_per_call': measure_us_per_call(_key_cached, n=self.N)},
+            'session_cached': {'us_per_call': measure_us_per_call(lambda: jwt_auth_get_id(cookies), n=self.N)},
+            'decode_jwe':     {'us_per_call': measure_us_per_call(lambda: decode_jwe(token), n=self.N)},
+            'cookie/legacy':  {'us_per_call': measure_us_per_call(_legacy_cookie, n=self.N * 10)},
+            'cookie/exact':   {'us_per_call': measure_us_per_call(lambda: get_session_token(cookies), n=self.N * 10)},
+        }
+        session_cache.clear()
+        print_benchmark_result('nextauth_session', rows)
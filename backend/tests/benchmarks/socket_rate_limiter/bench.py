@@ -0,0 +1,91 @@
+from django.test import TestCase
+from django.utils import timezone
+import asyncio
+import time
+from apps.utils import get_async_redis
+from apps.vrmchat.models import Room, SocketAccess
+from apps.vrmchat.settings import SOCKET_REQUEST_PER_SEC_LIMIT
+from apps.vrmchat.utils.RateLimiter import InMemoryRateLimiter, RedisRateLimiter
+from tests.common import create_test_user
+from ..utils import print_benchmark_result
+
+
+def legacy_request_count_and_check_socket_access(access_id:str) -> bool:
+    """
+    旧実装 (VrmchatConsumer._request_count_and_check_socket_access) の DB 判定
+    """
+    check_result      = True
+    socket_access_obj = SocketAccess.objects.filter(access_id = access_id).first()
+    now_utc_sec       = int(timezone.now().timestamp())
+    if socket_access_obj:
+        date_access_sec       = int(socket_access_obj.date_access.timestamp())
+        date_last_request_sec = int(socket_access_obj.date_last_request.timestamp())
+        if now_utc_sec - date_access_sec >= 2:
+            if now_utc_sec - date_last_request_sec < 1:
+                request_count = socket_access_obj.request_count + 1
+            else:
+                request_count = 1
+                socket_access_obj.date_last_request = timezone.now()
+            socket_access_obj.request_count = request_count
+            socket_access_obj.save()
+            if request_count > SOCKET_REQUEST_PER_SEC_LIMIT:
+                check_result = False
+    return check_result
+
+
+class SocketRateLimiterBenchmark(TestCase):
+    """
+    1 メッセージあたりのリクエスト制限の判定コスト(μs)を比較する
+      - legacy: SocketAccess の SELECT + UPDATE (旧実装)
+      - memory: InMemoryRateLimiter
+      - redis:  RedisRateLimiter (Redis に接続できない場合はスキップ)
+    """
+
+    N = 2000
+
+    def setUp(self):
+        user, _, _ = create_test_user()
+        room       = Room.objects.create(create_user=user)
+        SocketAccess.objects.create(room_id           = room,
+                                    access_id         = 'bench',
+                                    channel_name      = 'bench',
+                                    date_last_request = timezone.now(),
+                                    date_access       = timezone.now() - timezone.timedelta(seconds=10),)
+
+    def _measure_async(self, limiter) -> float:
+        async def _main():
+            await limiter.open('bench')
+            start = time.perf_counter()
+            for _ in range(self.N):
+                await limiter.hit('bench')
+            elapsed = time.perf_counter() - start
+            await limiter.close('bench')
+            return round(elapsed / self.N * 1e6, 3)
+        return asyncio.run(_main())
+
+    def _is_redis_available(self) -> bool:
+        async def _ping():
+            try:
+                return await get_async_redis().ping()
+            except Exception:
+                return False
+        return asyncio.run(_ping())
+
+    def test_bench_socket_rate_limiter(self):
+        """ [BENCH] WebSocket リクエスト制限 """
+        rows = {}
+
+        start = time.perf_counter()
+        for _ in range(self.N):
+            legacy_request_count_and_check_socket_access('bench')
+        rows['legacy(db)'] = {'us_per_message': round((time.perf_counter() - start) / self.N * 1e6, 3)}
+
+        rows['memory'] = {'us_per_message': self._measure_async(InMemoryRateLimiter(grace_sec=0))}
+
+        if self._is_redis_available():
+            rows['redis'] = {'us_per_message': self._measure_async(RedisRateLimiter(grace_sec=0))}
+        else:
+            rows['redis'] = {'us_per_message': 'skipped (redis unavailable)'}
+
+        print_benchmark_result('SocketRateLimiter', rows)
+        self.assertLess(rows['memory']['us_per_message'], rows['legacy(db)']['us_per_message'])
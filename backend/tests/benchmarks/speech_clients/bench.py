@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase
+import asyncio
+import grpc
+import time
+from google.cloud.speech_v1 import SpeechAsyncClient
+from google.cloud.speech_v1.services.speech.transports import SpeechGrpcAsyncIOTransport
+from apps.third_party.gcloud.stt_tts.utils.SpeechClientRegistry import CHANNEL_OPTIONS
+from apps.third_party.gcloud.stt_tts.utils import (
+    get_speech_async_client, aclose_speech_async_clients, SttSessionManager,
+)
+from tests.apps.third_party.gcloud.speech_clients.test import recognize
+from tests.common import FakeSpeechServer
+from ..utils import print_benchmark_result
+
+
+class SpeechClientPoolBenchmark(SimpleTestCase):
+    """
+    同時接続数に対するストリーミング認識の gRPC コネクション数と所要時間を比較する (FakeSpeechServer)
+      - legacy: 接続ごとに SpeechAsyncClient (= gRPC チャネル) を作成 (旧実装)
+      - pooled: SpeechClientRegistry の共有チャネルを使用 (現実装)
+    legacy のチャネルも共有チャネルと同じ設定 (チャネルごとに TCP 接続) で作成する
+    本番では legacy は接続ごとに認証情報の読み込みと TLS ハンドシェイクも発生する
+    """
+
+    CONNECTIONS_LIST = [50, 200]
+    N_CHUNKS         = 10
+
+    def _run(self, connections:int, is_pooled:bool, max_sessions:int = 0):
+        async def _main():
+            server   = FakeSpeechServer(chunk_delay=0.002)
+            await server.start()
+            manager  = SttSessionManager(max_sessions=max_sessions or connections)
+            channels   = []
+            create_sec = 0.0
+            async def _connection():
+                nonlocal create_sec
+                start = time.perf_counter()
+                if is_pooled:
+                    client = get_speech_async_client(endpoint=server.endpoint, is_insecure=True)
+                else:
+                    channel = grpc.aio.insecure_channel(server.endpoint, options=CHANNEL_OPTIONS)
+                    channels.append(channel)
+                    client  = SpeechAsyncClient(transport=SpeechGrpcAsyncIOTransport(channel=channel))
+                create_sec += time.perf_counter() - start
+                lease = manager.try_acquire()
+                if lease is None:
+                    return
+                try:
+                    await recognize(client, self.N_CHUNKS)
+                finally:
+                    lease.release()
+            start   = time.perf_counter()
+            await asyncio.gather(*[_connection() for _ in range(connections)])
+            elapsed = time.perf_counter() - start
+            for channel in channels:
+                await channel.close()
+            await aclose_speech_async_clients()
+            await server.stop()
+            stats = manager.stats()
+            return {
+                'connections': len(server.peers),
+                'streams':     server.stream_count,
+                'max_active':  server.max_active_streams,
+                'rejected':    stats['rejected'],
+                'create_us':   round(create_sec / connections * 1e6, 1),
+                'elapsed_ms':  round(elapsed * 1000, 1),
+            }
+        return asyncio.run(_main())
+
+    def test_bench_speech_client_pool(self):
+        """ [BENCH] Speech クライアントの共有と STT セッションの上限 """
+        rows = {}
+        for connections in self.CONNECTIONS_LIST:
+            rows[f'legacy conns={connections}'] = self._run(connections, is_pooled=False)
+            rows[f'pooled conns={connections}'] = self._run(connections, is_pooled=True)
+        # 上限 (STT_MAX_SESSIONS) を超えた分は開始しない
+        connections = self.CONNECTIONS_LIST[-1]
+        rows[f'pooled conns={connections} max_sessions={connections // 2}'] = self._run(connections, is_pooled=True, max_sessions=connections // 2)
+        print_benchmark_result('SpeechClientRegistry', rows)
+
+        for connections in self.CONNECTIONS_LIST:
+            self.assertEqual(rows[f'legacy conns={connections}']['connections'], connections)
+            self.assertLessEqual(rows[f'pooled conns={connections}']['connections'], 2)
+        self.assertEqual(rows[f'pooled conns={connections} max_sessions={connections // 2}']['rejected'], connections // 2)
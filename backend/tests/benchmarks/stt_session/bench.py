@@ -0,0 +1,105 @@
+from django.test import SimpleTestCase
+import asyncio
+import time
+from apps.third_party.gcloud.stt_tts.utils import SttSession
+from ..utils import print_benchmark_result
+
+
+class LegacySttSessions:
+    """
+    旧実装の STT セッション管理 (セッションの dict と max(keys) で現在のセッションを探す)
+    """
+    def __init__(self, live_sessions:int):
+        self.stt_sessions = {
+            session_id: {'queue': asyncio.Queue(), 'task': None, 'sttend_flag': True, 'running': True}
+            for session_id in range(live_sessions - 1)
+        }
+        self.stt_sessions[live_sessions - 1] = {'queue': asyncio.Queue(), 'task': None, 'sttend_flag': False, 'running': True}
+
+    def _get_latest_session_id(self):
+        if not self.stt_sessions:
+            return None
+        return max(self.stt_sessions.keys())
+
+    async def handle_audio(self, chunk:bytes):
+        current_session_id = self._get_latest_session_id()
+        if current_session_id is None or self.stt_sessions[current_session_id]['sttend_flag']:
+            return
+        await self.stt_sessions[current_session_id]['queue'].put(chunk)
+
+    async def watchdog(self, session_id:int, timeout:float):
+        await asyncio.sleep(timeout)
+
+
+class CurrentSttSessions:
+    """
+    現実装 (現在のセッションを直接持つ)
+    """
+    def __init__(self, live_sessions:int):
+        self.stt_sessions = {session_id: SttSession(session_id) for session_id in range(live_sessions)}
+        self.stt_session  = self.stt_sessions[live_sessions - 1]
+
+    async def handle_audio(self, chunk:bytes):
+        session = self.stt_session
+        if session is None or not session.is_streaming:
+            return
+        session.put_audio(chunk)
+
+
+class SttSessionBenchmark(SimpleTestCase):
+    """
+    音声チャンク 1 つあたりのセッション管理の時間と、b'sttend' ごとの期限の設定の時間を比較する
+      - legacy:  セッションの dict から max(keys) で現在のセッションを探す / b'sttend' ごとに watchdog のタスクを作成
+      - current: SttSession を直接持つ / セッションのタイマーを設定し直す
+    live は終了していないセッションの数 (draining のセッションは確定結果を受け取るまで残る)
+    前処理 (SttAudioPreprocessor) と gRPC の時間は含めない
+    """
+
+    LIVE_SESSIONS_LIST = [1, 8, 64]
+    N_CHUNKS           = 50000
+    N_STTEND           = 5000
+
+    def _measure_chunks(self, sessions_class:type, live_sessions:int) -> float:
+        async def _main():
+            sessions = sessions_class(live_sessions)
+            if sessions_class is CurrentSttSessions:
+                sessions.stt_session.start(asyncio.sleep(0))
+            chunk    = b'\x00' * 3200
+            start    = time.perf_counter()
+            for _ in range(self.N_CHUNKS):
+                await sessions.handle_audio(chunk)
+            elapsed  = time.perf_counter() - start
+            if sessions_class is CurrentSttSessions:
+                await sessions.stt_session.aclose()
+            return elapsed
+        return round(asyncio.run(_main()) / self.N_CHUNKS * 1e6, 3)
+
+    def _measure_sttend(self, is_legacy:bool) -> float:
+        async def _main():
+            legacy  = LegacySttSessions(1)
+            session = SttSession(0, max_sec=60, drain_timeout_sec=60)
+            session.start(asyncio.sleep(0))
+            tasks   = []
+            start   = time.perf_counter()
+            for _ in range(self.N_STTEND):
+                if is_legacy:
+                    tasks.append(asyncio.create_task(legacy.watchdog(0, timeout=60)))
+                else:
+                    session._set_deadline(session.drain_timeout_sec)
+            elapsed = time.perf_counter() - start
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await session.aclose()
+            return elapsed
+        return round(asyncio.run(_main()) / self.N_STTEND * 1e6, 3)
+
+    def test_bench_stt_session(self):
+        """ [BENCH] STT セッション管理の音声チャンクごとのオーバーヘッド """
+        rows = {}
+        for live_sessions in self.LIVE_SESSIONS_LIST:
+            rows[f'legacy  live={live_sessions}'] = {'chunk_us': self._measure_chunks(LegacySttSessions, live_sessions)}
+            rows[f'current live={live_sessions}'] = {'chunk_us': self._measure_chunks(CurrentSttSessions, live_sessions)}
+        rows['legacy  sttend (watchdog task)']   = {'sttend_us': self._measure_sttend(is_legacy=True)}
+        rows['current sttend (deadline timer)'] = {'sttend_us': self._measure_sttend(is_legacy=False)}
+        print_benchmark_result('SttSession', rows)
@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase
+import random
+from common.scripts.LlmUtils import text_modify_fnc, TextHermlessStream
+from tests.scripts.llm_utils.text_hermless.legacy import legacy_text_url_hermless
+from ..utils import print_benchmark_result, measure_us_per_call
+
+ALLOWED_DOMAINS_LIST = ['go.jp', 'or.jp', 'google.com',]
+
+
+def create_link_heavy_response(n_paragraphs:int = 40, seed:int = 0) -> str:
+    """
+    Markdown リンク・「」で囲まれた URL・直接 URL を多く含む長い回答
+    """
+    rnd = random.Random(seed)
+    urls = ['https://www.google.com/search?q=vrm', 'http://www.city.example.go.jp/guide',
+            'https://evil.example.com/path', 'http://tracker.example.net/?id=1',]
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        url = rnd.choice(urls)
+        paragraphs.append(rnd.choice([f'詳しくは [こちら]({url}) をご覧ください。',
+                                      f'公式サイトは「{url}」です。',
+                                      f'参考: {url} を確認してください。',
+                                      'VRM モデルの表情はブレンドシェイプで設定します。',]))
+    return '\n'.join(paragraphs)
+
+def _stream_sanitize(text:str, chunk_size:int = 8) -> str:
+    stream = TextHermlessStream(ALLOWED_DOMAINS_LIST)
+    output = [stream.feed(text[i:i+chunk_size]) for i in range(0, len(text), chunk_size)]
+    return ''.join(output) + stream.flush()
+
+
+class TextHermlessBenchmark(SimpleTestCase):
+    """
+    長くリンクの多い LLM 回答の URL 無害化コスト(μs)を比較する
+      - legacy: 旧実装 (3 つの正規表現を毎回コンパイル + urlparse)
+      - engine: text_modify_fnc (コンパイル済みの 1 回の走査)
+      - stream: TextHermlessStream (8 文字ずつ feed した合計)
+      - no_url: URL を含まない同程度の長さの回答 (text_modify_fnc)
+    """
+
+    N = 300
+
+    def test_bench_text_hermless(self):
+        """ [BENCH] URL の無害化 """
+        text    = create_link_heavy_response()
+        no_url  = 'VRM モデルの表情はブレンドシェイプで設定します。\n' * 40
+        self.assertEqual(text_modify_fnc(text, ALLOWED_DOMAINS_LIST), legacy_text_url_hermless(text, ALLOWED_DOMAINS_LIST))
+        self.assertEqual(_stream_sanitize(text), text_modify_fnc(text, ALLOWED_DOMAINS_LIST))
+
+        rows = {
+            'legacy': {'us_per_call': measure_us_per_call(lambda: legacy_text_url_hermless(text, ALLOWED_DOMAINS_LIST), self.N)},
+            'engine': {'us_per_call': measure_us_per_call(lambda: text_modify_fnc(text, ALLOWED_DOMAINS_LIST), self.N)},
+            'stream': {'us_per_call': measure_us_per_call(lambda: _stream_sanitize(text), self.N)},
+            'no_url': {'us_per_call': measure_us_per_call(lambda: text_modify_fnc(no_url, ALLOWED_DOMAINS_LIST), self.N)},
+        }
+        print_benchmark_result(f'TextHermless ({len(text)} chars)', rows)
+        self.assertLess(rows['engine']['us_per_call'], rows['legacy']['us_per_call'])
@@ -0,0 +1,25 @@
+import time
+from typing import Any, Callable, Dict
+
+
+def print_benchmark_result(title:str, rows:Dict[str, Dict[str, Any]]) -> None:
+    """
+    ベンチマーク結果を settings/test.py と同じ書式で出力する。
+
+    Args:
+        title (str): ベンチマーク名。
+        rows (dict): {ケース名: {指標名: 値}}。
+    """
+    print('\n'+'*'*15, f' BENCH {title} ', '*'*15)
+    for name, values in rows.items():
+        print(f' - {name}: ' + ', '.join(f'{k}={v}' for k, v in values.items()))
+    print('*'*47)
+
+def measure_us_per_call(fnc:Callable[[], Any], n:int = 10000) -> float:
+    """
+    fnc を n 回実行した 1 回あたりの平均時間(μs)を返す。
+    """
+    start = time.perf_counter()
+    for _ in range(n):
+        fnc()
+    return round((time.perf_counter() - start) / n * 1e6, 3)
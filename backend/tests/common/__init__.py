@@ -1 +1,5 @@
-from .create_user import *
\ No newline at end of file
+from .create_user import *
+from .fake_dns_resolver import *
+from .fake_speech_server import *
+from .stub_llm_server import *
+from .stub_sts_server import *
\ No newline at end of file
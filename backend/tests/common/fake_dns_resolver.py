@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class FakeDnsResolver:
+    """
+    GoogleBotVerifier に渡す名前解決のフェイク。
+    ネットワークに出ずに逆引き・正引きの結果と遅延を指定し、問い合わせ回数を計測する。
+
+    Args:
+        ptr (dict): {IP: ホスト名} (逆引き)。
+        a (dict): {ホスト名: [IP]} (正引き)。
+        delay (float): 1 回の問い合わせの遅延(秒)。
+        timeout_sec (float): これより遅延が長い場合は TimeoutError (SocketDnsResolver のタイムアウト)。
+
+    Example Usage:
+        resolver = FakeDnsResolver(ptr={'66.249.66.1': 'crawl-66-249-66-1.googlebot.com'},
+                                   a={'crawl-66-249-66-1.googlebot.com': ['66.249.66.1']})
+        verifier = GoogleBotVerifier(resolver=resolver)
+        print(resolver.reverse_count, resolver.forward_count)
+    """
+
+    def __init__(self,
+                 ptr:Optional[Dict[str, str]]     = None,
+                 a:Optional[Dict[str, List[str]]] = None,
+                 *,
+                 delay:float                      = 0.0,
+                 timeout_sec:Optional[float]      = None,):
+        self.ptr           = dict(ptr or {})
+        self.a             = dict(a or {})
+        self.delay         = delay
+        self.timeout_sec   = timeout_sec
+        self.reverse_count = 0
+        self.forward_count = 0
+        self._lock         = threading.Lock()
+
+    def reverse(self, ip:str) -> str:
+        with self._lock:
+            self.reverse_count += 1
+        self._wait()
+        if ip not in self.ptr:
+            raise OSError(f'unknown host: {ip}')
+        return self.ptr[ip]
+
+    def forward(self, host:str) -> List[str]:
+        with self._lock:
+            self.forward_count += 1
+        self._wait()
+        if host not in self.a:
+            raise OSError(f'unknown host: {host}')
+        return list(self.a[host])
+
+    def _wait(self) -> None:
+        if self.timeout_sec is not None and self.delay > self.timeout_sec:
+            time.sleep(self.timeout_sec)
+            raise TimeoutError('dns lookup timed out')
+        if self.delay:
+            time.sleep(self.delay)
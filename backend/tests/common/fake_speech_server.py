@@ -0,0 +1,104 @@
+import grpc
+import asyncio
+from typing import Set
+from google.cloud.speech_v1 import (
+    StreamingRecognizeRequest, StreamingRecognizeResponse,
+    StreamingRecognitionResult, SpeechRecognitionAlternative,
+)
+from google.cloud.texttospeech_v1 import SynthesizeSpeechRequest, SynthesizeSpeechResponse
+
+
+class FakeSpeechServer:
+    """
+    Speech-to-Text (StreamingRecognize) と Text-to-Speech (SynthesizeSpeech) の最小ローカル gRPC サーバ。
+    ネットワークに出ずに Speech クライアントのチャネル数や同時ストリーム数を計測する。
+
+    StreamingRecognize は音声チャンクごとに途中結果 (「チャンク数」回目) を返し、
+    クライアントがストリームを閉じたら確定結果を返す。
+    SynthesizeSpeech は b'OggS' + テキストを返す。
+
+    Args:
+        chunk_delay (float): 音声チャンクごとの応答遅延(秒)。
+        synthesize_delay (float): SynthesizeSpeech の応答遅延(秒)。
+
+    Example Usage:
+        server = FakeSpeechServer()
+        await server.start()
+        client = get_speech_async_client(endpoint=server.endpoint, is_insecure=True)
+        ...
+        await server.stop()
+        print(len(server.peers), server.max_active_streams)
+    """
+
+    def __init__(self,
+                 chunk_delay:float      = 0.0,
+                 synthesize_delay:float = 0.0,):
+        self.chunk_delay        = chunk_delay
+        self.synthesize_delay   = synthesize_delay
+        self.peers: Set[str]    = set() # クライアントの接続元 (= gRPC のコネクション)
+        self.stream_count       = 0
+        self.active_streams     = 0
+        self.max_active_streams = 0
+        self.synthesize_count   = 0
+        self._server            = None
+        self._port              = None
+
+    @property
+    def endpoint(self) -> str:
+        return f'127.0.0.1:{self._port}'
+
+    async def start(self) -> None:
+        self._server = grpc.aio.server()
+        self._server.add_generic_rpc_handlers((
+            grpc.method_handlers_generic_handler('google.cloud.speech.v1.Speech', {
+                'StreamingRecognize': grpc.stream_stream_rpc_method_handler(
+                                          self._streaming_recognize,
+                                          request_deserializer = StreamingRecognizeRequest.deserialize,
+                                          response_serializer  = StreamingRecognizeResponse.serialize,),
+            }),
+            grpc.method_handlers_generic_handler('google.cloud.texttospeech.v1.TextToSpeech', {
+                'SynthesizeSpeech': grpc.unary_unary_rpc_method_handler(
+                                        self._synthesize_speech,
+                                        request_deserializer = SynthesizeSpeechRequest.deserialize,
+                                        response_serializer  = SynthesizeSpeechResponse.serialize,),
+            }),
+        ))
+        self._port = self._server.add_insecure_port('127.0.0.1:0')
+        await self._server.start()
+
+    async def stop(self) -> None:
+        if self._server:
+            await self._server.stop(grace=None)
+
+    async def _streaming_recognize(self, request_iterator, context):
+        self.peers.add(context.peer())
+        self.stream_count       += 1
+        self.active_streams     += 1
+        self.max_active_streams  = max(self.max_active_streams, self.active_streams)
+        try:
+            chunk_count = 0
+            async for request in request_iterator:
+                if not request.audio_content:
+                    # 最初のリクエスト (streaming_config)
+                    continue
+                chunk_count += 1
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+                yield self._create_response(f'{chunk_count}回目', is_final=False)
+            yield self._create_response(f'{chunk_count}回目', is_final=True)
+        finally:
+            self.active_streams -= 1
+
+    async def _synthesize_speech(self, request, context):
+        self.peers.add(context.peer())
+        self.synthesize_count += 1
+        if self.synthesize_delay:
+            await asyncio.sleep(self.synthesize_delay)
+        return SynthesizeSpeechResponse(audio_content=b'OggS' + request.input.text.encode('utf-8'))
+
+    @staticmethod
+    def _create_response(transcript:str, is_final:bool) -> StreamingRecognizeResponse:
+        return StreamingRecognizeResponse(results=[
+            StreamingRecognitionResult(alternatives = [SpeechRecognitionAlternative(transcript=transcript)],
+                                       is_final     = is_final,),
+        ])
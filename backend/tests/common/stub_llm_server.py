@@ -0,0 +1,117 @@
+import asyncio
+import json
+from typing import List, Optional
+
+
+class StubLlmServer:
+    """
+    OpenAI 互換 (/v1/chat/completions) の最小ローカルサーバ。
+    ネットワークに出ずに LLM クライアントの接続数やストリーミング挙動を計測する。
+
+    Args:
+        response_text (str):   返却するテキスト。
+        stream_chunks (list):  stream=True の場合に 1 イベントずつ返す差分。
+        chunk_delay (float):   ストリーミング差分の送信間隔(秒)。
+        response_delay (float): 非ストリーミング時の応答遅延(秒)。
+
+    Example Usage:
+        server = StubLlmServer()
+        await server.start()
+        llm = OpenAILlm(api_key='dummy', base_url=server.base_url)
+        ...
+        await server.stop()
+        print(server.connection_count)
+    """
+
+    def __init__(self,
+                 response_text:str                   = 'stub response',
+                 stream_chunks:Optional[List[str]]   = None,
+                 *,
+                 chunk_delay:float    = 0.0,
+                 response_delay:float = 0.0,):
+        self.response_text    = response_text
+        self.stream_chunks    = stream_chunks if stream_chunks is not None else list(response_text)
+        self.chunk_delay      = chunk_delay
+        self.response_delay   = response_delay
+        self.connection_count = 0
+        self.request_count    = 0
+        self._server          = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}/v1'
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, '127.0.0.1', 0)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer) -> None:
+        self.connection_count += 1
+        try:
+            while True:
+                header = await reader.readuntil(b'\r\n\r\n')
+                content_length = 0
+                for line in header.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        content_length = int(line.split(b':', 1)[1].strip())
+                body = json.loads(await reader.readexactly(content_length)) if content_length else {}
+                self.request_count += 1
+                if body.get('stream'):
+                    await self._write_stream(writer)
+                else:
+                    await self._write_completion(writer)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_completion(self, writer) -> None:
+        if self.response_delay:
+            await asyncio.sleep(self.response_delay)
+        payload = json.dumps({
+            'id':      'chatcmpl-stub',
+            'object':  'chat.completion',
+            'created': 0,
+            'model':   'stub',
+            'choices': [{
+                'index':         0,
+                'finish_reason': 'stop',
+                'message':       {'role': 'assistant', 'content': self.response_text},
+            }],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        }).encode('utf-8')
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: application/json\r\n'
+                     b'Connection: keep-alive\r\n'
+                     + f'Content-Length: {len(payload)}\r\n\r\n'.encode('ascii')
+                     + payload)
+        await writer.drain()
+
+    async def _write_stream(self, writer) -> None:
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream\r\n'
+                     b'Connection: keep-alive\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+        for chunk in self.stream_chunks:
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            event = json.dumps({
+                'id':      'chatcmpl-stub',
+                'object':  'chat.completion.chunk',
+                'created': 0,
+                'model':   'stub',
+                'choices': [{'index': 0, 'finish_reason': None, 'delta': {'content': chunk}}],
+            })
+            await self._write_chunk(writer, f'data: {event}\n\n'.encode('utf-8'))
+        await self._write_chunk(writer, b'data: [DONE]\n\n')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _write_chunk(self, writer, data:bytes) -> None:
+        writer.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        await writer.drain()
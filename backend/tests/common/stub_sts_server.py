@@ -0,0 +1,86 @@
+import asyncio
+from typing import List
+
+
+class StubStsServer:
+    """
+    Azure Speech Services の STS (/{region}/sts/v1.0/issueToken) の最小ローカルサーバ。
+    ネットワークに出ずにトークンの取得回数や接続数を計測する。
+
+    Args:
+        response_delay (float): 応答遅延(秒)。
+        status_code (int): 応答のステータス (200 以外は失敗を返す)。
+
+    Example Usage:
+        server = StubStsServer()
+        await server.start()
+        broker = AzureSpeechTokenBroker('dummy', url_template=server.url_template)
+        ...
+        await server.stop()
+        print(server.request_count, server.connection_count)
+    """
+
+    def __init__(self,
+                 *,
+                 response_delay:float = 0.0,
+                 status_code:int      = 200,):
+        self.response_delay               = response_delay
+        self.status_code                  = status_code
+        self.connection_count             = 0
+        self.request_count                = 0
+        self.regions: List[str]           = []
+        self.subscription_keys: List[str] = []
+        self._server                      = None
+
+    @property
+    def url_template(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}/{{region}}/sts/v1.0/issueToken'
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, '127.0.0.1', 0)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer) -> None:
+        self.connection_count += 1
+        try:
+            while True:
+                header = await reader.readuntil(b'\r\n\r\n')
+                lines  = header.split(b'\r\n')
+                path   = lines[0].split(b' ')[1].decode('ascii')
+                content_length = 0
+                for line in lines[1:]:
+                    name, _, value = line.partition(b':')
+                    if name.lower() == b'content-length':
+                        content_length = int(value.strip())
+                    elif name.lower() == b'ocp-apim-subscription-key':
+                        self.subscription_keys.append(value.strip().decode('ascii'))
+                if content_length:
+                    await reader.readexactly(content_length)
+                self.request_count += 1
+                self.regions.append(path.split('/')[1])
+                if self.response_delay:
+                    await asyncio.sleep(self.response_delay)
+                await self._write_token(writer)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_token(self, writer) -> None:
+        if self.status_code == 200:
+            status  = b'200 OK'
+            payload = f'token-{self.request_count}'.encode('ascii')
+        else:
+            status  = f'{self.status_code} Error'.encode('ascii')
+            payload = b''
+        writer.write(b'HTTP/1.1 ' + status + b'\r\n'
+                     b'Content-Type: text/plain\r\n'
+                     b'Connection: keep-alive\r\n'
+                     + f'Content-Length: {len(payload)}\r\n\r\n'.encode('ascii')
+                     + payload)
+        await writer.drain()
@@ -0,0 +1 @@
+from .access_security import *
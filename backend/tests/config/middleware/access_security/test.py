@@ -0,0 +1,72 @@
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from apps.access_security.models import AccessSecurity, BlockIpList
+from apps.access_security.utils import get_access_log_writer, invalidate_ip_blocklist
+from config.settings.admin_protect.AdminProtect import AdminProtect
+from config.settings.security.AccessSecurityMiddleware import AccessSecurityMiddleware, N_TIMES_TO_BLOCK_ACCESS
+
+IP = '192.0.2.10'
+
+
+def get_response(request):
+    return HttpResponse('ok')
+
+async def aget_response(request):
+    return HttpResponse('ok')
+
+
+class AccessSecurityMiddlewareTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        invalidate_ip_blocklist()
+        # ログはバックグラウンドのスレッドで書き込まない (テストの DB の外で書き込まない)
+        writer = get_access_log_writer()
+        self.addCleanup(setattr, writer, 'is_background', writer.is_background)
+        writer.is_background = False
+        # googlebot の判定 (DNS) を行わない
+        cache.set(f'google_bot:{IP}', 0)
+        self.request = RequestFactory().get('/api/', REMOTE_ADDR=IP)
+
+    def test_sync_async(self):
+        """ get_response に合わせて sync/async で動作する """
+        self.assertFalse(iscoroutinefunction(AccessSecurityMiddleware(get_response)))
+        self.assertTrue(iscoroutinefunction(AccessSecurityMiddleware(aget_response)))
+
+    async def test_async_throttle(self):
+        """ async: 上限を超えたら 429 (キャッシュ・ログ記録でスレッドを移動しない) """
+        middleware = AccessSecurityMiddleware(aget_response)
+        statuses   = [(await middleware(self.request)).status_code for _ in range(N_TIMES_TO_BLOCK_ACCESS + 2)]
+        self.assertEqual(statuses[:N_TIMES_TO_BLOCK_ACCESS], [200] * N_TIMES_TO_BLOCK_ACCESS)
+        self.assertEqual(statuses[-1], 429)
+        self.assertGreater(get_access_log_writer().stats()['enqueued'], 0)
+
+    async def test_async_registered_block(self):
+        """ async: 登録済みブロックリストは 403 (DB の読み込みのみ database_sync_to_async) """
+        await BlockIpList.objects.acreate(ip='192.0.2.0', prefixlen=24)
+        response = await AccessSecurityMiddleware(aget_response)(self.request)
+        self.assertEqual(response.status_code, 403)
+        response = await AccessSecurityMiddleware(aget_response)(RequestFactory().get('/api/', REMOTE_ADDR='198.51.100.1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_sync_throttle(self):
+        middleware = AccessSecurityMiddleware(get_response)
+        statuses   = [middleware(self.request).status_code for _ in range(N_TIMES_TO_BLOCK_ACCESS + 2)]
+        self.assertEqual(statuses[-1], 429)
+        # ログ記録はバッファに積むだけ
+        self.assertEqual(AccessSecurity.objects.count(), 0)
+
+
+@override_settings(ADMIN_PATH='admin', ALLOWED_IP_ADMIN=['127.0.0.1'])
+class AdminProtectTest(TestCase):
+
+    async def test_async(self):
+        middleware = AdminProtect(aget_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = RequestFactory()
+        self.assertEqual((await middleware(factory.get('/admin/', REMOTE_ADDR=IP))).status_code, 403)
+        self.assertEqual((await middleware(factory.get('/admin/', REMOTE_ADDR='127.0.0.1'))).status_code, 200)
+        self.assertEqual((await middleware(factory.get('/api/', REMOTE_ADDR=IP))).status_code, 200)
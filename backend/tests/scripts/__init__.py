@@ -0,0 +1 @@
+from .llm_utils import *
\ No newline at end of file
@@ -0,0 +1,3 @@
+from .stream_response import *
+from .text_hermless import *
+from .token_utils import *
\ No newline at end of file
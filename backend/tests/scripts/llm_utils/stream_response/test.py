@@ -0,0 +1,224 @@
+from django.test import SimpleTestCase
+from unittest import mock
+import asyncio
+import threading
+import time
+from common.scripts.LlmUtils.llms import OpenAILlm, GcloudLlm, aclose_llm_async_clients
+from common.scripts.LlmUtils.llms.LlmClientRegistry import _aget_or_create_async
+from tests.common import StubLlmServer
+
+MESSAGES = [{'role': 'user', 'content': 'hello'}]
+
+
+class _FakeGenaiResponse:
+    def __init__(self, text):
+        self.text = text
+
+class _UnclosableStream:
+    """
+    close に失敗する同期ストリーム (受信したスレッド名を記録する)
+    """
+    def __init__(self, chunks):
+        self.chunks       = chunks
+        self.thread_names = []
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.thread_names.append(threading.current_thread().name)
+            yield _FakeGenaiResponse(chunk)
+
+    def close(self):
+        raise RuntimeError('close failed')
+
+class _FakeGenaiModels:
+    """
+    ネットワーク受信を time.sleep で模した同期ストリーム
+    """
+    def __init__(self, chunks, delay, closed_event):
+        self.chunks       = chunks
+        self.delay        = delay
+        self.closed_event = closed_event
+
+    def generate_content_stream(self, **kwargs):
+        def _generator():
+            try:
+                for chunk in self.chunks:
+                    time.sleep(self.delay)
+                    yield _FakeGenaiResponse(chunk)
+            finally:
+                self.closed_event.set()
+        return _generator()
+
+class _FakeGenaiClient:
+    def __init__(self, chunks, delay=0.05):
+        self.closed_event = threading.Event()
+        self.models       = _FakeGenaiModels(chunks, delay, self.closed_event)
+
+
+class _CancelOnGetQueue(asyncio.Queue):
+    """
+    cancel_at 回目の get で差分を受け取った直後に consumer_task をキャンセルする
+    (受信とキャンセルが同じタイミングになる状況を再現する)
+    """
+    consumer_task = None
+    cancel_at     = 3
+    get_count     = 0
+
+    async def get(self):
+        item = await super().get()
+        _CancelOnGetQueue.get_count += 1
+        if _CancelOnGetQueue.get_count == _CancelOnGetQueue.cancel_at:
+            _CancelOnGetQueue.consumer_task.cancel()
+        return item
+
+
+class LlmStreamResponseTest(SimpleTestCase):
+
+    async def _consume_with_ticker(self, stream):
+        """
+        stream を消費しながら 10ms 周期のティッカーを動かし、
+        (受信した差分, ティック数, ティック間隔の最大値) を返す
+        """
+        stop     = asyncio.Event()
+        ticks    = 0
+        max_gap  = 0.0
+
+        async def _ticker():
+            nonlocal ticks, max_gap
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now     = time.perf_counter()
+                max_gap = max(max_gap, now - last)
+                last    = now
+                ticks  += 1
+
+        ticker = asyncio.create_task(_ticker())
+        chunks = [chunk async for chunk in stream]
+        stop.set()
+        await ticker
+        return chunks, ticks, max_gap
+
+    def test_openai_stream_does_not_block_event_loop(self):
+        """ [STREAM] OpenAILlm のストリーミング中も他のコルーチンが動作すること """
+        async def _main():
+            server = StubLlmServer(stream_chunks=['a', 'b', 'c', 'd', 'e'], chunk_delay=0.05)
+            await server.start()
+            llm = OpenAILlm(api_key='dummy', base_url=server.base_url, model_name='stub')
+            result = await self._consume_with_ticker(llm.async_get_stream_response(MESSAGES))
+            await aclose_llm_async_clients()
+            await server.stop()
+            return result
+        chunks, ticks, max_gap = asyncio.run(_main())
+
+        self.assertEqual(''.join(chunks), 'abcde')
+        # 約 250ms のストリーム中にティッカーが動き続けていること
+        self.assertGreater(ticks, 10)
+        self.assertLess(max_gap, 0.04)
+
+    def test_async_client_created_off_loop(self):
+        """ [STREAM] 非同期クライアントはスレッドで 1 回だけ作成し、作成中もイベントループをブロックしないこと """
+        created_threads = []
+
+        def _factory():
+            created_threads.append(threading.get_ident())
+            time.sleep(0.1) # SSL コンテキストの読み込みなどの同期処理
+            return object()
+
+        async def _main():
+            async def _get_clients():
+                return await asyncio.gather(*[_aget_or_create_async(('test', 'key'), _factory) for _ in range(5)])
+            clients, ticks, max_gap = await self._consume_with_ticker(self._as_stream(_get_clients()))
+            again = await _aget_or_create_async(('test', 'key'), _factory)
+            return clients[0], again, max_gap, threading.get_ident()
+        clients, again, max_gap, loop_thread = asyncio.run(_main())
+
+        self.assertEqual(len(created_threads), 1)
+        self.assertNotEqual(created_threads[0], loop_thread)
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIs(again, clients[0])
+        self.assertLess(max_gap, 0.04)
+
+    async def _as_stream(self, coro):
+        yield await coro
+
+    def test_gcloud_stream_does_not_block_event_loop(self):
+        """ [STREAM] GcloudLlm の同期ストリームがイベントループをブロックしないこと """
+        async def _main():
+            llm        = GcloudLlm(project_name='dummy', location_name='dummy', model_name='stub')
+            llm.client = _FakeGenaiClient(['a', 'b', 'c', 'd', 'e'])
+            return await self._consume_with_ticker(llm.async_get_stream_response(MESSAGES))
+        chunks, ticks, max_gap = asyncio.run(_main())
+
+        self.assertEqual(''.join(chunks), 'abcde')
+        self.assertGreater(ticks, 10)
+        self.assertLess(max_gap, 0.04)
+
+    def test_gcloud_stream_cancel(self):
+        """ [STREAM] 切断(タスクのキャンセル)が差分の受信と重なっても GcloudLlm のワーカー側の受信を停止すること """
+        fake_client = _FakeGenaiClient(['a'] * 1000, delay=0.01)
+
+        async def _main():
+            llm        = GcloudLlm(project_name='dummy', location_name='dummy', model_name='stub')
+            llm.client = fake_client
+            received   = []
+
+            async def _consume():
+                async for chunk in llm.async_get_stream_response(MESSAGES):
+                    received.append(chunk)
+
+            _CancelOnGetQueue.get_count     = 0
+            _CancelOnGetQueue.consumer_task = asyncio.create_task(_consume())
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(_CancelOnGetQueue.consumer_task, timeout=5.0)
+            return received
+        with mock.patch('common.scripts.LlmUtils.llms.GcloudLlm.asyncio.Queue', _CancelOnGetQueue):
+            received = asyncio.run(_main())
+
+        self.assertEqual(_CancelOnGetQueue.get_count, _CancelOnGetQueue.cancel_at)
+        self.assertLess(len(received), _CancelOnGetQueue.cancel_at)
+        # ワーカースレッドの同期ストリームが閉じられること
+        self.assertTrue(fake_client.closed_event.wait(timeout=1.0))
+
+    def test_genai_client_created_off_loop(self):
+        """ [STREAM] GcloudLlm の genai.Client は初回の呼び出し時にスレッドで作成すること """
+        created_threads = []
+
+        def _client(**kwargs):
+            created_threads.append(threading.get_ident())
+            time.sleep(0.1) # 認証情報・トランスポートの準備
+            return _FakeGenaiClient(['a', 'b'])
+
+        async def _main():
+            llm = GcloudLlm(project_name='off-loop', location_name='dummy', model_name='stub')
+            self.assertIsNone(llm.client)
+            chunks, ticks, max_gap = await self._consume_with_ticker(llm.async_get_stream_response(MESSAGES))
+            again = GcloudLlm(project_name='off-loop', location_name='dummy', model_name='stub')
+            return chunks, max_gap, llm.client, await again.aget_client(), threading.get_ident()
+        with mock.patch('common.scripts.LlmUtils.llms.LlmClientRegistry.genai.Client', side_effect=_client):
+            chunks, max_gap, client, again, loop_thread = asyncio.run(_main())
+
+        self.assertEqual(''.join(chunks), 'ab')
+        self.assertEqual(len(created_threads), 1)
+        self.assertNotEqual(created_threads[0], loop_thread)
+        self.assertIs(again, client)
+        self.assertLess(max_gap, 0.04)
+
+    def test_gcloud_stream_worker(self):
+        """ [STREAM] GcloudLlm の受信は専用の executor で行い、ワーカーの例外をログに残すこと """
+        stream      = _UnclosableStream(['a', 'b'])
+        fake_client = _FakeGenaiClient([])
+        fake_client.models.generate_content_stream = lambda **kwargs: stream
+
+        async def _main():
+            llm        = GcloudLlm(project_name='dummy', location_name='dummy', model_name='stub')
+            llm.client = fake_client
+            chunks     = [chunk async for chunk in llm.async_get_stream_response(MESSAGES)]
+            await asyncio.sleep(0.05)
+            return chunks
+        with self.assertLogs('common.scripts.LlmUtils.llms.GcloudLlm', level='ERROR') as logs:
+            chunks = asyncio.run(_main())
+
+        self.assertEqual(''.join(chunks), 'ab')
+        self.assertTrue(all(name.startswith('llm-stream') for name in stream.thread_names))
+        self.assertIn('close failed', '\n'.join(logs.output))
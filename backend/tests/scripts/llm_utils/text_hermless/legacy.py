@@ -0,0 +1,42 @@
+"""
+比較用: 旧実装の text_url_hermless (TextHermlessUtil の書き換え前)
+"""
+import re
+from urllib.parse import urlparse
+
+def legacy_is_allowed_url(url:str, allowed_domains_list:list) -> bool:
+    parsed_url = urlparse(url)
+    domain     = parsed_url.netloc
+    domain_parts = domain.split('.')
+    for allowed_domain in allowed_domains_list:
+        allowed_parts = allowed_domain.split('.')
+        if domain_parts[-len(allowed_parts):] == allowed_parts:
+            return True
+    return False
+
+def legacy_text_url_hermless(text:str, allowed_domains_list:list) -> str:
+    url_pattern = re.compile(r'https?://[^\s]+')
+    def filter_url(m):
+        url = m.group(0).replace('http://', 'https://')
+        return url if legacy_is_allowed_url(url, allowed_domains_list) else ''
+    text = url_pattern.sub(filter_url, text)
+
+    md_link_pattern = re.compile(r'\[([^\]]+)\]\((https?://[^\s\)]+)\)')
+    def replace_link(m):
+        text, url = m.groups()
+        url = url.replace('http://', 'https://')
+        if legacy_is_allowed_url(url, allowed_domains_list):
+            return f'[{text}]({url})'
+        else:
+            return text
+    text = md_link_pattern.sub(replace_link, text)
+
+    quoted_url_pattern = re.compile(r'「(https?://[^\s]+?)」')
+    def filter_quoted_url(m):
+        url = m.group(1).replace('http://', 'https://')
+        if legacy_is_allowed_url(url, allowed_domains_list):
+            return f'「{url}」'
+        else:
+            return ''
+    text = quoted_url_pattern.sub(filter_quoted_url, text)
+    return text
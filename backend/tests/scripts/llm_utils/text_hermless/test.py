@@ -0,0 +1,75 @@
+from django.test import SimpleTestCase
+import random
+from common.scripts.LlmUtils import text_modify_fnc, TextHermlessStream
+from .legacy import legacy_text_url_hermless
+
+ALLOWED_DOMAINS_LIST = ['go.jp', 'or.jp', 'google.com',]
+TOKENS = ['http://', 'https://', 'http', 'www.', 'google.com', 'a.go.jp', 'evil.com', 'evilgoogle.com',
+          '/', '/path', '?q=', '#f', ':8080', '.', '[', ']', '(', ')', '](', '「', '」',
+          ' ', ' ', '\n', 'リンク', 'x', 'text',]
+
+
+def _random_text(rnd:random.Random, n:int) -> str:
+    return ''.join(rnd.choice(TOKENS) for _ in range(n))
+
+def _random_chunks(rnd:random.Random, text:str):
+    i = 0
+    while i < len(text):
+        j = i + rnd.randint(1, 12)
+        yield text[i:j]
+        i = j
+
+
+class TextHermlessTest(SimpleTestCase):
+
+    def test_examples(self):
+        """ [URL] 許可ドメイン以外の URL を削除し、http を https に変換すること """
+        cases = [
+            ('詳細は https://evil.com/a を参照', '詳細は  を参照'),
+            ('詳細は http://www.google.com/a を参照', '詳細は https://www.google.com/a を参照'),
+            ('[リンク](https://www.city.go.jp/a) と [悪](https://evil.com/a)', '[リンク](https://www.city.go.jp/a) と [悪]('),
+            ('「https://www.google.com/a」', '「https://www.google.com/a」'),
+            ('https://evilgoogle.com/a', ''),
+            ('URL なし', 'URL なし'),
+        ]
+        for text, expected in cases:
+            self.assertEqual(text_modify_fnc(text), expected)
+
+    def test_same_as_legacy(self):
+        """ [URL] ランダムな入力で旧実装と同じ結果になること """
+        rnd = random.Random(0)
+        for _ in range(3000):
+            text = _random_text(rnd, rnd.randint(1, 40))
+            try:
+                expected = legacy_text_url_hermless(text, ALLOWED_DOMAINS_LIST)
+            except ValueError:
+                # 旧実装は不正な netloc (Invalid IPv6 URL 等) で例外になる
+                continue
+            self.assertEqual(text_modify_fnc(text, ALLOWED_DOMAINS_LIST), expected, msg=repr(text))
+
+    def test_stream_same_as_full_text(self):
+        """ [URL] チャンクごとの逐次処理の結果が全文の処理と同じになること """
+        rnd = random.Random(1)
+        for _ in range(3000):
+            text   = _random_text(rnd, rnd.randint(1, 60))
+            stream = TextHermlessStream(ALLOWED_DOMAINS_LIST)
+            output = ''.join(stream.feed(chunk) for chunk in _random_chunks(rnd, text)) + stream.flush()
+            self.assertEqual(output, text_modify_fnc(text, ALLOWED_DOMAINS_LIST), msg=repr(text))
+
+    def test_stream_emits_early(self):
+        """ [URL] 確定した部分は URL の途中でも待たずに返すこと """
+        stream = TextHermlessStream(ALLOWED_DOMAINS_LIST)
+        self.assertEqual(stream.feed('こんにちは。 詳細は https://evil'), 'こんにちは。 詳細は ')
+        self.assertEqual(stream.feed('.com/a です'), ' です')
+        self.assertEqual(stream.flush(), '')
+
+    def test_stream_emits_without_space(self):
+        """ [URL] 空白のない文章は URL / Markdown リンクになりうる位置の手前までを返すこと """
+        stream = TextHermlessStream(ALLOWED_DOMAINS_LIST)
+        self.assertEqual(stream.feed('こんにちは。'), 'こんにちは。')
+        self.assertEqual(stream.feed('詳細はht'), '詳細は')
+        self.assertEqual(stream.feed('tps://evil.com'), '')
+        self.assertEqual(stream.feed('を参照。[リンク'), '')
+        self.assertEqual(stream.flush(), '')
+        stream = TextHermlessStream(ALLOWED_DOMAINS_LIST)
+        self.assertEqual(stream.feed('[注]です。'), '[注]です。')
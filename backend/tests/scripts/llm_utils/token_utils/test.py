@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase
+import tiktoken
+from common.scripts.LlmUtils import TokenizerService
+
+
+def _byte_encoding_loader(model_name=None):
+    """
+    BPE ファイルをダウンロードせずに使えるバイト単位の Encoding
+    """
+    return tiktoken.Encoding(name            = 'test_bytes',
+                             pat_str         = r"""\S+|\s+""",
+                             mergeable_ranks = {bytes([i]): i for i in range(256)},
+                             special_tokens  = {'<|endoftext|>': 256},)
+
+
+class TokenizerServiceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.load_count = 0
+        def _loader(model_name=None):
+            self.load_count += 1
+            return _byte_encoding_loader(model_name)
+        self.tokenizer = TokenizerService(encoding_loader=_loader)
+
+    def test_encoding_memoized(self):
+        """ [TOKEN] Encoding をモデルごとに 1 回だけ読み込むこと """
+        for _ in range(3):
+            self.tokenizer.count('abc', 'gpt-4o')
+        self.assertEqual(self.load_count, 1)
+
+    def test_count_batch(self):
+        """ [TOKEN] セグメントごとのトークン数 (空のセグメントは 0) """
+        self.assertEqual(self.tokenizer.count_batch(['abc', None, 'de', '']), [3, 0, 2, 0])
+        self.assertEqual(self.tokenizer.count_batch(['', 'abc']), [0, 3])
+        self.assertEqual(self.tokenizer.count_total(['abc', 'de', 'f']), 6)
+
+    def test_encode_batch(self):
+        """ [TOKEN] encode_batch の結果と count_batch のトークン数が一致すること """
+        tokens_list = self.tokenizer.encode_batch(['ab', 'cde'])
+        self.assertEqual([len(tokens) for tokens in tokens_list], [2, 3])
+        self.assertEqual(self.tokenizer.count_batch(['ab', 'cde']), [2, 3])
+
+    def test_special_token_text(self):
+        """ [TOKEN] 特殊トークン文字列を含む入力でもエラーにならず数えること """
+        self.assertEqual(self.tokenizer.count('<|endoftext|>'), len('<|endoftext|>'))
@@ -30,6 +30,7 @@ type CustomReceiveLogicProps = {
   allrecognizedTextRef: MutableRefObject<string[]>;
   textToSpeech:         (text: string) => Promise<void>;
   setSidebarInsetTitle: Dispatch<SetStateAction<string>> | undefined;
+  streamIndexRef:       MutableRefObject<number>;
 };
 
 // customReceiveLogic ▽
@@ -40,14 +41,37 @@ export async function customReceiveLogic({
   setRecognizedText,
   allrecognizedTextRef,
   textToSpeech,
-  setSidebarInsetTitle,}: CustomReceiveLogicProps): Promise<void> {
+  setSidebarInsetTitle,
+  streamIndexRef,}: CustomReceiveLogicProps): Promise<void> {
 
   const { setIsWebSocketWaiting }  = contextValue;
   const { cmd, ok, message, data } = payload;
+  // SendUserMessageChunk の受信中は多重送信管理フラグを解除しない
+  let isKeepWaiting = false;
 
   try {
-    // SendUserMessage
-    if (cmd === 'SendUserMessage') {
+    // SendUserMessageChunk: 回答の差分 (SendUserMessageEnd で全文に置き換える)
+    if (cmd === 'SendUserMessageChunk') {
+      if (ok) {
+        isKeepWaiting = true;
+        const index = Number(data?.index ?? -1);
+        const delta = String(data?.delta || '');
+        if (index === 0) {
+          setRecognizedText([]);
+          setReceivedMessages(sanitizeDOMPurify(delta));
+          streamIndexRef.current = 1;
+        } else if (index === streamIndexRef.current) {
+          setReceivedMessages((prev) => sanitizeDOMPurify(prev + delta));
+          streamIndexRef.current += 1;
+        } else {
+          // 受信の取りこぼしがあった場合は End の全文を待つ
+          streamIndexRef.current = -1;
+        };
+      } else {
+        showToast('error', 'receive error', {position: 'bottom-right', duration: 3000});
+      };
+    // SendUserMessage / SendUserMessageEnd: 回答の全文
+    } else if (cmd === 'SendUserMessage' || cmd === 'SendUserMessageEnd') {
       if (ok) {
         const messageText = sanitizeDOMPurify(String(data?.llmResponse || ''));
         
@@ -70,6 +94,9 @@ export async function customReceiveLogic({
     // Reconnect
     } else if (cmd === 'Reconnect') {
       // 特になにもしない
+    // Busy: サーバの処理待ちが上限に達した
+    } else if (cmd === 'Busy') {
+      showToast('info', sanitizeDOMPurify(String(message || 'server busy')), {position: 'bottom-right', duration: 3000});
     // Error
     } else if (cmd === 'Error') {
       if (message) {
@@ -84,7 +111,7 @@ export async function customReceiveLogic({
     showToast('error', 'receive error', {position: 'bottom-right', duration: 3000});
   } finally {
     // 多重送信管理フラグを解除
-    setIsWebSocketWaiting(false);
+    if (!isKeepWaiting) setIsWebSocketWaiting(false);
   };
 };
 // customReceiveLogic △
\ No newline at end of file
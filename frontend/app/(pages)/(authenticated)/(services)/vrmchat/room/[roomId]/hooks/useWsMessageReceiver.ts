@@ -1,7 +1,7 @@
 'use client';
 
 // react
-import { useEffect, type Dispatch, type SetStateAction } from 'react';
+import { useEffect, useRef, type Dispatch, type SetStateAction } from 'react';
 // providers
 import {
   WebSocketCoreContextValue,
@@ -34,6 +34,9 @@ export function useWsMessageReceiver({
   textToSpeech,
   setSidebarInsetTitle, }: UseWsMessageReceiverProps) {
 
+  // 次に受信する SendUserMessageChunk の index (-1: 欠落したため SendUserMessageEnd まで追記しない)
+  const streamIndexRef = useRef<number>(0);
+
   useEffect(() => {
     if (!wsContext || !serverMessage) return;
 
@@ -46,6 +49,7 @@ export function useWsMessageReceiver({
       allrecognizedTextRef,
       textToSpeech,
       setSidebarInsetTitle,
+      streamIndexRef,
     });
   }, [ serverMessage ]);
 };
\ No newline at end of file
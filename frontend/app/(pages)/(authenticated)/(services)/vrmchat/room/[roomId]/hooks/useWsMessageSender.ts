@@ -40,7 +40,9 @@ export function useWsMessageSender({
     handleSendCore({
       cmd:  'SendUserMessage',
       data: {
-        message: combinedMessage,
+        message:  combinedMessage,
+        // 回答を SendUserMessageChunk で逐次受信する (値は文字列で送信される)
+        isStream: 'true',
       },
     });
   }, [isStopRecognition]);
@@ -63,7 +63,7 @@ export function ClientUI({
 
         <CardContent className='relative z-10 flex h-full flex-col p-4 pr-16'>
 
-          {/* ユーザ発話 or AI レスポンスの表示切り替え */}
+          {/* ユーザ発話 or AI レスポンスの表示切り替え (回答の受信中 (SendUserMessageChunk) は isWebSocketWaiting が true のまま) */}
           <ScrollArea>
             { (!recognizedText?.length && !recognizingText && !receivedMessages?.length) ? (
               <>
@@ -71,13 +71,13 @@ export function ClientUI({
                 <p className='select-none text-foreground/60'>You can also start recognition by clicking the microphone icon on the right.</p>
               </>
               
-            ) : ( (!isStopRecognition || isWebSocketWaiting) ? (
+            ) : ( (!isStopRecognition || (isWebSocketWaiting && !receivedMessages)) ? (
               <>
                 <span className='select-none text-foreground'>{recognizedText}</span>
                 <span className='select-none text-foreground/60'>{recognizingText}</span>
               </>
             ) : ( (receivedMessages) ? (
-              <MarkdownRender markdownString={receivedMessages}/>
+              <MarkdownRender markdownString={receivedMessages} isStreamingRender={isWebSocketWaiting}/>
             ) : (
               <>
                 <Skeleton className='mt-1 h-[20px] w-[25rem] rounded-full' />
@@ -89,7 +89,7 @@ export function ClientUI({
 
           {/* 会話ターンの表示 */}
           <div className='absolute -left-4 -top-4 z-sticky'>
-            { (!isStopRecognition || isWebSocketWaiting) ? (
+            { (!isStopRecognition || (isWebSocketWaiting && !receivedMessages)) ? (
               <Badge className='bg-info font-semibold text-info-foreground hover:bg-info'>You</Badge>
             ) : (
               <Badge className='bg-success font-semibold text-success-foreground hover:bg-success'>AI</Badge>
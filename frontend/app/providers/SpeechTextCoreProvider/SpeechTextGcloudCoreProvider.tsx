@@ -64,8 +64,15 @@ export function SpeechTextGcloudCoreProvider({
   const [isStopRecognition, setIsStopRecognition] = useState<boolean>(false);
   const isSpacePressedRef                         = useRef<boolean>(false);
   const mediaRecorderRef                          = useRef<RecordRTC | null>(null);
+  // サーバは発話後の無音で認識を終了する (sttend は 1 回だけ送る)
+  const isSttendSentRef                           = useRef<boolean>(true);
   const audioContextRef                           = useRef<AudioContext | null>(null);
   const sourceRef                                 = useRef<AudioBufferSourceNode | null>(null);
+  const analyserRef                               = useRef<AnalyserNode | null>(null);
+  // TTS の音声は文ごとに届く (同じリクエストの音声は続けて再生する)
+  const ttsRequestIdRef                           = useRef<number | null>(null);
+  const ttsNextStartTimeRef                       = useRef<number>(0);
+  const ttsDecodeChainRef                         = useRef<Promise<void>>(Promise.resolve());
 
   /**
    * ==========
@@ -118,6 +125,7 @@ export function SpeechTextGcloudCoreProvider({
       const wsUrl          = `${wsProtocol}://${backendDomain}/${thirdPartyPath.gcloud.ws_stt_tts}`;
       const newSocket      = new WebSocket(wsUrl);
       newSocket.binaryType = 'arraybuffer'; // バイナリを扱う宣言
+      ttsRequestIdRef.current = null;       // requestId は接続ごとの連番
       setUpWebSocketListeners({ws: newSocket, isReconnect: isReconnect});
       socketRef.current = newSocket;
       console.log('gcloud connectWebSocket OK');    // Debug
@@ -215,69 +223,19 @@ export function SpeechTextGcloudCoreProvider({
           if (data.cmd === 'pong') return;
           if (data.cmd === 'receiverMessage') return;
           // --------------------
+          // Speech-to-Text (開始できなかった場合の通知)
+          // --------------------
+          if (data.cmd === 'stt') {
+            showToast(data?.toastType ?? 'info', data?.toastMessage ?? 'busy');
+            return;
+          };
+          // --------------------
           // Text-to-Speech
           // --------------------
+          // 音声はバイナリフレームで届く (ここでは失敗の通知のみ)
           if (data.cmd === 'tts') {
-            try {
-              if (!data.ok) {
-                showToast(data?.toastType ?? 'info', data?.toastMessage ?? 'No speech?');
-                return;
-              };
-              if (!data.audioContent) {
-                showToast(data?.toastType ?? 'info', data?.toastMessage ?? 'No speech?');
-                return;
-              };
-              // Base64 → ArrayBuffer ▽
-              const binary = atob(data.audioContent);
-              const len    = binary.length;
-              const buffer = new Uint8Array(len);
-              for (let i = 0; i < len; i++) {
-                buffer[i] = binary.charCodeAt(i);
-              };
-              const audioData = buffer.buffer;
-              if (!audioData) {
-                showToast(data?.toastType ?? 'info', data?.toastMessage ?? 'No speech?');
-                return;
-              };
-              // Base64 → ArrayBuffer △
-              // AudioContext 作成 ▽
-              if (audioContextRef.current) {
-                if(audioContextRef.current.state !== 'closed') audioContextRef.current.close();
-                audioContextRef.current = null;
-              };
-              const audioContext      = new AudioContext();
-              audioContextRef.current = audioContext;
-              if (!audioContext) {
-                // ブラウザがサポート外
-                // 使用環境によっては new (window.AudioContext || window.webkitAudioContext)(); を検討
-                showToast('warning', 'AudioContext not supported', {position: 'bottom-right', duration: 3000});
-                return;
-              };
-              // AudioContext 作成 △
-              // リップシンク解析用
-              const analyser   = audioContext.createAnalyser();
-              analyser.fftSize = 2048;
-              const dataArray  = new Uint8Array(analyser.frequencyBinCount);
-              // 音声合成完了
-              audioContext.decodeAudioData(audioData, (buffer) => {
-                  const source      = audioContext.createBufferSource();
-                  source.buffer     = buffer;
-                  sourceRef.current = source;
-                  // AudioContextにanalyserを接続してリップシンク用に解析
-                  source.connect(analyser);
-                  analyser.connect(audioContext.destination);
-                  setSpeechDataArray(dataArray); // VRMでリップシンクする際にstartLipSyncに渡す
-                  setSpeechAnalyser(analyser);   // VRMでリップシンクする際にstartLipSyncに渡す
-                  // 音声再生
-                  setIsSpeechStreaming(true);
-                  source.start(0);
-                }, () => {
-                  showToast('warning', 'error1', {position: 'bottom-right', duration: 3000});
-                },
-              );
-            } catch {
-              showToast('warning', 'error2', {position: 'bottom-right', duration: 3000});
-            };
+            showToast(data?.toastType ?? 'info', data?.toastMessage ?? 'No speech?');
+            return;
           };
         } else {
           // --------------------
@@ -301,7 +259,18 @@ export function SpeechTextGcloudCoreProvider({
               allrecognizedTextRef.current = [...allrecognizedTextRef.current, safeText];
             };
           } else {
-            // STT 終了 (キーボード離した後)
+            // STT 終了 (キーボード離した後 / サーバが発話後の無音で終了した)
+            if (!isSttendSentRef.current) {
+              // サーバが終了した場合は録音を止めて sttend を返す
+              isSttendSentRef.current = true;
+              setIsRecognizing(false);
+              if (mediaRecorderRef.current) {
+                mediaRecorderRef.current.stopRecording(() => {
+                  mediaRecorderRef.current = null;
+                });
+              };
+              sendBlob({blobData: new TextEncoder().encode('sttend')});
+            };
             // 認識途中のがあれば入れる
             setRecognizedText((prev) => [...prev, recognizingTextRef.current]);
             allrecognizedTextRef.current = [...allrecognizedTextRef.current, recognizingTextRef.current];
@@ -313,13 +282,82 @@ export function SpeechTextGcloudCoreProvider({
           };
         };
       } else {
-        //
+        // --------------------
+        // Text-to-Speech (音声)
+        // --------------------
+        handleTtsAudioFrame(event.data as ArrayBuffer);
       };
     } catch {
       //
     };
   };
 
+  // handleTtsAudioFrame
+  //  - フレーム: [ヘッダ長 (uint16 big endian)] [ヘッダ (JSON)] [音声]
+  //  - 文ごとに届く音声を同じ AudioContext で続けて再生する
+  function handleTtsAudioFrame(frame: ArrayBuffer): void {
+    try {
+      const headerLength = new DataView(frame).getUint16(0);
+      const header       = JSON.parse(new TextDecoder().decode(new Uint8Array(frame, 2, headerLength)));
+      if (header.cmd !== 'tts' || !header.ok) return;
+      const audioData    = frame.slice(2 + headerLength);
+      if (header.requestId === ttsRequestIdRef.current && !audioContextRef.current) {
+        // 再生を停止したリクエストの残り
+        return;
+      };
+      // AudioContext 作成 (新しいリクエストなら前の音声を止める) ▽
+      if (header.requestId !== ttsRequestIdRef.current) {
+        ttsRequestIdRef.current = header.requestId;
+        if (audioContextRef.current) {
+          if(audioContextRef.current.state !== 'closed') audioContextRef.current.close();
+          audioContextRef.current = null;
+        };
+        const audioContext      = new AudioContext();
+        audioContextRef.current = audioContext;
+        if (!audioContext) {
+          // ブラウザがサポート外
+          // 使用環境によっては new (window.AudioContext || window.webkitAudioContext)(); を検討
+          showToast('warning', 'AudioContext not supported', {position: 'bottom-right', duration: 3000});
+          return;
+        };
+        // リップシンク解析用
+        const analyser   = audioContext.createAnalyser();
+        analyser.fftSize = 2048;
+        analyser.connect(audioContext.destination);
+        analyserRef.current         = analyser;
+        ttsNextStartTimeRef.current = 0;
+        ttsDecodeChainRef.current   = Promise.resolve();
+        setSpeechDataArray(new Uint8Array(analyser.frequencyBinCount)); // VRMでリップシンクする際にstartLipSyncに渡す
+        setSpeechAnalyser(analyser);                                    // VRMでリップシンクする際にstartLipSyncに渡す
+      };
+      // AudioContext 作成 △
+      const audioContext = audioContextRef.current;
+      const analyser     = analyserRef.current;
+      if (!audioContext || !analyser) return;
+      // decodeAudioData は完了の順が前後するため届いた順に処理する
+      ttsDecodeChainRef.current = ttsDecodeChainRef.current.then(async () => {
+        try {
+          const buffer = await audioContext.decodeAudioData(audioData);
+          // 停止済み or 次のリクエストが始まっている
+          if (audioContextRef.current !== audioContext) return;
+          const source      = audioContext.createBufferSource();
+          source.buffer     = buffer;
+          sourceRef.current = source;
+          source.connect(analyser);
+          // 前の文の再生が終わる時刻から再生
+          const startTime             = Math.max(audioContext.currentTime, ttsNextStartTimeRef.current);
+          ttsNextStartTimeRef.current = startTime + buffer.duration;
+          setIsSpeechStreaming(true);
+          source.start(startTime);
+        } catch {
+          showToast('warning', 'error1', {position: 'bottom-right', duration: 3000});
+        };
+      });
+    } catch {
+      showToast('warning', 'error2', {position: 'bottom-right', duration: 3000});
+    };
+  };
+
   // --------------------
   // ping
   // - socket 死活監視
@@ -437,6 +475,7 @@ export function SpeechTextGcloudCoreProvider({
     if (isRecognizing) return;
     setIsRecognizing(true)
     setIsStopRecognition(false);
+    isSttendSentRef.current = false;
 
     // 再生中の音声があればストップ
     stopAudioPlayback();
@@ -491,6 +530,9 @@ export function SpeechTextGcloudCoreProvider({
     };
     
     // STT socket に終了のバイナリを注入する -> これをsocketが受け取ってレシーブしたらSTT終了とする
+    // (サーバが終了して送信済みの場合は送らない)
+    if (isSttendSentRef.current) return;
+    isSttendSentRef.current = true;
     const encoder = new TextEncoder();
     const data    = encoder.encode('sttend');
     sendBlob({blobData: data});